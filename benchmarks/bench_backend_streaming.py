@@ -0,0 +1,193 @@
+"""
+Measures peak memory and throughput of BackendService moving large bodies, buffered and streamed.
+
+A stub HTTP/1.1 backend in a separate process serves a download of
+``--size-mb`` bytes, counts the bytes of an upload (Content-Length or
+chunked) and streams a JSON array of ``--json-mb`` worth of small objects.
+Each mode runs in a fresh process, so the reported peak RSS growth
+(``ru_maxrss``) is that mode's alone.
+
+Modes: ``download_buffered`` reads the body with ``send_request`` and no size
+limit, ``download_streamed`` iterates ``stream_request`` chunks;
+``upload_bytes`` sends a body built in memory, ``upload_streamed`` sends a
+``ReplayableBody`` of generated chunks; ``json_buffered`` parses the whole
+array, ``json_streamed`` counts elements from ``iter_json``. The JSON size
+defaults to a quarter of the transfer size, as the buffered parse holds
+several times the document in Python objects.
+
+Usage:
+    python benchmarks/bench_backend_streaming.py --size-mb 1024 --json-mb 256
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import multiprocessing
+from harness import SRC, free_port, wait_for_port
+
+MEGABYTE = 1024 * 1024
+WRITE_SIZE = 1024 * 1024
+ITEM = b'{"id": %9d, "name": "item", "payload": "' + b"x" * 64 + b'"}'
+
+async def _read_body(reader, headers):
+    if b"transfer-encoding: chunked" in headers:
+        total = 0
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            if size == 0:
+                await reader.readuntil(b"\r\n")
+                return total
+            while size:
+                data = await reader.read(min(size, WRITE_SIZE))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", size)
+                size -= len(data)
+                total += len(data)
+            await reader.readexactly(2)
+    length = 0
+    for line in headers.split(b"\r\n"):
+        if line.startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    remaining = length
+    while remaining:
+        data = await reader.read(min(remaining, WRITE_SIZE))
+        if not data:
+            raise asyncio.IncompleteReadError(b"", remaining)
+        remaining -= len(data)
+    return length
+
+async def _write_chunk(writer, data):
+    writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+    await writer.drain()
+
+async def _stub(reader, writer):
+    try:
+        head = (await reader.readuntil(b"\r\n\r\n")).lower()
+        target = head.split(b" ", 2)[1].decode()
+        path, _, query = target.partition("?")
+        size = int(query.partition("=")[2] or 0)
+        if path == "/download":
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n"
+                         b"Content-Length: %d\r\nConnection: close\r\n\r\n" % size)
+            block = b"\0" * WRITE_SIZE
+            for offset in range(0, size, WRITE_SIZE):
+                writer.write(block[:min(WRITE_SIZE, size - offset)])
+                await writer.drain()
+        elif path == "/upload":
+            body = json.dumps({"bytes": await _read_body(reader, head)}).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\nConnection: close\r\n\r\n%s" % (len(body), body))
+        elif path == "/items":
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+            batch = []
+            for index in range(size):
+                batch.append(ITEM % index)
+                if len(batch) == 4096:
+                    await _write_chunk(writer, (b"[" if index < 4096 else b",") + b",".join(batch))
+                    batch = []
+            if batch:
+                await _write_chunk(writer, (b"[" if size <= 4096 else b",") + b",".join(batch))
+            await _write_chunk(writer, b"]")
+            writer.write(b"0\r\n\r\n")
+        await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+def _serve(port):
+    async def serve():
+        server = await asyncio.start_server(_stub, "127.0.0.1", port)
+        async with server:
+            await server.serve_forever()
+    asyncio.run(serve())
+
+async def _generate(size, chunk_size):
+    block = b"\0" * chunk_size
+    for offset in range(0, size, chunk_size):
+        yield block[:min(chunk_size, size - offset)]
+
+async def _transfer(mode, port, size, items):
+    from services.backend_service import BackendService, ReplayableBody
+
+    service = BackendService(f"http://127.0.0.1:{port}", max_retries=1, timeout=600)
+    if mode == "download_buffered":
+        service.max_body_size = None
+        return len(await service.send_request(f"download?bytes={size}"))
+    if mode == "download_streamed":
+        received = 0
+        async with service.stream_request(f"download?bytes={size}") as response:
+            async for chunk in response.iter_chunks():
+                received += len(chunk)
+        return received
+    if mode == "upload_bytes":
+        return (await service.send_request("upload", "POST", data=b"\0" * size))["bytes"]
+    if mode == "upload_streamed":
+        body = ReplayableBody.from_chunks(lambda: _generate(size, service.chunk_size))
+        return (await service.send_request("upload", "POST", data=body))["bytes"]
+    if mode == "json_buffered":
+        service.max_body_size = None
+        return len(await service.send_request(f"items?count={items}"))
+    async with service.stream_request(f"items?count={items}") as response:
+        count = 0
+        async for _ in response.iter_json():
+            count += 1
+        return count
+
+def _run_mode(mode, port, size, items, results):
+    sys.path.insert(0, SRC)
+    import aiohttp  # noqa: F401  (imported before the baseline, like in a running proxy)
+    import services.backend_service  # noqa: F401
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    count = asyncio.run(_transfer(mode, port, size, items))
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put({"count": count, "seconds": elapsed, "peak_rss_delta_kb": peak - baseline})
+
+def measure(mode, port, size, items, transferred):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_mode, args=(mode, port, size, items, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"{mode} failed with exit code {process.exitcode}")
+    result = results.get()
+    return {
+        "count": result["count"],
+        "seconds": round(result["seconds"], 2),
+        "throughput_mb_per_sec": round(transferred / MEGABYTE / result["seconds"], 1),
+        "peak_rss_delta_mb": round(result["peak_rss_delta_kb"] / 1024, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=1024, help="Download and upload size")
+    parser.add_argument("--json-mb", type=int, default=None, help="JSON array size (default: a quarter of --size-mb)")
+    parser.add_argument("--modes", default="download_buffered,download_streamed,upload_bytes,upload_streamed,"
+                                           "json_buffered,json_streamed")
+    args = parser.parse_args()
+
+    size = args.size_mb * MEGABYTE
+    items = (args.json_mb or max(1, args.size_mb // 4)) * MEGABYTE // (len(ITEM % 0) + 1)
+    json_size = items * (len(ITEM % 0) + 1) + 1
+    port = free_port()
+    server = multiprocessing.Process(target=_serve, args=(port,), daemon=True)
+    server.start()
+    wait_for_port(port)
+    try:
+        report = {}
+        for mode in args.modes.split(","):
+            transferred = json_size if mode.startswith("json") else size
+            report[mode] = measure(mode, port, size, items, transferred)
+    finally:
+        server.terminate()
+        server.join()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
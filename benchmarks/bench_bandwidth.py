@@ -0,0 +1,107 @@
+"""
+Measures fairness of bandwidth shaping among competing local flows.
+
+Several clients (distinct loopback source addresses) stream data through the
+proxy to an echo backend; one "aggressive" client opens several connections
+while the others open one each. Reports per-client throughput and Jain's
+fairness index (1.0 is perfectly fair) with shaping off, with only a global
+limit and with global plus per-client limits. Limits are charged for both
+directions, so echoed throughput settles at half the configured rate.
+
+Usage:
+    python benchmarks/bench_bandwidth.py --clients 4 --aggressive 4 --global-rate 40
+"""
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from harness import Backend, ProxyProcess, client_tls_context, generate_certificate
+
+SHAPED_PROXY_SCRIPT = """
+import asyncio, json, sys
+from core.proxy_handler import QuantumSafeProxy
+from middleware.bandwidth_shaper import BandwidthShaper
+shaper = BandwidthShaper.from_config(json.loads(sys.argv[5])) if sys.argv[5] != "null" else None
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4],
+                         shaper=shaper)
+asyncio.run(proxy.start())
+"""
+
+CHUNK = b"x" * 16384
+
+def jain_index(values):
+    """
+    Returns Jain's fairness index of the given allocations.
+    """
+    total = sum(values)
+    squares = sum(value * value for value in values)
+    return total * total / (len(values) * squares) if squares else 0.0
+
+async def _flow(port, source, deadline, received):
+    reader, writer = await asyncio.open_connection(
+        "127.0.0.1", port, ssl=client_tls_context(), local_addr=(source, 0))
+
+    async def send():
+        while time.monotonic() < deadline:
+            writer.write(CHUNK)
+            await writer.drain()
+
+    sender = asyncio.ensure_future(send())
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                data = await asyncio.wait_for(reader.read(65536), remaining)
+            except asyncio.TimeoutError:
+                break
+            if not data:
+                break
+            received[source] += len(data)
+    finally:
+        sender.cancel()
+        writer.close()
+
+async def _compete(port, clients, aggressive, duration):
+    sources = [f"127.0.0.{10 + index}" for index in range(clients)]
+    received = dict.fromkeys(sources, 0)
+    deadline = time.monotonic() + duration
+    flows = [_flow(port, source, deadline, received)
+             for index, source in enumerate(sources) for _ in range(aggressive if index == 0 else 1)]
+    await asyncio.gather(*flows, return_exceptions=True)
+    return [received[source] / duration / 1e6 for source in sources]
+
+def measure(bandwidth, backend_port, cert_file, key_file, args):
+    with ProxyProcess(backend_port, cert_file, key_file, script=SHAPED_PROXY_SCRIPT,
+                      extra_args=[json.dumps(bandwidth)]) as proxy:
+        per_client = asyncio.run(_compete(proxy.port, args.clients, args.aggressive, args.duration))
+    return {
+        "per_client_mb_per_sec": [round(rate, 2) for rate in per_client],
+        "total_mb_per_sec": round(sum(per_client), 2),
+        "jain_index": round(jain_index(per_client), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=4, help="Competing client addresses")
+    parser.add_argument("--aggressive", type=int, default=4, help="Connections opened by the first client")
+    parser.add_argument("--global-rate", type=float, default=40.0, help="Global limit in MB/s")
+    parser.add_argument("--duration", type=float, default=8.0, help="Seconds per run")
+    args = parser.parse_args()
+
+    global_rate = args.global_rate * 1e6
+    runs = {
+        "unshaped": None,
+        "global": {"global_rate": global_rate},
+        "global_and_per_client": {"global_rate": global_rate, "per_client_rate": global_rate / args.clients},
+    }
+    with tempfile.TemporaryDirectory() as directory, Backend("echo") as backend:
+        cert_file, key_file = generate_certificate(directory)
+        report = {name: measure(bandwidth, backend.port, cert_file, key_file, args)
+                  for name, bandwidth in runs.items()}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
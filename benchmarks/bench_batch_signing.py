@@ -0,0 +1,86 @@
+"""
+Compares per-message Dilithium signing with Merkle-batched signing.
+
+``per_message`` signs every message, as ``sign_message_with_dilithium``
+does. ``batched_<n>`` signs the same messages through ``MerkleBatchSigner.sign_batch``
+in batches of n. Reported per mode: signatures (messages) per second, bytes
+stored per message (signature, or inclusion proof plus the signed root
+shared by the batch), and verifications per second with a fresh verifier
+(first message of each batch checks the root signature, the rest hit the
+root cache). Keys are generated locally, so KMS is not part of the timing.
+Requires the liboqs Python bindings (``oqs``).
+
+Usage:
+    python benchmarks/bench_batch_signing.py --messages 2000 --batch-sizes 16 64 256 1024
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import oqs
+from crypto.merkle_signing import MerkleBatchSigner, MerkleBatchVerifier
+
+def per_message(messages, algorithm, signer, public_key):
+    started = time.perf_counter()
+    signatures = [signer.sign(message) for message in messages]
+    signing = time.perf_counter() - started
+    with oqs.Signature(algorithm) as verifier:
+        started = time.perf_counter()
+        valid = all(verifier.verify(message, signature, public_key)
+                    for message, signature in zip(messages, signatures))
+        verifying = time.perf_counter() - started
+    return {
+        "signatures_per_sec": round(len(messages) / signing, 1),
+        "bytes_per_message": round(sum(map(len, signatures)) / len(messages), 1),
+        "verifications_per_sec": round(len(messages) / verifying, 1),
+        "valid": valid,
+    }
+
+def batched(messages, batch_size, algorithm, signer, public_key):
+    batch_signer = MerkleBatchSigner(signer.sign, max_batch=batch_size)
+    started = time.perf_counter()
+    batches = [batch_signer.sign_batch(messages[offset:offset + batch_size])
+               for offset in range(0, len(messages), batch_size)]
+    signing = time.perf_counter() - started
+
+    results = [result for batch in batches for result in batch]
+    # Every message stores its proof; each batch stores its signed root once
+    stored = sum(len(result.proof.to_bytes()) for result in results)
+    stored += sum(len(batch[0].signed_root.to_bytes()) for batch in batches)
+    with oqs.Signature(algorithm) as verifier:
+        batch_verifier = MerkleBatchVerifier(
+            lambda payload, signature: verifier.verify(payload, signature, public_key))
+        started = time.perf_counter()
+        valid = all(batch_verifier.verify(message, result.proof, result.signed_root)
+                    for message, result in zip(messages, results))
+        verifying = time.perf_counter() - started
+    return {
+        "signatures_per_sec": round(len(messages) / signing, 1),
+        "bytes_per_message": round(stored / len(messages), 1),
+        "verifications_per_sec": round(len(messages) / verifying, 1),
+        "valid": valid,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--algorithm", default="Dilithium3")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--message-size", type=int, default=256, help="Bytes per message (an audit record)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 64, 256, 1024])
+    args = parser.parse_args()
+
+    messages = [os.urandom(args.message_size) for _ in range(args.messages)]
+    with oqs.Signature(args.algorithm) as signer:
+        public_key = signer.generate_keypair()
+        results = {"algorithm": args.algorithm, "messages": args.messages,
+                   "per_message": per_message(messages, args.algorithm, signer, public_key)}
+        for batch_size in args.batch_sizes:
+            results[f"batched_{batch_size}"] = batched(messages, batch_size, args.algorithm, signer, public_key)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Measures how fast pushed certificate updates reach clients of the proxy.
+
+Runs the proxy with a ``CertificateSubscriber`` against the stub TLS
+communication service and publishes a new certificate every ``--interval``
+seconds. For each update it reports the time until the stub received the
+acknowledgement and until a new TLS handshake presented the new
+certificate. The same is measured for updates published while the
+subscription is down (resume after reconnect), and for start-up with and
+without cached certificates. The placeholder this replaced rebuilt the TLS
+context every 60 seconds, i.e. 30 seconds of propagation delay on average.
+
+Usage:
+    python benchmarks/bench_cert_distribution.py --updates 20
+    python benchmarks/bench_cert_distribution.py --reconnect-delay 0.5 --heartbeat-interval 1
+"""
+import os
+import ssl
+import json
+import time
+import socket
+import argparse
+import tempfile
+from harness import Backend, ProxyProcess, client_tls_context, generate_certificate, percentile
+from cert_service_stub import CertificateServiceStub
+
+SUBSCRIBER_SCRIPT = """
+import asyncio, sys
+from core.proxy_handler import QuantumSafeProxy
+from services.cert_distribution import CertificateSubscriber
+async def main():
+    cert_file, key_file = sys.argv[3], sys.argv[4]
+    subscriber = CertificateSubscriber(sys.argv[5], cert_file, key_file, state_file=sys.argv[6],
+                                       heartbeat_timeout=float(sys.argv[7]), reconnect_delay=float(sys.argv[8]))
+    if not subscriber.restore():
+        subscriber.fetch_snapshot(10)
+    proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), cert_file, key_file)
+    subscriber.add_listener(lambda: proxy.reload_certificates(cert_file, key_file))
+    asyncio.ensure_future(subscriber.run())
+    await proxy.start()
+asyncio.run(main())
+"""
+
+def _new_certificate(directory, index):
+    path = os.path.join(directory, f"v{index}")
+    os.makedirs(path)
+    cert_file, key_file = generate_certificate(path, common_name=f"v{index}.localhost")
+    with open(cert_file) as cert, open(key_file) as key:
+        return {"cert_file": cert.read(), "key_file": key.read()}
+
+def _served_certificate(port, context):
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        with context.wrap_socket(sock, server_hostname="localhost") as tls:
+            return tls.getpeercert(binary_form=True)
+
+def _propagate(stub, proxy, files, context, timeout=30.0):
+    """
+    Publishes ``files`` and returns seconds until the acknowledgement and until a handshake serves the new certificate.
+    """
+    expected = ssl.PEM_cert_to_DER_cert(files["cert_file"])
+    started = time.perf_counter()
+    version = stub.publish(files)
+    acknowledged = served = None
+    while time.perf_counter() - started < timeout and (acknowledged is None or served is None):
+        if acknowledged is None and any(ack["version"] == version for ack in stub.acknowledgements.values()):
+            acknowledged = time.perf_counter() - started
+        if served is None and _served_certificate(proxy.port, context) == expected:
+            served = time.perf_counter() - started
+        time.sleep(0.001)
+    if served is None:
+        raise TimeoutError(f"version {version} was not served within {timeout}s")
+    return acknowledged or served, served
+
+def _summary(samples):
+    return {
+        "ack_ms_p50": round(percentile([ack for ack, _ in samples], 0.50) * 1000, 1),
+        "served_ms_p50": round(percentile([served for _, served in samples], 0.50) * 1000, 1),
+        "served_ms_p99": round(percentile([served for _, served in samples], 0.99) * 1000, 1),
+    }
+
+def _start(backend, directory, stub, args):
+    started = time.perf_counter()
+    proxy = ProxyProcess(backend.port, os.path.join(directory, "live", "cert.pem"),
+                         os.path.join(directory, "live", "key.pem"), script=SUBSCRIBER_SCRIPT,
+                         extra_args=[stub.url, os.path.join(directory, "state.json"), args.heartbeat_timeout,
+                                     args.reconnect_delay])
+    proxy.__enter__()
+    return proxy, (time.perf_counter() - started) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", type=int, default=20, help="Certificate updates per phase")
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between updates")
+    parser.add_argument("--heartbeat-interval", type=float, default=2.0, help="Stub heartbeat interval")
+    parser.add_argument("--heartbeat-timeout", type=float, default=6.0, help="Subscriber heartbeat timeout")
+    parser.add_argument("--reconnect-delay", type=float, default=0.5, help="Subscriber initial reconnect delay")
+    args = parser.parse_args()
+
+    context = client_tls_context()
+    with tempfile.TemporaryDirectory() as directory, Backend("echo") as backend, \
+            CertificateServiceStub(heartbeat_interval=args.heartbeat_interval) as stub:
+        certificates = [_new_certificate(directory, index) for index in range(2 * args.updates + 1)]
+        stub.publish(certificates.pop())
+
+        proxy, first_start_ms = _start(backend, directory, stub, args)
+        try:
+            pushed = []
+            for files in certificates[:args.updates]:
+                pushed.append(_propagate(stub, proxy, files, context))
+                time.sleep(args.interval)
+            resumed = []
+            for files in certificates[args.updates:]:
+                # The update is published while the subscription is down
+                stub.disconnect()
+                resumed.append(_propagate(stub, proxy, files, context))
+                time.sleep(args.interval)
+        finally:
+            proxy.__exit__(None, None, None)
+
+        # A restart serves the cached certificate without waiting for the service
+        proxy, cached_start_ms = _start(backend, directory, stub, args)
+        proxy.__exit__(None, None, None)
+
+    report = {
+        "push": _summary(pushed),
+        "resume_after_disconnect": _summary(resumed),
+        "start_ms_first": round(first_start_ms, 1),
+        "start_ms_cached": round(cached_start_ms, 1),
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
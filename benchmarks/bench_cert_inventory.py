@@ -0,0 +1,127 @@
+"""
+Benchmarks the certificate inventory against thousands of generated certificates.
+
+A fake ``certbot`` script stands in for the real one, so renewals exercise the
+async subprocess path without touching any CA.
+
+Usage:
+    python benchmarks/bench_cert_inventory.py --count 5000 --due 200
+"""
+import os
+import sys
+import json
+import time
+import stat
+import asyncio
+import argparse
+import tempfile
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import Encoding
+from services.certificate_manager import CertificateInventory
+
+FAKE_CERTBOT = """#!/bin/sh
+sleep {delay}
+echo "$@" >> "{log_file}"
+exit 0
+"""
+
+def generate_certificates(directory, count, due):
+    """
+    Writes ``count`` self-signed certificates in a Certbot-style ``live/<name>/cert.pem`` layout.
+
+    The first ``due`` certificates expire within the renewal threshold.
+    """
+    key = ec.generate_private_key(ec.SECP256R1())
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for i in range(count):
+        name = f"site{i:06d}.example.test"
+        expires_in = datetime.timedelta(days=5 if i < due else 60 + i % 300)
+        subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(subject)
+            .issuer_name(subject)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + expires_in)
+            .sign(key, hashes.SHA256())
+        )
+        cert_dir = os.path.join(directory, "live", name)
+        os.makedirs(cert_dir)
+        with open(os.path.join(cert_dir, "cert.pem"), "wb") as f:
+            f.write(cert.public_bytes(Encoding.PEM))
+
+def write_fake_certbot(directory, delay):
+    path = os.path.join(directory, "certbot")
+    log_file = os.path.join(directory, "certbot.log")
+    with open(path, "w") as f:
+        f.write(FAKE_CERTBOT.format(delay=delay, log_file=log_file))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path, log_file
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        generate_certificates(directory, args.count, args.due)
+        generate_seconds = time.perf_counter() - started
+        certbot_path, log_file = write_fake_certbot(directory, args.certbot_delay)
+
+        inventory = CertificateInventory(
+            [os.path.join(directory, "live")],
+            max_concurrent_renewals=args.concurrency,
+            certbot_path=certbot_path
+        )
+
+        started = time.perf_counter()
+        parsed = await inventory.refresh()
+        cold_scan = time.perf_counter() - started
+
+        started = time.perf_counter()
+        reparsed = await inventory.refresh()
+        warm_scan = time.perf_counter() - started
+
+        started = time.perf_counter()
+        renewed, failed = await inventory.renew_due()
+        renew_seconds = time.perf_counter() - started
+
+        with open(log_file) as f:
+            certbot_calls = sum(1 for _ in f)
+
+        return {
+            "certificates": args.count,
+            "generate_seconds": round(generate_seconds, 3),
+            "cold_scan_seconds": round(cold_scan, 4),
+            "cold_scan_parsed": parsed,
+            "warm_scan_seconds": round(warm_scan, 4),
+            "warm_scan_parsed": reparsed,
+            "renewed": renewed,
+            "failed": failed,
+            "certbot_calls": certbot_calls,
+            "renew_seconds": round(renew_seconds, 3),
+            "renew_concurrency": args.concurrency,
+            "next_due_in_seconds": round(inventory.seconds_until_next_due(), 1),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=2000, help="Number of certificates to generate")
+    parser.add_argument("--due", type=int, default=100, help="Number of certificates inside the renewal threshold")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum concurrent certbot processes")
+    parser.add_argument("--certbot-delay", type=float, default=0.05, help="Seconds each fake certbot run takes")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    if result["warm_scan_parsed"] != 0 or result["certbot_calls"] != args.due:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
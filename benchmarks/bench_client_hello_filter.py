@@ -0,0 +1,170 @@
+"""
+Measures proxy CPU during a handshake flood with and without ClientHello fingerprint filtering.
+
+Bot processes replay one captured ClientHello (Python's ssl defaults, no
+ALPN) over and over: each connection sends it, reads whatever the proxy
+answers and closes, which costs the bots almost nothing and the proxy a
+full key exchange and signature unless it rejects the ClientHello first.
+Meanwhile a few legitimate clients (ALPN ``http/1.1``, so a different JA4
+fingerprint) complete real handshakes and record their latency.
+
+Runs: ``filter_off``; ``deny`` with the bot fingerprint on the deny list;
+``rate_limited`` with ``--rate`` connections per minute per fingerprint;
+``tarpit`` like ``deny`` but holding rejected connections for one second.
+Reported per run: bot connections/sec and the share the proxy answered
+with a ServerHello, proxy CPU utilisation and CPU per bot connection,
+and legitimate handshake latency.
+
+Usage:
+    python benchmarks/bench_client_hello_filter.py --duration 8 --bot-processes 2 --bot-concurrency 64
+"""
+import sys
+import ssl
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+from harness import SRC, Backend, ProxyProcess, generate_certificate, percentile
+
+sys.path.insert(0, SRC)
+
+from core.client_hello import parse_client_hello
+
+FILTER_SCRIPT = """
+import asyncio, json, sys
+from core.proxy_handler import QuantumSafeProxy
+from middleware.fingerprint_filter import FingerprintFilter
+settings = json.loads(sys.argv[5])
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4],
+                         hello_filter=FingerprintFilter(**settings) if settings is not None else None)
+asyncio.run(proxy.start())
+"""
+
+LEGIT_ALPN = ["http/1.1"]
+
+def _client_context(alpn=None):
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    if alpn:
+        context.set_alpn_protocols(alpn)
+    return context
+
+def capture_client_hello(alpn=None):
+    """
+    Returns the ClientHello bytes a client context sends first.
+    """
+    incoming, outgoing = ssl.MemoryBIO(), ssl.MemoryBIO()
+    client = _client_context(alpn).wrap_bio(incoming, outgoing, server_hostname="localhost")
+    try:
+        client.do_handshake()
+    except ssl.SSLWantReadError:
+        pass
+    return outgoing.read()
+
+async def _bot(port, hello, deadline, counts):
+    loop = asyncio.get_running_loop()
+    while time.monotonic() < deadline:
+        sock = socket.socket()
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, ("127.0.0.1", port))
+            await loop.sock_sendall(sock, hello)
+            data = await loop.sock_recv(sock, 4096)
+            counts["answered" if data[:1] == b"\x16" else "rejected"] += 1
+        except OSError:
+            counts["rejected"] += 1
+        finally:
+            sock.close()
+
+def _run_bots(port, hello, duration, concurrency, results):
+    async def run():
+        counts = {"answered": 0, "rejected": 0}
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*[_bot(port, hello, deadline, counts) for _ in range(concurrency)])
+        return counts
+    results.put(asyncio.run(run()))
+
+async def _legit(port, duration, concurrency):
+    context = _client_context(LEGIT_ALPN)
+    deadline = time.monotonic() + duration
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection("127.0.0.1", port, ssl=context, server_hostname="localhost"), 10)
+                writer.write(b"x")
+                await writer.drain()
+                await reader.readexactly(1)
+                writer.close()
+                latencies.append(time.perf_counter() - started)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                errors += 1
+            await asyncio.sleep(0.05)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors
+
+def measure(settings, hello, backend_port, cert_file, key_file, args):
+    with ProxyProcess(backend_port, cert_file, key_file, script=FILTER_SCRIPT,
+                      extra_args=[json.dumps(settings)]) as proxy:
+        results = multiprocessing.Queue()
+        bots = [multiprocessing.Process(target=_run_bots,
+                                        args=(proxy.port, hello, args.duration, args.bot_concurrency, results))
+                for _ in range(args.bot_processes)]
+        cpu_before = proxy.cpu_seconds()
+        for bot in bots:
+            bot.start()
+        latencies, errors = asyncio.run(_legit(proxy.port, args.duration, args.legit_concurrency))
+        counts = [results.get() for _ in bots]
+        for bot in bots:
+            bot.join()
+        cpu_seconds = proxy.cpu_seconds() - cpu_before
+    attempts = sum(count["answered"] + count["rejected"] for count in counts)
+    answered = sum(count["answered"] for count in counts)
+    return {
+        "bot_connections_per_sec": round(attempts / args.duration, 1),
+        "bot_answered_share": round(answered / attempts, 3) if attempts else 0.0,
+        "proxy_cpu_percent": round(cpu_seconds / args.duration * 100, 1),
+        "proxy_cpu_us_per_bot_connection": round(cpu_seconds / attempts * 1e6, 1) if attempts else 0.0,
+        "legit_handshakes": len(latencies),
+        "legit_latency_ms_p50": round(percentile(latencies, 0.50) * 1000, 2),
+        "legit_latency_ms_p99": round(percentile(latencies, 0.99) * 1000, 2),
+        "legit_errors": errors,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=8.0, help="Seconds per run")
+    parser.add_argument("--bot-processes", type=int, default=2)
+    parser.add_argument("--bot-concurrency", type=int, default=64, help="Connections in flight per bot process")
+    parser.add_argument("--legit-concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=600, help="Connections per minute per fingerprint")
+    args = parser.parse_args()
+
+    hello = capture_client_hello()
+    bot_fingerprint = parse_client_hello(hello).ja4()
+    legit_fingerprint = parse_client_hello(capture_client_hello(LEGIT_ALPN)).ja4()
+    runs = {
+        "filter_off": None,
+        "deny": {"deny": [bot_fingerprint]},
+        "rate_limited": {"rate": args.rate},
+        "tarpit": {"deny": [bot_fingerprint], "action": "tarpit", "tarpit_seconds": 1.0},
+    }
+    with tempfile.TemporaryDirectory() as directory, Backend("echo") as backend:
+        cert_file, key_file = generate_certificate(directory)
+        report = {"bot_fingerprint": bot_fingerprint, "legit_fingerprint": legit_fingerprint}
+        for name, settings in runs.items():
+            report[name] = measure(settings, hello, backend.port, cert_file, key_file, args)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
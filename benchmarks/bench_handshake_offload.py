@@ -0,0 +1,110 @@
+"""
+Measures forwarding latency of established connections during a handshake flood.
+
+A set of long-lived connections exchange small messages through the proxy
+and an echo backend while separate load generator processes open, use and
+close new TLS connections as fast as they can. Runs with handshakes on the
+event loop thread and with handshakes offloaded to a HandshakePool, and
+reports round-trip latency percentiles of the established connections with
+and without the flood, plus the handshake rate the flood achieved.
+
+Usage:
+    python benchmarks/bench_handshake_offload.py --duration 10 --workers 2
+    python benchmarks/bench_handshake_offload.py --group secp384r1 --flood-concurrency 128
+"""
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+from harness import Backend, ProxyProcess, client_tls_context, generate_certificate, percentile
+from loadgen import run_load
+
+OFFLOAD_SCRIPT = """
+import asyncio, sys
+from core.proxy_handler import QuantumSafeProxy
+from core.handshake_pool import HandshakePool
+from core.tls_policy import TLSPolicies, TLSPolicy
+from core.tls_setup import create_tls_context
+workers, group = int(sys.argv[5]), sys.argv[6]
+policies = TLSPolicies(TLSPolicy("default", create_tls_context(sys.argv[3], sys.argv[4]), [group])) if group else None
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4],
+                         tls_policies=policies, handshake_pool=HandshakePool(workers) if workers else None)
+asyncio.run(proxy.start())
+"""
+
+MESSAGE = b"m" * 64
+
+async def _probe(port, connections, duration, interval):
+    """
+    Exchanges MESSAGE on ``connections`` established connections and returns the round-trip times.
+    """
+    context = client_tls_context()
+    streams = [await asyncio.open_connection("127.0.0.1", port, ssl=context) for _ in range(connections)]
+    deadline = time.monotonic() + duration
+    samples = []
+
+    async def exchange(reader, writer):
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            writer.write(MESSAGE)
+            await reader.readexactly(len(MESSAGE))
+            samples.append(time.perf_counter() - started)
+            await asyncio.sleep(interval)
+
+    try:
+        await asyncio.gather(*[exchange(reader, writer) for reader, writer in streams])
+    finally:
+        for _, writer in streams:
+            writer.close()
+    return samples
+
+def _latency(samples):
+    return {
+        "p50": round(percentile(samples, 0.50) * 1000, 3),
+        "p99": round(percentile(samples, 0.99) * 1000, 3),
+        "max": round(max(samples) * 1000, 3) if samples else 0.0,
+    }
+
+def measure(workers, backend_port, cert_file, key_file, args):
+    with ProxyProcess(backend_port, cert_file, key_file, script=OFFLOAD_SCRIPT,
+                      extra_args=[workers, args.group or ""], event_loop=args.loop) as proxy:
+        quiet = asyncio.run(_probe(proxy.port, args.connections, args.duration / 2, args.interval))
+        with multiprocessing.Pool(args.flood_processes) as pool:
+            flood = pool.starmap_async(run_load, [
+                ("churn", proxy.port, args.duration, max(1, args.flood_concurrency // args.flood_processes), 1)
+            ] * args.flood_processes)
+            # Let the flood ramp up before sampling
+            time.sleep(0.5)
+            loaded = asyncio.run(_probe(proxy.port, args.connections, args.duration - 1.0, args.interval))
+            results = flood.get()
+    return {
+        "latency_ms_quiet": _latency(quiet),
+        "latency_ms_flood": _latency(loaded),
+        "flood_handshakes_per_sec": round(sum(result["handshakes_per_sec"] for result in results), 1),
+        "flood_errors": sum(result["errors"] for result in results),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of flood per run")
+    parser.add_argument("--workers", type=int, default=2, help="Handshake worker threads in the offloaded run")
+    parser.add_argument("--connections", type=int, default=16, help="Established connections sampled")
+    parser.add_argument("--interval", type=float, default=0.005, help="Pause between messages per connection")
+    parser.add_argument("--flood-concurrency", type=int, default=64)
+    parser.add_argument("--flood-processes", type=int, default=2)
+    parser.add_argument("--group", default=None, help="Key exchange group the proxy offers, e.g. X25519MLKEM768")
+    parser.add_argument("--loop", default=None, choices=["asyncio", "uvloop"], help="Event loop of the proxy")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, Backend("echo") as backend:
+        cert_file, key_file = generate_certificate(directory)
+        report = {
+            "event_loop": measure(0, backend.port, cert_file, key_file, args),
+            f"pool_{args.workers}": measure(args.workers, backend.port, cert_file, key_file, args),
+        }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Compares time to first byte over HTTP/3 (QUIC) and HTTP/1.1 over TCP+TLS under packet loss.
+
+The proxy serves both listeners in front of the HTTP stub backend. Clients
+open a new connection per request, so each sample includes the handshake.
+Loss and delay are added by relays in the benchmark process, because netem
+needs root and the sch_netem module:
+
+- QUIC goes through a UDP relay that drops each datagram with probability
+  ``loss`` in either direction, so aioquic's own loss recovery runs.
+- TCP goes through a relay that models loss instead of causing it: when a
+  chunk of ``n`` bytes is "lost" (probability ``1 - (1 - loss) ** segments``)
+  it and everything after it in that direction are held back for
+  ``--tcp-rto`` seconds, the stall a retransmission timeout or tail loss probe
+  causes behind a lost segment (head-of-line blocking). Lost SYNs, which
+  cost a full second in the kernel, are not modelled.
+
+Both relays add ``--rtt / 2`` seconds of delay in each direction, and the
+TCP relay holds each new connection for one round trip to account for the
+TCP handshake.
+
+Usage:
+    python benchmarks/bench_http3.py --requests 200 --loss 0 0.01 0.05
+    python benchmarks/bench_http3.py --rtt 0.1 --tcp-rto 0.3
+"""
+import ssl
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+from harness import Backend, ProxyProcess, client_tls_context, generate_certificate, percentile
+
+from aioquic.asyncio import QuicConnectionProtocol
+from aioquic.h3.connection import H3_ALPN, H3Connection
+from aioquic.h3.events import HeadersReceived
+from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.connection import QuicConnection
+
+# Serves the TCP listener and an HTTP/3 listener on the same port number
+HTTP3_SCRIPT = """
+import asyncio, sys
+from core.proxy_handler import QuantumSafeProxy
+from core.quic_listener import QuicListener
+async def main():
+    proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4])
+    listener = QuicListener(proxy, "127.0.0.1", int(sys.argv[1]), sys.argv[3], sys.argv[4])
+    await listener.start()
+    await proxy.start()
+asyncio.run(main())
+"""
+
+# Payload bytes per TCP segment on a typical 1500-byte MTU path
+TCP_MSS = 1460
+REQUEST = b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n"
+
+class _LossyDatagramRelay(asyncio.DatagramProtocol):
+    """
+    Relays datagrams between clients and a UDP server, dropping and delaying them.
+    """
+
+    def __init__(self, target, loss, delay, rng):
+        self.target = target
+        self.loss = loss
+        self.delay = delay
+        self.rng = rng
+        self.transport = None
+        self.upstreams = {}
+        self.dropped = 0
+        self.relayed = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        upstream = self.upstreams.get(addr)
+        if upstream is None:
+            upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            upstream.setblocking(False)
+            upstream.connect(self.target)
+            asyncio.get_running_loop().add_reader(upstream.fileno(), self._reply, upstream, addr)
+            self.upstreams[addr] = upstream
+        self._pass(upstream.send, data)
+
+    def _reply(self, upstream, addr):
+        try:
+            data = upstream.recv(65535)
+        except OSError:
+            return
+        self._pass(self.transport.sendto, data, addr)
+
+    def _pass(self, send, *args):
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        self.relayed += 1
+        asyncio.get_running_loop().call_later(self.delay, self._send, send, args)
+
+    @staticmethod
+    def _send(send, args):
+        try:
+            send(*args)
+        except OSError:
+            pass
+
+    def close(self):
+        loop = asyncio.get_running_loop()
+        for upstream in self.upstreams.values():
+            loop.remove_reader(upstream.fileno())
+            upstream.close()
+        self.upstreams.clear()
+        self.transport.close()
+
+class _LossyStreamRelay:
+    """
+    Relays TCP connections, delaying them and stalling a direction after a modelled segment loss.
+    """
+
+    def __init__(self, target, loss, delay, rto, rng):
+        self.target = target
+        self.loss = loss
+        self.delay = delay
+        self.rto = rto
+        self.rng = rng
+        self.stalls = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._relay, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _relay(self, client_reader, client_writer):
+        # The client's connect completed locally; holding its first bytes for a
+        # round trip stands in for the SYN/SYN-ACK exchange
+        await asyncio.sleep(2 * self.delay)
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(self._pipe(client_reader, backend_writer), self._pipe(backend_reader, client_writer),
+                             return_exceptions=True)
+        client_writer.close()
+        backend_writer.close()
+
+    async def _pipe(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        release_at = 0.0
+        while True:
+            data = await reader.read(65536)
+            at = max(loop.time() + self.delay, release_at)
+            if data:
+                segments = -(-len(data) // TCP_MSS)
+                if self.rng.random() >= (1 - self.loss) ** segments:
+                    # Everything behind the lost segment waits for its retransmission
+                    self.stalls += 1
+                    at += self.rto
+            release_at = at
+            loop.call_at(at, self._send, writer, data)
+            if not data:
+                return
+
+    @staticmethod
+    def _send(writer, data):
+        if writer.is_closing():
+            return
+        try:
+            if data:
+                writer.write(data)
+            elif writer.can_write_eof():
+                writer.write_eof()
+        except OSError:
+            pass
+
+    def close(self):
+        self.server.close()
+
+async def _tcp_ttfb(port, context):
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, ssl=context, server_hostname="localhost")
+    try:
+        writer.write(REQUEST)
+        if not await reader.read(1):
+            raise ConnectionError("connection closed before the response")
+        return time.perf_counter() - started
+    finally:
+        writer.transport.abort()
+
+class _HTTP3Client(QuicConnectionProtocol):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.http = None
+        self.response = None
+
+    def quic_event_received(self, event):
+        if self.http is None:
+            return
+        for http_event in self.http.handle_event(event):
+            if isinstance(http_event, HeadersReceived) and not self.response.done():
+                self.response.set_result(http_event.headers)
+
+    def get(self):
+        self.http = H3Connection(self._quic)
+        self.response = self._loop.create_future()
+        stream_id = self._quic.get_next_available_stream_id()
+        self.http.send_headers(stream_id, [(b":method", b"GET"), (b":scheme", b"https"),
+                                           (b":authority", b"localhost"), (b":path", b"/")], end_stream=True)
+        self.transmit()
+        return self.response
+
+async def _http3_ttfb(port):
+    loop = asyncio.get_running_loop()
+    configuration = QuicConfiguration(is_client=True, alpn_protocols=H3_ALPN, verify_mode=ssl.CERT_NONE,
+                                      server_name="localhost")
+    started = time.perf_counter()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: _HTTP3Client(QuicConnection(configuration=configuration)), remote_addr=("127.0.0.1", port))
+    try:
+        protocol.connect(("127.0.0.1", port))
+        await protocol.wait_connected()
+        headers = await protocol.get()
+        if dict(headers).get(b":status") != b"200":
+            raise ConnectionError(f"unexpected response {headers}")
+        return time.perf_counter() - started
+    finally:
+        # Sends CONNECTION_CLOSE without waiting for the draining period, which is not part of the measurement
+        protocol.close()
+        transport.close()
+
+async def _measure(port, loss, args):
+    loop = asyncio.get_running_loop()
+    rng = random.Random(args.seed)
+    delay = args.rtt / 2
+    _, udp_relay = await loop.create_datagram_endpoint(
+        lambda: _LossyDatagramRelay(("127.0.0.1", port), loss, delay, rng), local_addr=("127.0.0.1", 0))
+    udp_port = udp_relay.transport.get_extra_info("sockname")[1]
+    tcp_relay = _LossyStreamRelay(("127.0.0.1", port), loss, delay, args.tcp_rto, rng)
+    tcp_port = await tcp_relay.start()
+    context = client_tls_context()
+    samples = {"tcp_tls": [], "http3": []}
+    errors = {"tcp_tls": 0, "http3": 0}
+    try:
+        for _ in range(args.requests):
+            for name, request in (("tcp_tls", lambda: _tcp_ttfb(tcp_port, context)),
+                                  ("http3", lambda: _http3_ttfb(udp_port))):
+                try:
+                    samples[name].append(await asyncio.wait_for(request(), args.timeout))
+                except (OSError, asyncio.TimeoutError, ConnectionError):
+                    errors[name] += 1
+    finally:
+        udp_relay.close()
+        tcp_relay.close()
+    report = {
+        name: {
+            "ttfb_ms_p50": round(percentile(values, 0.50) * 1000, 1),
+            "ttfb_ms_p90": round(percentile(values, 0.90) * 1000, 1),
+            "ttfb_ms_p99": round(percentile(values, 0.99) * 1000, 1),
+            "errors": errors[name],
+        }
+        for name, values in samples.items()
+    }
+    report["tcp_tls"]["modelled_stalls"] = tcp_relay.stalls
+    report["http3"]["datagrams_dropped"] = udp_relay.dropped
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per protocol and loss rate")
+    parser.add_argument("--loss", type=float, nargs="+", default=[0.0, 0.01, 0.05], help="Packet loss probabilities")
+    parser.add_argument("--rtt", type=float, default=0.04, help="Round-trip time added by the relays, in seconds")
+    parser.add_argument("--tcp-rto", type=float, default=0.2, help="Stall after a modelled TCP segment loss, in seconds")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds before a request counts as an error")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, Backend("http") as backend:
+        cert_file, key_file = generate_certificate(directory)
+        with ProxyProcess(backend.port, cert_file, key_file, script=HTTP3_SCRIPT) as proxy:
+            report = {f"loss_{loss:g}": asyncio.run(_measure(proxy.port, loss, args)) for loss in args.loss}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Measures proxy memory per idle proxied connection.
+
+Client processes open TLS connections through the proxy to an echo backend,
+exchange one byte on each so the backend leg is established, then leave them
+idle. Reports the growth of the proxy's resident set size divided by the
+number of connections for each requested count. Exits non-zero when any count
+exceeds ``--budget`` KiB per connection, so the script doubles as a memory
+regression check.
+
+Each proxied connection needs two descriptors in the proxy and a local port
+towards the single backend, so large counts need a raised ``ulimit -n`` and a
+wide ``net.ipv4.ip_local_port_range``; counts the host cannot hold are
+reported as skipped.
+
+Usage:
+    python benchmarks/bench_idle_memory.py --counts 10000,100000,500000 --processes 8 --budget 32
+"""
+import sys
+import json
+import time
+import socket
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from harness import Backend, ProxyProcess, client_tls_context, generate_certificate
+
+# Descriptors kept free in the proxy for listeners, logs and the event loop
+RESERVED_FDS = 256
+
+def _hold_connections(port, count, worker, ready, release):
+    context = client_tls_context()
+    connections = []
+    try:
+        for index in range(count):
+            # Spread clients over loopback addresses so the client->proxy leg does not run out of ports
+            source = f"127.0.{worker + 1}.{index % 250 + 2}"
+            sock = socket.create_connection(("127.0.0.1", port), timeout=30, source_address=(source, 0))
+            tls_sock = context.wrap_socket(sock)
+            tls_sock.sendall(b"x")
+            tls_sock.recv(1)
+            connections.append(tls_sock)
+        ready.send(len(connections))
+    except OSError as e:
+        ready.send(f"opened {len(connections)} of {count}: {e}")
+    release.recv()
+    for tls_sock in connections:
+        tls_sock.close()
+
+def rss_bytes(pid):
+    """
+    Returns the resident set size of a process in bytes.
+    """
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+def port_range():
+    with open("/proc/sys/net/ipv4/ip_local_port_range") as f:
+        low, high = map(int, f.read().split())
+    return high - low + 1
+
+def measure(count, proxy, args):
+    pipes, workers = [], []
+    per_worker = [count // args.processes + (1 if index < count % args.processes else 0)
+                  for index in range(args.processes)]
+    baseline = rss_bytes(proxy.process.pid)
+    started = time.monotonic()
+    for worker, share in enumerate(per_worker):
+        ready_recv, ready_send = multiprocessing.Pipe(duplex=False)
+        release_recv, release_send = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_hold_connections,
+                                          args=(proxy.port, share, worker, ready_send, release_recv), daemon=True)
+        process.start()
+        pipes.append((ready_recv, release_send))
+        workers.append(process)
+
+    errors = [result for result in (ready.recv() for ready, _ in pipes) if isinstance(result, str)]
+    open_seconds = time.monotonic() - started
+    # Let the proxy settle (handshake buffers freed, pending callbacks run) before sampling
+    time.sleep(args.settle)
+    rss = rss_bytes(proxy.process.pid)
+
+    for _, release in pipes:
+        release.send(None)
+    for process in workers:
+        process.join()
+    if errors:
+        return {"error": errors[0]}
+    return {
+        "rss_growth_mb": round((rss - baseline) / 1e6, 1),
+        "kib_per_connection": round((rss - baseline) / count / 1024, 2),
+        "connections_per_sec": round(count / open_seconds, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", default="10000,100000,500000", help="Comma-separated connection counts")
+    parser.add_argument("--processes", type=int, default=4, help="Client processes holding the connections")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds to wait before sampling RSS")
+    parser.add_argument("--budget", type=float, default=None, help="Allowed KiB per idle connection")
+    args = parser.parse_args()
+
+    # The proxy and the client processes inherit the raised descriptor limit
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    capacity = min((hard - RESERVED_FDS) // 2, port_range())
+
+    report = {}
+    with tempfile.TemporaryDirectory() as directory, Backend("echo") as backend:
+        cert_file, key_file = generate_certificate(directory)
+        for count in map(int, args.counts.split(",")):
+            if count > capacity:
+                report[count] = {"skipped": f"host holds at most {capacity} proxied connections "
+                                            f"(ulimit -n {hard}, {port_range()} local ports)"}
+                continue
+            # A fresh proxy per count keeps earlier runs' heap growth out of the measurement
+            with ProxyProcess(backend.port, cert_file, key_file) as proxy:
+                report[count] = measure(count, proxy, args)
+    print(json.dumps(report, indent=2))
+
+    if args.budget is not None:
+        over = [count for count, result in report.items()
+                if "error" in result or result.get("kib_per_connection", 0) > args.budget]
+        if over:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmarks burst latency of hybrid-mode Kyber encapsulations with the encapsulation pool on and off.
+
+Each burst stands for a wave of AES key encryptions, each of which needs a
+Kyber encapsulation against the long-term public key. Uses the liboqs
+Python bindings (``oqs``); without them, or with ``--simulate-us``, a
+stand-in KEM that burns the given CPU time per encapsulation is used.
+
+Usage:
+    python benchmarks/bench_kem_pool.py --bursts 20 --burst-size 32 --gap 0.2
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from crypto.kem_pool import EncapsulationPool
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def simulated_kem(cost_us):
+    def encapsulate(public_key):
+        deadline = time.thread_time() + cost_us / 1e6
+        seed = os.urandom(32)
+        while time.thread_time() < deadline:
+            seed = hashlib.sha256(seed).digest()
+        return hashlib.sha256(public_key + seed).digest() * 34, seed
+    return b"simulated-public-key", encapsulate
+
+def liboqs_kem(algorithm):
+    import oqs
+    with oqs.KeyEncapsulation(algorithm) as kem:
+        public_key = kem.generate_keypair()
+
+    def encapsulate(key):
+        with oqs.KeyEncapsulation(algorithm) as kem:
+            return kem.encap_secret(key)
+    return public_key, encapsulate
+
+def run_bursts(acquire, args):
+    latencies = []
+    for _ in range(args.bursts):
+        for _ in range(args.burst_size):
+            started = time.perf_counter()
+            acquire()
+            latencies.append(time.perf_counter() - started)
+        time.sleep(args.gap)
+    return {
+        "operations": len(latencies),
+        "p50_us": round(percentile(latencies, 0.50) * 1e6, 1),
+        "p99_us": round(percentile(latencies, 0.99) * 1e6, 1),
+        "max_us": round(max(latencies) * 1e6, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--algorithm", default="Kyber768")
+    parser.add_argument("--simulate-us", type=float, default=None,
+                        help="Use a stand-in KEM costing this many CPU microseconds per encapsulation")
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst-size", type=int, default=32)
+    parser.add_argument("--gap", type=float, default=0.2, help="Seconds between bursts")
+    parser.add_argument("--capacity", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    kem = "liboqs"
+    if args.simulate_us is None:
+        try:
+            public_key, encapsulate = liboqs_kem(args.algorithm)
+        except ImportError:
+            args.simulate_us = 100.0
+    if args.simulate_us is not None:
+        kem = f"simulated {args.simulate_us:g}us"
+        public_key, encapsulate = simulated_kem(args.simulate_us)
+
+    results = {"kem": kem, "burst_size": args.burst_size,
+               "inline": run_bursts(lambda: encapsulate(public_key), args)}
+
+    pool = EncapsulationPool(algorithm=args.algorithm, capacity=args.capacity, workers=args.workers,
+                             encapsulate=encapsulate)
+    pool.acquire(public_key)
+    time.sleep(0.5)  # Let the producers reach the minimum depth
+    pool.starvations = 0
+    results["pooled"] = run_bursts(lambda: pool.acquire(public_key), args)
+    results["pooled"]["starvations"] = pool.starvations
+    pool.close()
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Measures time-to-ready and KMS calls of proxy replicas with no key bundle, a cold bundle and a warm bundle.
+
+A fake KMS runs as an HTTP server in the benchmark process. Each decrypt
+call takes ``--kms-latency`` seconds and at most ``--kms-concurrency`` calls
+are served at once, so a scale-out of ``--replicas`` processes starting
+together queues on it the way a fleet queues on a KMS quota. Each replica
+process loads the hybrid-mode key pair through ``load_key_pair_from_kms``,
+reports when it is ready, then performs ``--operations`` further loads
+(one per hybrid operation).
+
+- ``no_bundle``: every load calls KMS twice.
+- ``cold``: the bundle file does not exist yet; replicas fetch from KMS and write it.
+- ``warm``: the bundle written by the cold run is reused; no KMS calls.
+
+Usage:
+    python benchmarks/bench_key_bundle.py --replicas 8 --runs 3
+    python benchmarks/bench_key_bundle.py --kms-latency 0.1 --kms-concurrency 2
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from harness import SRC, percentile
+
+KEY_NAME = "projects/bench/locations/global/keyRings/proxy/cryptoKeys/key-data"
+KMS_AES_KEY_NAME = "projects/bench/locations/global/keyRings/proxy/cryptoKeys/aes"
+
+REPLICA_SCRIPT = """
+import sys, json, time, base64, urllib.request
+from types import SimpleNamespace
+from crypto.key_management import fetch_key_pair, load_key_pair_from_kms, set_key_bundle, set_kms_client
+
+class HttpKms:
+    calls = 0
+    def decrypt(self, request):
+        HttpKms.calls += 1
+        body = json.dumps({"name": request["name"], "ciphertext": base64.b64encode(request["ciphertext"]).decode()})
+        with urllib.request.urlopen(sys.argv[1], body.encode()) as response:
+            return SimpleNamespace(plaintext=base64.b64decode(response.read()))
+
+mode, key_name, kms_aes_key_name, operations = sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5])
+set_kms_client(HttpKms())
+if mode != "no_bundle":
+    from crypto.key_bundle import KeyBundle
+    bundle = KeyBundle(sys.argv[6], sys.argv[7], fetch=fetch_key_pair)
+    bundle.load()
+    set_key_bundle(bundle)
+load_key_pair_from_kms(key_name, kms_aes_key_name)
+print("ready", flush=True)
+ready_calls = HttpKms.calls
+for _ in range(operations):
+    load_key_pair_from_kms(key_name, kms_aes_key_name)
+print(json.dumps({"kms_calls_to_ready": ready_calls, "kms_calls_per_operation": (HttpKms.calls - ready_calls) / max(operations, 1)}))
+"""
+
+def _key_material():
+    """
+    Returns the fake KMS's responses: the key data JSON and the data key it unwraps.
+    """
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    public_pem = private_key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                       serialization.PublicFormat.SubjectPublicKeyInfo)
+    private_pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                            serialization.NoEncryption())
+    aes_key = AESGCM.generate_key(bit_length=256)
+    wrapped_aes_key = os.urandom(64)
+
+    def seal(data):
+        nonce = os.urandom(12)
+        return base64.b64encode(nonce + AESGCM(aes_key).encrypt(nonce, data, None)).decode()
+
+    key_data = json.dumps({
+        "cipher": "aes-256-gcm",
+        "encrypted_aes_key": base64.b64encode(wrapped_aes_key).decode(),
+        "encrypted_public_key": seal(public_pem),
+        "encrypted_private_key": seal(private_pem),
+    }).encode()
+    return {b"": key_data, wrapped_aes_key: aes_key}
+
+class _FakeKmsHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.quota:
+            time.sleep(self.server.latency)
+            plaintext = self.server.responses.get(base64.b64decode(request["ciphertext"]))
+        with self.server.lock:
+            self.server.calls += 1
+        if plaintext is None:
+            self.send_error(400)
+            return
+        body = base64.b64encode(plaintext)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeKms:
+    """
+    Decrypt-only KMS stub with fixed latency and a concurrency quota.
+    """
+
+    def __init__(self, latency, concurrency):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeKmsHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.quota = threading.Semaphore(concurrency)
+        self.server.lock = threading.Lock()
+        self.server.calls = 0
+        self.server.responses = _key_material()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/decrypt"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def _start_replicas(mode, kms, directory, args):
+    """
+    Starts the replicas together and returns each one's time-to-ready in seconds and its report.
+    """
+    command = [sys.executable, "-c", REPLICA_SCRIPT, kms.url, mode, KEY_NAME, KMS_AES_KEY_NAME,
+               str(args.operations), os.path.join(directory, "key_bundle.bin"), os.path.join(directory, "bundle.key")]
+    started = time.perf_counter()
+    processes = [subprocess.Popen(command, cwd=SRC, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+                 for _ in range(args.replicas)]
+    ready, reports = [], []
+    for process in processes:
+        if process.stdout.readline().strip() != "ready":
+            raise RuntimeError(f"replica failed in {mode} mode (exit code {process.wait()})")
+        ready.append(time.perf_counter() - started)
+    for process in processes:
+        reports.append(json.loads(process.stdout.readline()))
+        process.wait()
+    return ready, reports
+
+def measure(mode, kms, directory, args):
+    bundle_path = os.path.join(directory, "key_bundle.bin")
+    samples, reports = [], []
+    for _ in range(args.runs):
+        if mode == "cold" and os.path.exists(bundle_path):
+            os.unlink(bundle_path)
+        ready, run_reports = _start_replicas(mode, kms, directory, args)
+        samples.extend(ready)
+        reports.extend(run_reports)
+    return {
+        "time_to_ready_ms_p50": round(percentile(samples, 0.50) * 1000, 1),
+        "time_to_ready_ms_max": round(max(samples) * 1000, 1),
+        "kms_calls_to_ready_per_replica": sum(report["kms_calls_to_ready"] for report in reports) / len(reports),
+        "kms_calls_per_operation": sum(report["kms_calls_per_operation"] for report in reports) / len(reports),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--replicas", type=int, default=8, help="Replica processes started together")
+    parser.add_argument("--runs", type=int, default=3, help="Scale-out events per mode")
+    parser.add_argument("--operations", type=int, default=20, help="Hybrid operations per replica after start-up")
+    parser.add_argument("--kms-latency", type=float, default=0.05, help="Seconds per fake KMS decrypt call")
+    parser.add_argument("--kms-concurrency", type=int, default=4, help="Decrypt calls the fake KMS serves at once")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, FakeKms(args.kms_latency, args.kms_concurrency) as kms:
+        # cold must run before warm, which reuses the bundle it leaves behind
+        report = {mode: measure(mode, kms, directory, args) for mode in ("no_bundle", "cold", "warm")}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compares proxy CPU cost per GB with kernel TLS offload on and off.
+
+Streams bulk traffic through an echo backend over loopback, once with the
+default asyncio TLS path and once with kTLS enabled, and reports the proxy
+process's CPU seconds per GB forwarded. When the kernel ``tls`` module is not
+loaded, the kTLS run measures the userspace fallback path instead.
+
+Usage:
+    sudo modprobe tls
+    python benchmarks/bench_ktls.py --duration 10 --concurrency 8
+"""
+import sys
+import json
+import argparse
+import tempfile
+from harness import SRC, PROXY_SCRIPT, Backend, ProxyProcess, generate_certificate
+from loadgen import run_load
+
+sys.path.insert(0, SRC)
+from core.ktls import kernel_tls_available
+
+KTLS_PROXY_SCRIPT = """
+import asyncio, sys
+from core.proxy_handler import QuantumSafeProxy
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4], ktls=True)
+asyncio.run(proxy.start())
+"""
+
+def measure(script, backend_port, cert_file, key_file, duration, concurrency):
+    with ProxyProcess(backend_port, cert_file, key_file, script=script) as proxy:
+        cpu_before = proxy.cpu_seconds()
+        result = run_load("bulk", proxy.port, duration=duration, concurrency=concurrency)
+        cpu_seconds = proxy.cpu_seconds() - cpu_before
+
+    # Every byte crosses the proxy twice (client to backend and back)
+    gigabytes = result["mb_per_sec"] * result["duration_s"] / 1000
+    return {
+        "mb_per_sec": result["mb_per_sec"],
+        "errors": result["errors"],
+        "proxy_cpu_seconds": round(cpu_seconds, 3),
+        "cpu_seconds_per_gb": round(cpu_seconds / gigabytes, 3) if gigabytes else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per run")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, Backend("echo") as backend:
+        cert_file, key_file = generate_certificate(directory)
+        report = {
+            "kernel_tls_available": kernel_tls_available(),
+            "userspace": measure(PROXY_SCRIPT, backend.port, cert_file, key_file, args.duration, args.concurrency),
+            "ktls": measure(KTLS_PROXY_SCRIPT, backend.port, cert_file, key_file, args.duration, args.concurrency),
+        }
+
+    userspace, offloaded = report["userspace"]["cpu_seconds_per_gb"], report["ktls"]["cpu_seconds_per_gb"]
+    if userspace and offloaded:
+        report["cpu_per_gb_change"] = f"{(offloaded - userspace) / userspace:+.1%}"
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Measures accept throughput with and without PROXY protocol headers.
+
+Clients connect, optionally send a PROXY protocol v1 or v2 header as a load
+balancer would, complete the TLS handshake, exchange one byte and close.
+Reports handshakes/sec and proxy CPU per connection for plain accepts, v1 and
+v2 headers, and v2 headers with a v2 header re-emitted to the backend.
+
+Usage:
+    python benchmarks/bench_proxy_protocol.py --duration 8 --concurrency 32
+"""
+import json
+import time
+import socket
+import struct
+import asyncio
+import argparse
+import tempfile
+from harness import Backend, ProxyProcess, client_tls_context, generate_certificate
+
+PROXY_PROTOCOL_SCRIPT = """
+import asyncio, json, sys
+from core.proxy_handler import QuantumSafeProxy
+from core.proxy_protocol import ProxyProtocol
+settings = json.loads(sys.argv[5])
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4],
+                         proxy_protocol=ProxyProtocol(**settings) if settings else None)
+asyncio.run(proxy.start())
+"""
+
+# Proxy settings and the header clients send in each run
+RUNS = {
+    "no_header": (None, None),
+    "v1": ({"accept": True}, "v1"),
+    "v2": ({"accept": True}, "v2"),
+    "v2_and_send": ({"accept": True, "send": True}, "v2"),
+}
+
+def client_header(version, source_port):
+    """
+    Returns the header a load balancer would send for a client at 203.0.113.7.
+    """
+    if version == "v1":
+        return f"PROXY TCP4 203.0.113.7 127.0.0.1 {source_port} 443\r\n".encode()
+    addresses = socket.inet_aton("203.0.113.7") + socket.inet_aton("127.0.0.1") + struct.pack("!HH", source_port, 443)
+    return b"\r\n\r\n\x00\r\nQUIT\n" + struct.pack("!BBH", 0x21, 0x11, len(addresses)) + addresses
+
+async def _connect(port, version, context):
+    loop = asyncio.get_running_loop()
+    sock = socket.socket()
+    sock.setblocking(False)
+    try:
+        await loop.sock_connect(sock, ("127.0.0.1", port))
+        if version is not None:
+            await loop.sock_sendall(sock, client_header(version, sock.getsockname()[1]))
+    except BaseException:
+        sock.close()
+        raise
+    reader, writer = await asyncio.open_connection(sock=sock, ssl=context, server_hostname="localhost")
+    try:
+        writer.write(b"x")
+        await writer.drain()
+        await reader.readexactly(1)
+    finally:
+        writer.close()
+
+async def _churn(port, version, duration, concurrency):
+    context = client_tls_context()
+    deadline = time.monotonic() + duration
+    counts = {"connections": 0, "errors": 0}
+
+    async def worker():
+        while time.monotonic() < deadline:
+            try:
+                await _connect(port, version, context)
+                counts["connections"] += 1
+            except (OSError, asyncio.IncompleteReadError):
+                counts["errors"] += 1
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return counts
+
+def measure(settings, version, backend_port, cert_file, key_file, args):
+    with ProxyProcess(backend_port, cert_file, key_file, script=PROXY_PROTOCOL_SCRIPT,
+                      extra_args=[json.dumps(settings)], event_loop=args.loop) as proxy:
+        asyncio.run(_churn(proxy.port, version, 1.0, args.concurrency))
+        cpu_before = proxy.cpu_seconds()
+        counts = asyncio.run(_churn(proxy.port, version, args.duration, args.concurrency))
+        cpu_seconds = proxy.cpu_seconds() - cpu_before
+    connections = counts["connections"]
+    return {
+        "handshakes_per_sec": round(connections / args.duration, 1),
+        "cpu_us_per_connection": round(cpu_seconds / connections * 1e6, 1) if connections else 0.0,
+        "errors": counts["errors"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=8.0, help="Seconds per run")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--loop", default=None, choices=["asyncio", "uvloop"], help="Event loop of the proxy")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, Backend("echo") as backend:
+        cert_file, key_file = generate_certificate(directory)
+        report = {name: measure(settings, version, backend.port, cert_file, key_file, args)
+                  for name, (settings, version) in RUNS.items()}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
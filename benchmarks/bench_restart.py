@@ -0,0 +1,86 @@
+"""
+Verifies zero-downtime restarts under load.
+
+Runs the proxy with socket handoff enabled, drives it with the loopback load
+generator, and repeatedly starts a replacement process that takes over the
+listening sockets while the previous one drains. Exits non-zero if any
+connection failed across the restarts.
+
+Usage:
+    python benchmarks/bench_restart.py --scenario churn --restarts 3 --duration 12
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from harness import SRC, Backend, ProxyProcess, generate_certificate, with_event_loop
+from loadgen import run_load
+
+RESTART_PROXY_SCRIPT = """
+import asyncio, os, sys
+from core.proxy_handler import QuantumSafeProxy
+from core.socket_handoff import serve_with_handoff, TAKEOVER_ENV
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4])
+asyncio.run(serve_with_handoff(proxy, sys.argv[5], drain_timeout=float(sys.argv[6]),
+                               takeover=os.getenv(TAKEOVER_ENV) == "1"))
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenario", default="churn", choices=["churn", "reqresp"])
+    parser.add_argument("--duration", type=float, default=12.0, help="Seconds of load")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--restarts", type=int, default=3)
+    parser.add_argument("--drain-timeout", type=float, default=10.0)
+    parser.add_argument("--loop", default=None, choices=["asyncio", "uvloop"], help="Event loop of the proxy processes")
+    args = parser.parse_args()
+
+    backend_kind = "http" if args.scenario == "reqresp" else "echo"
+    with tempfile.TemporaryDirectory() as directory, Backend(backend_kind) as backend:
+        cert_file, key_file = generate_certificate(directory)
+        handoff_path = os.path.join(directory, "handoff.sock")
+        extra_args = [handoff_path, args.drain_timeout]
+
+        with ProxyProcess(backend.port, cert_file, key_file, script=RESTART_PROXY_SCRIPT, extra_args=extra_args,
+                          event_loop=args.loop) as proxy:
+            result = {}
+            load = threading.Thread(target=lambda: result.update(run_load(
+                args.scenario, proxy.port, duration=args.duration, concurrency=args.concurrency)))
+            load.start()
+
+            current = proxy.process
+            replacements = []
+            handoffs = []
+            for _ in range(args.restarts):
+                time.sleep(args.duration / (args.restarts + 1))
+                started = time.perf_counter()
+                replacement = subprocess.Popen(
+                    [sys.executable, "-c", with_event_loop(RESTART_PROXY_SCRIPT, args.loop), str(proxy.port), str(backend.port),
+                     cert_file, key_file, *map(str, extra_args)],
+                    cwd=SRC, env=dict(os.environ, PROXY_TAKEOVER="1"),
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+                replacements.append(replacement)
+                current.wait(timeout=args.drain_timeout + 15)
+                handoffs.append({
+                    "previous_exit_code": current.returncode,
+                    "handoff_and_drain_seconds": round(time.perf_counter() - started, 3),
+                })
+                current = replacement
+
+            load.join()
+            for replacement in replacements:
+                replacement.kill()
+                replacement.wait()
+
+    report = {"load": result, "restarts": handoffs, "failed_connections": result.get("errors")}
+    print(json.dumps(report, indent=2))
+    if result.get("errors") != 0 or any(handoff["previous_exit_code"] != 0 for handoff in handoffs):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Measures client certificate revocation checking against a CRL with a million revoked serials.
+
+The stand-in CA of ``revocation_responder.py`` publishes a base CRL with
+``--revoked`` serial numbers. Two parts are reported:
+
+- ``index``: time to parse the CRL and build the per-issuer index, its
+  memory next to a Python set of the same serials, lookup cost of a
+  revoked and a not revoked serial (index alone, the full per-handshake
+  check, and ``get_revoked_certificate_by_serial_number`` on the parsed CRL
+  as a baseline), and applying a delta CRL to the index against rebuilding it.
+- ``handshakes``: mTLS handshakes/sec and proxy CPU per connection with
+  client certificates required, without and with revocation checking; the
+  proxy indexes the CRL from the responder before it starts listening. A
+  client with a revoked certificate must be disconnected when checking is on.
+
+Usage:
+    python benchmarks/bench_revocation.py --revoked 1000000 --duration 8 --concurrency 32
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+import ssl
+from cryptography import x509
+from cryptography.hazmat.primitives.serialization import Encoding
+from harness import SRC, Backend, ProxyProcess
+from revocation_responder import RevocationResponderStub
+
+sys.path.insert(0, SRC)
+
+from core.revocation import IssuerRevocations, RevocationChecker, RevokedSerials, normalize_serial, subject_name
+
+REVOCATION_SCRIPT = """
+import asyncio, sys
+from core.proxy_handler import QuantumSafeProxy
+from core.revocation import RevocationChecker
+from services.revocation_service import CRLUpdater
+ca_file, crl_url = sys.argv[5], sys.argv[6]
+checker = None
+if crl_url != "off":
+    checker = RevocationChecker()
+    CRLUpdater(checker, ca_file, [(crl_url, None)]).refresh()
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4],
+                         ca_file, client_auth="required", revocation=checker)
+asyncio.run(proxy.start())
+"""
+
+FIRST_REVOKED = 1_000_000
+
+def _per_call_us(func, argument, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func(argument)
+    return round((time.perf_counter() - started) / rounds * 1e6, 2)
+
+def measure_index(responder, certificates, rounds):
+    crl_der = responder.base_crl[0]
+    started = time.perf_counter()
+    crl = x509.load_der_x509_crl(crl_der)
+    serials = [normalize_serial(entry.serial_number) for entry in crl]
+    parsed = time.perf_counter()
+    index = RevokedSerials.build(serials)
+    built = time.perf_counter()
+
+    tracemalloc.start()
+    as_set = {entry.serial_number for entry in crl}
+    set_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del as_set
+
+    checker = RevocationChecker()
+    checker.update(subject_name(responder.ca.certificate.public_bytes(Encoding.DER)),
+                   IssuerRevocations("bench", index, None, None))
+    revoked_serial = normalize_serial(FIRST_REVOKED + len(serials) // 2)
+    good_serial = normalize_serial(2)
+    lookups = {
+        "index_revoked_us": _per_call_us(index.__contains__, revoked_serial, rounds),
+        "index_not_revoked_us": _per_call_us(index.__contains__, good_serial, rounds),
+        "check_revoked_us": _per_call_us(checker.check, certificates["revoked"], rounds),
+        "check_not_revoked_us": _per_call_us(checker.check, certificates["client"], rounds),
+        "crl_lookup_revoked_us": _per_call_us(crl.get_revoked_certificate_by_serial_number,
+                                              FIRST_REVOKED + len(serials) // 2, max(rounds // 1000, 10)),
+        "crl_lookup_not_revoked_us": _per_call_us(crl.get_revoked_certificate_by_serial_number, 2,
+                                                  max(rounds // 1000, 10)),
+    }
+
+    # A delta with 1000 new revocations and 100 removals
+    responder.revoke(*range(10, 1010))
+    responder.unrevoke(*range(FIRST_REVOKED, FIRST_REVOKED + 100))
+    responder.publish_delta()
+    delta = x509.load_der_x509_crl(responder.delta_crl[0])
+    added, removed = [], []
+    for entry in delta:
+        try:
+            reason = entry.extensions.get_extension_for_class(x509.CRLReason).value.reason
+        except x509.ExtensionNotFound:
+            reason = None
+        (removed if reason == x509.ReasonFlags.remove_from_crl else added).append(normalize_serial(entry.serial_number))
+    started_merge = time.perf_counter()
+    merged = index.merged(added, removed)
+    merge_seconds = time.perf_counter() - started_merge
+    started_rebuild = time.perf_counter()
+    RevokedSerials.build((set(serials) - set(removed)) | set(added))
+    rebuild_seconds = time.perf_counter() - started_rebuild
+    assert normalize_serial(10) in merged and normalize_serial(FIRST_REVOKED) not in merged
+
+    return {
+        "revoked_serials": len(index),
+        "crl_megabytes": round(len(crl_der) / 2 ** 20, 1),
+        "crl_parse_s": round(parsed - started, 2),
+        "index_build_s": round(built - parsed, 2),
+        "index_megabytes": round((len(index.data) + len(index.bloom.bits)) / 2 ** 20, 1),
+        "python_set_megabytes": round(set_bytes / 2 ** 20, 1),
+        **lookups,
+        "delta_entries": len(added) + len(removed),
+        "delta_merge_ms": round(merge_seconds * 1000, 1),
+        "full_rebuild_ms": round(rebuild_seconds * 1000, 1),
+    }
+
+async def _connect(port, context):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, ssl=context, server_hostname="localhost")
+    try:
+        writer.write(b"x")
+        await writer.drain()
+        await reader.readexactly(1)
+    finally:
+        writer.close()
+
+async def _churn(port, context, duration, concurrency):
+    deadline = time.monotonic() + duration
+    counts = {"connections": 0, "errors": 0}
+
+    async def worker():
+        while time.monotonic() < deadline:
+            try:
+                await _connect(port, context)
+                counts["connections"] += 1
+            except (OSError, asyncio.IncompleteReadError):
+                counts["errors"] += 1
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return counts
+
+async def _rejected(port, context):
+    try:
+        await asyncio.wait_for(_connect(port, context), 5)
+    except (OSError, asyncio.IncompleteReadError):
+        return True
+    return False
+
+def _client_context(paths, name):
+    context = ssl.create_default_context(cafile=paths["ca"])
+    context.load_cert_chain(*paths[name])
+    return context
+
+def measure_handshakes(crl_url, backend_port, paths, args):
+    with ProxyProcess(backend_port, *paths["server"], script=REVOCATION_SCRIPT,
+                      extra_args=[paths["ca"], crl_url]) as proxy:
+        context = _client_context(paths, "client")
+        asyncio.run(_churn(proxy.port, context, 1.0, args.concurrency))
+        cpu_before = proxy.cpu_seconds()
+        counts = asyncio.run(_churn(proxy.port, context, args.duration, args.concurrency))
+        cpu_seconds = proxy.cpu_seconds() - cpu_before
+        revoked_rejected = asyncio.run(_rejected(proxy.port, _client_context(paths, "revoked")))
+    connections = counts["connections"]
+    return {
+        "handshakes_per_sec": round(connections / args.duration, 1),
+        "cpu_us_per_connection": round(cpu_seconds / connections * 1e6, 1) if connections else 0.0,
+        "errors": counts["errors"],
+        "revoked_client_rejected": revoked_rejected,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--revoked", type=int, default=1_000_000, help="Serial numbers in the base CRL")
+    parser.add_argument("--rounds", type=int, default=200_000, help="Lookups per measurement")
+    parser.add_argument("--duration", type=float, default=8.0, help="Seconds per handshake run")
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, RevocationResponderStub() as responder, \
+            Backend("echo") as backend:
+        ca = responder.ca
+        paths = {"ca": ca.write(directory, "ca", ca.certificate)[0]}
+        paths["server"] = ca.write(directory, "server", *responder.issue("localhost", 1, server=True), chain=True)
+        certificates = {}
+        for name, serial in (("client", 2), ("revoked", 3)):
+            certificate, key = responder.issue(name, serial)
+            paths[name] = ca.write(directory, name, certificate, key)
+            certificates[name] = certificate.public_bytes(Encoding.DER)
+        responder.revoke(3, *range(FIRST_REVOKED, FIRST_REVOKED + args.revoked - 1))
+        responder.publish_base()
+
+        report = {"index": measure_index(responder, certificates, args.rounds)}
+        responder.publish_base()
+        report["handshakes"] = {
+            "revocation_off": measure_handshakes("off", backend.port, paths, args),
+            "revocation_on": measure_handshakes(f"{responder.url}/crl", backend.port, paths, args),
+        }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Measures event loop lag while background tasks run inline on the loop and through the TaskScheduler.
+
+A 1 ms probe timer stands in for the proxy's connections and records how
+late it fires. Two tasks the proxy runs in the background are measured:
+
+- ``cert_inventory_scan``: ``CertificateInventory.scan`` over ``--certificates``
+  certificate files.
+- ``ticket_key_rotation``: building a new TLS context from the certificate files.
+
+``inline`` calls the task from a coroutine, as AsyncWorker did; ``scheduled``
+registers the same callable with a TaskScheduler, which routes it to its
+thread pool. For scheduled runs the loop-blocking time the scheduler exports
+is reported next to the probe's view.
+
+Usage:
+    python benchmarks/bench_scheduler.py --certificates 2000 --runs 5
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+from harness import SRC, generate_certificate, percentile
+
+sys.path.insert(0, SRC)
+
+from core.tls_setup import create_tls_context
+from services.certificate_manager import CertificateInventory
+from workers.scheduler import TaskScheduler, IntervalTrigger
+
+PROBE_INTERVAL = 0.001
+
+class _Probe:
+    """
+    Re-arms a timer every PROBE_INTERVAL seconds and records how late it fired.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.lags = []
+        self._expected = loop.time() + PROBE_INTERVAL
+        self._handle = loop.call_at(self._expected, self._tick)
+
+    def _tick(self):
+        now = self.loop.time()
+        self.lags.append(max(now - self._expected, 0.0))
+        self._expected = now + PROBE_INTERVAL
+        self._handle = self.loop.call_at(self._expected, self._tick)
+
+    def stop(self):
+        self._handle.cancel()
+
+def _tasks(directory, cert_file, key_file):
+    return {
+        "cert_inventory_scan": lambda: CertificateInventory([directory]).scan(),
+        "ticket_key_rotation": lambda: create_tls_context(cert_file, key_file),
+    }
+
+async def _run_inline(func):
+    func()
+
+async def _run_scheduled(name, func):
+    reports = []
+    scheduler = TaskScheduler(on_run=lambda *report: reports.append(report))
+    scheduler.add(name, func, IntervalTrigger(3600), run_at_start=True)
+    runner = asyncio.ensure_future(scheduler.run())
+    while not reports:
+        await asyncio.sleep(0.005)
+    runner.cancel()
+    scheduler.close()
+    return reports[0][3]
+
+async def measure(mode, name, func, runs):
+    loop = asyncio.get_running_loop()
+    lags, durations, blocked = [], [], []
+    for _ in range(runs):
+        probe = _Probe(loop)
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        if mode == "inline":
+            await _run_inline(func)
+        else:
+            blocked.append(await _run_scheduled(name, func))
+        durations.append(time.perf_counter() - started)
+        await asyncio.sleep(0.05)
+        probe.stop()
+        lags.extend(probe.lags)
+    result = {
+        "task_ms_p50": round(percentile(durations, 0.50) * 1000, 1),
+        "probe_lag_ms_p99": round(percentile(lags, 0.99) * 1000, 2),
+        "probe_lag_ms_max": round(max(lags) * 1000, 2),
+    }
+    if blocked:
+        result["exported_loop_blocking_ms_max"] = round(max(blocked) * 1000, 2)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--certificates", type=int, default=2000, help="Certificate files in the inventory")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per task and mode")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert_file, key_file = generate_certificate(directory)
+        inventory = os.path.join(directory, "inventory")
+        os.makedirs(inventory)
+        for index in range(args.certificates):
+            shutil.copy(cert_file, os.path.join(inventory, f"cert{index}.pem"))
+
+        async def run():
+            report = {}
+            for name, func in _tasks(inventory, cert_file, key_file).items():
+                report[name] = {mode: await measure(mode, name, func, args.runs) for mode in ("inline", "scheduled")}
+            return report
+
+        report = asyncio.run(run())
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
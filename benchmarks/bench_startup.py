@@ -0,0 +1,148 @@
+"""
+Measures proxy start-up cost and guards it against regressions.
+
+Reports the cumulative ``python -X importtime`` cost of importing ``main``,
+checks that optional subsystems stay unimported until the config enables
+them, and measures time from process spawn to the first accepted TLS
+connection. Exits non-zero when a budget or the stored baseline is exceeded.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5 --baseline benchmarks/baselines/startup.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import datetime
+import tempfile
+import subprocess
+from harness import SRC, client_tls_context, free_port, generate_certificate
+
+# Modules that must only be imported once the configuration enables them
+DEFERRED_MODULES = [
+    "google.cloud.kms_v1", "oqs", "aiohttp", "prometheus_client", "jwt", "cryptography", "aioquic"
+]
+
+PROXY_SCRIPT = """
+import asyncio, sys
+from core.proxy_handler import QuantumSafeProxy
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", 9, sys.argv[2], sys.argv[3])
+asyncio.run(proxy.start())
+"""
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+def measure_import_time():
+    """
+    Returns the cumulative import time of ``main`` in milliseconds and the slowest modules.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SRC, capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        modules.append((name, int(self_us), int(cumulative_us)))
+    total_ms = next(cumulative for name, _, cumulative in reversed(modules) if name == "main") / 1000
+    slowest = sorted(modules, key=lambda module: module[1], reverse=True)[:10]
+    return total_ms, [{"module": name, "self_ms": self_us / 1000} for name, self_us, _ in slowest]
+
+def find_deferred_imports():
+    """
+    Returns the deferred modules that importing ``main`` pulled in.
+    """
+    script = "import sys, json, main; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", script], cwd=SRC, capture_output=True, text=True, check=True)
+    loaded = set(json.loads(result.stdout))
+    return [module for module in DEFERRED_MODULES if module in loaded]
+
+def measure_time_to_first_connection(cert_file, key_file, timeout=30.0):
+    """
+    Spawns the proxy and returns milliseconds until a TLS handshake with it succeeds.
+    """
+    port = free_port()
+    client_context = client_tls_context()
+
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", PROXY_SCRIPT, str(port), cert_file, key_file],
+        cwd=SRC, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=1) as sock:
+                    with client_context.wrap_socket(sock, server_hostname="localhost"):
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.002)
+        raise TimeoutError(f"Proxy did not accept a connection within {timeout}s")
+    finally:
+        process.kill()
+        process.wait()
+
+def check_regressions(result, args):
+    failures = []
+    if result["deferred_modules_imported"]:
+        failures.append(f"deferred modules imported at start-up: {result['deferred_modules_imported']}")
+    if args.max_import_ms and result["import_ms"] > args.max_import_ms:
+        failures.append(f"import time {result['import_ms']:.1f}ms exceeds budget {args.max_import_ms}ms")
+    if args.max_ready_ms and result["first_connection_ms"] > args.max_ready_ms:
+        failures.append(f"time to first connection {result['first_connection_ms']:.1f}ms exceeds budget {args.max_ready_ms}ms")
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for metric in ("import_ms", "first_connection_ms"):
+            limit = baseline[metric] * (1 + args.tolerance)
+            if result[metric] > limit:
+                failures.append(f"{metric} {result[metric]:.1f} regressed beyond {limit:.1f} (baseline {baseline[metric]:.1f})")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Number of measurements; the median is reported")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="Fail if importing main takes longer")
+    parser.add_argument("--max-ready-ms", type=float, default=None, help="Fail if the first connection takes longer")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown against the baseline")
+    parser.add_argument("--save-baseline", default=None, help="Write the result as the new baseline")
+    args = parser.parse_args()
+
+    import_samples = []
+    for _ in range(args.runs):
+        total_ms, slowest = measure_import_time()
+        import_samples.append(total_ms)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert_file, key_file = generate_certificate(directory)
+        ready_samples = [measure_time_to_first_connection(cert_file, key_file) for _ in range(args.runs)]
+
+    result = {
+        "python": sys.version.split()[0],
+        "measured_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "import_ms": round(median(import_samples), 2),
+        "first_connection_ms": round(median(ready_samples), 2),
+        "slowest_imports": slowest,
+        "deferred_modules_imported": find_deferred_imports(),
+    }
+    failures = check_regressions(result, args)
+    result["regressions"] = failures
+    print(json.dumps(result, indent=2))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump({key: result[key] for key in ("python", "measured_at", "import_ms", "first_connection_ms")}, f, indent=2)
+            f.write("\n")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
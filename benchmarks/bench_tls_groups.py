@@ -0,0 +1,132 @@
+"""
+Compares TLS handshake rates and CPU cost across key exchange groups.
+
+For each group the proxy runs with a TLS policy offering only that group,
+and clients offering the same group connect, complete the handshake,
+exchange one byte and close. Reports handshakes/sec, proxy CPU per
+connection and the handshake CPU time the proxy exported for the
+negotiated group. Groups the local OpenSSL does not know (hybrid groups
+without oqs-provider) are reported as skipped.
+
+Usage:
+    python benchmarks/bench_tls_groups.py --duration 8 --concurrency 32
+    python benchmarks/bench_tls_groups.py --groups X25519 X25519MLKEM768 --providers oqsprovider
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from harness import Backend, ProxyProcess, client_tls_context, generate_certificate
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from core.tls_policy import configure_groups, load_providers, negotiated_group
+
+DEFAULT_GROUPS = ["X25519", "secp256r1", "secp384r1", "X448", "ffdhe2048", "X25519MLKEM768", "SecP256r1MLKEM768"]
+
+# Serves with a single-group policy and periodically writes the exported
+# handshake telemetry (count and CPU seconds per group) to a JSON file
+GROUP_SCRIPT = """
+import asyncio, json, sys
+from core.proxy_handler import QuantumSafeProxy
+from core.tls_policy import TLSPolicies, TLSPolicy, load_providers
+from core.tls_setup import create_tls_context
+group, providers, report_file = sys.argv[5], json.loads(sys.argv[6]), sys.argv[7]
+load_providers(providers)
+totals = {}
+def on_handshake(policy, negotiated, cpu_seconds):
+    count, cpu = totals.get(negotiated, (0, 0.0))
+    totals[negotiated] = (count + 1, cpu + cpu_seconds)
+async def report():
+    while True:
+        await asyncio.sleep(0.25)
+        with open(report_file, "w") as f:
+            json.dump(totals, f)
+async def main():
+    policies = TLSPolicies(TLSPolicy("default", create_tls_context(sys.argv[3], sys.argv[4]), [group]),
+                           on_handshake=on_handshake)
+    proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4],
+                             tls_policies=policies)
+    asyncio.ensure_future(report())
+    await proxy.start()
+asyncio.run(main())
+"""
+
+def group_context(group):
+    context = client_tls_context()
+    configure_groups(context, [group])
+    return context
+
+async def _connect(port, context):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, ssl=context, server_hostname="localhost")
+    try:
+        writer.write(b"x")
+        await writer.drain()
+        await reader.readexactly(1)
+        return negotiated_group(writer.get_extra_info("ssl_object"))
+    finally:
+        writer.close()
+
+async def _churn(port, context, duration, concurrency):
+    deadline = time.monotonic() + duration
+    counts = {"connections": 0, "errors": 0}
+
+    async def worker():
+        while time.monotonic() < deadline:
+            try:
+                await _connect(port, context)
+                counts["connections"] += 1
+            except (OSError, asyncio.IncompleteReadError):
+                counts["errors"] += 1
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return counts
+
+def measure(group, backend_port, cert_file, key_file, directory, args):
+    try:
+        context = group_context(group)
+    except ValueError:
+        return {"skipped": "group not supported by the local OpenSSL"}
+    report_file = os.path.join(directory, f"{group}.json")
+    with ProxyProcess(backend_port, cert_file, key_file, script=GROUP_SCRIPT,
+                      extra_args=[group, json.dumps(args.providers), report_file], event_loop=args.loop) as proxy:
+        negotiated = asyncio.run(_connect(proxy.port, context))
+        asyncio.run(_churn(proxy.port, context, 1.0, args.concurrency))
+        cpu_before = proxy.cpu_seconds()
+        with open(report_file) as f:
+            exported_before = json.load(f).get(negotiated, (0, 0.0))
+        counts = asyncio.run(_churn(proxy.port, context, args.duration, args.concurrency))
+        cpu_seconds = proxy.cpu_seconds() - cpu_before
+        time.sleep(0.5)
+        with open(report_file) as f:
+            exported = json.load(f).get(negotiated, (0, 0.0))
+    connections = counts["connections"]
+    handshakes = exported[0] - exported_before[0]
+    return {
+        "negotiated_group": negotiated,
+        "handshakes_per_sec": round(connections / args.duration, 1),
+        "cpu_us_per_connection": round(cpu_seconds / connections * 1e6, 1) if connections else 0.0,
+        "handshake_cpu_us": round((exported[1] - exported_before[1]) / handshakes * 1e6, 1) if handshakes else 0.0,
+        "errors": counts["errors"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--groups", nargs="+", default=DEFAULT_GROUPS)
+    parser.add_argument("--providers", nargs="*", default=[], help="OpenSSL providers to load, e.g. oqsprovider")
+    parser.add_argument("--duration", type=float, default=8.0, help="Seconds per group")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--loop", default=None, choices=["asyncio", "uvloop"], help="Event loop of the proxy")
+    args = parser.parse_args()
+
+    load_providers(args.providers)
+    with tempfile.TemporaryDirectory() as directory, Backend("echo") as backend:
+        cert_file, key_file = generate_certificate(directory)
+        report = {group: measure(group, backend.port, cert_file, key_file, directory, args) for group in args.groups}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
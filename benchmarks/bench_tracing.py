@@ -0,0 +1,101 @@
+"""
+Measures tracing overhead and checks it stays within budget.
+
+Alternates churn runs with tracing off and on (1% head sampling plus tail
+sampling by default), exporting to a local OTLP/HTTP collector stub, and
+compares proxy CPU per connection and handshakes/sec. Exits non-zero when the
+median CPU overhead exceeds ``--budget``.
+
+Usage:
+    python benchmarks/bench_tracing.py --rounds 3 --duration 8 --sample-rate 0.01
+"""
+import sys
+import json
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from harness import PROXY_SCRIPT, Backend, ProxyProcess, generate_certificate
+from loadgen import run_load
+
+TRACED_PROXY_SCRIPT = """
+import asyncio, sys
+from core.proxy_handler import QuantumSafeProxy
+from monitoring.tracing import Tracer, TraceExporter, OTLPHttpExporter, set_tracer
+tracer = Tracer(sample_rate=float(sys.argv[5]), tail_latency=0.5)
+set_tracer(tracer)
+TraceExporter(tracer, OTLPHttpExporter(sys.argv[6])).start()
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4])
+asyncio.run(proxy.start())
+"""
+
+class CollectorStub(BaseHTTPRequestHandler):
+    """
+    Accepts OTLP/JSON export requests and counts the received spans.
+    """
+    spans = 0
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        CollectorStub.spans += sum(len(scope["spans"]) for resource in payload["resourceSpans"]
+                                   for scope in resource["scopeSpans"])
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def measure(script, extra_args, backend_port, cert_file, key_file, args):
+    with ProxyProcess(backend_port, cert_file, key_file, script=script, extra_args=extra_args) as proxy:
+        # Warm up so one-off costs (first handshake, first export) are not measured
+        run_load("churn", proxy.port, duration=1.5, concurrency=args.concurrency)
+        cpu_before = proxy.cpu_seconds()
+        result = run_load("churn", proxy.port, duration=args.duration, concurrency=args.concurrency)
+        cpu_seconds = proxy.cpu_seconds() - cpu_before
+    connections = result["handshakes_per_sec"] * result["duration_s"]
+    return result["handshakes_per_sec"], cpu_seconds / connections * 1e6 if connections else 0.0
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=8.0, help="Seconds per run")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sample-rate", type=float, default=0.01)
+    parser.add_argument("--budget", type=float, default=0.02, help="Allowed CPU overhead (fraction)")
+    args = parser.parse_args()
+
+    collector = ThreadingHTTPServer(("127.0.0.1", 0), CollectorStub)
+    threading.Thread(target=collector.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{collector.server_address[1]}/v1/traces"
+
+    runs = {"off": [], "on": []}
+    with tempfile.TemporaryDirectory() as directory, Backend("echo") as backend:
+        cert_file, key_file = generate_certificate(directory)
+        for _ in range(args.rounds):
+            runs["off"].append(measure(PROXY_SCRIPT, None, backend.port, cert_file, key_file, args))
+            runs["on"].append(measure(TRACED_PROXY_SCRIPT, [args.sample_rate, endpoint],
+                                      backend.port, cert_file, key_file, args))
+    collector.shutdown()
+
+    report = {}
+    for name, results in runs.items():
+        report[name] = {
+            "handshakes_per_sec": round(median([rate for rate, _ in results]), 1),
+            "cpu_us_per_connection": round(median([cpu for _, cpu in results]), 1),
+        }
+    cpu_overhead = report["on"]["cpu_us_per_connection"] / report["off"]["cpu_us_per_connection"] - 1
+    report["sample_rate"] = args.sample_rate
+    report["spans_exported"] = CollectorStub.spans
+    report["cpu_overhead"] = f"{cpu_overhead:+.2%}"
+    report["throughput_change"] = f"{report['on']['handshakes_per_sec'] / report['off']['handshakes_per_sec'] - 1:+.2%}"
+    print(json.dumps(report, indent=2))
+    if cpu_overhead > args.budget:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
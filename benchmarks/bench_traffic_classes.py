@@ -0,0 +1,155 @@
+"""
+Measures internal-class latency while public clients overload the proxy, with and without traffic classes.
+
+Public load processes open TLS connections to the proxy's port as fast as
+they can (handshake, one echoed byte, close), far beyond what one proxy
+process can handshake. A few internal clients meanwhile do the same
+against the internal listener and record their latency.
+
+Runs: ``idle`` has internal clients only; ``classes_off`` adds the public
+flood with every connection scheduled alike (internal clients use the
+proxy's port, as there is no internal listener); ``classes_on`` puts the
+internal listener in a class with weight ``--internal-weight`` and a higher
+shedding priority than the public class. Reported per run: internal p50/p99
+latency and errors, public connections completed per second and the share
+that failed or was shed, and proxy CPU utilisation.
+
+Usage:
+    python benchmarks/bench_traffic_classes.py --duration 10 --public-processes 3 --public-concurrency 128
+"""
+import ssl
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+from harness import Backend, ProxyProcess, client_tls_context, free_port, generate_certificate, percentile
+
+TRAFFIC_SCRIPT = """
+import asyncio, json, sys
+from core.proxy_handler import QuantumSafeProxy
+from core.traffic_classes import TrafficClass, TrafficClasses
+settings = json.loads(sys.argv[5])
+traffic = None
+if settings is not None:
+    traffic = TrafficClasses([TrafficClass(**item) for item in settings["classes"]], settings["default"],
+                             handshake_slots=settings["handshake_slots"], max_queued=settings["max_queued"])
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4],
+                         traffic=traffic)
+asyncio.run(proxy.start())
+"""
+
+async def _connect_once(port, context, timeout):
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection("127.0.0.1", port, ssl=context, server_hostname="localhost"), timeout)
+    try:
+        writer.write(b"x")
+        await writer.drain()
+        await asyncio.wait_for(reader.readexactly(1), timeout)
+    finally:
+        writer.close()
+
+def _run_public(port, duration, concurrency, results):
+    async def run():
+        context = client_tls_context()
+        counts = {"completed": 0, "failed": 0}
+        deadline = time.monotonic() + duration
+
+        async def worker():
+            while time.monotonic() < deadline:
+                try:
+                    await _connect_once(port, context, 5)
+                    counts["completed"] += 1
+                except (OSError, ssl.SSLError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    counts["failed"] += 1
+                    await asyncio.sleep(0.01)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return counts
+    results.put(asyncio.run(run()))
+
+async def _internal(port, duration, concurrency):
+    context = client_tls_context()
+    deadline = time.monotonic() + duration
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                await _connect_once(port, context, 10)
+                latencies.append(time.perf_counter() - started)
+            except (OSError, ssl.SSLError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                errors += 1
+            await asyncio.sleep(0.05)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors
+
+def measure(settings, internal_port, public_processes, backend_port, cert_file, key_file, args):
+    with ProxyProcess(backend_port, cert_file, key_file, script=TRAFFIC_SCRIPT,
+                      extra_args=[json.dumps(settings)]) as proxy:
+        internal_port = internal_port or proxy.port
+        results = multiprocessing.Queue()
+        public = [multiprocessing.Process(target=_run_public,
+                                          args=(proxy.port, args.duration, args.public_concurrency, results))
+                  for _ in range(public_processes)]
+        cpu_before = proxy.cpu_seconds()
+        for process in public:
+            process.start()
+        latencies, errors = asyncio.run(_internal(internal_port, args.duration, args.internal_concurrency))
+        counts = [results.get() for _ in public]
+        for process in public:
+            process.join()
+        cpu_seconds = proxy.cpu_seconds() - cpu_before
+    completed = sum(count["completed"] for count in counts)
+    attempts = completed + sum(count["failed"] for count in counts)
+    return {
+        "internal_connections": len(latencies),
+        "internal_latency_ms_p50": round(percentile(latencies, 0.50) * 1000, 2),
+        "internal_latency_ms_p99": round(percentile(latencies, 0.99) * 1000, 2),
+        "internal_errors": errors,
+        "public_completed_per_sec": round(completed / args.duration, 1),
+        "public_failed_share": round(1 - completed / attempts, 3) if attempts else 0.0,
+        "proxy_cpu_percent": round(cpu_seconds / args.duration * 100, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run")
+    parser.add_argument("--public-processes", type=int, default=3)
+    parser.add_argument("--public-concurrency", type=int, default=128, help="Connections in flight per public process")
+    parser.add_argument("--internal-concurrency", type=int, default=4)
+    parser.add_argument("--internal-weight", type=float, default=8.0)
+    parser.add_argument("--handshake-slots", type=int, default=16)
+    parser.add_argument("--max-queued", type=int, default=256)
+    args = parser.parse_args()
+
+    internal_port = free_port()
+    classes_on = {
+        "classes": [
+            {"name": "internal", "weight": args.internal_weight, "priority": 10,
+             "listen": [f"127.0.0.1:{internal_port}"]},
+            {"name": "public", "weight": 1.0, "priority": 0, "max_queue_wait": 2.0},
+        ],
+        "default": "public",
+        "handshake_slots": args.handshake_slots,
+        "max_queued": args.max_queued,
+    }
+    runs = {
+        "idle": (None, None, 0),
+        "classes_off": (None, None, args.public_processes),
+        "classes_on": (classes_on, internal_port, args.public_processes),
+    }
+    with tempfile.TemporaryDirectory() as directory, Backend("echo") as backend:
+        cert_file, key_file = generate_certificate(directory)
+        report = {}
+        for name, (settings, port, public_processes) in runs.items():
+            report[name] = measure(settings, port, public_processes, backend.port, cert_file, key_file, args)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Local stand-in for the TLS communication service, for tests and benchmarks.
+
+Implements the subscription protocol ``CertificateSubscriber`` speaks:
+``GET /v1/certificates`` (snapshot), ``GET /v1/certificates/subscribe``
+(newline-delimited JSON stream of deltas and heartbeats) and
+``POST /v1/certificates/ack``. Versions start at 1 and every ``publish()``
+adds one; a subscriber resuming from a version it knows receives only the
+files that changed since then.
+
+Usage:
+    python benchmarks/cert_service_stub.py --port 8700 --cert cert.pem --key key.pem
+    (send SIGHUP to publish the files again after replacing them)
+"""
+import json
+import time
+import signal
+import argparse
+import threading
+from urllib.parse import parse_qs, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        stub = self.server.stub
+        if url.path == "/v1/certificates":
+            body = json.dumps(stub.update_since(0)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == "/v1/certificates/subscribe":
+            self._stream(stub, query.get("subscriber", [""])[0], int(query.get("version", ["0"])[0]))
+        else:
+            self.send_error(404)
+
+    def _stream(self, stub, subscriber, applied):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        generation = stub.generation
+        sent = applied
+        try:
+            while stub.generation == generation:
+                # Deltas are relative to what the subscriber applied, not to what was sent,
+                # so an update it rejected is carried again by the next one
+                applied = max(applied, stub.applied.get(subscriber, 0))
+                message = stub.wait_for_update(sent, applied, stub.heartbeat_interval, generation)
+                if stub.generation != generation:
+                    break
+                if message is None:
+                    message = {"type": "heartbeat"}
+                else:
+                    sent = message["version"]
+                line = json.dumps(message).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            pass
+        self.close_connection = True
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/v1/certificates/ack":
+            self.send_error(404)
+            return
+        acknowledgement = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        self.server.stub.acknowledge(acknowledgement)
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class CertificateServiceStub:
+    """
+    In-process TLS communication service with versioned certificate files.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, heartbeat_interval=5.0):
+        self.heartbeat_interval = heartbeat_interval
+        self.history = []  # (version, issued_at, files) with the complete file set per version
+        self.acknowledgements = {}
+        self.applied = {}
+        self.generation = 0
+        self._changed = threading.Condition()
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.disconnect()
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def version(self):
+        return self.history[-1][0] if self.history else 0
+
+    def publish(self, files):
+        """
+        Publishes a new version; ``files`` maps ``cert_file``/``key_file``/``ca_file`` to PEM text.
+
+        Returns:
+            int: The new version.
+        """
+        with self._changed:
+            current = dict(self.history[-1][2]) if self.history else {}
+            current.update(files)
+            self.history.append((self.version + 1, time.time(), current))
+            self._changed.notify_all()
+            return self.version
+
+    def update_since(self, version):
+        """
+        Returns the update message taking a subscriber from ``version`` to the latest version.
+        """
+        latest, issued_at, files = self.history[-1]
+        known = next((entry[2] for entry in self.history if entry[0] == version), None)
+        message = {"type": "update", "version": latest, "issued_at": issued_at}
+        if known is None:
+            message.update(snapshot=True, files=files)
+        else:
+            message["files"] = {name: pem for name, pem in files.items() if known.get(name) != pem}
+        return message
+
+    def wait_for_update(self, sent, applied, timeout, generation):
+        """
+        Blocks until a version newer than ``sent`` exists or the streams of ``generation`` are disconnected.
+
+        Returns:
+            dict: The update message from ``applied``, or None on timeout or disconnect.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.version > sent or self.generation != generation, timeout)
+            if self.version > sent and self.generation == generation:
+                return self.update_since(applied)
+            return None
+
+    def disconnect(self):
+        """
+        Ends every open subscription stream, as a service restart or network failure would.
+        """
+        with self._changed:
+            self.generation += 1
+            self._changed.notify_all()
+
+    def acknowledge(self, acknowledgement):
+        with self._changed:
+            self.acknowledgements[acknowledgement["subscriber"]] = acknowledgement
+            if acknowledgement.get("applied"):
+                self.applied[acknowledgement["subscriber"]] = acknowledgement["version"]
+            self._changed.notify_all()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--cert", required=True, help="Certificate chain to publish")
+    parser.add_argument("--key", required=True, help="Private key to publish")
+    parser.add_argument("--ca", default=None, help="CA bundle to publish")
+    parser.add_argument("--heartbeat-interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    def publish():
+        files = {"cert_file": args.cert, "key_file": args.key, "ca_file": args.ca}
+        contents = {}
+        for name, path in files.items():
+            if path:
+                with open(path) as f:
+                    contents[name] = f.read()
+        print(f"Published version {stub.publish(contents)}", flush=True)
+
+    with CertificateServiceStub(args.host, args.port, args.heartbeat_interval) as stub:
+        publish()
+        signal.signal(signal.SIGHUP, lambda *_: publish())
+        print(f"Serving certificates on {stub.url}", flush=True)
+        while True:
+            signal.pause()
+
+if __name__ == "__main__":
+    main()
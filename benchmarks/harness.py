@@ -0,0 +1,207 @@
+"""
+Shared helpers for the benchmark suite: throwaway certificates, local
+backends and a proxy process running from ``src/``.
+"""
+import os
+import sys
+import ssl
+import time
+import socket
+import asyncio
+import threading
+import subprocess
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+PROXY_SCRIPT = """
+import asyncio, sys
+from core.proxy_handler import QuantumSafeProxy
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4])
+asyncio.run(proxy.start())
+"""
+
+HTTP_BODY_SIZE = 512
+
+def percentile(samples, fraction):
+    """
+    Returns the sample at the given fraction (0..1) of the sorted samples.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def free_port():
+    """
+    Returns a TCP port on the loopback interface that is currently free.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def generate_certificate(directory, common_name="localhost"):
+    """
+    Writes a throwaway self-signed certificate and key with the openssl CLI.
+
+    Returns:
+        tuple: Paths to the certificate and key files.
+    """
+    cert_file = os.path.join(directory, "cert.pem")
+    key_file = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+         "-nodes", "-days", "1", "-subj", f"/CN={common_name}", "-keyout", key_file, "-out", cert_file],
+        check=True, capture_output=True
+    )
+    return cert_file, key_file
+
+def client_tls_context():
+    """
+    Returns a client TLS context that accepts the throwaway certificates.
+    """
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+def wait_for_port(port, timeout=15.0):
+    """
+    Blocks until something accepts TCP connections on ``port``.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.01)
+    raise TimeoutError(f"Nothing is listening on port {port} after {timeout}s")
+
+async def _echo(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def _http_stub(reader, writer):
+    """
+    Minimal HTTP/1.1 keep-alive server returning a fixed body for every request.
+    """
+    body = b"x" * HTTP_BODY_SIZE
+    response = (b"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+    try:
+        while True:
+            request = await reader.readuntil(b"\r\n\r\n")
+            if not request:
+                break
+            writer.write(response)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+def _serve_backend(kind, port):
+    async def serve():
+        handler = _echo if kind == "echo" else _http_stub
+        server = await asyncio.start_server(handler, "127.0.0.1", port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+    asyncio.run(serve())
+
+class Backend:
+    """
+    Runs an echo or HTTP stub backend in a separate process.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.port = free_port()
+        self.process = None
+
+    def __enter__(self):
+        self.process = multiprocessing.Process(target=_serve_backend, args=(self.kind, self.port), daemon=True)
+        self.process.start()
+        wait_for_port(self.port)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.join()
+
+def with_event_loop(script, event_loop=None):
+    """
+    Prefixes a launcher script so it runs on the given event loop (``asyncio`` or ``uvloop``).
+    """
+    if event_loop is None:
+        return script
+    return f"from core.event_loop import install_event_loop\ninstall_event_loop({event_loop!r})\n{script}"
+
+class ProxyProcess:
+    """
+    Runs ``QuantumSafeProxy`` from ``src/`` in a subprocess in front of a backend.
+
+    Args:
+        backend_port (int): Port of the local backend to forward to.
+        cert_file (str): Path to the TLS certificate file.
+        key_file (str): Path to the private key file.
+        script (str, optional): Alternative launcher script taking the same arguments.
+        extra_args (list, optional): Additional arguments appended to the launcher.
+        event_loop (str, optional): Event loop to install before the launcher runs
+            (``asyncio`` or ``uvloop``); the interpreter default when omitted.
+    """
+
+    def __init__(self, backend_port, cert_file, key_file, script=PROXY_SCRIPT, extra_args=None, event_loop=None):
+        self.port = free_port()
+        self.backend_port = backend_port
+        self.cert_file = cert_file
+        self.key_file = key_file
+        self.script = script
+        self.extra_args = [str(arg) for arg in (extra_args or [])]
+        self.event_loop = event_loop
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", with_event_loop(self.script, self.event_loop), str(self.port), str(self.backend_port),
+             self.cert_file, self.key_file, *self.extra_args],
+            cwd=SRC, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        try:
+            wait_for_port(self.port)
+        except TimeoutError:
+            self.process.kill()
+            raise RuntimeError(f"Proxy failed to start: {self.process.stderr.read().decode(errors='replace')}")
+        # Keep reading so a proxy logging per connection never blocks on a full pipe
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+        return self
+
+    def _drain_stderr(self):
+        try:
+            while self.process.stderr.read(65536):
+                pass
+        except (OSError, ValueError):
+            pass
+
+    def cpu_seconds(self):
+        """
+        Returns user plus system CPU seconds consumed by the proxy process so far.
+        """
+        with open(f"/proc/{self.process.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def __exit__(self, *exc_info):
+        self.process.kill()
+        self.process.wait()
+        self.process.stderr.close()
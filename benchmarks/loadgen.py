@@ -0,0 +1,149 @@
+"""
+Asyncio load generator for the proxy, fanned out across worker processes.
+
+Scenarios:
+    churn    - open a TLS connection, exchange one byte, close; repeat
+    bulk     - long-lived connections streaming data through an echo backend
+    reqresp  - keep-alive HTTP/1.1 request/response through an HTTP stub backend
+"""
+import time
+import asyncio
+import multiprocessing
+from harness import client_tls_context, percentile
+
+BULK_CHUNK = 64 * 1024
+HTTP_REQUEST = b"GET / HTTP/1.1\r\nHost: localhost\r\nConnection: keep-alive\r\n\r\n"
+
+async def _churn(port, deadline, stats):
+    context = client_tls_context()
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port, ssl=context)
+            writer.write(b"p")
+            await writer.drain()
+            await reader.readexactly(1)
+            stats["latencies"].append(time.perf_counter() - started)
+            stats["handshakes"] += 1
+            writer.close()
+            await writer.wait_closed()
+        except (OSError, asyncio.IncompleteReadError):
+            stats["errors"] += 1
+
+async def _bulk(port, deadline, stats):
+    context = client_tls_context()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port, ssl=context)
+    except OSError:
+        stats["errors"] += 1
+        return
+    stats["handshakes"] += 1
+    payload = b"\0" * BULK_CHUNK
+
+    async def send():
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            writer.write(payload)
+            try:
+                await asyncio.wait_for(writer.drain(), remaining)
+            except asyncio.TimeoutError:
+                break
+            stats["bytes_sent"] += len(payload)
+
+    async def receive():
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                data = await asyncio.wait_for(reader.read(BULK_CHUNK), remaining)
+            except asyncio.TimeoutError:
+                break
+            if not data:
+                break
+            stats["bytes_received"] += len(data)
+
+    try:
+        await asyncio.gather(send(), receive())
+    except (OSError, asyncio.IncompleteReadError):
+        stats["errors"] += 1
+    finally:
+        writer.close()
+
+async def _reqresp(port, deadline, stats):
+    context = client_tls_context()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port, ssl=context)
+    except OSError:
+        stats["errors"] += 1
+        return
+    stats["handshakes"] += 1
+    try:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            writer.write(HTTP_REQUEST)
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = int(headers.split(b"Content-Length: ", 1)[1].split(b"\r\n", 1)[0])
+            body = await reader.readexactly(length)
+            stats["latencies"].append(time.perf_counter() - started)
+            stats["requests"] += 1
+            stats["bytes_received"] += len(headers) + len(body)
+    except (OSError, asyncio.IncompleteReadError, IndexError):
+        stats["errors"] += 1
+    finally:
+        writer.close()
+
+SCENARIOS = {"churn": _churn, "bulk": _bulk, "reqresp": _reqresp}
+
+def _run_worker(scenario, port, concurrency, duration):
+    async def run():
+        stats = {"handshakes": 0, "requests": 0, "errors": 0,
+                 "bytes_sent": 0, "bytes_received": 0, "latencies": []}
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*[SCENARIOS[scenario](port, deadline, stats) for _ in range(concurrency)])
+        return stats
+    return asyncio.run(run())
+
+def run_load(scenario, port, duration=10.0, concurrency=32, processes=1):
+    """
+    Drives the proxy listening on ``port`` and returns aggregated results.
+
+    Args:
+        scenario (str): One of ``churn``, ``bulk`` or ``reqresp``.
+        port (int): The proxy port on the loopback interface.
+        duration (float): Seconds to generate load for.
+        concurrency (int): Concurrent connections per worker process.
+        processes (int): Number of load generator processes.
+
+    Returns:
+        dict: Throughput, latency percentiles and error counts.
+    """
+    per_process = max(1, concurrency // processes)
+    started = time.perf_counter()
+    if processes == 1:
+        results = [_run_worker(scenario, port, per_process, duration)]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(_run_worker, [(scenario, port, per_process, duration)] * processes)
+    elapsed = time.perf_counter() - started
+
+    totals = {key: sum(result[key] for result in results)
+              for key in ("handshakes", "requests", "errors", "bytes_sent", "bytes_received")}
+    latencies = [sample for result in results for sample in result["latencies"]]
+    return {
+        "scenario": scenario,
+        "duration_s": round(elapsed, 3),
+        "connections": per_process * processes,
+        "processes": processes,
+        "handshakes_per_sec": round(totals["handshakes"] / elapsed, 1),
+        "requests_per_sec": round(totals["requests"] / elapsed, 1),
+        "mb_per_sec": round((totals["bytes_sent"] + totals["bytes_received"]) / elapsed / 1e6, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "p999": round(percentile(latencies, 0.999) * 1000, 3),
+        },
+        "errors": totals["errors"],
+    }
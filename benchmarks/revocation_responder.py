@@ -0,0 +1,327 @@
+"""
+Local stand-in CRL distribution point and OCSP responder, for tests and benchmarks.
+
+Runs a throwaway certificate authority that issues client and server
+certificates and publishes what it revoked:
+
+- ``GET /crl`` serves the base CRL (DER) with an ``ETag``; a request with a
+  matching ``If-None-Match`` gets 304.
+- ``GET /delta.crl`` serves a delta CRL listing the revocations and
+  un-revocations (reason ``removeFromCRL``) since the base.
+- ``POST /ocsp`` answers DER OCSP requests for certificates it issued.
+
+CRLs are DER-encoded here rather than with ``CertificateRevocationListBuilder``,
+which copies its entry list on every addition and cannot build a CRL with
+a million entries in reasonable time.
+
+Usage:
+    python benchmarks/revocation_responder.py --port 8800 --revoked 1000000 --directory /tmp/ca
+    (writes ca.pem plus server and client certificates to the directory)
+"""
+import os
+import time
+import hashlib
+import argparse
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cryptography import x509
+from cryptography.x509 import ocsp
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+# ecdsa-with-SHA256, CRL number, delta CRL indicator and reason code
+_ECDSA_SHA256 = bytes.fromhex("06082a8648ce3d040302")
+_CRL_NUMBER = bytes.fromhex("0603551d14")
+_DELTA_CRL_INDICATOR = bytes.fromhex("0603551d1b")
+_REASON_CODE = bytes.fromhex("0603551d15")
+REMOVE_FROM_CRL = 8
+
+def _tlv(tag, value):
+    length = len(value)
+    if length < 0x80:
+        return bytes((tag, length)) + value
+    encoded = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes((tag, 0x80 | len(encoded))) + encoded + value
+
+def _integer(value):
+    return _tlv(0x02, value.to_bytes(value.bit_length() // 8 + 1, "big", signed=True))
+
+def _time(moment):
+    return _tlv(0x17, moment.strftime("%y%m%d%H%M%SZ").encode())
+
+def _extension(oid, value, critical=False):
+    return _tlv(0x30, oid + (b"\x01\x01\xff" if critical else b"") + _tlv(0x04, value))
+
+def _sequence(*parts):
+    return _tlv(0x30, b"".join(parts))
+
+class CertificateAuthority:
+    """
+    Throwaway ECDSA P-256 CA issuing certificates with consecutive serial numbers and signing CRLs.
+    """
+
+    def __init__(self, common_name="Revocation Test CA", url=None):
+        self.key = ec.generate_private_key(ec.SECP256R1())
+        self.url = url
+        self.name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self.certificate = (
+            x509.CertificateBuilder()
+            .subject_name(self.name).issuer_name(self.name)
+            .public_key(self.key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(minutes=5))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+            .sign(self.key, hashes.SHA256())
+        )
+        self._name_der = self.name.public_bytes()
+
+    def issue(self, common_name, serial_number, server=False):
+        """
+        Issues a certificate; server certificates carry the responder's OCSP URL.
+
+        Returns:
+            tuple: The certificate and its private key.
+        """
+        key = ec.generate_private_key(ec.SECP256R1())
+        now = datetime.datetime.now(datetime.timezone.utc)
+        builder = (
+            x509.CertificateBuilder()
+            .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)]))
+            .issuer_name(self.name)
+            .public_key(key.public_key())
+            .serial_number(serial_number)
+            .not_valid_before(now - datetime.timedelta(minutes=5))
+            .not_valid_after(now + datetime.timedelta(days=1))
+        )
+        if server:
+            builder = builder.add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+            if self.url:
+                builder = builder.add_extension(x509.AuthorityInformationAccess([x509.AccessDescription(
+                    x509.oid.AuthorityInformationAccessOID.OCSP, x509.UniformResourceIdentifier(f"{self.url}/ocsp"))]),
+                    critical=False)
+        return builder.sign(self.key, hashes.SHA256()), key
+
+    def write(self, directory, name, certificate, key=None, chain=False):
+        """
+        Writes a certificate (followed by the CA certificate when ``chain`` is set) and its key as PEM.
+
+        Returns:
+            tuple: Paths to the certificate and key files.
+        """
+        cert_file = os.path.join(directory, f"{name}.pem")
+        key_file = os.path.join(directory, f"{name}-key.pem")
+        with open(cert_file, "wb") as f:
+            f.write(certificate.public_bytes(serialization.Encoding.PEM))
+            if chain:
+                f.write(self.certificate.public_bytes(serialization.Encoding.PEM))
+        if key is not None:
+            with open(key_file, "wb") as f:
+                f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                          serialization.NoEncryption()))
+        return cert_file, key_file
+
+    def crl(self, entries, number, next_update_seconds=3600, base_number=None):
+        """
+        Signs a CRL.
+
+        Args:
+            entries (iterable): ``(serial_number, reason)`` pairs; reason None for no reason code.
+            number (int): The CRL number.
+            next_update_seconds (float): Seconds until the CRL's nextUpdate.
+            base_number (int, optional): Makes this a delta CRL on top of the base CRL with this number.
+
+        Returns:
+            bytes: The DER-encoded CRL.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        revocation_date = _time(now - datetime.timedelta(minutes=1))
+        revoked = []
+        for serial_number, reason in entries:
+            entry = _integer(serial_number) + revocation_date
+            if reason is not None:
+                entry += _sequence(_extension(_REASON_CODE, _tlv(0x0a, bytes((reason,)))))
+            revoked.append(_tlv(0x30, entry))
+        extensions = [_extension(_CRL_NUMBER, _integer(number))]
+        if base_number is not None:
+            extensions.append(_extension(_DELTA_CRL_INDICATOR, _integer(base_number), critical=True))
+        tbs = _sequence(
+            _integer(1),
+            _sequence(_ECDSA_SHA256),
+            self._name_der,
+            _time(now),
+            _time(now + datetime.timedelta(seconds=next_update_seconds)),
+            *((_tlv(0x30, b"".join(revoked)),) if revoked else ()),
+            _tlv(0xa0, _sequence(*extensions)),
+        )
+        signature = self.key.sign(tbs, ec.ECDSA(hashes.SHA256()))
+        return _sequence(tbs, _sequence(_ECDSA_SHA256), _tlv(0x03, b"\x00" + signature))
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        responder = self.server.responder
+        if self.path == "/crl":
+            body, etag = responder.base_crl
+        elif self.path == "/delta.crl":
+            body, etag = responder.delta_crl
+        else:
+            self.send_error(404)
+            return
+        with responder.lock:
+            responder.requests[self.path] = responder.requests.get(self.path, 0) + 1
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send(body, "application/pkix-crl", etag)
+
+    def do_POST(self):
+        if self.path != "/ocsp":
+            self.send_error(404)
+            return
+        request = ocsp.load_der_ocsp_request(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        self._send(self.server.responder.ocsp_response(request), "application/ocsp-response")
+
+    def _send(self, body, content_type, etag=None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class RevocationResponderStub:
+    """
+    In-process CRL distribution point and OCSP responder for one CertificateAuthority.
+
+    Serial numbers revoked before ``publish_base()`` go into the base CRL;
+    ``revoke()`` and ``unrevoke()`` afterwards appear in the delta CRL until
+    the next base is published.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, next_update_seconds=3600):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.responder = self
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self.ca = CertificateAuthority(url=self.url)
+        self.next_update_seconds = next_update_seconds
+        self.lock = threading.Lock()
+        self.revoked = set()
+        self.issued = {}
+        self.requests = {}
+        self.number = 0
+        self.base_number = None
+        self._base_revoked = set()
+        self.base_crl = (b"", "")
+        self.delta_crl = (b"", "")
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def _etag(body):
+        return '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+
+    def publish_base(self):
+        """
+        Signs a new base CRL with every revoked serial and an empty delta CRL on top of it.
+        """
+        with self.lock:
+            self.number += 1
+            self.base_number = self.number
+            self._base_revoked = set(self.revoked)
+            body = self.ca.crl(((serial, None) for serial in sorted(self._base_revoked)), self.number,
+                               self.next_update_seconds)
+            self.base_crl = (body, self._etag(body))
+        self.publish_delta()
+
+    def publish_delta(self):
+        """
+        Signs a delta CRL with the changes since the base CRL.
+        """
+        with self.lock:
+            self.number += 1
+            added = [(serial, None) for serial in sorted(self.revoked - self._base_revoked)]
+            removed = [(serial, REMOVE_FROM_CRL) for serial in sorted(self._base_revoked - self.revoked)]
+            body = self.ca.crl(added + removed, self.number, self.next_update_seconds, base_number=self.base_number)
+            self.delta_crl = (body, self._etag(body))
+
+    def revoke(self, *serial_numbers):
+        with self.lock:
+            self.revoked.update(serial_numbers)
+
+    def unrevoke(self, *serial_numbers):
+        with self.lock:
+            self.revoked.difference_update(serial_numbers)
+
+    def ocsp_response(self, request):
+        """
+        Returns the signed DER OCSP response for a request about a certificate issued by this CA.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if self.issued.get(request.serial_number) is None:
+            return ocsp.OCSPResponseBuilder.build_unsuccessful(ocsp.OCSPResponseStatus.UNAUTHORIZED).public_bytes(
+                serialization.Encoding.DER)
+        revoked = request.serial_number in self.revoked
+        builder = ocsp.OCSPResponseBuilder().add_response(
+            cert=self.issued[request.serial_number],
+            issuer=self.ca.certificate,
+            algorithm=hashes.SHA1(),
+            cert_status=ocsp.OCSPCertStatus.REVOKED if revoked else ocsp.OCSPCertStatus.GOOD,
+            this_update=now - datetime.timedelta(minutes=1),
+            next_update=now + datetime.timedelta(seconds=self.next_update_seconds),
+            revocation_time=now - datetime.timedelta(minutes=1) if revoked else None,
+            revocation_reason=None,
+        ).responder_id(ocsp.OCSPResponderEncoding.HASH, self.ca.certificate)
+        with self.lock:
+            self.requests["/ocsp"] = self.requests.get("/ocsp", 0) + 1
+        return builder.sign(self.ca.key, hashes.SHA256()).public_bytes(serialization.Encoding.DER)
+
+    def issue(self, common_name, serial_number, server=False):
+        """
+        Issues a certificate the OCSP responder knows about.
+        """
+        certificate, key = self.ca.issue(common_name, serial_number, server)
+        self.issued[serial_number] = certificate
+        return certificate, key
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--revoked", type=int, default=1000, help="Serial numbers in the base CRL")
+    parser.add_argument("--directory", required=True, help="Where the CA and issued certificates are written")
+    args = parser.parse_args()
+
+    with RevocationResponderStub(args.host, args.port) as responder:
+        os.makedirs(args.directory, exist_ok=True)
+        ca = responder.ca
+        ca.write(args.directory, "ca", ca.certificate)
+        ca.write(args.directory, "server", *responder.issue("localhost", 1, server=True), chain=True)
+        ca.write(args.directory, "client", *responder.issue("client", 2))
+        ca.write(args.directory, "revoked-client", *responder.issue("revoked-client", 3))
+        responder.revoke(3, *range(1_000_000, 1_000_000 + args.revoked))
+        responder.publish_base()
+        print(f"Serving CRLs and OCSP on {responder.url} ({len(responder.revoked)} revoked)", flush=True)
+        while True:
+            time.sleep(3600)
+
+if __name__ == "__main__":
+    main()
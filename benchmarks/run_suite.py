@@ -0,0 +1,138 @@
+"""
+End-to-end benchmark suite for QuantumSafeProxy.
+
+Generates a throwaway certificate, starts local echo and HTTP stub backends,
+runs the proxy from ``src/`` in front of each, and drives it with the load
+generator. Results are printed as JSON; with ``--baseline`` they are compared
+against an earlier run and regressions beyond ``--tolerance`` fail the run.
+
+With several ``--loops`` every scenario runs once per event loop; results are
+keyed ``scenario/loop`` and summarised per loop under ``loops``.
+
+Usage:
+    python benchmarks/run_suite.py --duration 10 --save results/HEAD.json
+    python benchmarks/run_suite.py --baseline results/main.json --tolerance 0.10
+    python benchmarks/run_suite.py --loops asyncio,uvloop
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import platform
+import subprocess
+import importlib.util
+from harness import ROOT, Backend, ProxyProcess, generate_certificate
+from loadgen import run_load
+
+# Backend each scenario runs against
+SCENARIO_BACKENDS = {"churn": "echo", "bulk": "echo", "reqresp": "http"}
+
+# Metrics compared against a baseline and whether larger values are better
+COMPARED_METRICS = {
+    "churn": {"handshakes_per_sec": True, "latency_ms.p99": False},
+    "bulk": {"mb_per_sec": True},
+    "reqresp": {"requests_per_sec": True, "latency_ms.p50": False, "latency_ms.p99": False, "latency_ms.p999": False},
+}
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def metric_value(result, metric):
+    value = result
+    for part in metric.split("."):
+        value = value[part]
+    return value
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    Returns a list of regressions between ``results`` and ``baseline``.
+    """
+    regressions = []
+    for scenario, result in results.items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS[scenario.split("/")[0]].items():
+            current, reference = metric_value(result, metric), metric_value(previous, metric)
+            if not reference:
+                continue
+            change = (current - reference) / reference
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append({
+                    "scenario": scenario,
+                    "metric": metric,
+                    "baseline": reference,
+                    "current": current,
+                    "change_pct": round(change * 100, 1),
+                })
+    return regressions
+
+def run_scenario(scenario, cert_file, key_file, args, event_loop=None):
+    with Backend(SCENARIO_BACKENDS[scenario]) as backend:
+        with ProxyProcess(backend.port, cert_file, key_file, event_loop=event_loop) as proxy:
+            cpu_before = proxy.cpu_seconds()
+            result = run_load(scenario, proxy.port, duration=args.duration,
+                              concurrency=args.concurrency, processes=args.processes)
+            result["proxy_cpu_seconds"] = round(proxy.cpu_seconds() - cpu_before, 3)
+            return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", default="churn,bulk,reqresp", help="Comma-separated scenarios to run")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="Total concurrent connections")
+    parser.add_argument("--processes", type=int, default=1, help="Load generator processes")
+    parser.add_argument("--save", default=None, help="Write results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression")
+    parser.add_argument("--loops", default="asyncio", help="Comma-separated event loops (asyncio, uvloop)")
+    args = parser.parse_args()
+    loops = args.loops.split(",")
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {"duration": args.duration, "concurrency": args.concurrency, "processes": args.processes,
+                   "loops": loops},
+        "scenarios": {},
+    }
+    if len(loops) > 1:
+        report["loops"] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        cert_file, key_file = generate_certificate(directory)
+        for loop in loops:
+            if loop == "uvloop" and importlib.util.find_spec("uvloop") is None:
+                report.setdefault("loops", {})[loop] = {"skipped": "uvloop is not installed"}
+                continue
+            for scenario in args.scenarios.split(","):
+                result = run_scenario(scenario, cert_file, key_file, args, event_loop=loop)
+                report["scenarios"][scenario if len(loops) == 1 else f"{scenario}/{loop}"] = result
+                if len(loops) > 1:
+                    report["loops"].setdefault(loop, {})[scenario] = {
+                        "handshakes_per_sec": result["handshakes_per_sec"],
+                        "mb_per_sec": result["mb_per_sec"],
+                    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["baseline_revision"] = baseline.get("revision")
+        report["regressions"] = compare_with_baseline(report["scenarios"], baseline, args.tolerance)
+
+    print(json.dumps(report, indent=2))
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if report.get("regressions"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,167 @@
 import os
+import re
 import json
 import yaml
 from utils.logger import get_logger
+from config.schema import Config, ConfigError, diff_config
 
 logger = get_logger(__name__)
 
-class ConfigLoader:
+DEFAULT_CONFIG_FILE = "config/env/config.yaml"
+
+_PLACEHOLDER = re.compile(r"\$\{([A-Za-z_][A-Za-z0-9_]*)(?::-([^}]*))?\}")
+
+class _UniqueKeyLoader(yaml.SafeLoader):
     """
-    Loads and manages configuration settings for the application.
+    YAML loader that rejects duplicate mapping keys instead of keeping the last one.
     """
 
-    def __init__(self, config_file=None, env_prefix="APP_"):
-        """
-        Initializes the ConfigLoader.
-        
-        Args:
-            config_file (str, optional): Path to the configuration file (JSON or YAML).
-            env_prefix (str, optional): Prefix for environment variables (default is "APP_").
-        """
-        self.config_file = config_file
-        self.env_prefix = env_prefix
-        self.config = {}
+    def construct_mapping(self, node, deep=False):
+        keys = set()
+        for key_node, _ in node.value:
+            key = self.construct_object(key_node, deep=deep)
+            if key in keys:
+                raise ConfigError(f"Duplicate key '{key}' at line {key_node.start_mark.line + 1}")
+            keys.add(key)
+        return super().construct_mapping(node, deep=deep)
 
-        # Load configurations from the file and environment
-        self.load_config()
+def interpolate(value, environ=None):
+    """
+    Expands ``${VAR}`` and ``${VAR:-default}`` placeholders from the environment.
 
-    def load_config(self):
-        """
-        Loads the configuration from the specified file and environment variables.
-        """
-        if self.config_file:
-            self.load_from_file(self.config_file)
+    A value that consists of a single unset placeholder without a default
+    yields None. Expanded values stay strings; the schema converts them to
+    the field's type.
+
+    Args:
+        value: A scalar, list or mapping from the parsed configuration file.
+        environ (dict, optional): Variables to use instead of ``os.environ``.
+
+    Returns:
+        The value with all placeholders expanded.
+    """
+    environ = os.environ if environ is None else environ
+    if isinstance(value, dict):
+        return {key: interpolate(item, environ) for key, item in value.items()}
+    if isinstance(value, list):
+        return [interpolate(item, environ) for item in value]
+    if not isinstance(value, str) or "${" not in value:
+        return value
+
+    whole = _PLACEHOLDER.fullmatch(value)
+    if whole:
+        return environ.get(whole.group(1), whole.group(2))
+    return _PLACEHOLDER.sub(lambda match: environ.get(match.group(1), match.group(2) or ""), value)
+
+def read_config_file(file_path, environ=None):
+    """
+    Reads a JSON or YAML configuration file and expands environment placeholders.
+
+    Args:
+        file_path (str): Path to the configuration file.
+        environ (dict, optional): Variables to use instead of ``os.environ``.
+
+    Returns:
+        dict: The raw configuration.
+    """
+    try:
+        with open(file_path, 'r') as file:
+            if file_path.endswith(".json"):
+                raw = json.load(file)
+            elif file_path.endswith(".yaml") or file_path.endswith(".yml"):
+                raw = yaml.load(file, Loader=_UniqueKeyLoader)
+            else:
+                raise ConfigError(f"Unsupported file format: {file_path}")
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        raise ConfigError(f"Failed to read configuration file {file_path}: {e}") from e
+    return interpolate(raw or {}, environ)
+
+def load_config(file_path=None, environ=None):
+    """
+    Loads, validates and compiles the proxy configuration.
 
-        self.load_from_env()
+    Args:
+        file_path (str, optional): Path to the configuration file; defaults to
+            ``$CONFIG_FILE`` or ``config/env/config.yaml``.
+        environ (dict, optional): Variables to use instead of ``os.environ``.
 
-    def load_from_file(self, file_path):
+    Returns:
+        Config: The compiled configuration.
+
+    Raises:
+        ConfigError: If the file cannot be read or fails validation.
+    """
+    file_path = file_path or os.getenv("CONFIG_FILE", DEFAULT_CONFIG_FILE)
+    config = Config.compile(read_config_file(file_path, environ))
+    logger.info(f"Configuration loaded from file: {file_path}")
+    return config
+
+class ConfigReloader:
+    """
+    Reloads the configuration and applies only what changed.
+
+    Subsystems register a handler for the settings they can change at
+    runtime. On ``reload`` the new file is validated first (an invalid file
+    leaves everything as it is), then each handler whose settings changed is
+    called once with the new configuration. Changed settings no handler
+    covers are reported as needing a restart.
+    """
+
+    def __init__(self, config, file_path=None):
         """
-        Loads configuration from a JSON or YAML file.
-        
+        Initializes the ConfigReloader.
+
         Args:
-            file_path (str): Path to the configuration file.
-        """
-        try:
-            with open(file_path, 'r') as file:
-                if file_path.endswith(".json"):
-                    self.config.update(json.load(file))
-                elif file_path.endswith(".yaml") or file_path.endswith(".yml"):
-                    self.config.update(yaml.safe_load(file))
-                else:
-                    logger.error(f"Unsupported file format: {file_path}")
-                    return
-            logger.info(f"Configuration loaded from file: {file_path}")
-        except Exception as e:
-            logger.error(f"Failed to load configuration from file {file_path}: {e}")
-
-    def load_from_env(self):
+            config (Config): The configuration currently applied.
+            file_path (str, optional): Path to reload from; defaults as in ``load_config``.
         """
-        Loads configuration from environment variables with the specified prefix.
-        """
-        for key, value in os.environ.items():
-            if key.startswith(self.env_prefix):
-                # Remove the prefix and use the rest of the key as the configuration key
-                config_key = key[len(self.env_prefix):]
-                self.config[config_key] = value
-        logger.info("Configuration loaded from environment variables.")
-
-    def get(self, key, default=None):
+        self.config = config
+        self.file_path = file_path
+        self._handlers = []
+
+    def register(self, handler, *settings):
         """
-        Retrieves a configuration value.
-        
+        Registers a handler for changes to the given settings or sections.
+
         Args:
-            key (str): The configuration key.
-            default: The default value if the key is not found (default is None).
-        
-        Returns:
-            The configuration value or the default if not found.
+            handler (callable): Called with the new ``Config`` when any of ``settings`` changed.
+            settings (str): Dotted setting or section names, e.g. ``"rate_limiter"`` or ``"tls.cert_file"``.
         """
-        return self.config.get(key, default)
+        self._handlers.append((handler, settings))
 
-    def get_all(self):
+    def reload(self):
         """
-        Returns all configuration settings.
-        
+        Loads the configuration file again and applies the differences.
+
         Returns:
-            dict: The entire configuration dictionary.
+            list: The changed settings (empty if nothing changed or the new file is invalid).
         """
-        return self.config
+        try:
+            new_config = load_config(self.file_path)
+        except ConfigError as e:
+            logger.error(f"Configuration reload rejected; keeping the current configuration: {e}")
+            return []
+
+        changes = diff_config(self.config, new_config)
+        if not changes:
+            logger.info("Configuration reloaded; nothing changed.")
+            return []
+
+        applied = set()
+        for handler, settings in self._handlers:
+            affected = [change for change in changes
+                        if any(change == setting or change.startswith(setting + ".") for setting in settings)]
+            if not affected:
+                continue
+            try:
+                handler(new_config)
+                applied.update(affected)
+                logger.info(f"Applied configuration change(s): {', '.join(affected)}")
+            except Exception as e:
+                logger.error(f"Failed to apply configuration change(s) {', '.join(affected)}: {e}")
+
+        pending = [change for change in changes if change not in applied]
+        if pending:
+            logger.warning(f"Configuration change(s) take effect after a restart: {', '.join(pending)}")
+        self.config = new_config
+        return changes
@@ -0,0 +1,574 @@
+REQUIRED = object()
+
+class ConfigError(Exception):
+    """
+    Raised when the configuration file is malformed or fails validation.
+    """
+
+class Field:
+    """
+    Declares one setting of a section: its type, default and constraints.
+    """
+
+    __slots__ = ("name", "kind", "default", "choices", "minimum", "maximum")
+
+    def __init__(self, name, kind, default=None, choices=None, minimum=None, maximum=None):
+        """
+        Initializes the Field.
+
+        Args:
+            name (str): The key in the configuration file.
+            kind (type): ``str``, ``int``, ``float``, ``bool``, ``tuple`` (a list of strings), a ``Section``
+                subclass, or a one-element list ``[SectionSubclass]`` for a list of sections.
+            default: Value used when the key is missing or null; ``REQUIRED`` makes the key mandatory.
+            choices (tuple, optional): Allowed values.
+            minimum (float, optional): Smallest allowed numeric value.
+            maximum (float, optional): Largest allowed numeric value.
+        """
+        self.name = name
+        self.kind = kind
+        self.default = default
+        self.choices = choices
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def compile(self, raw, path):
+        if isinstance(self.kind, type) and issubclass(self.kind, Section):
+            return self.kind.compile(raw, path)
+        if isinstance(self.kind, list):
+            if raw is None:
+                return ()
+            if not isinstance(raw, (list, tuple)):
+                raise ConfigError(f"{path} must be a list")
+            return tuple(self.kind[0].compile(item, f"{path}[{index}]") for index, item in enumerate(raw))
+        if raw is None:
+            if self.default is REQUIRED:
+                raise ConfigError(f"{path} is required")
+            return self.default
+
+        value = _coerce(raw, self.kind, path)
+        if self.choices is not None and value not in self.choices:
+            raise ConfigError(f"{path} must be one of {', '.join(map(str, self.choices))}, got {value!r}")
+        if self.minimum is not None and value < self.minimum:
+            raise ConfigError(f"{path} must be at least {self.minimum}, got {value}")
+        if self.maximum is not None and value > self.maximum:
+            raise ConfigError(f"{path} must be at most {self.maximum}, got {value}")
+        return value
+
+def _coerce(raw, kind, path):
+    # Values expanded from environment placeholders arrive as strings
+    if kind is bool:
+        if isinstance(raw, bool):
+            return raw
+        if isinstance(raw, str) and raw.strip().lower() in ("true", "yes", "on", "1", "false", "no", "off", "0"):
+            return raw.strip().lower() in ("true", "yes", "on", "1")
+    elif kind is int:
+        if isinstance(raw, int) and not isinstance(raw, bool):
+            return raw
+        if isinstance(raw, str):
+            try:
+                return int(raw.strip())
+            except ValueError:
+                pass
+    elif kind is float:
+        if isinstance(raw, (int, float)) and not isinstance(raw, bool):
+            return float(raw)
+        if isinstance(raw, str):
+            try:
+                return float(raw.strip())
+            except ValueError:
+                pass
+    elif kind is str:
+        if isinstance(raw, (str, int, float)) and not isinstance(raw, bool):
+            return str(raw)
+    elif kind is tuple:
+        if isinstance(raw, (list, tuple)) and all(isinstance(item, str) for item in raw):
+            return tuple(raw)
+    raise ConfigError(f"{path} must be of type {kind.__name__}, got {raw!r}")
+
+class Section:
+    """
+    Base class of compiled, immutable configuration sections.
+
+    The raw configuration is validated once and compiled into these objects,
+    so code reading settings on hot paths does attribute lookups instead of
+    nested dict lookups with fallbacks. Subclasses list their settings in
+    ``FIELDS`` and declare matching ``__slots__``. ``get`` lets code written
+    against the raw dicts read sections unchanged.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, values):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    @classmethod
+    def compile(cls, raw, path=""):
+        """
+        Validates a raw mapping and compiles it into a section.
+
+        Args:
+            raw (dict): The section's raw values (None for an absent section).
+            path (str): Dotted location of the section, used in error messages.
+
+        Returns:
+            Section: The compiled section.
+        """
+        if raw is None:
+            raw = {}
+        if not isinstance(raw, dict):
+            raise ConfigError(f"{path or 'configuration'} must be a mapping")
+        known = {field.name for field in cls.FIELDS}
+        unknown = sorted(set(raw) - known)
+        if unknown:
+            raise ConfigError(f"Unknown setting(s) {', '.join(_join(path, key) for key in unknown)}")
+        values = {field.name: field.compile(raw.get(field.name), _join(path, field.name)) for field in cls.FIELDS}
+        cls.validate(values, path)
+        return cls(values)
+
+    @classmethod
+    def validate(cls, values, path):
+        """
+        Hook for checks spanning several settings of the section.
+        """
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+    def to_dict(self):
+        return {field.name: _plain(getattr(self, field.name)) for field in self.FIELDS}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+def _join(path, key):
+    return f"{path}.{key}" if path else key
+
+def _plain(value):
+    if isinstance(value, Section):
+        return value.to_dict()
+    if isinstance(value, tuple) and value and isinstance(value[0], Section):
+        return [item.to_dict() for item in value]
+    return value
+
+def _validate_networks(values, key, path):
+    if values[key]:
+        import ipaddress
+        for network in values[key]:
+            try:
+                ipaddress.ip_network(network, strict=False)
+            except ValueError:
+                raise ConfigError(f"{_join(path, key)} contains an invalid network {network!r}")
+
+class AppConfig(Section):
+    __slots__ = ("environment", "debug")
+    FIELDS = (Field("environment", str, "dev"), Field("debug", bool, False))
+
+class ProxyProtocolConfig(Section):
+    __slots__ = ("accept", "send", "trusted_networks", "header_timeout")
+    FIELDS = (
+        Field("accept", bool, False),
+        Field("send", bool, False),
+        Field("trusted_networks", tuple, ()),
+        Field("header_timeout", float, 3.0, minimum=0.1),
+    )
+
+    @classmethod
+    def validate(cls, values, path):
+        _validate_networks(values, "trusted_networks", path)
+
+class QuicConfig(Section):
+    __slots__ = ("enabled", "host", "port", "alt_svc_max_age")
+    FIELDS = (
+        Field("enabled", bool, False),
+        Field("host", str),
+        Field("port", int, minimum=1, maximum=65535),
+        Field("alt_svc_max_age", int, 86400, minimum=0),
+    )
+
+class ProxyConfig(Section):
+    __slots__ = ("host", "port", "event_loop", "handshake_workers", "proxy_protocol", "quic")
+    FIELDS = (
+        Field("host", str, "0.0.0.0"),
+        Field("port", int, 443, minimum=1, maximum=65535),
+        Field("event_loop", str, "auto", choices=("auto", "asyncio", "uvloop")),
+        Field("handshake_workers", int, 0, minimum=0),
+        Field("proxy_protocol", ProxyProtocolConfig),
+        Field("quic", QuicConfig),
+    )
+
+class BackendConfig(Section):
+    __slots__ = ("url", "host", "port", "max_body_size", "chunk_size")
+    FIELDS = (
+        Field("url", str),
+        Field("host", str),
+        Field("port", int, minimum=1, maximum=65535),
+        Field("max_body_size", int, 16 * 1024 * 1024, minimum=1),
+        Field("chunk_size", int, 64 * 1024, minimum=1024),
+    )
+
+class TLSPolicyOverrideConfig(Section):
+    __slots__ = ("name", "server_names", "client_networks", "groups", "signature_algorithms")
+    FIELDS = (
+        Field("name", str, REQUIRED),
+        Field("server_names", tuple, ()),
+        Field("client_networks", tuple, ()),
+        Field("groups", tuple, ()),
+        Field("signature_algorithms", tuple, ()),
+    )
+
+    @classmethod
+    def validate(cls, values, path):
+        if not values["server_names"] and not values["client_networks"]:
+            raise ConfigError(f"{path} must set server_names or client_networks")
+        _validate_networks(values, "client_networks", path)
+
+class TLSPolicyConfig(Section):
+    __slots__ = ("providers", "groups", "signature_algorithms", "overrides", "handshake_metrics")
+    FIELDS = (
+        Field("providers", tuple, ()),
+        Field("groups", tuple, ()),
+        Field("signature_algorithms", tuple, ()),
+        Field("overrides", [TLSPolicyOverrideConfig]),
+        Field("handshake_metrics", bool, False),
+    )
+
+    @classmethod
+    def validate(cls, values, path):
+        names = [override.name for override in values["overrides"]]
+        if "default" in names or len(set(names)) != len(names):
+            raise ConfigError(f"{_join(path, 'overrides')} names must be unique and not 'default'")
+
+class CertificateDistributionConfig(Section):
+    __slots__ = ("url", "state_file", "subscriber_id", "heartbeat_timeout", "reconnect_delay", "max_reconnect_delay",
+                 "startup_timeout")
+    FIELDS = (
+        Field("url", str),
+        Field("state_file", str, "/var/lib/quantum-safe-proxy/certificates.json"),
+        Field("subscriber_id", str),
+        Field("heartbeat_timeout", float, 30.0, minimum=1),
+        Field("reconnect_delay", float, 1.0, minimum=0.1),
+        Field("max_reconnect_delay", float, 60.0, minimum=0.1),
+        Field("startup_timeout", float, 30.0, minimum=1),
+    )
+
+class RevocationSourceConfig(Section):
+    __slots__ = ("url", "delta_url")
+    FIELDS = (Field("url", str, REQUIRED), Field("delta_url", str))
+
+class RevocationConfig(Section):
+    __slots__ = ("enabled", "crls", "fail_closed", "grace", "cache_dir", "bloom_error_rate", "fetch_timeout",
+                 "ocsp_staple_file", "ocsp_responder_url")
+    FIELDS = (
+        Field("enabled", bool, False),
+        Field("crls", [RevocationSourceConfig]),
+        Field("fail_closed", bool, False),
+        Field("grace", float, 0.0, minimum=0),
+        Field("cache_dir", str, "/var/cache/quantum-safe-proxy/crls"),
+        Field("bloom_error_rate", float, 0.01, minimum=0.0001, maximum=0.5),
+        Field("fetch_timeout", float, 30.0, minimum=1),
+        Field("ocsp_staple_file", str),
+        Field("ocsp_responder_url", str),
+    )
+
+    @classmethod
+    def validate(cls, values, path):
+        if values["enabled"] and not values["crls"]:
+            raise ConfigError(f"{_join(path, 'crls')} must list at least one CRL when revocation is enabled")
+
+class TLSConfig(Section):
+    __slots__ = ("cert_file", "key_file", "ca_file", "use_hybrid", "ktls", "check_interval", "client_auth",
+                 "policy", "distribution", "revocation")
+    FIELDS = (
+        Field("cert_file", str, REQUIRED),
+        Field("key_file", str, REQUIRED),
+        Field("ca_file", str),
+        Field("use_hybrid", bool, False),
+        Field("ktls", bool, False),
+        Field("check_interval", int, 60, minimum=1),
+        Field("client_auth", str, "none", choices=("none", "optional", "required")),
+        Field("policy", TLSPolicyConfig),
+        Field("distribution", CertificateDistributionConfig),
+        Field("revocation", RevocationConfig),
+    )
+
+    @classmethod
+    def validate(cls, values, path):
+        if values["client_auth"] != "none" and not values["ca_file"]:
+            raise ConfigError(f"{_join(path, 'client_auth')} requires {_join(path, 'ca_file')}")
+        if values["revocation"].enabled and (values["client_auth"] == "none" or not values["ca_file"]):
+            raise ConfigError(f"{_join(path, 'revocation')} requires {_join(path, 'client_auth')} and "
+                              f"{_join(path, 'ca_file')}")
+
+class KeyBundleConfig(Section):
+    __slots__ = ("enabled", "path", "key_file", "ttl", "refresh_margin")
+    FIELDS = (
+        Field("enabled", bool, False),
+        Field("path", str, "/var/cache/quantum-safe-proxy/key_bundle.bin"),
+        Field("key_file", str, "/var/run/secrets/quantum-safe-proxy/key_bundle.key"),
+        Field("ttl", float, 3600.0, minimum=60),
+        Field("refresh_margin", float, 0.2, minimum=0.01, maximum=0.9),
+    )
+
+class EncapsulationPoolConfig(Section):
+    __slots__ = ("enabled", "capacity", "min_depth", "refill_horizon", "workers")
+    FIELDS = (
+        Field("enabled", bool, False),
+        Field("capacity", int, 64, minimum=1),
+        Field("min_depth", int, 4, minimum=0),
+        Field("refill_horizon", float, 1.0, minimum=0.1),
+        Field("workers", int, 1, minimum=1),
+    )
+
+    @classmethod
+    def validate(cls, values, path):
+        if values["min_depth"] > values["capacity"]:
+            raise ConfigError(f"{_join(path, 'min_depth')} must not exceed {_join(path, 'capacity')}")
+
+class QuantumConfig(Section):
+    __slots__ = ("key_name", "kms_aes_key_name", "encapsulation_pool", "key_bundle")
+    FIELDS = (Field("key_name", str), Field("kms_aes_key_name", str),
+              Field("encapsulation_pool", EncapsulationPoolConfig), Field("key_bundle", KeyBundleConfig))
+
+class AuthConfig(Section):
+    __slots__ = ("enable", "token_secret", "algorithm")
+    FIELDS = (Field("enable", bool, False), Field("token_secret", str), Field("algorithm", str, "HS256"))
+
+    @classmethod
+    def validate(cls, values, path):
+        if values["enable"] and not values["token_secret"]:
+            raise ConfigError(f"{_join(path, 'token_secret')} is required when authentication is enabled")
+
+class RateLimiterConfig(Section):
+    __slots__ = ("enabled", "max_requests_per_minute")
+    FIELDS = (Field("enabled", bool, False), Field("max_requests_per_minute", int, 60, minimum=1))
+
+class ClientHelloFilterConfig(Section):
+    __slots__ = ("enabled", "allow", "deny", "rate_per_minute", "burst", "action", "tarpit_seconds", "max_tracked")
+    FIELDS = (
+        Field("enabled", bool, False),
+        Field("allow", tuple, ()),
+        Field("deny", tuple, ()),
+        Field("rate_per_minute", float, minimum=1),
+        Field("burst", int, minimum=1),
+        Field("action", str, "drop", choices=("drop", "tarpit")),
+        Field("tarpit_seconds", float, 10.0, minimum=0.1),
+        Field("max_tracked", int, 10000, minimum=1),
+    )
+
+class BandwidthConfig(Section):
+    __slots__ = ("enabled", "global_rate", "global_burst", "per_client_rate", "per_client_burst",
+                 "per_backend_rate", "per_backend_burst")
+    FIELDS = (
+        Field("enabled", bool, False),
+        Field("global_rate", float, minimum=1),
+        Field("global_burst", float, minimum=1),
+        Field("per_client_rate", float, minimum=1),
+        Field("per_client_burst", float, minimum=1),
+        Field("per_backend_rate", float, minimum=1),
+        Field("per_backend_burst", float, minimum=1),
+    )
+
+class TrafficClassConfig(Section):
+    __slots__ = ("name", "weight", "priority", "max_connections", "max_queue_wait", "listen", "server_names",
+                 "client_networks", "client_identities")
+    FIELDS = (
+        Field("name", str, REQUIRED),
+        Field("weight", float, 1.0, minimum=0.01),
+        Field("priority", int, 0),
+        Field("max_connections", int, minimum=1),
+        Field("max_queue_wait", float, minimum=0.001),
+        Field("listen", tuple, ()),
+        Field("server_names", tuple, ()),
+        Field("client_networks", tuple, ()),
+        Field("client_identities", tuple, ()),
+    )
+
+    @classmethod
+    def validate(cls, values, path):
+        _validate_networks(values, "client_networks", path)
+        for address in values["listen"]:
+            _, separator, port = address.rpartition(":")
+            if not separator or not port.isdigit() or not 0 < int(port) < 65536:
+                raise ConfigError(f"{_join(path, 'listen')} contains an invalid address {address!r} (host:port)")
+
+class TrafficConfig(Section):
+    __slots__ = ("enabled", "default_class", "handshake_slots", "max_queued", "forward_rate", "forward_burst",
+                 "classes")
+    FIELDS = (
+        Field("enabled", bool, False),
+        Field("default_class", str, "public"),
+        Field("handshake_slots", int, minimum=1),
+        Field("max_queued", int, 1024, minimum=1),
+        Field("forward_rate", float, minimum=1),
+        Field("forward_burst", float, minimum=1),
+        Field("classes", [TrafficClassConfig]),
+    )
+
+    @classmethod
+    def validate(cls, values, path):
+        names = [traffic_class.name for traffic_class in values["classes"]]
+        if len(set(names)) != len(names):
+            raise ConfigError(f"{_join(path, 'classes')} names must be unique")
+        if values["enabled"] and values["default_class"] not in names:
+            raise ConfigError(f"{_join(path, 'default_class')} must name one of {_join(path, 'classes')}")
+        ports = [address.rpartition(":")[2] for traffic_class in values["classes"] for address in traffic_class.listen]
+        if len(set(ports)) != len(ports):
+            raise ConfigError(f"{_join(path, 'classes')} must not share listen ports")
+
+class RestartConfig(Section):
+    __slots__ = ("handoff_socket", "handoff_timeout", "drain_timeout")
+    FIELDS = (
+        Field("handoff_socket", str, "/tmp/quantum-safe-tls-proxy.sock"),
+        Field("handoff_timeout", float, 10.0, minimum=0),
+        Field("drain_timeout", float, 30.0, minimum=0),
+    )
+
+class LoopLagConfig(Section):
+    __slots__ = ("enabled", "interval", "slow_threshold")
+    FIELDS = (
+        Field("enabled", bool, False),
+        Field("interval", float, 0.25, minimum=0.001),
+        Field("slow_threshold", float, 0.1, minimum=0.001),
+    )
+
+class TracingConfig(Section):
+    __slots__ = ("enabled", "sample_rate", "tail_latency_ms", "tail_errors", "buffer_size", "export_interval",
+                 "exporter", "file_path", "endpoint", "service_name")
+    FIELDS = (
+        Field("enabled", bool, False),
+        Field("sample_rate", float, 0.01, minimum=0, maximum=1),
+        Field("tail_latency_ms", float, minimum=0),
+        Field("tail_errors", bool, True),
+        Field("buffer_size", int, 8192, minimum=1),
+        Field("export_interval", float, 5.0, minimum=0.01),
+        Field("exporter", str, "file", choices=("file", "otlp_http")),
+        Field("file_path", str, "traces.jsonl"),
+        Field("endpoint", str, "http://127.0.0.1:4318/v1/traces"),
+        Field("service_name", str, "quantum-safe-tls-proxy"),
+    )
+
+class MonitoringConfig(Section):
+    __slots__ = ("metrics_port", "admin_port", "admin_host", "loop_lag", "tracing")
+    FIELDS = (
+        Field("metrics_port", int, minimum=1, maximum=65535),
+        Field("admin_port", int, minimum=1, maximum=65535),
+        Field("admin_host", str, "127.0.0.1"),
+        Field("loop_lag", LoopLagConfig),
+        Field("tracing", TracingConfig),
+    )
+
+class RenewalConfig(Section):
+    __slots__ = ("enable_auto_renewal", "renewal_check_interval", "renewal_threshold_days", "inventory_paths",
+                 "max_concurrent_renewals", "certbot_path")
+    FIELDS = (
+        Field("enable_auto_renewal", bool, False),
+        Field("renewal_check_interval", float, 3600.0, minimum=1),
+        Field("renewal_threshold_days", int, 30, minimum=1),
+        Field("inventory_paths", tuple, ()),
+        Field("max_concurrent_renewals", int, 4, minimum=1),
+        Field("certbot_path", str, "certbot"),
+    )
+
+class ControlPlaneConfig(Section):
+    __slots__ = ("mode", "nginx_binary", "nginx_config", "envoy_bootstrap", "xds_host", "xds_port", "refresh_delay")
+    FIELDS = (
+        Field("mode", str, "off", choices=("off", "nginx", "envoy")),
+        Field("nginx_binary", str, "nginx"),
+        Field("nginx_config", str, "/etc/nginx/nginx.conf"),
+        Field("envoy_bootstrap", str, "/etc/envoy/envoy.json"),
+        Field("xds_host", str, "127.0.0.1"),
+        Field("xds_port", int, 18000, minimum=1, maximum=65535),
+        Field("refresh_delay", float, 1.0, minimum=0.1),
+    )
+
+class ScheduledTaskConfig(Section):
+    __slots__ = ("enabled", "interval", "cron", "jitter", "timeout")
+    FIELDS = (
+        Field("enabled", bool, True),
+        Field("interval", float, minimum=1),
+        Field("cron", str),
+        Field("jitter", float, 0.0, minimum=0),
+        Field("timeout", float, minimum=0.1),
+    )
+
+    @classmethod
+    def validate(cls, values, path):
+        if values["interval"] is not None and values["cron"]:
+            raise ConfigError(f"{path} must set interval or cron, not both")
+        if values["cron"] and len(values["cron"].split()) != 5:
+            raise ConfigError(f"{_join(path, 'cron')} must have 5 fields (minute hour day month weekday)")
+
+class SchedulerConfig(Section):
+    __slots__ = ("lock_dir", "thread_workers", "process_workers", "cert_inventory_scan", "cert_renewal",
+                 "key_bundle_refresh", "ticket_key_rotation", "crl_refresh", "ocsp_staple_refresh")
+    FIELDS = (
+        Field("lock_dir", str, "/tmp/quantum-safe-tls-proxy-locks"),
+        Field("thread_workers", int, 2, minimum=1),
+        Field("process_workers", int, 1, minimum=1),
+        Field("cert_inventory_scan", ScheduledTaskConfig),
+        Field("cert_renewal", ScheduledTaskConfig),
+        Field("key_bundle_refresh", ScheduledTaskConfig),
+        Field("ticket_key_rotation", ScheduledTaskConfig),
+        Field("crl_refresh", ScheduledTaskConfig),
+        Field("ocsp_staple_refresh", ScheduledTaskConfig),
+    )
+
+class Config(Section):
+    """
+    The complete proxy configuration.
+    """
+
+    __slots__ = ("app", "proxy", "public_backend", "internal_backend", "tls", "quantum", "auth", "rate_limiter",
+                 "client_hello_filter", "bandwidth", "traffic", "restart", "monitoring", "renewal", "control_plane",
+                 "scheduler")
+    FIELDS = (
+        Field("app", AppConfig),
+        Field("proxy", ProxyConfig),
+        Field("public_backend", BackendConfig),
+        Field("internal_backend", BackendConfig),
+        Field("tls", TLSConfig),
+        Field("quantum", QuantumConfig),
+        Field("auth", AuthConfig),
+        Field("rate_limiter", RateLimiterConfig),
+        Field("client_hello_filter", ClientHelloFilterConfig),
+        Field("bandwidth", BandwidthConfig),
+        Field("traffic", TrafficConfig),
+        Field("restart", RestartConfig),
+        Field("monitoring", MonitoringConfig),
+        Field("renewal", RenewalConfig),
+        Field("control_plane", ControlPlaneConfig),
+        Field("scheduler", SchedulerConfig),
+    )
+
+def diff_config(old, new, path=""):
+    """
+    Lists the settings that differ between two compiled configurations.
+
+    Args:
+        old (Section): The configuration currently applied.
+        new (Section): The newly loaded configuration of the same type.
+        path (str): Dotted prefix for the returned names.
+
+    Returns:
+        list: Dotted names of the changed settings, e.g. ``["rate_limiter.max_requests_per_minute"]``.
+    """
+    changes = []
+    for field in old.FIELDS:
+        before, after = getattr(old, field.name), getattr(new, field.name)
+        if isinstance(before, Section):
+            changes.extend(diff_config(before, after, _join(path, field.name)))
+        elif before != after:
+            changes.append(_join(path, field.name))
+    return changes
@@ -0,0 +1,85 @@
+# Read buffer sizes; 16 KiB matches the largest TLS record and is used when
+# the transport gives no size hint
+SIZE_CLASSES = (2048, 16384, 65536)
+DEFAULT_SIZE = 16384
+MAX_FREE_PER_CLASS = 256
+
+class BufferPool:
+    """
+    Shared pool of reusable read buffers in a few fixed size classes.
+
+    Connections borrow a buffer only for the duration of a read and return it
+    straight after, so an idle connection holds no buffer at all and the
+    number of live buffers tracks the number of reads in flight rather than
+    the number of open connections.
+    """
+
+    __slots__ = ("size_classes", "max_free", "_free")
+
+    def __init__(self, size_classes=SIZE_CLASSES, max_free=MAX_FREE_PER_CLASS):
+        """
+        Initializes the BufferPool.
+
+        Args:
+            size_classes (tuple): Buffer sizes in bytes that the pool hands out.
+            max_free (int): Released buffers kept per size class; extra ones are left to the garbage collector.
+        """
+        self.size_classes = tuple(sorted(size_classes))
+        self.max_free = max_free
+        self._free = {size: [] for size in self.size_classes}
+
+    def size_class(self, size_hint=-1):
+        """
+        Returns the size class serving a read of ``size_hint`` bytes.
+
+        Args:
+            size_hint (int): Requested size; zero or negative means no preference.
+
+        Returns:
+            int: The smallest size class that fits the hint, capped at the largest class.
+        """
+        if size_hint <= 0:
+            size_hint = DEFAULT_SIZE
+        for size in self.size_classes:
+            if size >= size_hint:
+                return size
+        return self.size_classes[-1]
+
+    def acquire(self, size_hint=-1):
+        """
+        Borrows a buffer from the pool.
+
+        Args:
+            size_hint (int): Requested size; zero or negative means no preference.
+
+        Returns:
+            bytearray: A buffer of the matching size class. Its contents are undefined.
+        """
+        size = self.size_class(size_hint)
+        free = self._free[size]
+        return free.pop() if free else bytearray(size)
+
+    def release(self, buffer):
+        """
+        Returns a buffer obtained from ``acquire``; the caller must not use it afterwards.
+
+        Args:
+            buffer (bytearray): The buffer to return.
+        """
+        free = self._free.get(len(buffer))
+        if free is not None and len(free) < self.max_free:
+            free.append(buffer)
+
+    def stats(self):
+        """
+        Returns the number of free buffers held per size class.
+        """
+        return {size: len(free) for size, free in self._free.items()}
+
+_default_pool = BufferPool()
+
+def get_buffer_pool():
+    """
+    Returns the process-wide buffer pool.
+    """
+    return _default_pool
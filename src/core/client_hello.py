@@ -0,0 +1,158 @@
+import hashlib
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RECORD_HANDSHAKE = 0x16
+HANDSHAKE_CLIENT_HELLO = 0x01
+CLIENT_HELLO_MAX = 64 * 1024
+
+EXTENSION_SERVER_NAME = 0x0000
+EXTENSION_SUPPORTED_GROUPS = 0x000a
+EXTENSION_SIGNATURE_ALGORITHMS = 0x000d
+EXTENSION_ALPN = 0x0010
+EXTENSION_SUPPORTED_VERSIONS = 0x002b
+
+_VERSIONS = {0x0304: "13", 0x0303: "12", 0x0302: "11", 0x0301: "10", 0x0300: "s3"}
+_EMPTY_HASH = "000000000000"
+
+def is_grease(value):
+    """
+    Returns whether a cipher suite, extension or group code point is a GREASE value (RFC 8701).
+    """
+    return value & 0x0f0f == 0x0a0a and value >> 8 == value & 0xff
+
+def _u16_list(data):
+    return [int.from_bytes(data[i:i + 2], "big") for i in range(0, len(data) - 1, 2)]
+
+class ClientHello:
+    """
+    The fields of a ClientHello that identify the client software.
+    """
+
+    __slots__ = ("legacy_version", "ciphers", "extensions", "server_name", "alpn", "versions",
+                 "signature_algorithms")
+
+    def __init__(self, legacy_version, ciphers, extensions, server_name="", alpn=(), versions=(),
+                 signature_algorithms=()):
+        self.legacy_version = legacy_version
+        self.ciphers = ciphers
+        self.extensions = extensions
+        self.server_name = server_name
+        self.alpn = alpn
+        self.versions = versions
+        self.signature_algorithms = signature_algorithms
+
+    def ja4(self):
+        """
+        Returns the JA4 fingerprint of the ClientHello (TCP).
+
+        The format is ``t<version><d|i><ciphers><extensions><alpn>_<cipher hash>_<extension hash>``:
+        GREASE values are ignored, cipher suites and extensions are sorted
+        before hashing (so extension order randomization does not change the
+        fingerprint), and the extension hash leaves out SNI and ALPN and
+        appends the signature algorithms in the client's order.
+        """
+        versions = [version for version in self.versions if not is_grease(version)]
+        version = _VERSIONS.get(max(versions) if versions else self.legacy_version, "00")
+        ciphers = sorted(f"{cipher:04x}" for cipher in self.ciphers if not is_grease(cipher))
+        extensions = [extension for extension in self.extensions if not is_grease(extension)]
+        alpn = self.alpn[0] if self.alpn else ""
+        if alpn and not (alpn[0].isascii() and alpn[0].isalnum() and alpn[-1].isascii() and alpn[-1].isalnum()):
+            alpn = alpn.encode("latin-1").hex()
+        alpn = alpn[0] + alpn[-1] if alpn else "00"
+        part_a = (f"t{version}{'d' if self.server_name else 'i'}{min(len(ciphers), 99):02d}"
+                  f"{min(len(extensions), 99):02d}{alpn}")
+
+        part_b = hashlib.sha256(",".join(ciphers).encode()).hexdigest()[:12] if ciphers else _EMPTY_HASH
+        hashed = sorted(f"{extension:04x}" for extension in extensions
+                        if extension not in (EXTENSION_SERVER_NAME, EXTENSION_ALPN))
+        text = ",".join(hashed)
+        if self.signature_algorithms:
+            text += "_" + ",".join(f"{algorithm:04x}" for algorithm in self.signature_algorithms)
+        part_c = hashlib.sha256(text.encode()).hexdigest()[:12] if hashed else _EMPTY_HASH
+        return f"{part_a}_{part_b}_{part_c}"
+
+def parse_client_hello(data):
+    """
+    Parses the ClientHello at the start of the bytes received on a connection.
+
+    Only record framing and the fields needed for fingerprinting and SNI are
+    read; nothing is validated beyond what parsing needs, so this is cheap
+    enough to run before every handshake.
+
+    Args:
+        data (bytes): Bytes received so far on the connection.
+
+    Returns:
+        ClientHello: The parsed ClientHello, or None while it is still incomplete.
+
+    Raises:
+        ValueError: If the data is not a TLS ClientHello.
+    """
+    handshake = b""
+    offset = 0
+    while True:
+        if len(data) < offset + 5:
+            return None
+        if data[offset] != RECORD_HANDSHAKE:
+            raise ValueError("not a TLS handshake record")
+        end = offset + 5 + int.from_bytes(data[offset + 3:offset + 5], "big")
+        if len(data) < end:
+            return None
+        # A ClientHello may be fragmented over several records
+        handshake += bytes(data[offset + 5:end])
+        offset = end
+        if len(handshake) >= 4:
+            if handshake[0] != HANDSHAKE_CLIENT_HELLO:
+                raise ValueError("not a ClientHello")
+            length = 4 + int.from_bytes(handshake[1:4], "big")
+            if length > CLIENT_HELLO_MAX:
+                raise ValueError("ClientHello too large")
+            if len(handshake) >= length:
+                try:
+                    return _parse_body(handshake[4:length])
+                except IndexError as e:
+                    raise ValueError("truncated ClientHello") from e
+
+def _parse_body(hello):
+    legacy_version = int.from_bytes(hello[0:2], "big")
+    # Skip the random and session id
+    offset = 34
+    offset += 1 + hello[offset]
+    size = int.from_bytes(hello[offset:offset + 2], "big")
+    ciphers = _u16_list(hello[offset + 2:offset + 2 + size])
+    offset += 2 + size
+    offset += 1 + hello[offset]
+    extensions = []
+    server_name = ""
+    alpn = ()
+    versions = ()
+    signature_algorithms = ()
+    if offset + 2 <= len(hello):
+        end = offset + 2 + int.from_bytes(hello[offset:offset + 2], "big")
+        offset += 2
+        while offset + 4 <= end:
+            extension = int.from_bytes(hello[offset:offset + 2], "big")
+            size = int.from_bytes(hello[offset + 2:offset + 4], "big")
+            body = hello[offset + 4:offset + 4 + size]
+            offset += 4 + size
+            extensions.append(extension)
+            if extension == EXTENSION_SERVER_NAME:
+                # server_name_list length, name type (0 = host_name), name length, name
+                if len(body) > 5 and body[2] == 0:
+                    length = int.from_bytes(body[3:5], "big")
+                    server_name = body[5:5 + length].decode("ascii", "replace").lower()
+            elif extension == EXTENSION_ALPN:
+                protocols = []
+                position = 2
+                while position < len(body):
+                    length = body[position]
+                    protocols.append(body[position + 1:position + 1 + length].decode("latin-1"))
+                    position += 1 + length
+                alpn = tuple(protocols)
+            elif extension == EXTENSION_SUPPORTED_VERSIONS:
+                versions = tuple(_u16_list(body[1:1 + body[0]])) if body else ()
+            elif extension == EXTENSION_SIGNATURE_ALGORITHMS:
+                signature_algorithms = tuple(_u16_list(body[2:2 + int.from_bytes(body[0:2], "big")]))
+    return ClientHello(legacy_version, ciphers, extensions, server_name, alpn, versions, signature_algorithms)
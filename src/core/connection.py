@@ -0,0 +1,580 @@
+import ssl
+import asyncio
+from time import thread_time_ns
+from utils.logger import get_logger
+from core.buffer_pool import get_buffer_pool
+from core.client_hello import parse_client_hello
+from monitoring.tracing import get_tracer
+
+logger = get_logger(__name__)
+
+# Upper bound on a client's TLS handshake
+HANDSHAKE_TIMEOUT_SECONDS = 10
+
+_pool = get_buffer_pool()
+
+class _Endpoint(asyncio.BufferedProtocol):
+    """
+    One side of a proxied connection; forwards what it reads to its peer.
+
+    Reads go into a buffer borrowed from the shared pool and are copied out
+    before the buffer is returned, so an idle endpoint holds no read buffer.
+    Back-pressure is transport-level: when the peer's write buffer fills up,
+    this side stops reading until it drains.
+    """
+
+    __slots__ = ("connection", "transport", "peer", "buffer", "holds", "forwarded")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.transport = None
+        self.peer = None
+        self.buffer = None
+        self.holds = 0
+        self.forwarded = 0
+
+    def hold(self):
+        # Reading stays paused until every hold (peer back-pressure, shaping delay) is released
+        self.holds += 1
+        if self.holds == 1 and self.transport is not None and not self.transport.is_closing():
+            self.transport.pause_reading()
+
+    def unhold(self):
+        self.holds -= 1
+        if self.holds == 0 and self.transport is not None and not self.transport.is_closing():
+            self.transport.resume_reading()
+
+    def pause_writing(self):
+        self.peer.hold()
+
+    def resume_writing(self):
+        self.peer.unhold()
+
+    def get_buffer(self, sizehint):
+        # A transport may ask for a buffer and then find nothing to read; keep it for the next attempt
+        if self.buffer is None:
+            self.buffer = _pool.acquire(sizehint)
+        return self.buffer
+
+    def _release_buffer(self):
+        if self.buffer is not None:
+            _pool.release(self.buffer)
+            self.buffer = None
+
+    def forward(self, data):
+        self.forwarded += len(data)
+        self.peer.write(data)
+        flow = self.connection.flow
+        if flow is not None:
+            delay = flow.consume(len(data))
+            if delay:
+                # Throttled data stays in the kernel socket buffer, so TCP flow
+                # control pushes back on the sender instead of the proxy buffering it
+                self.hold()
+                asyncio.get_running_loop().call_later(delay, self.unhold)
+
+    def write(self, data):
+        if self.transport is not None:
+            self.transport.write(data)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    def eof_received(self):
+        # Returning a false value closes the transport once pending writes are flushed
+        self._release_buffer()
+        return False
+
+    def connection_lost(self, exc):
+        self._release_buffer()
+        self.transport = None
+        self.connection.endpoint_lost(self, exc)
+
+class _BackendProtocol(_Endpoint):
+    """
+    The backend side of a proxied connection.
+
+    When the proxy has an HTTP/3 listener, ``alt_svc`` holds its ``Alt-Svc``
+    header line until the first chunk of the response has been forwarded.
+    """
+
+    __slots__ = ("alt_svc",)
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self.alt_svc = connection.proxy.alt_svc
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def buffer_updated(self, nbytes):
+        buffer = self.buffer
+        self.buffer = None
+        data = buffer[:nbytes]
+        _pool.release(buffer)
+        if self.alt_svc is not None:
+            data = self._advertise(data)
+        self.forward(data)
+
+    def _advertise(self, data):
+        # Adds the header after the status line of the first final HTTP/1.x response; other protocols pass unchanged
+        start = 0
+        while start < len(data):
+            end = data.find(b"\r\n", start)
+            if end == -1 or not data.startswith(b"HTTP/1.", start):
+                break
+            if data[start + 9:start + 10] != b"1":
+                alt_svc = self.alt_svc
+                self.alt_svc = None
+                return data[:end + 2] + alt_svc + data[end + 2:]
+            # Clients do not take Alt-Svc from interim (1xx) responses
+            start = data.find(b"\r\n\r\n", end)
+            if start == -1:
+                return data
+            start += 4
+        else:
+            # Only interim responses so far; the final one may follow in the next read
+            return data
+        self.alt_svc = None
+        return data
+
+class _TLSClientProtocol(_Endpoint):
+    """
+    The client side of a proxied connection; terminates TLS itself.
+
+    TLS runs on an ``ssl.SSLObject`` over memory BIOs rather than the event
+    loop's SSL transport, which keeps a 256 KiB receive buffer per connection
+    for the connection's whole lifetime. With a ``HandshakePool`` the
+    handshake steps run on its workers; bytes arriving meanwhile wait in
+    ``backlog``. With traffic classes, a connection waiting for a handshake
+    slot stops reading and keeps what it has read in ``pending``.
+    """
+
+    __slots__ = ("sslobj", "incoming", "outgoing", "handshake_timer", "header", "hello", "policy",
+                 "handshake_cpu_ns", "step", "backlog", "admission", "pending")
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self.sslobj = None
+        self.incoming = None
+        self.outgoing = None
+        self.handshake_timer = None
+        self.header = None
+        self.hello = None
+        self.policy = None
+        self.handshake_cpu_ns = 0
+        self.step = None
+        self.backlog = None
+        self.admission = None
+        self.pending = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.incoming = ssl.MemoryBIO()
+        self.outgoing = ssl.MemoryBIO()
+        timeout = HANDSHAKE_TIMEOUT_SECONDS
+        proxy_protocol = self.connection.proxy.proxy_protocol
+        peername = transport.get_extra_info('peername')
+        if proxy_protocol is not None and proxy_protocol.expects_header(peername):
+            # The PROXY protocol header precedes the ClientHello and has its own, stricter deadline
+            self.header = b""
+            timeout = proxy_protocol.header_timeout
+        elif not self._admit(peername):
+            return
+        self.handshake_timer = asyncio.get_running_loop().call_later(timeout, self._handshake_timeout)
+
+    def _admit(self, peername, source=None):
+        # Rate limiting happens before the handshake so rejected clients cost no TLS work
+        proxy = self.connection.proxy
+        if not proxy.admits(peername, source):
+            self.transport.abort()
+            return False
+        client_address = source or peername
+        policies = proxy.tls_policies
+        traffic = proxy.traffic
+        if (proxy.hello_filter is not None or (policies is not None and policies.needs_server_name)
+                or (traffic is not None and traffic.needs_server_name)):
+            # The TLS object is created once the ClientHello was screened and shows which policy and class apply
+            self.hello = b""
+            return True
+        return self._start_tls(None, client_address)
+
+    def _start_tls(self, server_name, client_address, data=b""):
+        # Creates the TLS object once the connection has a handshake slot; returns False if it was closed instead
+        proxy = self.connection.proxy
+        policies = proxy.tls_policies
+        if policies is not None:
+            self.policy = policies.select(server_name, client_address)
+        traffic = proxy.traffic
+        if traffic is not None:
+            self.admission = traffic.admit(self.transport.get_extra_info('sockname'), server_name, client_address)
+            if self.admission is None:
+                self.transport.abort()
+                return False
+            if not self.admission.request_handshake(self._handshake_granted, self._handshake_shed):
+                # Queued: further bytes stay in the kernel socket buffer until a slot is granted
+                self.pending = data
+                self.transport.pause_reading()
+                return not self.transport.is_closing()
+        self._wrap(data)
+        return True
+
+    def _wrap(self, data):
+        context = self.policy.context if self.policy is not None else self.connection.proxy.tls_context
+        self.sslobj = context.wrap_bio(self.incoming, self.outgoing, server_side=True)
+        if data:
+            self.incoming.write(data)
+            self._do_handshake()
+
+    def _handshake_granted(self):
+        data = self.pending
+        self.pending = None
+        if self.transport is None or self.transport.is_closing():
+            return
+        self.transport.resume_reading()
+        self._wrap(data)
+
+    def _handshake_shed(self, reason):
+        logger.debug(f"Shed connection from {self.transport.get_extra_info('peername')}: {reason}")
+        self.transport.abort()
+
+    def buffer_updated(self, nbytes):
+        buffer = self.buffer
+        self.buffer = None
+        if self.header is not None:
+            # Parsed from the bytes already read for the handshake, so no extra syscall
+            data = self.header + buffer[:nbytes]
+            _pool.release(buffer)
+            self._read_header(data)
+            return
+        if self.hello is not None:
+            data = self.hello + buffer[:nbytes]
+            _pool.release(buffer)
+            self._read_hello(data)
+            return
+        if self.pending is not None:
+            # Read before reading was paused for the handshake slot
+            self.pending += buffer[:nbytes]
+            _pool.release(buffer)
+            return
+        with memoryview(buffer) as view:
+            if self.step is None:
+                self.incoming.write(view[:nbytes])
+            else:
+                # The BIO belongs to the handshake worker until its step completes
+                self.backlog = (self.backlog or b"") + view[:nbytes]
+        _pool.release(buffer)
+        if self.handshake_timer is not None:
+            self._do_handshake()
+        else:
+            self._read_appdata()
+
+    def _read_header(self, data):
+        try:
+            parsed = self.connection.proxy.proxy_protocol.parse_header(data)
+        except ValueError as e:
+            logger.warning(f"Rejected connection from {self.transport.get_extra_info('peername')}: {e}")
+            self.transport.abort()
+            return
+        if parsed is None:
+            self.header = data
+            return
+        length, self.connection.source, self.connection.destination = parsed
+        self.header = None
+        self.handshake_timer.cancel()
+        self.handshake_timer = None
+        if not self._admit(self.transport.get_extra_info('peername'), self.connection.source):
+            return
+        self.handshake_timer = asyncio.get_running_loop().call_later(HANDSHAKE_TIMEOUT_SECONDS, self._handshake_timeout)
+        if len(data) > length:
+            if self.hello is not None:
+                self._read_hello(data[length:])
+            elif self.pending is not None:
+                self.pending += data[length:]
+            else:
+                self.incoming.write(data[length:])
+                self._do_handshake()
+
+    def _read_hello(self, data):
+        proxy = self.connection.proxy
+        try:
+            hello = parse_client_hello(data)
+            if hello is None:
+                self.hello = data
+                return
+        except ValueError:
+            # Not a ClientHello; the handshake fails on it before any key exchange
+            hello = None
+        self.hello = None
+        hello_filter = proxy.hello_filter
+        if hello is not None and hello_filter is not None:
+            rejection = hello_filter.check(hello.ja4())
+            if rejection is not None:
+                self._reject_hello(rejection, hello_filter)
+                return
+        client_address = self.connection.source or self.transport.get_extra_info('peername')
+        self._start_tls(hello.server_name if hello is not None else "", client_address, data)
+
+    def _reject_hello(self, reason, hello_filter):
+        logger.debug(f"Rejected ClientHello from {self.transport.get_extra_info('peername')}: {reason}")
+        self.handshake_timer.cancel()
+        self.handshake_timer = None
+        if hello_filter.action == "tarpit":
+            # Nothing is read or answered; the client waits until the connection is reset
+            self.transport.pause_reading()
+            asyncio.get_running_loop().call_later(hello_filter.tarpit_seconds, self.transport.abort)
+        else:
+            self.transport.abort()
+
+    def _do_handshake(self):
+        pool = self.connection.proxy.handshake_pool
+        if pool is None:
+            self._handshake_stepped(self._handshake_step())
+        elif self.step is None:
+            self.step = pool.run(self._handshake_step)
+            self.step.add_done_callback(self._handshake_step_done)
+
+    def _handshake_step(self):
+        # Runs on a handshake worker when the proxy has a pool; returns None once the handshake is complete
+        started = thread_time_ns()
+        try:
+            self.sslobj.do_handshake()
+            error = None
+        except ssl.SSLError as e:
+            error = e
+        self.handshake_cpu_ns += thread_time_ns() - started
+        return error
+
+    def _handshake_step_done(self, step):
+        self.step = None
+        if self.transport is None or self.transport.is_closing() or step.cancelled():
+            # Timed out or lost while the worker was busy
+            return
+        backlog = self.backlog
+        self.backlog = None
+        if backlog:
+            self.incoming.write(backlog)
+        self._handshake_stepped(step.result())
+        if backlog and self.handshake_timer is not None and not self.transport.is_closing():
+            self._do_handshake()
+
+    def _handshake_stepped(self, error):
+        if isinstance(error, ssl.SSLWantReadError):
+            self._flush()
+            return
+        if error is not None:
+            logger.warning(f"TLS handshake with {self.transport.get_extra_info('peername')} failed: {error}")
+            # Send the alert before closing
+            self._flush()
+            self.transport.close()
+            return
+        self.handshake_timer.cancel()
+        self.handshake_timer = None
+        self._flush()
+        rejection = self.connection.proxy.revocation_error(self.sslobj)
+        if rejection is not None:
+            logger.warning(f"Rejected client certificate from {self.transport.get_extra_info('peername')}: "
+                           f"{rejection}")
+            self.transport.close()
+            return
+        if self.admission is not None:
+            self.admission.handshake_finished()
+            if not self.admission.identify(self.sslobj):
+                self.transport.close()
+                return
+        self.connection.client_ready()
+        self._read_appdata()
+
+    def _handshake_timeout(self):
+        self.handshake_timer = None
+        stage = "PROXY protocol header" if self.header is not None else "TLS handshake"
+        logger.warning(f"{stage} from {self.transport.get_extra_info('peername')} timed out")
+        self.transport.abort()
+
+    def unhold(self):
+        super().unhold()
+        if self.holds == 0 and self.handshake_timer is None:
+            # Records that arrived while held are still waiting in the BIO
+            self._read_appdata()
+
+    def _read_appdata(self):
+        # Decrypts what has arrived, one record (at most 16 KiB) at a time. While
+        # held, records stay in the BIO and the transport stops reading further.
+        buffer = _pool.acquire()
+        try:
+            while self.holds == 0 and self.transport is not None:
+                try:
+                    nbytes = self.sslobj.read(len(buffer), buffer)
+                except ssl.SSLWantReadError:
+                    break
+                except ssl.SSLZeroReturnError:
+                    nbytes = 0
+                except ssl.SSLError as e:
+                    logger.warning(f"TLS error from {self.connection.peername}: {e}")
+                    self.transport.close()
+                    return
+                if not nbytes:
+                    # close_notify: the client is done
+                    self.close()
+                    return
+                self.forward(buffer[:nbytes])
+        finally:
+            _pool.release(buffer)
+        self._flush()
+
+    def _flush(self):
+        if self.outgoing.pending and self.transport is not None:
+            self.transport.write(self.outgoing.read())
+
+    def write(self, data):
+        if self.transport is not None:
+            self.sslobj.write(data)
+            self._flush()
+
+    def close(self):
+        if self.transport is None or self.transport.is_closing():
+            return
+        if self.handshake_timer is None and self.sslobj is not None:
+            try:
+                self.sslobj.unwrap()
+            except ssl.SSLError:
+                # Our close_notify is sent; the client's is not awaited
+                pass
+            self._flush()
+        self.transport.close()
+
+    def connection_lost(self, exc):
+        if self.handshake_timer is not None:
+            self.handshake_timer.cancel()
+            self.handshake_timer = None
+        if self.admission is not None:
+            self.admission.close()
+        super().connection_lost(exc)
+
+class ProxyConnection:
+    """
+    State of one proxied client connection.
+
+    The two sides are protocols forwarding from callbacks, so an established
+    connection costs a few small slotted objects instead of stream
+    reader/writer pairs and suspended coroutines. ``done`` resolves once both
+    sides have closed; cancelling it aborts the connection.
+    """
+
+    __slots__ = ("proxy", "accepted_ns", "peername", "source", "destination", "client", "backend", "flow", "span",
+                 "forward_span", "connector", "done")
+
+    def __init__(self, proxy, accepted_ns=None):
+        """
+        Initializes the ProxyConnection.
+
+        Args:
+            proxy (QuantumSafeProxy): The proxy the connection was accepted by.
+            accepted_ns (int, optional): Unix time in nanoseconds at which the connection was accepted.
+        """
+        self.proxy = proxy
+        self.accepted_ns = accepted_ns
+        self.peername = None
+        self.source = None
+        self.destination = None
+        self.client = _TLSClientProtocol(self)
+        self.backend = _BackendProtocol(self)
+        self.client.peer = self.backend
+        self.backend.peer = self.client
+        self.flow = None
+        self.span = None
+        self.forward_span = None
+        self.connector = None
+        self.done = None
+
+    def client_ready(self):
+        """
+        Called once the client's TLS handshake has completed; connects to the backend.
+        """
+        proxy = self.proxy
+        loop = asyncio.get_running_loop()
+        handshake = None
+        if proxy.tls_policies is not None:
+            handshake = proxy.tls_policies.handshake_completed(self.client.policy, self.client.sslobj,
+                                                               self.client.handshake_cpu_ns)
+        # The client address from a PROXY protocol header, if the load balancer sent one
+        self.peername = self.source or self.client.transport.get_extra_info('peername')
+        logger.info(f"Accepted connection from {self.peername}")
+        self.done = loop.create_future()
+        self.done.add_done_callback(self._closed)
+        proxy._connections.add(self.done)
+        if proxy.shaper is not None:
+            self.flow = proxy.shaper.open_flow(self.peername[0], proxy.backend_id)
+        attributes = {"net.peer": str(self.peername)}
+        admission = self.client.admission
+        if admission is not None:
+            self.flow = admission.scheduler.open_flow(admission.traffic_class, self.flow)
+            attributes["traffic.class"] = admission.traffic_class.name
+        tracer = get_tracer()
+        self.span = tracer.start_span("proxy.connection", start_ns=self.accepted_ns, attributes=attributes,
+                                      tail_latency=False)
+        if self.accepted_ns is not None:
+            tracer.start_span("tls.handshake", parent=self.span, start_ns=self.accepted_ns, attributes=handshake).end()
+
+        # Nothing is read from the client until the backend is connected
+        self.client.hold()
+        self.connector = loop.create_task(self._connect_backend())
+
+    async def _connect_backend(self):
+        proxy = self.proxy
+        tracer = get_tracer()
+        try:
+            with tracer.start_span("backend.connect", parent=self.span):
+                await asyncio.get_running_loop().create_connection(
+                    lambda: self.backend, proxy.backend_host, proxy.backend_port, ssl=proxy.backend_ssl
+                )
+        except Exception as e:
+            logger.error(f"Error handling client {self.peername}: {e}")
+            self.span.record_error(e)
+            self.client.close()
+        finally:
+            self.connector = None
+
+        if self.client.transport is None:
+            # The client left while the backend was connecting
+            self.backend.close()
+        elif self.backend.transport is not None:
+            if proxy.proxy_protocol is not None and proxy.proxy_protocol.send:
+                destination = self.destination or self.client.transport.get_extra_info('sockname')
+                self.backend.transport.write(proxy.proxy_protocol.build_v2_header(self.peername, destination))
+            self.forward_span = tracer.start_span("proxy.forward", parent=self.span, tail_latency=False)
+            self.client.unhold()
+        self._finish_if_closed()
+
+    def endpoint_lost(self, endpoint, exc):
+        if self.done is None:
+            # The TLS handshake never completed
+            return
+        if exc is not None:
+            logger.warning(f"Error during data forwarding: {exc}")
+        endpoint.peer.close()
+        self._finish_if_closed()
+
+    def _finish_if_closed(self):
+        if (self.connector is None and self.client.transport is None and self.backend.transport is None
+                and not self.done.done()):
+            self.done.set_result(None)
+
+    def _closed(self, done):
+        if done.cancelled():
+            # Cancelled by a drain deadline
+            if self.connector is not None:
+                self.connector.cancel()
+            for endpoint in (self.client, self.backend):
+                if endpoint.transport is not None:
+                    endpoint.transport.abort()
+        self.proxy._connections.discard(done)
+        if self.flow is not None:
+            self.flow.close()
+        if self.forward_span is not None:
+            self.forward_span.set_attribute("bytes.upstream", self.client.forwarded)
+            self.forward_span.set_attribute("bytes.downstream", self.backend.forwarded)
+            self.forward_span.end()
+        self.span.end()
+        logger.info(f"Connection with {self.peername} closed.")
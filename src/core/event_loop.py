@@ -0,0 +1,44 @@
+import asyncio
+import importlib.util
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Values accepted for proxy.event_loop; "auto" prefers uvloop when it is installed
+EVENT_LOOPS = ("auto", "asyncio", "uvloop")
+
+def uvloop_available():
+    """
+    Returns whether the optional uvloop package is installed.
+    """
+    return importlib.util.find_spec("uvloop") is not None
+
+def install_event_loop(name="auto"):
+    """
+    Installs the event loop policy used by ``asyncio.run`` and later new loops.
+
+    Must be called before the event loop is created. Every component runs on
+    either loop; uvloop replaces the pure-Python selector loop with libuv,
+    which makes accepts, protocol callbacks and transport writes cheaper.
+
+    Args:
+        name (str): ``auto``, ``asyncio`` or ``uvloop``.
+
+    Returns:
+        str: The event loop that will be used (``asyncio`` or ``uvloop``).
+    """
+    if name not in EVENT_LOOPS:
+        raise ValueError(f"Unknown event loop {name!r}; expected one of {', '.join(EVENT_LOOPS)}")
+    if name == "asyncio" or (name == "auto" and not uvloop_available()):
+        asyncio.set_event_loop_policy(asyncio.DefaultEventLoopPolicy())
+        logger.info("Using the asyncio event loop.")
+        return "asyncio"
+    try:
+        import uvloop
+    except ImportError:
+        logger.warning("uvloop is not installed; falling back to the asyncio event loop.")
+        asyncio.set_event_loop_policy(asyncio.DefaultEventLoopPolicy())
+        return "asyncio"
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    logger.info(f"Using the uvloop event loop ({uvloop.__version__}).")
+    return "uvloop"
@@ -0,0 +1,61 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class HandshakePool:
+    """
+    Runs TLS handshake steps on worker threads instead of the event loop thread.
+
+    OpenSSL releases the GIL while it computes a handshake step (key share
+    generation, encapsulation, certificate signing), so a burst of new
+    connections is worked off by the workers while the event loop keeps
+    forwarding bytes for established connections. Once the handshake has
+    completed the connection is driven by the event loop only.
+
+    A step touches the connection's SSL object and memory BIOs, so callers
+    must not use either until the step's future has resolved.
+    """
+
+    __slots__ = ("workers", "executor")
+
+    def __init__(self, workers=None):
+        """
+        Initializes the HandshakePool.
+
+        Args:
+            workers (int, optional): Number of worker threads; defaults to the number of CPUs.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tls-handshake")
+        logger.info(f"TLS handshakes run on {self.workers} worker thread(s).")
+
+    def submit(self, step):
+        """
+        Schedules a handshake step on a worker.
+
+        Args:
+            step (callable): Performs one ``do_handshake`` call and returns its outcome.
+
+        Returns:
+            concurrent.futures.Future: Completes on the worker; it stays pending
+                while the step runs even if a waiter on the event loop is cancelled.
+        """
+        return self.executor.submit(step)
+
+    def run(self, step):
+        """
+        Schedules a handshake step on a worker.
+
+        Returns:
+            asyncio.Future: Resolves on the event loop with the step's return value.
+        """
+        return asyncio.wrap_future(self.submit(step))
+
+    def shutdown(self):
+        """
+        Stops the workers once the steps already queued have run.
+        """
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,336 @@
+import os
+import ssl
+import socket
+import asyncio
+from time import thread_time_ns
+from utils.logger import get_logger
+from core.buffer_pool import get_buffer_pool
+from core.client_hello import parse_client_hello
+
+logger = get_logger(__name__)
+
+# Linux socket option level and names for kernel TLS (linux/tls.h)
+SOL_TLS = 282
+TLS_TX = 1
+TLS_RX = 2
+
+# SSL_OP_ENABLE_KTLS; exposed by the ssl module from Python 3.12
+OP_ENABLE_KTLS = getattr(ssl, "OP_ENABLE_KTLS", 1 << 3)
+
+FORWARD_CHUNK = 64 * 1024
+
+# Largest PROXY protocol v2 header (fixed part plus a 16-bit length)
+PROXY_HEADER_MAX = 16 + 65535
+# Largest ClientHello peeked at to choose a TLS policy by server name
+CLIENT_HELLO_PEEK_MAX = 64 * 1024
+# Pause before peeking again at an incomplete header or ClientHello
+PEEK_RETRY_SECONDS = 0.005
+
+_pool = get_buffer_pool()
+
+async def _throttle(flow, size):
+    if flow is not None:
+        delay = flow.consume(size)
+        if delay:
+            await asyncio.sleep(delay)
+
+def kernel_tls_available():
+    """
+    Checks whether the kernel offers the ``tls`` upper layer protocol.
+
+    Returns:
+        bool: True if the tls module is loaded (or built in).
+    """
+    try:
+        with open("/proc/sys/net/ipv4/tcp_available_ulp") as f:
+            return "tls" in f.read().split()
+    except OSError:
+        return False
+
+def enable_ktls(context):
+    """
+    Lets OpenSSL install negotiated TLS keys into the kernel after the handshake.
+
+    OpenSSL only offloads when it was built with kTLS support and the
+    negotiated cipher is supported by the kernel; otherwise records keep
+    being processed in userspace.
+    """
+    context.options |= OP_ENABLE_KTLS
+
+def offload_status(sock):
+    """
+    Returns which directions of an established TLS socket are offloaded to the kernel.
+
+    Returns:
+        tuple: ``(tx, rx)`` booleans.
+    """
+    def configured(direction):
+        try:
+            sock.getsockopt(SOL_TLS, direction, 64)
+            return True
+        except OSError:
+            return False
+    return configured(TLS_TX), configured(TLS_RX)
+
+async def _wait_ready(loop, fd, writable=False):
+    """
+    Waits until ``fd`` is readable (or writable) on the event loop.
+    """
+    future = loop.create_future()
+    add, remove = (loop.add_writer, loop.remove_writer) if writable else (loop.add_reader, loop.remove_reader)
+
+    def ready():
+        if not future.done():
+            future.set_result(None)
+
+    add(fd, ready)
+    try:
+        await future
+    finally:
+        remove(fd)
+
+async def read_proxy_header(loop, sock, proxy_protocol):
+    """
+    Consumes a PROXY protocol header from a socket, leaving the TLS bytes after it unread.
+
+    The handshake runs on the socket itself in kTLS mode, so the header is
+    peeked at and only its exact length is read off the socket.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): The running event loop.
+        sock (socket.socket): The accepted, non-blocking client socket.
+        proxy_protocol (ProxyProtocol): The PROXY protocol settings.
+
+    Returns:
+        tuple: ``(source, destination)`` addresses from the header (None for ``LOCAL``/``UNKNOWN``).
+    """
+    while True:
+        await _wait_ready(loop, sock.fileno())
+        data = sock.recv(PROXY_HEADER_MAX, socket.MSG_PEEK)
+        if not data:
+            raise ConnectionError("connection closed before the PROXY protocol header")
+        parsed = proxy_protocol.parse_header(data)
+        if parsed is not None:
+            break
+        # The socket stays readable while the partial header is queued
+        await asyncio.sleep(PEEK_RETRY_SECONDS)
+    length, source, destination = parsed
+    sock.recv(length)
+    return source, destination
+
+async def peek_client_hello(loop, sock):
+    """
+    Reads a client's ClientHello without consuming it.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): The running event loop.
+        sock (socket.socket): The accepted, non-blocking client socket.
+
+    Returns:
+        ClientHello: The parsed ClientHello, or None if the client sent something else.
+    """
+    while True:
+        await _wait_ready(loop, sock.fileno())
+        data = sock.recv(CLIENT_HELLO_PEEK_MAX, socket.MSG_PEEK)
+        if not data:
+            raise ConnectionError("connection closed before the ClientHello")
+        try:
+            hello = parse_client_hello(data)
+        except ValueError:
+            return None
+        if hello is not None:
+            return hello
+        await asyncio.sleep(PEEK_RETRY_SECONDS)
+
+async def tls_handshake(loop, sock, context, timeout, handshake_pool=None):
+    """
+    Performs a server-side TLS handshake on a socket bound to the SSL object.
+
+    Unlike asyncio's memory-BIO transport, the resulting ``SSLSocket`` owns
+    the file descriptor, which OpenSSL needs to hand record crypto to the kernel.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): The running event loop.
+        sock (socket.socket): The accepted TCP socket.
+        context (ssl.SSLContext): Server TLS context.
+        timeout (float): Seconds allowed for the handshake.
+        handshake_pool (HandshakePool, optional): Runs the handshake steps off the event loop thread.
+
+    Returns:
+        tuple: The non-blocking ``ssl.SSLSocket`` and the CPU time spent in the handshake, in nanoseconds.
+    """
+    sock.setblocking(False)
+    tls_sock = context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False)
+    cpu_ns = 0
+    step_future = None
+
+    def step():
+        # Returns the CPU time of one handshake step and the error that ended it, if any
+        started = thread_time_ns()
+        try:
+            tls_sock.do_handshake()
+            error = None
+        except ssl.SSLError as e:
+            error = e
+        return thread_time_ns() - started, error
+
+    async def drive():
+        nonlocal cpu_ns, step_future
+        while True:
+            if handshake_pool is None:
+                step_ns, error = step()
+            else:
+                step_future = handshake_pool.submit(step)
+                step_ns, error = await asyncio.wrap_future(step_future)
+            cpu_ns += step_ns
+            if error is None:
+                return
+            if not isinstance(error, (ssl.SSLWantReadError, ssl.SSLWantWriteError)):
+                raise error
+            await _wait_ready(loop, tls_sock.fileno(), writable=isinstance(error, ssl.SSLWantWriteError))
+
+    try:
+        await asyncio.wait_for(drive(), timeout)
+    except BaseException:
+        if step_future is not None and not step_future.done():
+            # A worker is still in do_handshake; closing now could hand it a reused descriptor
+            step_future.add_done_callback(lambda _: tls_sock.close())
+        else:
+            tls_sock.close()
+        raise
+    return tls_sock, cpu_ns
+
+def detach_offloaded(tls_sock):
+    """
+    Turns a fully offloaded TLS socket into a plain socket.
+
+    With both directions in the kernel, plaintext written to or read from the
+    descriptor is encrypted and decrypted by the kernel, so the userspace SSL
+    object is no longer needed.
+    """
+    return socket.socket(fileno=tls_sock.detach())
+
+async def _splice(loop, src, dst, flow):
+    read_fd, write_fd = os.pipe2(os.O_NONBLOCK)
+    flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+    try:
+        while True:
+            try:
+                received = os.splice(src.fileno(), write_fd, FORWARD_CHUNK, flags=flags)
+            except BlockingIOError:
+                await _wait_ready(loop, src.fileno())
+                continue
+            if received == 0:
+                return
+            await _throttle(flow, received)
+            while received:
+                try:
+                    received -= os.splice(read_fd, dst.fileno(), received, flags=flags)
+                except BlockingIOError:
+                    await _wait_ready(loop, dst.fileno(), writable=True)
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+async def _recv_pooled(loop, sock):
+    # Waits for data before borrowing a buffer, so an idle connection holds none
+    while True:
+        await _wait_ready(loop, sock.fileno())
+        buffer = _pool.acquire(FORWARD_CHUNK)
+        try:
+            received = sock.recv_into(buffer)
+        except (BlockingIOError, InterruptedError):
+            _pool.release(buffer)
+            continue
+        except BaseException:
+            _pool.release(buffer)
+            raise
+        return buffer, received
+
+async def _copy(loop, src, dst, flow):
+    while True:
+        buffer, received = await _recv_pooled(loop, src)
+        try:
+            if not received:
+                return
+            with memoryview(buffer) as view:
+                await loop.sock_sendall(dst, view[:received])
+        finally:
+            _pool.release(buffer)
+        await _throttle(flow, received)
+
+async def forward_plain(loop, src, dst, flow=None):
+    """
+    Forwards bytes between two plain (or fully kernel-TLS) sockets until EOF.
+
+    Uses ``splice`` through a pipe where available, so payload never enters
+    userspace; otherwise copies through a pooled buffer. When a shaping
+    ``flow`` is given, the source is not read again until its delay has passed.
+    """
+    try:
+        if hasattr(os, "splice"):
+            await _splice(loop, src, dst, flow)
+        else:
+            await _copy(loop, src, dst, flow)
+    finally:
+        try:
+            dst.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+async def forward_from_tls(loop, tls_sock, dst, flow=None):
+    """
+    Forwards decrypted bytes from a userspace TLS socket to a plain socket until EOF.
+    """
+    try:
+        while True:
+            if not tls_sock.pending():
+                await _wait_ready(loop, tls_sock.fileno())
+            buffer = _pool.acquire(FORWARD_CHUNK)
+            try:
+                try:
+                    received = tls_sock.recv_into(buffer)
+                except ssl.SSLWantReadError:
+                    continue
+                except ssl.SSLWantWriteError:
+                    await _wait_ready(loop, tls_sock.fileno(), writable=True)
+                    continue
+                except ssl.SSLZeroReturnError:
+                    return
+                if not received:
+                    return
+                with memoryview(buffer) as view:
+                    await loop.sock_sendall(dst, view[:received])
+            finally:
+                _pool.release(buffer)
+            await _throttle(flow, received)
+    finally:
+        try:
+            dst.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+async def forward_to_tls(loop, src, tls_sock, flow=None):
+    """
+    Forwards bytes from a plain socket into a userspace TLS socket until EOF.
+    """
+    while True:
+        buffer, received = await _recv_pooled(loop, src)
+        try:
+            if not received:
+                return
+            with memoryview(buffer) as buffer_view:
+                view = buffer_view[:received]
+                while view:
+                    try:
+                        sent = tls_sock.send(view)
+                    except ssl.SSLWantWriteError:
+                        await _wait_ready(loop, tls_sock.fileno(), writable=True)
+                        continue
+                    except ssl.SSLWantReadError:
+                        await _wait_ready(loop, tls_sock.fileno())
+                        continue
+                    view = view[sent:]
+        finally:
+            _pool.release(buffer)
+        await _throttle(flow, received)
@@ -1,11 +1,46 @@
+import ssl
+import time
+import socket
+import struct
 import asyncio
 from utils.logger import get_logger
-from tls_setup import create_tls_context
+from core import ktls as kernel_tls
+from core.connection import HANDSHAKE_TIMEOUT_SECONDS, ProxyConnection
+from core.tls_setup import create_tls_context
+from monitoring.tracing import get_tracer
 
 logger = get_logger(__name__)
 
+# Bounds how long a drain waits for handshakes that were in progress when the
+# proxy stopped accepting
+HANDSHAKE_GRACE_SECONDS = 1.0
+LISTEN_BACKLOG = 100
+
+CLIENT_AUTH_MODES = {"none": ssl.CERT_NONE, "optional": ssl.CERT_OPTIONAL, "required": ssl.CERT_REQUIRED}
+
+def _reset(sock):
+    # Closing with a zero linger time sends a RST instead of a FIN
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+
+async def _handshake_slot(admission):
+    # Waits for the connection's handshake slot; False if it was shed or timed out in the queue
+    granted = asyncio.get_running_loop().create_future()
+
+    def resolve(result):
+        if not granted.done():
+            granted.set_result(result)
+
+    if admission.request_handshake(lambda: resolve(True), lambda reason: resolve(False)):
+        return True
+    try:
+        return await asyncio.wait_for(granted, HANDSHAKE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        return False
+
 class QuantumSafeProxy:
-    def __init__(self, host, port, backend_host, backend_port, cert_file, key_file, ca_file=None):
+    def __init__(self, host, port, backend_host, backend_port, cert_file, key_file, ca_file=None, backend_ssl=None,
+                 ktls=False, shaper=None, proxy_protocol=None, rate_limiter=None, tls_policies=None,
+                 handshake_pool=None, client_auth="none", revocation=None, hello_filter=None, traffic=None):
         """
         Initializes the quantum-safe proxy.
         
@@ -17,62 +52,446 @@ class QuantumSafeProxy:
             cert_file (str): Path to the TLS certificate file.
             key_file (str): Path to the private key file.
             ca_file (str, optional): Path to the CA certificate file.
+            backend_ssl (ssl.SSLContext, optional): Client TLS context for the backend connection;
+                the connection is plain TCP when omitted.
+            ktls (bool): Whether to offload record encryption of established connections
+                to the kernel (Linux kTLS) where possible.
+            shaper (BandwidthShaper, optional): Byte-rate shaper applied to forwarded traffic.
+            proxy_protocol (ProxyProtocol, optional): PROXY protocol settings for accepted and backend connections.
+            rate_limiter (RateLimiter, optional): Limits new connections per client address (see ``admits``).
+            tls_policies (TLSPolicies, optional): Key exchange group policies per server name or
+                client network; their contexts replace the one built from ``cert_file``.
+            handshake_pool (HandshakePool, optional): Runs TLS handshakes off the event loop thread,
+                so a burst of handshakes does not delay forwarding on established connections.
+            client_auth (str): Whether client certificates issued by ``ca_file`` are requested:
+                none, optional or required.
+            revocation (RevocationChecker, optional): Rejects clients whose certificate is revoked
+                once their handshake completes.
+            hello_filter (FingerprintFilter, optional): Screens the ClientHello of each connection
+                before the TLS handshake starts.
+            traffic (TrafficClasses, optional): Assigns connections to traffic classes, which share
+                handshake slots and forwarding bandwidth by weight; the proxy also listens on their addresses.
         """
         self.host = host
         self.port = port
         self.backend_host = backend_host
         self.backend_port = backend_port
-        self.tls_context = create_tls_context(cert_file, key_file, ca_file)
+        self.tls_policies = tls_policies
+        self.tls_context = tls_policies.default.context if tls_policies is not None else create_tls_context(
+            cert_file, key_file, ca_file)
+        self._certificates = (cert_file, key_file, ca_file)
+        self.backend_ssl = backend_ssl
+        self.ktls = ktls
+        self.shaper = shaper
+        self.proxy_protocol = proxy_protocol
+        self.rate_limiter = rate_limiter
+        self.handshake_pool = handshake_pool
+        self.client_auth = client_auth
+        self.revocation = revocation
+        self.hello_filter = hello_filter
+        self.traffic = traffic
+        self.backend_id = f"{backend_host}:{backend_port}"
+        # Alt-Svc header line added to the first backend response of each connection (see QuicListener)
+        self.alt_svc = None
+        if ktls and backend_ssl is not None:
+            logger.warning("kTLS offload requires a plain backend connection; disabling it.")
+            self.ktls = False
+        if self.ktls:
+            from monitoring.metrics import increment_ktls_offload
+            self._record_offload = increment_ktls_offload
+        self._configure_contexts()
+        if self.ktls:
+            if not kernel_tls.kernel_tls_available():
+                logger.warning("Kernel TLS module is not loaded; connections will use userspace TLS.")
+        self.servers = []
+        self._listeners = []
+        self._accept_tasks = []
+        self._connections = set()
+        self._stopped = None
 
-    async def handle_client(self, reader, writer):
+    def admits(self, peername, source=None):
         """
-        Handles incoming client connections and forwards them to the backend.
-        
+        Applies the per-client rate limit to a new connection.
+
+        Connections are limited by the client address from their PROXY protocol
+        header, or by the peer address when the peer is not a trusted load
+        balancer; a load balancer's own address stands for all of its clients.
+
         Args:
-            reader (asyncio.StreamReader): Reader for client input.
-            writer (asyncio.StreamWriter): Writer for sending responses.
+            peername (tuple): The address of the connected peer.
+            source (tuple, optional): The client address from the PROXY protocol header.
+
+        Returns:
+            bool: False if the connection must be closed.
         """
-        peername = writer.get_extra_info('peername')
-        logger.info(f"Accepted connection from {peername}")
+        if self.rate_limiter is None:
+            return True
+        if source is None:
+            if self.proxy_protocol is not None and self.proxy_protocol.trusts(peername):
+                return True
+            source = peername
+        return not source or self.rate_limiter.is_allowed(source[0])
+
+    def _tls_contexts(self):
+        if self.tls_policies is not None:
+            return self.tls_policies.contexts()
+        return [self.tls_context]
+
+    def _configure_contexts(self):
+        # Applied to every context the proxy is given, including rebuilt ones
+        for context in self._tls_contexts():
+            context.verify_mode = CLIENT_AUTH_MODES[self.client_auth]
+            if self.ktls:
+                kernel_tls.enable_ktls(context)
+
+    def revocation_error(self, ssl_object):
+        """
+        Checks the client certificate of a completed handshake against the revocation indexes.
+
+        Args:
+            ssl_object: The SSLObject or SSLSocket of the connection.
+
+        Returns:
+            str: Why the connection must be closed, or None.
+        """
+        if self.revocation is None:
+            return None
+        return self.revocation.check(ssl_object.getpeercert(binary_form=True))
+
+    def _listen_addresses(self):
+        addresses = [(self.host, self.port)]
+        if self.traffic is not None:
+            addresses.extend(self.traffic.listen_addresses())
+        return addresses
+
+    def _accepting_protocol(self):
+        # Called by the server when a connection is accepted, before the TLS
+        # handshake, so the handshake can be timed
+        return ProxyConnection(self, time.time_ns()).client
+
+    async def _accept_loop(self, listener):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                client, peername = await loop.sock_accept(listener)
+            except OSError as e:
+                logger.error(f"Error accepting connection: {e}")
+                await asyncio.sleep(0.1)
+                continue
+            loop.create_task(self.handle_ktls_client(client, peername))
+
+    async def handle_ktls_client(self, client, peername):
+        """
+        Handles a client connection in kTLS mode.
+
+        The handshake runs on a socket-backed SSL object so that OpenSSL can
+        install the session keys into the kernel. Connections offloaded in both
+        directions are forwarded as plain sockets with ``splice``; all others
+        fall back to forwarding through the userspace TLS socket.
+
+        Args:
+            client (socket.socket): The accepted client socket.
+            peername (tuple): The client address.
+        """
+        loop = asyncio.get_running_loop()
+        source = destination = None
+        if self.proxy_protocol is not None and self.proxy_protocol.expects_header(peername):
+            try:
+                source, destination = await asyncio.wait_for(
+                    kernel_tls.read_proxy_header(loop, client, self.proxy_protocol), self.proxy_protocol.header_timeout)
+            except (asyncio.TimeoutError, ValueError, OSError) as e:
+                logger.warning(f"Rejected connection from {peername}: {e or 'PROXY protocol header timed out'}")
+                client.close()
+                return
+        if not self.admits(peername, source):
+            client.close()
+            return
+        peername = source or peername
+
+        task = asyncio.current_task()
+        self._connections.add(task)
+        flow = self.shaper.open_flow(peername[0], self.backend_id) if self.shaper else None
+        tracer = get_tracer()
+        span = tracer.start_span("proxy.connection", attributes={"net.peer": str(peername)}, tail_latency=False)
+        tls_sock = None
+        backend = None
+        admission = None
 
         try:
-            backend_reader, backend_writer = await asyncio.open_connection(
-                self.backend_host, self.backend_port, ssl=self.tls_context
-            )
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with tracer.start_span("tls.handshake", parent=span) as handshake_span:
+                policies = self.tls_policies
+                traffic = self.traffic
+                policy = None
+                context = self.tls_context
+                hello = None
+                if (self.hello_filter is not None or (policies is not None and policies.needs_server_name)
+                        or (traffic is not None and traffic.needs_server_name)):
+                    hello = await asyncio.wait_for(kernel_tls.peek_client_hello(loop, client),
+                                                   HANDSHAKE_TIMEOUT_SECONDS)
+                if hello is not None and self.hello_filter is not None:
+                    rejection = self.hello_filter.check(hello.ja4())
+                    if rejection is not None:
+                        logger.debug(f"Rejected ClientHello from {peername}: {rejection}")
+                        handshake_span.set_attribute("tls.client_hello", rejection)
+                        if self.hello_filter.action == "tarpit":
+                            await asyncio.sleep(self.hello_filter.tarpit_seconds)
+                        _reset(client)
+                        return
+                server_name = hello.server_name if hello is not None else None
+                if policies is not None:
+                    policy = policies.select(server_name, peername)
+                    context = policy.context
+                if traffic is not None:
+                    admission = traffic.admit(client.getsockname(), server_name, peername)
+                    if admission is None or not await _handshake_slot(admission):
+                        handshake_span.set_attribute("traffic.shed", True)
+                        _reset(client)
+                        return
+                    handshake_span.set_attribute("traffic.class", admission.traffic_class.name)
+                tls_sock, handshake_cpu_ns = await kernel_tls.tls_handshake(
+                    loop, client, context, HANDSHAKE_TIMEOUT_SECONDS, self.handshake_pool)
+                rejection = self.revocation_error(tls_sock)
+                if rejection is not None:
+                    logger.warning(f"Rejected client certificate from {peername}: {rejection}")
+                    handshake_span.set_attribute("tls.client_certificate", "rejected")
+                    return
+                if admission is not None:
+                    admission.handshake_finished()
+                    if not admission.identify(tls_sock):
+                        return
+                    flow = traffic.open_flow(admission.traffic_class, flow)
+                if policy is not None:
+                    for key, value in policies.handshake_completed(policy, tls_sock, handshake_cpu_ns).items():
+                        handshake_span.set_attribute(key, value)
+                tx, rx = kernel_tls.offload_status(tls_sock)
+                offload = "full" if tx and rx else "tx" if tx else "rx" if rx else "none"
+                handshake_span.set_attribute("tls.ktls_offload", offload)
+            self._record_offload(offload)
+            logger.info(f"Accepted connection from {peername} (kTLS offload: {offload})")
+
+            with tracer.start_span("backend.connect", parent=span):
+                family, type_, proto, _, address = (await loop.getaddrinfo(
+                    self.backend_host, self.backend_port, type=socket.SOCK_STREAM))[0]
+                backend = socket.socket(family, type_, proto)
+                backend.setblocking(False)
+                backend.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                await loop.sock_connect(backend, address)
+                if self.proxy_protocol is not None and self.proxy_protocol.send:
+                    await loop.sock_sendall(backend, self.proxy_protocol.build_v2_header(
+                        peername, destination or client.getsockname()))
 
-            async def forward_data(src_reader, dst_writer):
+            if offload == "full":
+                tls_sock = kernel_tls.detach_offloaded(tls_sock)
+                upstream = loop.create_task(kernel_tls.forward_plain(loop, tls_sock, backend, flow))
+                downstream = kernel_tls.forward_plain(loop, backend, tls_sock, flow)
+            else:
+                upstream = loop.create_task(kernel_tls.forward_from_tls(loop, tls_sock, backend, flow))
+                downstream = kernel_tls.forward_to_tls(loop, backend, tls_sock, flow)
+
+            # The client may half-close after its request; the connection ends
+            # once the backend has finished responding
+            with tracer.start_span("proxy.forward", parent=span, tail_latency=False):
                 try:
-                    while True:
-                        data = await src_reader.read(4096)
-                        if not data:
-                            break
-                        dst_writer.write(data)
-                        await dst_writer.drain()
-                except Exception as e:
-                    logger.warning(f"Error during data forwarding: {e}")
+                    await downstream
                 finally:
-                    dst_writer.close()
-
-            await asyncio.gather(
-                forward_data(reader, backend_writer),
-                forward_data(backend_reader, writer)
-            )
+                    upstream.cancel()
+                    await asyncio.gather(upstream, return_exceptions=True)
         except Exception as e:
             logger.error(f"Error handling client {peername}: {e}")
+            span.record_error(e)
         finally:
-            writer.close()
-            await writer.wait_closed()
+            self._connections.discard(task)
+            if admission is not None:
+                admission.close()
+            if flow is not None:
+                flow.close()
+            span.end()
+            for sock in (tls_sock or client, backend):
+                if sock is not None:
+                    sock.close()
             logger.info(f"Connection with {peername} closed.")
 
-    async def start(self):
+    def set_backend(self, backend_host, backend_port):
+        """
+        Points new connections at a different backend; established connections are unaffected.
+
+        Args:
+            backend_host (str): Host address for the backend server.
+            backend_port (int): Port number for the backend server.
+        """
+        self.backend_host = backend_host
+        self.backend_port = backend_port
+        self.backend_id = f"{backend_host}:{backend_port}"
+        logger.info(f"Forwarding new connections to {self.backend_id}")
+
+    def reload_certificates(self, cert_file, key_file, ca_file=None):
+        """
+        Loads a new certificate and key into the live TLS contexts.
+
+        Handshakes started afterwards use the new certificate; established
+        connections keep theirs.
+
+        Args:
+            cert_file (str): Path to the TLS certificate file.
+            key_file (str): Path to the private key file.
+            ca_file (str, optional): Path to the CA certificate file.
+        """
+        for context in self._tls_contexts():
+            context.load_cert_chain(certfile=cert_file, keyfile=key_file)
+            if ca_file:
+                context.load_verify_locations(cafile=ca_file)
+        self._certificates = (cert_file, key_file, ca_file)
+        logger.info(f"Reloaded TLS certificate from {cert_file}")
+
+    def set_tls_policies(self, tls_policies, tls_context=None):
+        """
+        Switches new handshakes to other TLS policies; established connections are unaffected.
+
+        Args:
+            tls_policies (TLSPolicies): The new policies, or None for a single context with OpenSSL's defaults.
+            tls_context (ssl.SSLContext, optional): Prebuilt context used when ``tls_policies`` is None,
+                so callers can build it off the event loop.
+        """
+        self.tls_policies = tls_policies
+        if tls_policies is not None:
+            self.tls_context = tls_policies.default.context
+        else:
+            self.tls_context = tls_context or create_tls_context(*self._certificates)
+        self._configure_contexts()
+        logger.info("Applied the TLS policies to new handshakes.")
+
+    def warm_up(self):
+        """
+        Primes the TLS contexts with an in-memory handshake before taking traffic.
+
+        The first handshake on a fresh context pays one-off costs (certificate
+        and key loading into OpenSSL, provider initialisation); doing it here
+        keeps them off the first real client's connection.
+        """
+        client_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        client_context.check_hostname = False
+        client_context.verify_mode = ssl.CERT_NONE
+        for context in self._tls_contexts():
+            self._warm_up_context(client_context, context)
+
+    def _warm_up_context(self, client_context, context):
+        client_in, client_out = ssl.MemoryBIO(), ssl.MemoryBIO()
+        server_in, server_out = ssl.MemoryBIO(), ssl.MemoryBIO()
+        client = client_context.wrap_bio(client_in, client_out, server_side=False)
+        server = context.wrap_bio(server_in, server_out, server_side=True)
+
+        for _ in range(10):
+            for endpoint in (client, server):
+                try:
+                    endpoint.do_handshake()
+                except ssl.SSLWantReadError:
+                    pass
+                except ssl.SSLError as e:
+                    if context.verify_mode != ssl.CERT_REQUIRED:
+                        raise
+                    # The warm-up client has no certificate; the server side has done its one-off work
+                    logger.info(f"TLS context warmed up up to the client certificate request ({e.reason}).")
+                    return
+            server_in.write(client_out.read())
+            client_in.write(server_out.read())
+            if server.version() and client.version():
+                logger.info(f"TLS context warmed up ({server.version()}, {server.cipher()[0]}).")
+                return
+        logger.warning("TLS context warm-up handshake did not complete.")
+
+    def listening_sockets(self):
+        """
+        Returns the sockets the proxy is currently accepting connections on.
+        """
+        if self.ktls:
+            return list(self._listeners)
+        return [sock for server in self.servers for sock in server.sockets]
+
+    async def _stop_accepting(self):
+        for server in self.servers:
+            server.close()
+        for task in self._accept_tasks:
+            task.cancel()
+        await asyncio.gather(*self._accept_tasks, return_exceptions=True)
+        for listener in self._listeners:
+            listener.close()
+        self._accept_tasks = []
+        self._listeners = []
+
+    async def shutdown(self, drain_timeout=30):
+        """
+        Stops accepting new connections and drains the existing ones.
+
+        Args:
+            drain_timeout (float): Seconds to wait for in-flight connections before cancelling them.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + drain_timeout
+        await self._stop_accepting()
+        logger.info(f"Stopped accepting connections; draining {len(self._connections)} in-flight connection(s).")
+
+        # Connections still in the TLS handshake are not tracked yet; give them
+        # a moment to complete and register before waiting on the set
+        await asyncio.sleep(min(HANDSHAKE_GRACE_SECONDS, drain_timeout))
+        while self._connections and loop.time() < deadline:
+            await asyncio.wait(set(self._connections), timeout=deadline - loop.time())
+
+        pending = set(self._connections)
+        if pending:
+            logger.warning(f"Drain deadline reached; closing {len(pending)} connection(s).")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        logger.info("All connections drained.")
+        if self._stopped is not None and not self._stopped.done():
+            self._stopped.set_result(None)
+
+    async def start_serving(self, sockets=None):
+        """
+        Starts accepting connections and returns once the proxy is listening.
+
+        Args:
+            sockets (list, optional): Already-listening sockets to serve on, e.g.
+                inherited from a previous process; binds ``host:port`` when omitted.
+        """
+        loop = asyncio.get_running_loop()
+        self._stopped = loop.create_future()
+        if self.ktls:
+            self._listeners = list(sockets) if sockets else [
+                socket.create_server(address, backlog=LISTEN_BACKLOG) for address in self._listen_addresses()
+            ]
+            for listener in self._listeners:
+                listener.setblocking(False)
+            self._accept_tasks = [asyncio.create_task(self._accept_loop(listener)) for listener in self._listeners]
+            logger.info(f"Quantum-safe TLS proxy running with kTLS offload on {len(self._listeners)} socket(s)")
+        elif sockets:
+            self.servers = [
+                await loop.create_server(self._accepting_protocol, sock=sock)
+                for sock in sockets
+            ]
+            logger.info(f"Quantum-safe TLS proxy running on {len(sockets)} inherited socket(s)")
+        else:
+            # TLS is terminated by the connection's protocol (see core.connection)
+            addresses = self._listen_addresses()
+            self.servers = [await loop.create_server(self._accepting_protocol, host, port) for host, port in addresses]
+            logger.info(f"Quantum-safe TLS proxy running on {', '.join(f'{host}:{port}' for host, port in addresses)}")
+
+    async def start(self, sockets=None):
         """
         Starts the quantum-safe TLS proxy server.
+
+        Runs until ``shutdown`` has drained the proxy or the task is cancelled.
+
+        Args:
+            sockets (list, optional): Already-listening sockets to serve on.
         """
-        server = await asyncio.start_server(self.handle_client, self.host, self.port, ssl=self.tls_context)
-        logger.info(f"Quantum-safe TLS proxy running on {self.host}:{self.port}")
+        if self._stopped is None:
+            await self.start_serving(sockets)
         
         try:
-            async with server:
-                await server.serve_forever()
+            await self._stopped
         except asyncio.CancelledError:
-            logger.info("Server shutdown initiated.")
\ No newline at end of file
+            logger.info("Server shutdown initiated.")
+            await self._stop_accepting()
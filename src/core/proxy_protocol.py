@@ -0,0 +1,189 @@
+import socket
+import struct
+import ipaddress
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# PROXY protocol (HAProxy spec) framing
+V1_PREFIX = b"PROXY "
+V1_MAX_LENGTH = 107
+V2_SIGNATURE = b"\r\n\r\n\x00\r\nQUIT\n"
+V2_HEADER_LENGTH = 16
+V2_VERSION = 0x20
+V2_COMMAND_LOCAL = 0x00
+V2_COMMAND_PROXY = 0x01
+V2_FAMILY_TCP4 = 0x11
+V2_FAMILY_TCP6 = 0x21
+V2_ADDRESS_LENGTHS = {V2_FAMILY_TCP4: 12, V2_FAMILY_TCP6: 36}
+
+_V2_FIXED = struct.Struct("!12sBBH")
+
+class ProxyProtocolError(ValueError):
+    """
+    Raised when a connection does not start with a valid PROXY protocol header.
+    """
+
+def parse_header(data):
+    """
+    Parses a PROXY protocol v1 or v2 header at the start of ``data``.
+
+    Args:
+        data (bytes): Bytes received so far on the connection.
+
+    Returns:
+        tuple: ``(length, source, destination)`` once the header is complete, where
+            ``length`` is the header size and ``source``/``destination`` are
+            ``(host, port)`` tuples, or None for ``LOCAL``/``UNKNOWN`` headers
+            (health checks from the load balancer itself). None while the header
+            is still incomplete.
+
+    Raises:
+        ProxyProtocolError: If the data cannot start with a valid header.
+    """
+    if data[:1] == V2_SIGNATURE[:1]:
+        return _parse_v2(data)
+    if data[:1] == V1_PREFIX[:1]:
+        return _parse_v1(data)
+    raise ProxyProtocolError("connection does not start with a PROXY protocol header")
+
+def _parse_v1(data):
+    if not data.startswith(V1_PREFIX[:len(data)]):
+        raise ProxyProtocolError("invalid PROXY protocol v1 signature")
+    end = data.find(b"\r\n", 0, V1_MAX_LENGTH)
+    if end < 0:
+        if len(data) >= V1_MAX_LENGTH:
+            raise ProxyProtocolError("PROXY protocol v1 header is too long")
+        return None
+    fields = data[:end].decode("ascii", "replace").split(" ")
+    if fields[1] == "UNKNOWN":
+        return end + 2, None, None
+    if len(fields) != 6 or fields[1] not in ("TCP4", "TCP6"):
+        raise ProxyProtocolError(f"malformed PROXY protocol v1 header {data[:end]!r}")
+    try:
+        family = socket.AF_INET if fields[1] == "TCP4" else socket.AF_INET6
+        socket.inet_pton(family, fields[2])
+        socket.inet_pton(family, fields[3])
+        source_port, destination_port = int(fields[4]), int(fields[5])
+    except (OSError, ValueError):
+        raise ProxyProtocolError(f"malformed PROXY protocol v1 header {data[:end]!r}")
+    if not (0 <= source_port <= 65535 and 0 <= destination_port <= 65535):
+        raise ProxyProtocolError(f"malformed PROXY protocol v1 header {data[:end]!r}")
+    return end + 2, (fields[2], source_port), (fields[3], destination_port)
+
+def _parse_v2(data):
+    if len(data) < V2_HEADER_LENGTH:
+        if not V2_SIGNATURE.startswith(bytes(data[:12])):
+            raise ProxyProtocolError("invalid PROXY protocol v2 signature")
+        return None
+    signature, version_command, family, address_length = _V2_FIXED.unpack_from(data)
+    if signature != V2_SIGNATURE or version_command & 0xF0 != V2_VERSION:
+        raise ProxyProtocolError("invalid PROXY protocol v2 signature")
+    length = V2_HEADER_LENGTH + address_length
+    if len(data) < length:
+        return None
+    command = version_command & 0x0F
+    if command == V2_COMMAND_LOCAL:
+        return length, None, None
+    if command != V2_COMMAND_PROXY:
+        raise ProxyProtocolError(f"unsupported PROXY protocol v2 command {command}")
+    required = V2_ADDRESS_LENGTHS.get(family)
+    if required is None:
+        # UNSPEC, UDP or Unix sockets: the header is valid but carries no TCP address
+        return length, None, None
+    if address_length < required:
+        raise ProxyProtocolError("truncated PROXY protocol v2 address block")
+    size = 4 if family == V2_FAMILY_TCP4 else 16
+    addresses = bytes(data[V2_HEADER_LENGTH:V2_HEADER_LENGTH + required])
+    inet = socket.AF_INET if family == V2_FAMILY_TCP4 else socket.AF_INET6
+    source_port, destination_port = struct.unpack_from("!HH", addresses, 2 * size)
+    return (length,
+            (socket.inet_ntop(inet, addresses[:size]), source_port),
+            (socket.inet_ntop(inet, addresses[size:2 * size]), destination_port))
+
+def build_v2_header(source, destination):
+    """
+    Builds a PROXY protocol v2 header announcing a proxied TCP connection.
+
+    Args:
+        source (tuple): ``(host, port)`` of the original client.
+        destination (tuple): ``(host, port)`` the client connected to.
+
+    Returns:
+        bytes: The header; a ``LOCAL`` header when the addresses are not IPv4/IPv6 of the same family.
+    """
+    try:
+        source_ip = ipaddress.ip_address(source[0])
+        destination_ip = ipaddress.ip_address(destination[0])
+    except (TypeError, ValueError, IndexError):
+        source_ip = destination_ip = None
+    if source_ip is None or source_ip.version != destination_ip.version:
+        return _V2_FIXED.pack(V2_SIGNATURE, V2_VERSION | V2_COMMAND_LOCAL, 0, 0)
+    family = V2_FAMILY_TCP4 if source_ip.version == 4 else V2_FAMILY_TCP6
+    addresses = source_ip.packed + destination_ip.packed + struct.pack("!HH", source[1], destination[1])
+    return _V2_FIXED.pack(V2_SIGNATURE, V2_VERSION | V2_COMMAND_PROXY, family, len(addresses)) + addresses
+
+class ProxyProtocol:
+    """
+    PROXY protocol settings for the listener and the backend connections.
+
+    Load balancers in front of the proxy (AWS NLB, Azure and GCP load
+    balancers) prepend a header carrying the real client address. Headers are
+    only honoured from ``trusted_networks``, so other peers cannot spoof their
+    address; connections from them are handled as direct clients. Trusted
+    peers are never rate limited by their own address, as it is shared by
+    every client behind them.
+    """
+
+    __slots__ = ("accept", "send", "trusted_networks", "header_timeout")
+
+    # Exposed on the settings so connection handling does not import this module up front
+    parse_header = staticmethod(parse_header)
+    build_v2_header = staticmethod(build_v2_header)
+
+    def __init__(self, accept=False, send=False, trusted_networks=(), header_timeout=3.0):
+        """
+        Initializes the ProxyProtocol settings.
+
+        Args:
+            accept (bool): Whether accepted connections from trusted peers must start with a v1 or v2 header.
+            send (bool): Whether to send a v2 header with the client address on each backend connection.
+            trusted_networks (iterable): CIDRs of the load balancers; empty trusts every peer when ``accept`` is set.
+            header_timeout (float): Seconds a trusted peer has to send the complete header.
+        """
+        self.accept = accept
+        self.send = send
+        self.trusted_networks = tuple(ipaddress.ip_network(network, strict=False) for network in trusted_networks)
+        self.header_timeout = header_timeout
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Creates the settings from the ``proxy.proxy_protocol`` configuration section.
+        """
+        return cls(
+            accept=config.get("accept", False),
+            send=config.get("send", False),
+            trusted_networks=config.get("trusted_networks", ()),
+            header_timeout=config.get("header_timeout", 3.0)
+        )
+
+    def trusts(self, peername):
+        """
+        Returns whether ``peername`` is a load balancer rather than a client.
+
+        Empty ``trusted_networks`` trust every peer only while headers are accepted.
+        """
+        if not self.trusted_networks:
+            return self.accept
+        try:
+            address = ipaddress.ip_address(peername[0])
+        except (TypeError, ValueError, IndexError):
+            return False
+        return any(address in network for network in self.trusted_networks)
+
+    def expects_header(self, peername):
+        """
+        Returns whether a connection from ``peername`` must start with a PROXY protocol header.
+        """
+        return self.accept and self.trusts(peername)
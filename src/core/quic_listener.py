@@ -0,0 +1,416 @@
+import asyncio
+from aioquic.asyncio import QuicConnectionProtocol
+from aioquic.asyncio.server import QuicServer
+from aioquic.buffer import Buffer
+from aioquic.h3.connection import H3_ALPN, ErrorCode, H3Connection
+from aioquic.h3.events import DataReceived, HeadersReceived
+from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.events import ConnectionTerminated, HandshakeCompleted, StreamReset
+from aioquic.quic.packet import QuicPacketType, pull_quic_header
+from aioquic.tls import Group
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Key exchange groups aioquic implements, by OpenSSL and TLS group name
+QUIC_GROUPS = {
+    "x25519": Group.X25519,
+    "x448": Group.X448,
+    "secp256r1": Group.SECP256R1,
+    "prime256v1": Group.SECP256R1,
+    "secp384r1": Group.SECP384R1,
+    "secp521r1": Group.SECP521R1,
+}
+
+# Headers describing one HTTP/1.1 hop; they are not forwarded in either direction
+HOP_BY_HOP_HEADERS = frozenset((
+    b"connection", b"keep-alive", b"proxy-connection", b"transfer-encoding", b"upgrade", b"te", b"trailer",
+))
+
+FORWARD_CHUNK = 64 * 1024
+# Largest backend response head (status line and headers) accepted
+RESPONSE_HEAD_MAX = 64 * 1024
+
+def quic_groups(groups):
+    """
+    Maps TLS policy group names to the groups aioquic can negotiate.
+
+    aioquic implements its own TLS 1.3 handshake on top of ``cryptography``
+    and has no hybrid or ML-KEM groups, so those are dropped.
+
+    Args:
+        groups (iterable): Group names from a TLS policy.
+
+    Returns:
+        tuple: ``aioquic.tls.Group`` values in policy order, and the names that were dropped.
+    """
+    supported, dropped = [], []
+    for name in groups:
+        group = QUIC_GROUPS.get(name.lower())
+        if group is None:
+            dropped.append(name)
+        elif group not in supported:
+            supported.append(group)
+    return tuple(supported), tuple(dropped)
+
+def _request_head(headers, client_address, chunked):
+    # Builds the HTTP/1.1 request line and headers for an HTTP/3 request
+    pseudo = {}
+    lines = []
+    for name, value in headers:
+        if name.startswith(b":"):
+            pseudo[name] = value
+        elif name not in HOP_BY_HOP_HEADERS and name != b"host":
+            lines.append(name + b": " + value)
+    authority = pseudo.get(b":authority", b"")
+    head = [pseudo.get(b":method", b"GET") + b" " + pseudo.get(b":path", b"/") + b" HTTP/1.1", b"Host: " + authority]
+    head.extend(lines)
+    head.append(b"X-Forwarded-For: " + client_address[0].encode())
+    head.append(b"X-Forwarded-Proto: https")
+    if chunked:
+        head.append(b"Transfer-Encoding: chunked")
+    head.append(b"Connection: close")
+    return b"\r\n".join(head) + b"\r\n\r\n"
+
+def _parse_response_head(head):
+    # Returns the status code and lower-cased headers of an HTTP/1.x response head
+    lines = head.rstrip(b"\r\n").split(b"\r\n")
+    parts = lines[0].split(b" ", 2)
+    if len(parts) < 2 or not parts[0].startswith(b"HTTP/1."):
+        raise ValueError(f"invalid backend status line {lines[0][:80]!r}")
+    status = int(parts[1])
+    headers = []
+    for line in lines[1:]:
+        name, separator, value = line.partition(b":")
+        if not separator:
+            raise ValueError(f"invalid backend header line {line[:80]!r}")
+        headers.append((name.strip().lower(), value.strip()))
+    return status, headers
+
+async def _read_chunked(reader):
+    # Yields the payload of a chunked HTTP/1.1 body
+    while True:
+        size_line = await reader.readuntil(b"\r\n")
+        size = int(size_line.split(b";", 1)[0], 16)
+        if size == 0:
+            # Trailers are dropped
+            while await reader.readuntil(b"\r\n") != b"\r\n":
+                pass
+            return
+        yield await reader.readexactly(size)
+        await reader.readexactly(2)
+
+class _Stream:
+    """
+    An HTTP/3 request being forwarded: its pending body chunks and forwarding task.
+    """
+
+    __slots__ = ("body", "task", "responded")
+
+    def __init__(self):
+        self.body = asyncio.Queue()
+        self.task = None
+        self.responded = False
+
+class _HTTP3Protocol(QuicConnectionProtocol):
+    """
+    One QUIC connection; forwards each HTTP/3 request to the backend as an HTTP/1.1 request.
+    """
+
+    def __init__(self, quic, listener, stream_handler=None):
+        super().__init__(quic, stream_handler)
+        self.listener = listener
+        self.client_address = None
+        self.http = None
+        self.streams = {}
+
+    def datagram_received(self, data, addr):
+        if self.client_address is None:
+            # The connection's TLS context is created while the first datagram is processed
+            self.client_address = addr
+            groups = self.listener.groups_for(addr)
+            if groups:
+                self._restrict_groups(groups)
+        super().datagram_received(data, addr)
+
+    def _restrict_groups(self, groups):
+        quic = self._quic
+        initialize = quic._initialize
+
+        def initialize_with_groups(peer_cid):
+            initialize(peer_cid)
+            quic.tls._supported_groups = list(groups)
+
+        quic._initialize = initialize_with_groups
+
+    def quic_event_received(self, event):
+        if isinstance(event, HandshakeCompleted):
+            self.http = H3Connection(self._quic)
+            logger.info(f"Accepted QUIC connection from {self.client_address} ({event.alpn_protocol})")
+        elif isinstance(event, StreamReset):
+            stream = self.streams.pop(event.stream_id, None)
+            if stream is not None and stream.task is not None:
+                stream.task.cancel()
+        elif isinstance(event, ConnectionTerminated):
+            for stream in self.streams.values():
+                if stream.task is not None:
+                    stream.task.cancel()
+            self.streams.clear()
+            logger.info(f"QUIC connection with {self.client_address} closed.")
+        if self.http is not None:
+            for http_event in self.http.handle_event(event):
+                self._http_event_received(http_event)
+
+    def _http_event_received(self, event):
+        if isinstance(event, HeadersReceived):
+            if event.stream_id in self.streams:
+                # Trailers are not forwarded
+                if event.stream_ended:
+                    self.streams[event.stream_id].body.put_nowait(None)
+                return
+            stream = _Stream()
+            self.streams[event.stream_id] = stream
+            has_length = any(name == b"content-length" for name, _ in event.headers)
+            chunked = not event.stream_ended and not has_length
+            head = _request_head(event.headers, self.client_address, chunked)
+            if event.stream_ended:
+                stream.body.put_nowait(None)
+            method = dict(event.headers).get(b":method", b"GET")
+            stream.task = asyncio.ensure_future(self._forward(event.stream_id, stream, head, method, chunked))
+            self.listener.track(stream.task)
+        elif isinstance(event, DataReceived):
+            stream = self.streams.get(event.stream_id)
+            if stream is None:
+                return
+            if event.data:
+                stream.body.put_nowait(event.data)
+            if event.stream_ended:
+                stream.body.put_nowait(None)
+
+    async def _forward(self, stream_id, stream, head, method, chunked):
+        proxy = self.listener.proxy
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(
+                proxy.backend_host, proxy.backend_port, ssl=proxy.backend_ssl, limit=RESPONSE_HEAD_MAX
+            )
+            if proxy.proxy_protocol is not None and proxy.proxy_protocol.send:
+                writer.write(proxy.proxy_protocol.build_v2_header(self.client_address, self.listener.address))
+            writer.write(head)
+            while True:
+                chunk = await stream.body.get()
+                if chunk is None:
+                    break
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk) if chunked else chunk)
+                await writer.drain()
+            if chunked:
+                writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            await self._relay_response(stream_id, stream, reader, method)
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+            logger.error(f"Error forwarding HTTP/3 request from {self.client_address}: {e}")
+            if stream.responded:
+                self._quic.reset_stream(stream_id, ErrorCode.H3_INTERNAL_ERROR)
+            else:
+                self.http.send_headers(stream_id, [(b":status", b"502"), (b"content-length", b"0")], end_stream=True)
+            self.transmit()
+        finally:
+            if self.streams.get(stream_id) is stream:
+                del self.streams[stream_id]
+            if writer is not None:
+                writer.close()
+
+    async def _relay_response(self, stream_id, stream, reader, method):
+        while True:
+            status, headers = _parse_response_head(await reader.readuntil(b"\r\n\r\n"))
+            # Interim responses (100 Continue) are consumed here
+            if status >= 200:
+                break
+        length = None
+        chunked = False
+        response_headers = [(b":status", str(status).encode())]
+        for name, value in headers:
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"transfer-encoding":
+                chunked = b"chunked" in value.lower()
+            if name not in HOP_BY_HOP_HEADERS:
+                response_headers.append((name, value))
+        no_body = method == b"HEAD" or status in (204, 304)
+        self.http.send_headers(stream_id, response_headers, end_stream=no_body)
+        stream.responded = True
+        self.transmit()
+        if no_body:
+            return
+
+        if chunked:
+            async for chunk in _read_chunked(reader):
+                self.http.send_data(stream_id, chunk, end_stream=False)
+                self.transmit()
+        elif length is not None:
+            while length:
+                chunk = await reader.readexactly(min(length, FORWARD_CHUNK))
+                length -= len(chunk)
+                self.http.send_data(stream_id, chunk, end_stream=False)
+                self.transmit()
+        else:
+            while True:
+                chunk = await reader.read(FORWARD_CHUNK)
+                if not chunk:
+                    break
+                self.http.send_data(stream_id, chunk, end_stream=False)
+                self.transmit()
+        self.http.send_data(stream_id, b"", end_stream=True)
+        self.transmit()
+
+class _QuicServer(QuicServer):
+    """
+    Demultiplexes datagrams to connections; rate limits new connections before any TLS work.
+    """
+
+    def __init__(self, listener, **kwargs):
+        super().__init__(**kwargs)
+        self.listener = listener
+
+    def datagram_received(self, data, addr):
+        rate_limiter = self.listener.proxy.rate_limiter
+        # Only long header packets can open a connection
+        if rate_limiter is not None and data and data[0] & 0x80 and self._opens_connection(data):
+            if not rate_limiter.is_allowed(addr[0]):
+                return
+        super().datagram_received(data, addr)
+
+    def _opens_connection(self, data):
+        try:
+            header = pull_quic_header(Buffer(data=data), host_cid_length=self._configuration.connection_id_length)
+        except ValueError:
+            return False
+        return header.packet_type == QuicPacketType.INITIAL and header.destination_cid not in self._protocols
+
+class QuicListener:
+    """
+    Terminates HTTP/3 over QUIC next to the TCP listener and forwards requests to the same backend.
+
+    QUIC avoids TCP's head-of-line blocking and combines the transport and
+    TLS handshakes into one round trip, which matters most for clients on
+    lossy mobile networks. The listener uses the proxy's certificate and the
+    key exchange groups of its TLS policy that aioquic supports; the TCP
+    listener advertises it to HTTP clients with an ``Alt-Svc`` header.
+
+    Each HTTP/3 request is forwarded on a new backend connection as an
+    HTTP/1.1 request with ``X-Forwarded-For`` and ``X-Forwarded-Proto``.
+    """
+
+    __slots__ = ("proxy", "host", "port", "alt_svc_max_age", "configuration", "transport", "server", "_groups",
+                 "_tasks")
+
+    def __init__(self, proxy, host, port, cert_file, key_file, alt_svc_max_age=86400):
+        """
+        Initializes the QuicListener.
+
+        Args:
+            proxy (QuantumSafeProxy): The TCP proxy whose backend, TLS policies and rate limiter are used.
+            host (str): Host address to listen on.
+            port (int): UDP port to listen on; 0 picks a free port.
+            cert_file (str): Path to the TLS certificate file.
+            key_file (str): Path to the private key file.
+            alt_svc_max_age (int): Seconds clients may remember the ``Alt-Svc`` advertisement; 0 disables it.
+        """
+        self.proxy = proxy
+        self.host = host
+        self.port = port
+        self.alt_svc_max_age = alt_svc_max_age
+        self.configuration = QuicConfiguration(is_client=False, alpn_protocols=H3_ALPN)
+        self.configuration.load_cert_chain(cert_file, key_file)
+        self.transport = None
+        self.server = None
+        self._groups = {}
+        self._tasks = set()
+
+    @property
+    def address(self):
+        """
+        The ``(host, port)`` the listener is bound to.
+        """
+        return (self.host, self.port)
+
+    def groups_for(self, client_address):
+        """
+        Returns the key exchange groups a connection from ``client_address`` may negotiate.
+
+        Overrides matching on server names do not apply, since aioquic reads
+        the server name only while it processes the ClientHello.
+
+        Returns:
+            tuple: ``aioquic.tls.Group`` values; empty keeps aioquic's defaults.
+        """
+        policies = self.proxy.tls_policies
+        if policies is None:
+            return ()
+        policy = policies.select(None, client_address)
+        groups = self._groups.get(policy.groups)
+        if groups is None:
+            groups, dropped = quic_groups(policy.groups)
+            if dropped:
+                logger.warning(f"TLS policy {policy.name}: groups {':'.join(dropped)} are not available over QUIC.")
+            if policy.groups and not groups:
+                logger.warning(f"TLS policy {policy.name} has no group available over QUIC; using aioquic's defaults.")
+            self._groups[policy.groups] = groups
+        return groups
+
+    def track(self, task):
+        """
+        Keeps a request task referenced until it finishes, so ``close`` can cancel it.
+        """
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def alt_svc(self):
+        """
+        Returns the ``Alt-Svc`` response header line advertising the listener, or None if disabled.
+        """
+        if not self.alt_svc_max_age:
+            return None
+        return f'Alt-Svc: h3=":{self.port}"; ma={self.alt_svc_max_age}\r\n'.encode()
+
+    async def start(self):
+        """
+        Binds the UDP socket and starts advertising the listener on the proxy's HTTP responses.
+        """
+        loop = asyncio.get_running_loop()
+        self.transport, self.server = await loop.create_datagram_endpoint(
+            lambda: _QuicServer(
+                self,
+                configuration=self.configuration,
+                create_protocol=lambda quic, stream_handler=None: _HTTP3Protocol(quic, self, stream_handler)
+            ),
+            local_addr=(self.host, self.port),
+            # A replacement process started for a restart binds the port while this one drains
+            reuse_port=True
+        )
+        self.port = self.transport.get_extra_info("sockname")[1]
+        self.proxy.alt_svc = self.alt_svc()
+        logger.info(f"HTTP/3 listener running on {self.host}:{self.port} (UDP)")
+
+    def reload_certificates(self, cert_file, key_file):
+        """
+        Loads a new certificate and key for new QUIC connections.
+
+        Args:
+            cert_file (str): Path to the TLS certificate file.
+            key_file (str): Path to the private key file.
+        """
+        self.configuration.load_cert_chain(cert_file, key_file)
+        logger.info(f"Reloaded QUIC certificate from {cert_file}")
+
+    def close(self):
+        """
+        Stops advertising and closes all QUIC connections and the socket.
+        """
+        self.proxy.alt_svc = None
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        for task in self._tasks:
+            task.cancel()
+        logger.info("HTTP/3 listener stopped.")
@@ -0,0 +1,189 @@
+import os
+import sys
+import socket
+import asyncio
+import threading
+import subprocess
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+TAKEOVER_ENV = "PROXY_TAKEOVER"
+MAX_HANDOFF_FDS = 16
+
+class HandoffServer:
+    """
+    Hands the proxy's listening sockets to a replacement process over a Unix socket.
+
+    The replacement connects, sends ``TAKEOVER`` and receives the listening
+    socket descriptors via ``SCM_RIGHTS``. Once it replies ``READY`` (it is
+    accepting on the shared sockets), ``on_handoff`` is scheduled on the event
+    loop so this process can stop accepting and drain.
+    """
+
+    def __init__(self, path, get_sockets, on_handoff, loop, timeout=10):
+        """
+        Initializes the HandoffServer.
+
+        Args:
+            path (str): Filesystem path of the Unix control socket.
+            get_sockets (callable): Returns the listening sockets to hand over.
+            on_handoff (callable): Coroutine function run on the loop after a successful handoff.
+            loop (asyncio.AbstractEventLoop): The loop running the proxy.
+            timeout (float): Seconds to wait for the replacement at each step.
+        """
+        self.path = path
+        self.get_sockets = get_sockets
+        self.on_handoff = on_handoff
+        self.loop = loop
+        self.timeout = timeout
+        self._listener = None
+        self._inode = None
+        self._thread = None
+
+    def start(self):
+        """
+        Binds the control socket, replacing one left by a previous process, and starts serving it.
+        """
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self._listener.listen(1)
+        self._inode = os.stat(self.path).st_ino
+        self._thread = threading.Thread(target=self._serve, name="socket-handoff", daemon=True)
+        self._thread.start()
+        logger.info(f"Listening for socket handoff requests on {self.path}")
+
+    def close(self):
+        """
+        Stops serving handoff requests and removes the control socket if it is still ours.
+        """
+        if self._listener is None:
+            return
+        try:
+            self._listener.shutdown(socket.SHUT_RDWR)  # Wakes the thread blocked in accept()
+        except OSError:
+            pass
+        self._listener.close()
+        self._listener = None
+        try:
+            if os.stat(self.path).st_ino == self._inode:
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _serve(self):
+        while self._listener is not None:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            with conn:
+                if self._hand_over(conn):
+                    asyncio.run_coroutine_threadsafe(self.on_handoff(), self.loop)
+                    return
+
+    def _hand_over(self, conn):
+        conn.settimeout(self.timeout)
+        try:
+            if conn.recv(64).strip() != b"TAKEOVER":
+                logger.warning("Ignoring malformed socket handoff request.")
+                return False
+            fds = [sock.fileno() for sock in self.get_sockets()]
+            socket.send_fds(conn, [str(len(fds)).encode()], fds)
+            logger.info(f"Sent {len(fds)} listening socket(s) to the replacement process.")
+            if conn.recv(64).strip() != b"READY":
+                logger.error("Replacement process did not confirm it is serving; keeping traffic here.")
+                return False
+        except OSError as e:
+            logger.error(f"Socket handoff failed: {e}")
+            return False
+        logger.info("Replacement process is serving; handing over traffic.")
+        return True
+
+def request_listening_sockets(path, timeout=10):
+    """
+    Asks the running proxy for its listening sockets.
+
+    Args:
+        path (str): Filesystem path of the running proxy's control socket.
+        timeout (float): Seconds to wait for the running proxy.
+
+    Returns:
+        tuple: The received listening sockets and the control connection, which
+            must be passed to ``confirm_ready`` once the sockets are being served.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    try:
+        conn.connect(path)
+        conn.sendall(b"TAKEOVER\n")
+        _, fds, _, _ = socket.recv_fds(conn, 64, MAX_HANDOFF_FDS)
+    except OSError:
+        conn.close()
+        raise
+    if not fds:
+        conn.close()
+        raise RuntimeError("Running proxy sent no listening sockets")
+    sockets = [socket.socket(fileno=fd) for fd in fds]
+    for sock in sockets:
+        sock.setblocking(False)
+    logger.info(f"Received {len(sockets)} listening socket(s) from the running proxy.")
+    return sockets, conn
+
+def confirm_ready(conn):
+    """
+    Tells the previous process that the inherited sockets are being served.
+    """
+    try:
+        conn.sendall(b"READY\n")
+    finally:
+        conn.close()
+
+def spawn_replacement():
+    """
+    Starts a replacement of the current process in takeover mode.
+    """
+    env = dict(os.environ, **{TAKEOVER_ENV: "1"})
+    process = subprocess.Popen([sys.executable, *sys.argv], env=env)
+    logger.info(f"Spawned replacement process {process.pid} for zero-downtime restart.")
+    return process
+
+async def serve_with_handoff(proxy, path, drain_timeout=30, takeover=False, timeout=10):
+    """
+    Runs the proxy with zero-downtime restart support.
+
+    In takeover mode the TLS context is warmed up first, then the listening
+    sockets are taken from the running process, and only once they are served
+    is that process told to stop accepting and drain. Either way this process
+    then listens on ``path`` for its own replacement.
+
+    Args:
+        proxy (QuantumSafeProxy): The proxy to run.
+        path (str): Filesystem path of the Unix control socket.
+        drain_timeout (float): Seconds to drain in-flight connections after handing over.
+        takeover (bool): Whether to take the listening sockets from a running process.
+        timeout (float): Seconds to wait for the other process at each handoff step.
+    """
+    loop = asyncio.get_running_loop()
+    proxy.warm_up()
+
+    sockets, control = None, None
+    if takeover:
+        try:
+            sockets, control = await loop.run_in_executor(None, request_listening_sockets, path, timeout)
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"Socket takeover from {path} failed ({e}); binding a fresh listener.")
+
+    await proxy.start_serving(sockets)
+    if control is not None:
+        confirm_ready(control)
+
+    handoff_server = HandoffServer(path, proxy.listening_sockets, lambda: proxy.shutdown(drain_timeout), loop, timeout)
+    handoff_server.start()
+    try:
+        await proxy.start()
+    finally:
+        handoff_server.close()
@@ -0,0 +1,340 @@
+import ssl
+import ctypes
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# SSL_CTX_ctrl/SSL_ctrl commands (openssl/ssl.h)
+SSL_CTRL_SET_GROUPS_LIST = 92
+SSL_CTRL_SET_SIGALGS_LIST = 98
+SSL_CTRL_GET_NEGOTIATED_GROUP = 134
+
+# OpenSSL reports groups without a NID (those from providers such as
+# oqs-provider) as this flag combined with the TLS group code point
+TLSEXT_NID_UNKNOWN = 0x1000000
+
+# TLS code points of hybrid and post-quantum groups, which have no NID
+GROUP_NAMES = {
+    0x0200: "MLKEM512",
+    0x0201: "MLKEM768",
+    0x0202: "MLKEM1024",
+    0x11EB: "SecP256r1MLKEM768",
+    0x11EC: "X25519MLKEM768",
+    0x11ED: "SecP384r1MLKEM1024",
+    0x6399: "X25519Kyber768Draft00",
+    0x639A: "SecP256r1Kyber768Draft00",
+}
+# OpenSSL short names that differ from the TLS group names
+_NID_ALIASES = {"prime256v1": "secp256r1"}
+_CURVE_NAMES = {group: name for name, group in _NID_ALIASES.items()}
+
+_bindings = None
+_bindings_checked = False
+_loaded_providers = set()
+
+class _LibSSL:
+    """
+    ctypes bindings for the OpenSSL calls the ssl module does not expose.
+
+    The library is opened through the ``_ssl`` extension, so symbols resolve
+    to the libssl that created the contexts. The ``SSL_CTX``/``SSL`` pointers
+    are read from fixed offsets in the ssl module's objects, which are
+    verified against a probe connection before the bindings are used.
+    """
+
+    def __init__(self):
+        import _ssl
+        lib = ctypes.CDLL(_ssl.__file__)
+        lib.SSL_CTX_ctrl.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_long, ctypes.c_void_p]
+        lib.SSL_CTX_ctrl.restype = ctypes.c_long
+        lib.SSL_ctrl.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_long, ctypes.c_void_p]
+        lib.SSL_ctrl.restype = ctypes.c_long
+        lib.SSL_get_SSL_CTX.argtypes = [ctypes.c_void_p]
+        lib.SSL_get_SSL_CTX.restype = ctypes.c_void_p
+        lib.OBJ_nid2sn.argtypes = [ctypes.c_int]
+        lib.OBJ_nid2sn.restype = ctypes.c_char_p
+        self.lib = lib
+        # PySSLContext starts with its SSL_CTX pointer; PySSLSocket with the
+        # owning socket, its SSL pointer and its context
+        self.header = object.__basicsize__
+        self.pointer = ctypes.sizeof(ctypes.c_void_p)
+        self._check_layout()
+
+    def _check_layout(self):
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        probe = context.wrap_bio(ssl.MemoryBIO(), ssl.MemoryBIO(), server_side=True)
+        owner = ctypes.c_void_p.from_address(id(probe._sslobj) + self.header + 2 * self.pointer).value
+        if owner != id(context) or self.lib.SSL_get_SSL_CTX(self.ssl(probe)) != self.ssl_ctx(context):
+            raise RuntimeError("unexpected layout of ssl module objects")
+
+    def ssl_ctx(self, context):
+        return ctypes.c_void_p.from_address(id(context) + self.header).value
+
+    def ssl(self, ssl_object):
+        return ctypes.c_void_p.from_address(id(ssl_object._sslobj) + self.header + self.pointer).value
+
+    def load_provider(self, name):
+        # Bound on first use: OpenSSL 1.1 has no providers, which must not disable the other bindings
+        load = self.lib.OSSL_PROVIDER_load
+        load.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+        load.restype = ctypes.c_void_p
+        return bool(load(None, name.encode()))
+
+    def set_list(self, context, command, names):
+        return self.lib.SSL_CTX_ctrl(self.ssl_ctx(context), command, 0, ctypes.c_char_p(":".join(names).encode())) == 1
+
+def _libssl():
+    global _bindings, _bindings_checked
+    if not _bindings_checked:
+        _bindings_checked = True
+        try:
+            _bindings = _LibSSL()
+        except (AttributeError, OSError, RuntimeError) as e:
+            logger.warning(f"OpenSSL group and signature algorithm settings are unavailable: {e}")
+    return _bindings
+
+def load_providers(names):
+    """
+    Loads OpenSSL providers, such as ``oqsprovider``, into the default library context.
+
+    Must run before the TLS contexts using their groups are created. The
+    ``default`` provider is loaded first, since loading any provider
+    explicitly stops OpenSSL from activating it implicitly.
+
+    Args:
+        names (iterable): Provider names.
+    """
+    names = [name for name in names if name not in _loaded_providers]
+    if not names:
+        return
+    bindings = _libssl()
+    if bindings is None:
+        logger.warning(f"Cannot load OpenSSL provider(s) {', '.join(names)}.")
+        return
+    if "default" not in names and "default" not in _loaded_providers:
+        names.insert(0, "default")
+    for name in names:
+        try:
+            loaded = bindings.load_provider(name)
+        except AttributeError:
+            logger.warning(f"{ssl.OPENSSL_VERSION} has no providers; cannot load {', '.join(names)}.")
+            return
+        if loaded:
+            _loaded_providers.add(name)
+            logger.info(f"Loaded OpenSSL provider {name}.")
+        else:
+            logger.warning(f"OpenSSL provider {name} could not be loaded; its algorithms are unavailable.")
+
+def configure_groups(context, groups=(), signature_algorithms=()):
+    """
+    Sets the key exchange groups and signature algorithms a TLS context offers, in preference order.
+
+    Names OpenSSL does not know (for example hybrid groups when oqs-provider
+    is not loaded) are skipped with a warning, so a policy listing a hybrid
+    group first falls back to the classical groups after it.
+
+    Args:
+        context (ssl.SSLContext): The server context.
+        groups (iterable): Group names, e.g. ``X25519MLKEM768``, ``X25519``, ``secp256r1``; empty keeps OpenSSL's defaults.
+        signature_algorithms (iterable): Signature scheme names, e.g. ``ecdsa_secp256r1_sha256``; empty keeps the defaults.
+
+    Returns:
+        tuple: The groups and signature algorithms applied.
+    """
+    groups, signature_algorithms = tuple(groups), tuple(signature_algorithms)
+    if not groups and not signature_algorithms:
+        return (), ()
+    bindings = _libssl()
+    if bindings is None:
+        # The ssl module alone can only restrict a context to a single curve
+        for name in groups:
+            try:
+                context.set_ecdh_curve(_CURVE_NAMES.get(name, name))
+            except ValueError:
+                continue
+            logger.warning(f"Offering only {name} for key exchange.")
+            return (name,), ()
+        return (), ()
+
+    applied = []
+    for command, names, kind in ((SSL_CTRL_SET_GROUPS_LIST, groups, "key exchange group"),
+                                 (SSL_CTRL_SET_SIGALGS_LIST, signature_algorithms, "signature algorithm")):
+        supported = tuple(name for name in names if bindings.set_list(context, command, [name]))
+        for name in names:
+            if name not in supported:
+                logger.warning(f"Skipping unsupported {kind} {name}.")
+        if names and not supported:
+            raise ValueError(f"None of the configured {kind}s ({', '.join(names)}) is supported")
+        if supported:
+            bindings.set_list(context, command, supported)
+        applied.append(supported)
+    return tuple(applied)
+
+def negotiated_group(ssl_object):
+    """
+    Returns the key exchange group negotiated on a connection.
+
+    Args:
+        ssl_object (ssl.SSLObject or ssl.SSLSocket): A connection whose handshake completed.
+
+    Returns:
+        str: The TLS group name (e.g. ``X25519MLKEM768``), or None if it cannot be determined.
+    """
+    bindings = _libssl()
+    if bindings is None:
+        return None
+    nid = bindings.lib.SSL_ctrl(bindings.ssl(ssl_object), SSL_CTRL_GET_NEGOTIATED_GROUP, 0, None)
+    if nid <= 0:
+        return None
+    if nid & TLSEXT_NID_UNKNOWN:
+        code_point = nid & 0xFFFF
+        return GROUP_NAMES.get(code_point, f"0x{code_point:04x}")
+    name = bindings.lib.OBJ_nid2sn(nid)
+    if name is None:
+        return None
+    name = name.decode()
+    return _NID_ALIASES.get(name, name)
+
+def _name_matches(pattern, server_name):
+    if pattern.startswith("*."):
+        return server_name.endswith(pattern[1:])
+    return server_name == pattern
+
+class TLSPolicy:
+    """
+    A key exchange group and signature algorithm policy and the TLS context applying it.
+    """
+
+    __slots__ = ("name", "context", "groups", "signature_algorithms", "server_names", "client_networks")
+
+    def __init__(self, name, context, groups=(), signature_algorithms=(), server_names=(), client_networks=()):
+        """
+        Initializes the TLSPolicy and configures its context.
+
+        Args:
+            name (str): Name reported in metrics and traces.
+            context (ssl.SSLContext): A server context of its own, with the certificate loaded.
+            groups (iterable): Key exchange groups in preference order; empty keeps OpenSSL's defaults.
+            signature_algorithms (iterable): Signature algorithms in preference order; empty keeps the defaults.
+            server_names (iterable): Server names (``*.example.com`` matches subdomains) the policy applies to.
+            client_networks (iterable): Client CIDRs the policy applies to.
+        """
+        self.name = name
+        self.context = context
+        self.server_names = tuple(server_name.lower() for server_name in server_names)
+        self.client_networks = ()
+        if client_networks:
+            import ipaddress
+            self.client_networks = tuple(ipaddress.ip_network(network, strict=False) for network in client_networks)
+        self.groups, self.signature_algorithms = configure_groups(context, groups, signature_algorithms)
+        logger.info(f"TLS policy {name}: groups {':'.join(self.groups) or 'OpenSSL defaults'}, "
+                    f"signature algorithms {':'.join(self.signature_algorithms) or 'OpenSSL defaults'}")
+
+    def matches(self, server_name, client_address):
+        """
+        Returns whether the policy applies to a connection; every criterion it sets must match.
+        """
+        if self.server_names:
+            if not server_name or not any(_name_matches(pattern, server_name) for pattern in self.server_names):
+                return False
+        if self.client_networks:
+            import ipaddress
+            try:
+                address = ipaddress.ip_address(client_address[0])
+            except (TypeError, ValueError, IndexError):
+                return False
+            if not any(address in network for network in self.client_networks):
+                return False
+        return True
+
+class TLSPolicies:
+    """
+    Chooses the TLS context, and so the key exchange groups, for each connection.
+
+    Overrides are matched in order on the ClientHello's server name and the
+    client's network (the address from a PROXY protocol header when there is
+    one); other connections use the default policy. OpenSSL picks the key
+    share before an SNI callback runs, and switching contexts there keeps the
+    first context's groups, so the context is chosen from the raw ClientHello
+    before the connection's TLS object is created.
+    """
+
+    __slots__ = ("default", "overrides", "needs_server_name", "on_handshake")
+
+    def __init__(self, default, overrides=(), on_handshake=None):
+        """
+        Initializes the TLSPolicies.
+
+        Args:
+            default (TLSPolicy): Policy of connections no override matches.
+            overrides (iterable): ``TLSPolicy`` objects, matched in order.
+            on_handshake (callable, optional): Called with the policy name, negotiated group and
+                handshake CPU seconds of each completed handshake.
+        """
+        self.default = default
+        self.overrides = tuple(overrides)
+        self.needs_server_name = any(policy.server_names for policy in self.overrides)
+        self.on_handshake = on_handshake
+
+    @classmethod
+    def from_config(cls, config, create_context, on_handshake=None):
+        """
+        Creates the policies from the ``tls.policy`` configuration section.
+
+        Args:
+            config (TLSPolicyConfig): The policy settings.
+            create_context (callable): Returns a new server context with the certificate loaded.
+            on_handshake (callable, optional): Handshake telemetry callback.
+        """
+        load_providers(config.get("providers", ()))
+        groups = config.get("groups", ())
+        signature_algorithms = config.get("signature_algorithms", ())
+        default = TLSPolicy("default", create_context(), groups, signature_algorithms)
+        overrides = [
+            TLSPolicy(
+                override.name,
+                create_context(),
+                override.groups or groups,
+                override.signature_algorithms or signature_algorithms,
+                server_names=override.server_names,
+                client_networks=override.client_networks
+            )
+            for override in config.get("overrides", ())
+        ]
+        return cls(default, overrides, on_handshake=on_handshake)
+
+    def select(self, server_name=None, client_address=None):
+        """
+        Returns the policy for a connection.
+
+        Args:
+            server_name (str, optional): The ClientHello's server name.
+            client_address (tuple, optional): The client's ``(host, port)``.
+        """
+        for policy in self.overrides:
+            if policy.matches(server_name, client_address):
+                return policy
+        return self.default
+
+    def contexts(self):
+        """
+        Returns the TLS contexts of all policies.
+        """
+        return [self.default.context] + [policy.context for policy in self.overrides]
+
+    def handshake_completed(self, policy, ssl_object, cpu_ns):
+        """
+        Reports a completed handshake.
+
+        Args:
+            policy (TLSPolicy): The policy the connection was handled with.
+            ssl_object (ssl.SSLObject or ssl.SSLSocket): The connection.
+            cpu_ns (int): Proxy CPU time spent in the handshake, in nanoseconds.
+
+        Returns:
+            dict: Trace attributes describing the handshake.
+        """
+        group = negotiated_group(ssl_object) or "unknown"
+        if self.on_handshake is not None:
+            self.on_handshake(policy.name, group, cpu_ns / 1e9)
+        return {"tls.policy": policy.name, "tls.group": group, "tls.handshake_cpu_us": cpu_ns // 1000}
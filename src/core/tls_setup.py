@@ -1,50 +1,52 @@
 import os
 from services.tls_service import TLSService
-from config.config_loader import load_config
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-DEFAULT_CONFIG = {
-    'tls': {
-        'cert_file': 'config/tls/cert.pem',
-        'key_file': 'config/tls/key.pem',
-        'ca_file': None,
-        'use_hybrid': False,
-        'check_interval': 60
-    },
-    'quantum': {
-        'key_name': None,
-        'kms_aes_key_name': None
-    }
-}
-
-def setup_tls_service():
+def setup_tls_service(config, encapsulation_pool=None):
     """
     Sets up the TLS service with the appropriate configuration.
 
+    Args:
+        config (Config): The validated configuration; defaults are applied by the schema.
+        encapsulation_pool (EncapsulationPool, optional): Pregenerated Kyber encapsulations for hybrid operations.
+
     Returns:
         TLSService: An instance of the TLSService configured with the specified parameters.
     """
     try:
-        # Load configuration with fallback to default values
-        config = load_config() or {}
-        tls_config = config.get('tls', DEFAULT_CONFIG['tls'])
-        quantum_config = config.get('quantum', DEFAULT_CONFIG['quantum'])
+        tls_config = config.tls
+        quantum_config = config.quantum
 
         # Validate required TLS parameters
-        cert_file = tls_config.get('cert_file')
-        key_file = tls_config.get('key_file')
+        cert_file = tls_config.cert_file
+        key_file = tls_config.key_file
         if not os.path.isfile(cert_file) or not os.path.isfile(key_file):
             logger.error(f"Missing or invalid TLS certificate/key file: cert_file={cert_file}, key_file={key_file}")
             raise FileNotFoundError("TLS certificate or key file is not found or accessible.")
 
-        # Extract parameters with fallbacks
-        ca_file = tls_config.get('ca_file', DEFAULT_CONFIG['tls']['ca_file'])
-        use_hybrid = tls_config.get('use_hybrid', DEFAULT_CONFIG['tls']['use_hybrid'])
-        check_interval = tls_config.get('check_interval', DEFAULT_CONFIG['tls']['check_interval'])
-        key_name = quantum_config.get('key_name', DEFAULT_CONFIG['quantum']['key_name'])
-        kms_aes_key_name = quantum_config.get('kms_aes_key_name', DEFAULT_CONFIG['quantum']['kms_aes_key_name'])
+        ca_file = tls_config.ca_file
+        use_hybrid = tls_config.use_hybrid
+        check_interval = tls_config.check_interval
+        key_name = quantum_config.key_name
+        kms_aes_key_name = quantum_config.kms_aes_key_name
+
+        # Serve KMS key pairs from the local bundle on restarts and scale-out;
+        # the task scheduler refreshes it before it expires
+        bundle_config = quantum_config.key_bundle
+        if use_hybrid and bundle_config.enabled:
+            from crypto.key_bundle import KeyBundle
+            from crypto.key_management import fetch_key_pair, set_key_bundle
+            key_bundle = KeyBundle(
+                bundle_config.path,
+                bundle_config.key_file,
+                ttl=bundle_config.ttl,
+                refresh_margin=bundle_config.refresh_margin,
+                fetch=fetch_key_pair
+            )
+            key_bundle.load()
+            set_key_bundle(key_bundle)
 
         # Log the configuration being used (do not log sensitive data)
         logger.info(f"Setting up TLS service with cert_file: {cert_file}, key_file: {key_file}, "
@@ -58,7 +60,8 @@ def setup_tls_service():
             use_hybrid=use_hybrid,
             check_interval=check_interval,
             key_name=key_name,
-            kms_aes_key_name=kms_aes_key_name
+            kms_aes_key_name=kms_aes_key_name,
+            encapsulation_pool=encapsulation_pool
         )
 
         logger.info("TLS service setup completed successfully.")
@@ -71,16 +74,33 @@ def setup_tls_service():
         logger.error(f"Failed to set up TLS service: {e}", exc_info=True)
         raise
 
-def get_tls_context():
+def create_tls_context(cert_file, key_file, ca_file=None):
+    """
+    Creates a server-side TLS context directly from certificate files.
+
+    Args:
+        cert_file (str): Path to the TLS certificate file.
+        key_file (str): Path to the private key file.
+        ca_file (str, optional): Path to the CA certificate file.
+
+    Returns:
+        ssl.SSLContext: The configured TLS context.
+    """
+    return TLSService(cert_file=cert_file, key_file=key_file, ca_file=ca_file).get_tls_context()
+
+def get_tls_context(config):
     """
     Gets the TLS context from the configured TLS service.
 
+    Args:
+        config (Config): The validated configuration.
+
     Returns:
         ssl.SSLContext: The configured TLS context.
     """
     try:
         # Set up the TLS service
-        tls_service = setup_tls_service()
+        tls_service = setup_tls_service(config)
 
         # Retrieve the TLS context
         tls_context = tls_service.get_tls_context()
@@ -91,14 +111,17 @@ def get_tls_context():
         logger.error(f"Error getting TLS context: {e}", exc_info=True)
         raise
 
-def dynamic_reload_config():
+def dynamic_reload_config(config):
     """
     Dynamically reloads the TLS configuration.
     Useful for situations where configuration changes need to be applied without restarting the service.
+
+    Args:
+        config (Config): The newly loaded configuration, e.g. from ``ConfigReloader``.
     """
     try:
         logger.info("Attempting to dynamically reload TLS configuration.")
-        tls_service = setup_tls_service()
+        tls_service = setup_tls_service(config)
         logger.info("TLS configuration dynamically reloaded successfully.")
         return tls_service
     except Exception as e:
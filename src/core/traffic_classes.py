@@ -0,0 +1,477 @@
+import os
+import time
+import fnmatch
+from collections import deque
+from utils.logger import get_logger
+from middleware.bandwidth_shaper import TokenBucket
+
+logger = get_logger(__name__)
+
+# Settings copied onto a class that keeps its name across a reload
+_SETTINGS = ("weight", "priority", "max_connections", "max_queue_wait", "listen", "ports", "server_names",
+             "client_networks", "client_identities")
+
+def parse_listen_address(address):
+    """
+    Splits a ``host:port`` listen address (``[::]:8443`` for IPv6) into its host and port.
+
+    Raises:
+        ValueError: If the address has no valid port.
+    """
+    host, separator, port = address.rpartition(":")
+    if not separator or not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"invalid listen address {address!r}")
+    return host.strip("[]") or "0.0.0.0", int(port)
+
+def _identities(peer_certificate):
+    # The subject common names and the DNS and URI subject alternative names of a verified certificate
+    names = [value for rdn in peer_certificate.get("subject", ()) for key, value in rdn if key == "commonName"]
+    names.extend(value for kind, value in peer_certificate.get("subjectAltName", ()) if kind in ("DNS", "URI"))
+    return names
+
+class TrafficClass:
+    """
+    A class of connections with its own share, limits and shedding priority.
+    """
+
+    __slots__ = ("name", "weight", "priority", "max_connections", "max_queue_wait", "listen", "ports", "server_names",
+                 "client_networks", "client_identities", "connections", "queue", "queued", "last_tag", "bucket",
+                 "flows")
+
+    def __init__(self, name, weight=1.0, priority=0, max_connections=None, max_queue_wait=None, listen=(),
+                 server_names=(), client_networks=(), client_identities=()):
+        """
+        Initializes the TrafficClass.
+
+        Args:
+            name (str): Name reported in metrics and logs.
+            weight (float): Share of handshake slots and forwarding bandwidth relative to the other classes.
+            priority (int): Shedding order under overload; classes with a lower priority are shed first.
+            max_connections (int, optional): Connections of the class at most, handshaking or established.
+            max_queue_wait (float, optional): Seconds a connection may wait for a handshake slot before it is shed.
+            listen (iterable): ``host:port`` addresses; connections accepted on them belong to the class.
+            server_names (iterable): Server names (``*.example.com`` matches subdomains) of the class.
+            client_networks (iterable): Client CIDRs of the class.
+            client_identities (iterable): ``fnmatch`` patterns for the common name or DNS/URI alternative
+                names of verified client certificates; matched once the handshake has completed.
+        """
+        self.name = name
+        self.connections = 0
+        self.queue = deque()
+        self.queued = 0
+        self.last_tag = 0.0
+        self.bucket = None
+        self.flows = 0
+        self.configure(weight, priority, max_connections, max_queue_wait, listen, server_names, client_networks,
+                       client_identities)
+
+    def configure(self, weight=1.0, priority=0, max_connections=None, max_queue_wait=None, listen=(),
+                  server_names=(), client_networks=(), client_identities=()):
+        """
+        Applies new settings; connections already in the class stay in it.
+        """
+        self.weight = float(weight)
+        self.priority = priority
+        self.max_connections = max_connections
+        self.max_queue_wait = max_queue_wait
+        self.listen = tuple(parse_listen_address(address) for address in listen)
+        self.ports = frozenset(port for _, port in self.listen)
+        self.server_names = tuple(server_name.lower() for server_name in server_names)
+        self.client_networks = ()
+        if client_networks:
+            import ipaddress
+            self.client_networks = tuple(ipaddress.ip_network(network, strict=False) for network in client_networks)
+        self.client_identities = tuple(client_identities)
+
+    def matches(self, local_address, server_name, client_address):
+        """
+        Returns whether a connection belongs to the class before its handshake; any criterion set may match.
+        """
+        if self.ports and local_address and local_address[1] in self.ports:
+            return True
+        if server_name and self.server_names:
+            for pattern in self.server_names:
+                if server_name == pattern or (pattern.startswith("*.") and server_name.endswith(pattern[1:])):
+                    return True
+        if self.client_networks and client_address:
+            import ipaddress
+            try:
+                address = ipaddress.ip_address(client_address[0])
+            except (TypeError, ValueError):
+                return False
+            return any(address in network for network in self.client_networks)
+        return False
+
+    def matches_identity(self, peer_certificate):
+        """
+        Returns whether a verified client certificate names an identity of the class.
+        """
+        if not self.client_identities or not peer_certificate:
+            return False
+        return any(fnmatch.fnmatchcase(name, pattern) for name in _identities(peer_certificate)
+                   for pattern in self.client_identities)
+
+class Admission:
+    """
+    A connection's place in its traffic class, from acceptance until it closes.
+
+    Tracks whether the connection waits for, holds or has finished with a
+    handshake slot, so every exit path gives back exactly what it took.
+    """
+
+    __slots__ = ("scheduler", "traffic_class", "state", "tag", "queued_at", "on_grant", "on_shed")
+
+    def __init__(self, scheduler, traffic_class):
+        self.scheduler = scheduler
+        self.traffic_class = traffic_class
+        self.state = "admitted"
+        self.tag = 0.0
+        self.queued_at = 0.0
+        self.on_grant = None
+        self.on_shed = None
+
+    def request_handshake(self, on_grant, on_shed):
+        """
+        Asks for a handshake slot.
+
+        Args:
+            on_grant (callable): Called without arguments once a queued connection gets its slot.
+            on_shed (callable): Called with the reason when the connection is shed instead; the caller closes it.
+
+        Returns:
+            bool: True if the handshake may start now, False if the connection was queued or shed.
+        """
+        return self.scheduler._request(self, on_grant, on_shed)
+
+    def handshake_finished(self):
+        """
+        Gives the handshake slot back, or leaves the queue, once the handshake is over either way.
+        """
+        if self.state == "handshaking":
+            self.state = "established"
+            self.scheduler._release_slot()
+        elif self.state == "queued":
+            self.state = "established"
+            self.scheduler._withdraw(self)
+
+    def identify(self, ssl_object):
+        """
+        Moves the connection to the first class naming its client certificate's identity.
+
+        Args:
+            ssl_object: The SSLObject or SSLSocket of the completed handshake.
+
+        Returns:
+            bool: False if that class is at its connection limit and the connection must be closed.
+        """
+        if not self.scheduler.needs_identity:
+            return True
+        return self.scheduler._identify(self, ssl_object.getpeercert())
+
+    def close(self):
+        """
+        Releases everything the connection holds in its class.
+        """
+        if self.state == "closed":
+            return
+        self.handshake_finished()
+        self.state = "closed"
+        self.traffic_class.connections -= 1
+
+class _ClassFlow:
+    """
+    Charges forwarded bytes to the traffic class bucket and, when shaping is enabled, the connection's shaped flow.
+    """
+
+    __slots__ = ("scheduler", "traffic_class", "inner")
+
+    def __init__(self, scheduler, traffic_class, inner):
+        self.scheduler = scheduler
+        self.traffic_class = traffic_class
+        self.inner = inner
+
+    def consume(self, size):
+        delay = self.traffic_class.bucket.consume(size, time.monotonic())
+        if self.inner is not None:
+            delay = max(delay, self.inner.consume(size))
+        return delay
+
+    def close(self):
+        if self.traffic_class is not None:
+            self.traffic_class.flows -= 1
+            if self.traffic_class.flows == 0:
+                self.scheduler._rebalance()
+            self.traffic_class = None
+        if self.inner is not None:
+            self.inner.close()
+
+class TrafficClasses:
+    """
+    Assigns connections to traffic classes and shares the proxy between them.
+
+    Before the handshake, a connection belongs to the first class matching
+    the address it was accepted on, its ClientHello's server name or its
+    client network, and otherwise to the default class; after the handshake
+    a class naming its client certificate's identity takes it over.
+
+    Handshakes are the expensive part of a connection, so they run in a
+    bounded number of slots. Connections waiting for a slot pause reading
+    (their bytes stay in the kernel) and are granted slots by weighted fair
+    queueing: each waiter gets a virtual finish tag ``1 / weight`` after its
+    class's previous one, and the smallest tag goes next, so a flooded class
+    cannot delay another beyond its weighted share. When the queue is full,
+    the newest waiter of the lowest-priority class is shed; waiters older
+    than their class's ``max_queue_wait`` are shed when they reach the head
+    rather than handshaking clients that have likely given up. With a
+    forwarding rate, established connections of each class share a byte
+    bucket whose rate is the class's weighted share among classes with
+    open connections.
+    """
+
+    def __init__(self, classes, default, handshake_slots=None, max_queued=1024, forward_rate=None, forward_burst=None,
+                 on_shed=None, on_queue_wait=None):
+        """
+        Initializes the TrafficClasses.
+
+        Args:
+            classes (iterable): ``TrafficClass`` objects, matched in order.
+            default (str): Name of the class of connections no class matches.
+            handshake_slots (int, optional): Handshakes in progress at most; defaults to 16 per CPU.
+            max_queued (int): Connections waiting for a handshake slot at most, across all classes.
+            forward_rate (float, optional): Bytes per second forwarded across all classes; unshared when None.
+            forward_burst (float, optional): Burst size of each class bucket in bytes.
+            on_shed (callable, optional): Called with the class name and reason of each shed connection.
+            on_queue_wait (callable, optional): Called with the class name and seconds waited of each granted slot.
+        """
+        self.classes = {}
+        self.order = ()
+        self.retired = []
+        self.default = None
+        self.busy = 0
+        self.queued = 0
+        self.virtual_time = 0.0
+        self.on_shed = on_shed
+        self.on_queue_wait = on_queue_wait
+        self.reconfigure(classes, default, handshake_slots, max_queued, forward_rate, forward_burst)
+
+    @classmethod
+    def from_config(cls, config, on_shed=None, on_queue_wait=None):
+        """
+        Creates the traffic classes from the ``traffic`` configuration section.
+        """
+        return cls(cls.classes_from_config(config), config.default_class, handshake_slots=config.handshake_slots,
+                   max_queued=config.max_queued, forward_rate=config.forward_rate, forward_burst=config.forward_burst,
+                   on_shed=on_shed, on_queue_wait=on_queue_wait)
+
+    @staticmethod
+    def classes_from_config(config):
+        """
+        Builds the classes listed in a ``traffic`` configuration section.
+        """
+        return [TrafficClass(item.name, item.weight, item.priority, item.max_connections, item.max_queue_wait,
+                             item.listen, item.server_names, item.client_networks, item.client_identities)
+                for item in config.classes]
+
+    def reconfigure(self, classes, default, handshake_slots=None, max_queued=1024, forward_rate=None,
+                    forward_burst=None):
+        """
+        Applies new classes and limits.
+
+        Classes keeping their name keep their connections, queue and bucket;
+        connections of removed classes finish in them, and those still
+        waiting for a handshake slot are served with their old weight.
+        """
+        previous = self.classes
+        self.classes = {}
+        for traffic_class in classes:
+            current = previous.get(traffic_class.name)
+            if current is not None:
+                for name in _SETTINGS:
+                    setattr(current, name, getattr(traffic_class, name))
+                traffic_class = current
+            self.classes[traffic_class.name] = traffic_class
+        self.order = tuple(self.classes.values())
+        self.retired = [traffic_class for traffic_class in list(previous.values()) + self.retired
+                        if traffic_class.name not in self.classes and traffic_class.queued > 0]
+        self.default = self.classes[default]
+        self.slots = handshake_slots or 16 * (os.cpu_count() or 1)
+        self.max_queued = max_queued
+        self.forward_rate = forward_rate
+        self.forward_burst = forward_burst
+        self.needs_server_name = any(traffic_class.server_names for traffic_class in self.order)
+        self.needs_identity = any(traffic_class.client_identities for traffic_class in self.order)
+        self._rebalance()
+        self._dispatch()
+        logger.info(f"Traffic classes: {', '.join(f'{c.name} (weight {c.weight:g})' for c in self.order)}; "
+                    f"{self.slots} handshake slot(s).")
+
+    def listen_addresses(self):
+        """
+        Returns the ``(host, port)`` addresses the classes listen on besides the proxy's own.
+        """
+        return [address for traffic_class in self.order for address in traffic_class.listen]
+
+    def classify(self, local_address, server_name=None, client_address=None):
+        """
+        Returns the class of a connection before its handshake.
+
+        Args:
+            local_address (tuple): The ``(host, port)`` the connection was accepted on.
+            server_name (str, optional): The ClientHello's server name.
+            client_address (tuple, optional): The client's ``(host, port)``.
+        """
+        for traffic_class in self.order:
+            if traffic_class.matches(local_address, server_name, client_address):
+                return traffic_class
+        return self.default
+
+    def admit(self, local_address, server_name=None, client_address=None):
+        """
+        Assigns a new connection to its class.
+
+        Returns:
+            Admission: The connection's admission, or None if its class is at its connection limit.
+        """
+        traffic_class = self.classify(local_address, server_name, client_address)
+        if traffic_class.max_connections is not None and traffic_class.connections >= traffic_class.max_connections:
+            self._shed(traffic_class, "connection_limit")
+            return None
+        traffic_class.connections += 1
+        return Admission(self, traffic_class)
+
+    def open_flow(self, traffic_class, inner=None):
+        """
+        Returns the flow forwarded bytes of an established connection are charged to.
+
+        Args:
+            traffic_class (TrafficClass): The connection's class.
+            inner (ShapedFlow, optional): The connection's flow in the bandwidth shaper.
+        """
+        if self.forward_rate is None:
+            return inner
+        traffic_class.flows += 1
+        if traffic_class.flows == 1:
+            self._rebalance()
+        return _ClassFlow(self, traffic_class, inner)
+
+    def _rebalance(self):
+        if self.forward_rate is None:
+            return
+        # Work-conserving: the rate is split among the classes that have connections to forward for
+        total = sum(traffic_class.weight for traffic_class in self.order if traffic_class.flows > 0)
+        for traffic_class in self.order:
+            share = total if traffic_class.flows > 0 else total + traffic_class.weight
+            fresh = TokenBucket(self.forward_rate * traffic_class.weight / share, self.forward_burst)
+            if traffic_class.bucket is None:
+                traffic_class.bucket = fresh
+            else:
+                traffic_class.bucket.rate, traffic_class.bucket.burst = fresh.rate, fresh.burst
+                traffic_class.bucket.tokens = min(traffic_class.bucket.tokens, fresh.burst)
+
+    def _shed(self, traffic_class, reason):
+        logger.debug(f"Shedding a {traffic_class.name} connection: {reason}")
+        if self.on_shed is not None:
+            self.on_shed(traffic_class.name, reason)
+
+    def _request(self, admission, on_grant, on_shed):
+        if self.busy < self.slots and not self.queued:
+            self.busy += 1
+            admission.state = "handshaking"
+            return True
+        traffic_class = admission.traffic_class
+        if self.queued >= self.max_queued:
+            victim = self._lowest_priority_waiter()
+            if victim is None or victim.traffic_class.priority >= traffic_class.priority:
+                admission.state = "shed"
+                self._shed(traffic_class, "queue_full")
+                on_shed("queue_full")
+                return False
+            on_victim_shed = victim.on_shed
+            self._withdraw(victim)
+            victim.state = "shed"
+            self._shed(victim.traffic_class, "queue_full")
+            on_victim_shed("queue_full")
+        # Self-clocked fair queueing: tags advance by 1/weight within a class and never start behind the
+        # tag last served, so an idle class gets no credit for the time it was idle
+        admission.tag = max(self.virtual_time, traffic_class.last_tag) + 1.0 / traffic_class.weight
+        traffic_class.last_tag = admission.tag
+        admission.queued_at = time.monotonic()
+        admission.on_grant = on_grant
+        admission.on_shed = on_shed
+        admission.state = "queued"
+        traffic_class.queue.append(admission)
+        traffic_class.queued += 1
+        self.queued += 1
+        return False
+
+    def _waiting_classes(self):
+        if self.retired:
+            self.retired = [traffic_class for traffic_class in self.retired if traffic_class.queued > 0]
+            return [traffic_class for traffic_class in self.order if traffic_class.queued > 0] + self.retired
+        return [traffic_class for traffic_class in self.order if traffic_class.queued > 0]
+
+    def _lowest_priority_waiter(self):
+        waiting = self._waiting_classes()
+        if not waiting:
+            return None
+        traffic_class = min(waiting, key=lambda candidate: candidate.priority)
+        # Withdrawn waiters are dropped lazily; the newest live one is shed
+        while traffic_class.queue[-1].state != "queued":
+            traffic_class.queue.pop()
+        return traffic_class.queue[-1]
+
+    def _withdraw(self, admission):
+        # The entry stays in the deque until it reaches an end; only the counts change here
+        admission.on_grant = admission.on_shed = None
+        admission.traffic_class.queued -= 1
+        self.queued -= 1
+
+    def _release_slot(self):
+        self.busy -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self.busy < self.slots and self.queued:
+            head = None
+            for traffic_class in self._waiting_classes():
+                queue = traffic_class.queue
+                while queue and queue[0].state != "queued":
+                    queue.popleft()
+                if queue and (head is None or queue[0].tag < head.tag):
+                    head = queue[0]
+            if head is None:
+                break
+            traffic_class = head.traffic_class
+            traffic_class.queue.popleft()
+            on_grant, on_shed = head.on_grant, head.on_shed
+            self._withdraw(head)
+            self.virtual_time = head.tag
+            waited = now - head.queued_at
+            if traffic_class.max_queue_wait is not None and waited > traffic_class.max_queue_wait:
+                head.state = "shed"
+                self._shed(traffic_class, "queue_timeout")
+                on_shed("queue_timeout")
+                continue
+            self.busy += 1
+            head.state = "handshaking"
+            if self.on_queue_wait is not None:
+                self.on_queue_wait(traffic_class.name, waited)
+            on_grant()
+
+    def _identify(self, admission, peer_certificate):
+        current = admission.traffic_class
+        for traffic_class in self.order:
+            if traffic_class.matches_identity(peer_certificate):
+                break
+        else:
+            return True
+        if traffic_class is current:
+            return True
+        if traffic_class.max_connections is not None and traffic_class.connections >= traffic_class.max_connections:
+            self._shed(traffic_class, "connection_limit")
+            return False
+        current.connections -= 1
+        traffic_class.connections += 1
+        admission.traffic_class = traffic_class
+        return True
@@ -0,0 +1,172 @@
+import time
+import threading
+from collections import deque
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class EncapsulationPool:
+    """
+    Keeps a bounded pool of pregenerated Kyber encapsulations against one public key.
+
+    ``QuantumEncryptionService.encrypt_aes_key_with_kyber`` encapsulates
+    against the long-term public key from KMS on every call; the pool moves
+    that work to producer threads, which aim for a depth covering
+    ``refill_horizon`` seconds of the observed consumption rate. Each
+    ``(ciphertext, shared_secret)`` pair is handed out exactly once, and
+    callers fall back to inline encapsulation when the pool is empty.
+
+    The producers start on the first ``acquire``, which also names the public
+    key; material made for a previous key is never handed out.
+    """
+
+    def __init__(self, algorithm="Kyber768", capacity=64, min_depth=4, refill_horizon=1.0, workers=1,
+                 encapsulate=None, on_depth=None, on_starvation=None):
+        """
+        Initializes the EncapsulationPool.
+
+        Args:
+            algorithm (str): The liboqs KEM algorithm name.
+            capacity (int): Maximum number of pooled encapsulations.
+            min_depth (int): Depth kept even when nothing is consumed.
+            refill_horizon (float): Seconds of observed consumption the pool tries to hold.
+            workers (int): Number of producer threads.
+            encapsulate (callable, optional): Takes a public key and returns ``(ciphertext, shared_secret)``;
+                liboqs is used when omitted.
+            on_depth (callable, optional): Called with the pool depth after each change by a producer.
+            on_starvation (callable, optional): Called without arguments when a caller had to encapsulate inline.
+        """
+        self.algorithm = algorithm
+        self.capacity = capacity
+        self.min_depth = min(min_depth, capacity)
+        self.refill_horizon = refill_horizon
+        self.workers = workers
+        self.encapsulate = encapsulate or self._encapsulate
+        self.on_depth = on_depth
+        self.on_starvation = on_starvation
+        self.starvations = 0
+
+        # (public_key, ciphertext, shared_secret); the key travels with the material, so an
+        # item made just before a key change is recognised and dropped instead of misused
+        self._items = deque(maxlen=capacity)
+        self._public_key = None
+        self._lock = threading.Lock()
+        self._consumed = 0
+        self._rate = 0.0
+        self._rate_updated = time.monotonic()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._threads = []
+
+    @classmethod
+    def from_config(cls, pool_config, on_depth=None, on_starvation=None):
+        """
+        Creates the pool from the validated ``quantum.encapsulation_pool`` section.
+        """
+        return cls(
+            capacity=pool_config.capacity,
+            min_depth=pool_config.min_depth,
+            refill_horizon=pool_config.refill_horizon,
+            workers=pool_config.workers,
+            on_depth=on_depth,
+            on_starvation=on_starvation
+        )
+
+    def _encapsulate(self, public_key):
+        import oqs
+        with oqs.KeyEncapsulation(self.algorithm) as kem:
+            return kem.encap_secret(public_key)
+
+    def _start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._produce, name=f"kem-pool-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Kyber encapsulation pool started with {self.workers} producer(s), capacity {self.capacity}.")
+
+    def close(self):
+        """
+        Stops the producer threads and drops the pooled material.
+        """
+        self._running = False
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._items.clear()
+
+    def _target_depth(self):
+        """
+        Returns the depth the producers aim for, based on the smoothed consumption rate.
+        """
+        now = time.monotonic()
+        elapsed = now - self._rate_updated
+        if elapsed >= 0.1:
+            consumed, self._consumed = self._consumed, 0
+            # Exponentially weighted moving average of encapsulations consumed per second
+            self._rate = 0.7 * self._rate + 0.3 * (consumed / elapsed)
+            self._rate_updated = now
+        target = int(self._rate * self.refill_horizon) + 1
+        return max(self.min_depth, min(self.capacity, target))
+
+    def _produce(self):
+        while self._running:
+            with self._lock:
+                target = self._target_depth()
+            public_key = self._public_key
+            if public_key is None or len(self._items) >= target:
+                # Re-evaluate periodically so the target decays when consumption stops
+                self._wakeup.wait(timeout=0.5)
+                self._wakeup.clear()
+                continue
+            try:
+                ciphertext, shared_secret = self.encapsulate(public_key)
+            except Exception as e:
+                logger.error(f"Kyber encapsulation pool producer failed: {e}", exc_info=True)
+                self._wakeup.wait(timeout=1.0)
+                self._wakeup.clear()
+                continue
+            with self._lock:
+                if public_key is self._public_key:
+                    self._items.append((public_key, ciphertext, shared_secret))
+            if self.on_depth is not None:
+                self.on_depth(len(self._items))
+
+    def acquire(self, public_key):
+        """
+        Returns a ``(ciphertext, shared_secret)`` encapsulation against ``public_key``.
+
+        Pooled material is used only when it was made for the same public key;
+        otherwise the pool is retargeted and the encapsulation is done inline.
+        """
+        if not self._running:
+            self._start()
+        self._consumed += 1
+        current = self._public_key
+        if current is not public_key and current != public_key:
+            with self._lock:
+                self._public_key = public_key
+                self._items.clear()
+        else:
+            public_key = current
+        try:
+            item_key, ciphertext, shared_secret = self._items.popleft()
+        except IndexError:
+            item_key = None
+        self._wakeup.set()
+        if item_key is public_key:
+            return ciphertext, shared_secret
+        self.starvations += 1
+        if self.on_starvation is not None:
+            self.on_starvation()
+        return self.encapsulate(public_key)
+
+    def depth(self):
+        """
+        Returns the current number of pooled encapsulations.
+        """
+        return len(self._items)
@@ -0,0 +1,261 @@
+import os
+import json
+import mmap
+import time
+import base64
+import struct
+import threading
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MAGIC = b"QSKB"
+FORMAT_VERSION = 1
+# Magic, format version and header length, followed by the JSON header
+_PREFIX = struct.Struct("!4sBI")
+_NONCE_SIZE = 12
+# Nonce plus a 256-bit data key and its GCM tag
+_WRAPPED_KEY_SIZE = _NONCE_SIZE + 32 + 16
+
+def _entry_name(key_name, kms_aes_key_name):
+    return f"{key_name}|{kms_aes_key_name}"
+
+class KeyBundle:
+    """
+    Envelope-encrypted on-disk cache of the key pairs decrypted from KMS.
+
+    The bundle file holds a JSON header (format version, bundle version and
+    expiry), a random data key wrapped with AES-256-GCM under the local key
+    file, and the PEM key pairs encrypted with AES-256-GCM under the data key.
+    Both ciphertexts authenticate the header, so a modified, truncated or
+    expired bundle is rejected and the keys are fetched from KMS instead.
+
+    A process that finds a valid bundle serves key pairs without calling KMS.
+    ``refresh_if_due()``, run periodically by the task scheduler, fetches them
+    again before the bundle expires and rewrites the file atomically.
+    """
+
+    def __init__(self, path, key_file, ttl=3600, refresh_margin=0.2, fetch=None):
+        """
+        Initializes the KeyBundle.
+
+        Args:
+            path (str): Path of the bundle file.
+            key_file (str): File holding the 32-byte key that wraps the bundle's data key; created if missing.
+            ttl (float): Seconds a written bundle stays valid.
+            refresh_margin (float): Fraction of ``ttl`` before expiry from which ``refresh_if_due()`` refreshes.
+            fetch (callable, optional): Takes ``(key_name, kms_aes_key_name)`` and returns
+                ``(public_pem, private_pem)`` from KMS; required for refreshes.
+        """
+        self.path = path
+        self.key_file = key_file
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.fetch = fetch
+        self.version = 0
+        self.expires_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _key_encryption_key(self, create=False):
+        """
+        Returns the key that wraps the data key, creating the key file when ``create`` is set.
+        """
+        try:
+            with open(self.key_file, "rb") as f:
+                key = f.read()
+        except FileNotFoundError:
+            if not create:
+                raise
+            os.makedirs(os.path.dirname(os.path.abspath(self.key_file)), exist_ok=True)
+            key = AESGCM.generate_key(bit_length=256)
+            try:
+                fd = os.open(self.key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                # Another process sharing the bundle created it first
+                return self._key_encryption_key()
+            with os.fdopen(fd, "wb") as f:
+                f.write(key)
+            logger.info(f"Created key bundle key file {self.key_file}")
+        if len(key) != 32:
+            raise ValueError(f"Key bundle key file {self.key_file} must hold exactly 32 bytes")
+        return key
+
+    def load(self):
+        """
+        Reads and validates the bundle file.
+
+        Returns:
+            bool: True if the bundle was valid and its key pairs are now served from memory.
+        """
+        try:
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                header, entries = self._decode(data, self._key_encryption_key())
+        except FileNotFoundError as e:
+            # The bundle or its key file
+            logger.info(f"No key bundle ({e.filename} does not exist); key pairs will be fetched from KMS.")
+            return False
+        except (OSError, ValueError, KeyError, InvalidTag) as e:
+            # InvalidTag carries no message
+            logger.warning(f"Ignoring key bundle {self.path}: {str(e) or 'authentication failed'}")
+            return False
+        with self._lock:
+            self._entries = entries
+            self.version = header["version"]
+            self.expires_at = header["expires_at"]
+        logger.info(f"Loaded key bundle {self.path} version {self.version} with {len(entries)} key pair(s), "
+                    f"valid for {self.expires_at - time.time():.0f}s.")
+        return True
+
+    @staticmethod
+    def _decode(data, key_encryption_key):
+        if len(data) < _PREFIX.size:
+            raise ValueError("truncated bundle")
+        magic, format_version, header_length = _PREFIX.unpack(data[:_PREFIX.size])
+        if magic != MAGIC:
+            raise ValueError("not a key bundle")
+        if format_version != FORMAT_VERSION:
+            raise ValueError(f"unsupported bundle format version {format_version}")
+        header_end = _PREFIX.size + header_length
+        if len(data) < header_end + _WRAPPED_KEY_SIZE + _NONCE_SIZE:
+            raise ValueError("truncated bundle")
+        header = json.loads(data[_PREFIX.size:header_end])
+        # Checked before decrypting; a forged expiry fails authentication below
+        if header["expires_at"] <= time.time():
+            raise ValueError(f"bundle version {header['version']} has expired")
+
+        associated_data = data[:header_end]
+        wrapped_key = data[header_end:header_end + _WRAPPED_KEY_SIZE]
+        data_key = AESGCM(key_encryption_key).decrypt(wrapped_key[:_NONCE_SIZE], wrapped_key[_NONCE_SIZE:],
+                                                      associated_data)
+        payload = data[header_end + _WRAPPED_KEY_SIZE:]
+        plaintext = AESGCM(data_key).decrypt(payload[:_NONCE_SIZE], payload[_NONCE_SIZE:], associated_data)
+        entries = {
+            name: (base64.b64decode(entry["public_key"]), base64.b64decode(entry["private_key"]))
+            for name, entry in json.loads(plaintext).items()
+        }
+        return header, entries
+
+    def _encode(self, entries, version, expires_at):
+        header = json.dumps({"version": version, "created_at": time.time(), "expires_at": expires_at}).encode()
+        prefix = _PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)) + header
+        payload = json.dumps({
+            name: {"public_key": base64.b64encode(public_pem).decode(),
+                   "private_key": base64.b64encode(private_pem).decode()}
+            for name, (public_pem, private_pem) in entries.items()
+        }).encode()
+
+        # A fresh data key per write; only the wrapping key lives outside the file
+        data_key = AESGCM.generate_key(bit_length=256)
+        key_nonce = os.urandom(_NONCE_SIZE)
+        payload_nonce = os.urandom(_NONCE_SIZE)
+        wrapped_key = AESGCM(self._key_encryption_key(create=True)).encrypt(key_nonce, data_key, prefix)
+        return b"".join((prefix, key_nonce, wrapped_key,
+                         payload_nonce, AESGCM(data_key).encrypt(payload_nonce, payload, prefix)))
+
+    def _write(self, entries, version, expires_at):
+        """
+        Writes the bundle to a temporary file and renames it over the previous one.
+        """
+        data = self._encode(entries, version, expires_at)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Unique per process so replicas sharing the path never write the same temporary file
+        candidate = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(candidate, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(candidate, self.path)
+        except OSError:
+            if os.path.exists(candidate):
+                os.unlink(candidate)
+            raise
+
+    def get(self, key_name, kms_aes_key_name):
+        """
+        Returns the cached key pair, or None if it is not cached or the bundle has expired.
+
+        Returns:
+            tuple: ``(public_pem, private_pem)`` or None.
+        """
+        entry = self._entries.get(_entry_name(key_name, kms_aes_key_name))
+        if entry is None or self.expires_at <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key_name, kms_aes_key_name, public_pem, private_pem):
+        """
+        Caches a key pair fetched from KMS and persists the bundle.
+
+        A failed write is logged; the key pair is still served from memory.
+        """
+        with self._lock:
+            entries = dict(self._entries)
+            entries[_entry_name(key_name, kms_aes_key_name)] = (public_pem, private_pem)
+            # A new entry does not extend the expiry of the ones already cached
+            expires_at = self.expires_at if self.expires_at > time.time() else time.time() + self.ttl
+            self._store(entries, expires_at)
+
+    def _store(self, entries, expires_at):
+        version = self.version + 1
+        try:
+            self._write(entries, version, expires_at)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to write key bundle {self.path}: {e}")
+        self._entries = entries
+        self.version = version
+        self.expires_at = expires_at
+
+    def refresh(self):
+        """
+        Fetches every cached key pair from KMS again and rewrites the bundle with a new expiry.
+
+        Returns:
+            bool: True if the bundle was refreshed.
+        """
+        names = list(self._entries)
+        try:
+            entries = {}
+            for name in names:
+                key_name, _, kms_aes_key_name = name.partition("|")
+                entries[name] = self.fetch(key_name, kms_aes_key_name)
+        except Exception as e:
+            logger.error(f"Failed to refresh key bundle {self.path}: {e}", exc_info=True)
+            return False
+        with self._lock:
+            # Keep key pairs added while the refresh was fetching
+            merged = dict(self._entries)
+            merged.update(entries)
+            self._store(merged, time.time() + self.ttl)
+        logger.info(f"Refreshed key bundle {self.path} to version {self.version}.")
+        return True
+
+    def refresh_due(self, now=None):
+        """
+        Returns whether the cached key pairs are within ``refresh_margin`` of expiring.
+        """
+        now = time.time() if now is None else now
+        return bool(self._entries) and now >= self.expires_at - self.ttl * self.refresh_margin
+
+    def refresh_if_due(self):
+        """
+        Refreshes the bundle when it is due, unless another process sharing the file already has.
+
+        Returns:
+            bool: True if this call fetched the key pairs from KMS.
+        """
+        if self.fetch is None or not self.refresh_due():
+            return False
+        # Replicas sharing the bundle take turns under the scheduler's lock;
+        # the one running after a refresh finds the new file and stops here
+        if os.path.exists(self.path) and self.load() and not self.refresh_due():
+            return False
+        return self.refresh()
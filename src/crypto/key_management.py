@@ -1,20 +1,82 @@
 import json
+import base64
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
-from google.cloud import kms_v1
-from google.api_core import exceptions
 from utils.logger import get_logger
+from monitoring.tracing import get_tracer
 
 logger = get_logger(__name__)
 
-# Initialize Google KMS client
-kms_client = kms_v1.KeyManagementServiceClient()
+# Google KMS client, created on first use so importing this module stays cheap
+_kms_client = None
+
+# Optional on-disk cache of decrypted key pairs, see set_key_bundle()
+_key_bundle = None
+
+# Nonce length of AES-256-GCM encrypted key data
+GCM_NONCE_SIZE = 12
+
+def get_kms_client():
+    """
+    Returns the Google KMS client, importing the SDK and constructing the client on first use.
+    
+    Returns:
+        KeyManagementServiceClient: The shared KMS client.
+    """
+    global _kms_client
+    if _kms_client is None:
+        from google.cloud import kms_v1
+        _kms_client = kms_v1.KeyManagementServiceClient()
+    return _kms_client
+
+def set_kms_client(client):
+    """
+    Replaces the shared KMS client, e.g. with a fake for local benchmarks.
+    
+    Args:
+        client: An object exposing a ``decrypt(request=...)`` method.
+    """
+    global _kms_client
+    _kms_client = client
+
+def set_key_bundle(bundle):
+    """
+    Serves key pairs from a local KeyBundle, fetching from KMS only on a miss.
+    
+    Args:
+        bundle (KeyBundle): The bundle, or None to always fetch from KMS.
+    """
+    global _key_bundle
+    _key_bundle = bundle
+
+def get_key_bundle():
+    """
+    Returns the KeyBundle key pairs are served from, or None if none is set.
+    """
+    return _key_bundle
+
+def _kms_api_errors():
+    """
+    Returns the Google API exception types to catch around KMS calls.
+    
+    The SDK is only imported once an error actually occurs; without it
+    installed (e.g. with a substituted client) nothing extra is caught.
+    """
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        return ()
+    return (exceptions.GoogleAPIError,)
 
 def load_key_pair_from_kms(key_name, kms_aes_key_name, password=None):
     """
     Loads and decrypts a quantum key pair (public and private keys) stored in KMS.
     
+    With a key bundle set, a cached key pair is used without calling KMS and
+    a fetched one is added to the bundle.
+    
     Args:
         key_name (str): The KMS key resource name where the encrypted key data is stored.
         kms_aes_key_name (str): The KMS key resource name used to decrypt the AES key.
@@ -24,21 +86,15 @@ def load_key_pair_from_kms(key_name, kms_aes_key_name, password=None):
         tuple: A tuple containing the loaded public and private key objects.
     """
     try:
-        # Step 1: Retrieve the encrypted key data from KMS
-        encrypted_key_data = _retrieve_key_data_from_kms(key_name)
-
-        # Step 2: Decrypt the AES key using KMS
-        encrypted_aes_key = encrypted_key_data["encrypted_aes_key"]
-        aes_key = _retrieve_aes_key_from_kms(encrypted_aes_key, kms_aes_key_name)
-
-        # Step 3: Decrypt the key pair using the decrypted AES key
-        encrypted_public_key = encrypted_key_data["encrypted_public_key"]
-        encrypted_private_key = encrypted_key_data["encrypted_private_key"]
-
-        decrypted_public_key_data = _decrypt_data_with_aes(encrypted_public_key, aes_key)
-        decrypted_private_key_data = _decrypt_data_with_aes(encrypted_private_key, aes_key)
+        bundle = _key_bundle
+        pems = bundle.get(key_name, kms_aes_key_name) if bundle is not None else None
+        if pems is None:
+            pems = fetch_key_pair(key_name, kms_aes_key_name)
+            if bundle is not None:
+                bundle.put(key_name, kms_aes_key_name, *pems)
+        decrypted_public_key_data, decrypted_private_key_data = pems
 
-        # Step 4: Load the decrypted public and private keys
+        # Load the decrypted public and private keys
         public_key = load_pem_public_key(decrypted_public_key_data)
         private_key = load_pem_private_key(decrypted_private_key_data, password=password)
 
@@ -49,6 +105,37 @@ def load_key_pair_from_kms(key_name, kms_aes_key_name, password=None):
         logger.error(f"Failed to load key pair from KMS. Error: {e}", exc_info=True)
         raise
 
+def fetch_key_pair(key_name, kms_aes_key_name):
+    """
+    Retrieves the encrypted key pair from KMS and decrypts it.
+    
+    Args:
+        key_name (str): The KMS key resource name where the encrypted key data is stored.
+        kms_aes_key_name (str): The KMS key resource name used to decrypt the AES key.
+    
+    Returns:
+        tuple: The PEM-encoded public and private key.
+    """
+    # Step 1: Retrieve the encrypted key data from KMS
+    encrypted_key_data = _retrieve_key_data_from_kms(key_name)
+
+    # Step 2: Decrypt the AES key using KMS
+    encrypted_aes_key = _as_bytes(encrypted_key_data["encrypted_aes_key"])
+    aes_key = _retrieve_aes_key_from_kms(encrypted_aes_key, kms_aes_key_name)
+
+    # Step 3: Decrypt the key pair using the decrypted AES key
+    cipher = encrypted_key_data.get("cipher", "aes-256-cbc")
+    encrypted_public_key = _as_bytes(encrypted_key_data["encrypted_public_key"])
+    encrypted_private_key = _as_bytes(encrypted_key_data["encrypted_private_key"])
+    return (_decrypt_data_with_aes(encrypted_public_key, aes_key, cipher),
+            _decrypt_data_with_aes(encrypted_private_key, aes_key, cipher))
+
+def _as_bytes(value):
+    """
+    Returns key data fields as bytes; JSON carries them base64-encoded.
+    """
+    return base64.b64decode(value) if isinstance(value, str) else value
+
 def _retrieve_key_data_from_kms(key_name):
     """
     Retrieves the encrypted key data from KMS.
@@ -61,12 +148,13 @@ def _retrieve_key_data_from_kms(key_name):
     """
     try:
         # Retrieve the encrypted key data from KMS
-        response = kms_client.decrypt(request={"name": key_name, "ciphertext": b""})
+        with get_tracer().start_span("kms.decrypt", attributes={"kms.key": key_name}):
+            response = get_kms_client().decrypt(request={"name": key_name, "ciphertext": b""})
         # Decode the response data as JSON
         key_data = json.loads(response.plaintext)
         logger.info(f"Key data retrieved successfully from KMS key: {key_name}")
         return key_data
-    except exceptions.GoogleAPIError as e:
+    except _kms_api_errors() as e:
         logger.error(f"Failed to retrieve key data from KMS key: {key_name}. Error: {e}", exc_info=True)
         raise
 
@@ -83,26 +171,41 @@ def _retrieve_aes_key_from_kms(encrypted_aes_key, kms_key_name):
     """
     try:
         # Use the KMS client to decrypt the AES key
-        response = kms_client.decrypt(request={"name": kms_key_name, "ciphertext": encrypted_aes_key})
+        with get_tracer().start_span("kms.decrypt", attributes={"kms.key": kms_key_name}):
+            response = get_kms_client().decrypt(request={"name": kms_key_name, "ciphertext": encrypted_aes_key})
         aes_key = response.plaintext
         logger.info(f"AES key decrypted successfully using KMS key: {kms_key_name}")
         return aes_key
-    except exceptions.GoogleAPIError as e:
+    except _kms_api_errors() as e:
         logger.error(f"Failed to decrypt AES key using KMS key: {kms_key_name}. Error: {e}", exc_info=True)
         raise
 
-def _decrypt_data_with_aes(encrypted_data, aes_key):
+def _decrypt_data_with_aes(encrypted_data, aes_key, cipher="aes-256-cbc"):
     """
     Decrypts data using the provided AES key.
     
+    ``aes-256-gcm`` data is a 12-byte nonce followed by the ciphertext and
+    tag, and fails with ``InvalidTag`` if it was modified. ``aes-256-cbc``
+    data is a 16-byte IV followed by the ciphertext and is not authenticated;
+    it is accepted for key data written before the switch to GCM.
+    
     Args:
         encrypted_data (bytes): The data to decrypt.
         aes_key (bytes): The AES key used for decryption.
+        cipher (str): ``aes-256-gcm`` or ``aes-256-cbc``.
     
     Returns:
         bytes: The decrypted data.
     """
     try:
+        if cipher == "aes-256-gcm":
+            decrypted_data = AESGCM(aes_key).decrypt(encrypted_data[:GCM_NONCE_SIZE], encrypted_data[GCM_NONCE_SIZE:],
+                                                     None)
+            logger.info("Data decrypted and authenticated successfully with AES-GCM.")
+            return decrypted_data
+        if cipher != "aes-256-cbc":
+            raise ValueError(f"Unsupported key data cipher: {cipher}")
+
         iv = encrypted_data[:16]  # Extract the initialization vector (IV)
         actual_encrypted_data = encrypted_data[16:]  # The rest is the encrypted data
 
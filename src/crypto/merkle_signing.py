@@ -0,0 +1,328 @@
+import time
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+HASH_SIZE = 32
+# Prefixed to the signed root so a batch root signature is never valid as a plain message signature
+ROOT_CONTEXT = b"quantum-safe-tls-proxy merkle batch v1\x00"
+
+def leaf_hash(message):
+    return hashlib.sha256(b"\x00" + message).digest()
+
+def node_hash(left, right):
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+def root_payload(tree_size, root):
+    """
+    Returns the bytes the batch signature covers.
+    """
+    return ROOT_CONTEXT + struct.pack(">I", tree_size) + root
+
+def build_tree(leaves):
+    """
+    Builds the Merkle tree levels over the given leaf hashes.
+
+    The tree is the one of RFC 9162 (Certificate Transparency): a node
+    without a sibling is promoted to the next level unchanged, and leaves
+    and interior nodes are hashed with different prefixes.
+
+    Returns:
+        list: The levels from the leaves up to the one-element root level.
+    """
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+def inclusion_path(levels, index):
+    """
+    Returns the sibling hashes from leaf ``index`` up to the root.
+    """
+    path = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            path.append(level[sibling])
+        index >>= 1
+    return path
+
+def root_from_path(leaf, index, tree_size, path):
+    """
+    Recomputes the root from a leaf hash and its inclusion path (RFC 9162, 2.1.3.2).
+
+    Returns:
+        bytes: The root, or None if the path does not fit ``index`` and ``tree_size``.
+    """
+    if index >= tree_size:
+        return None
+    node, last = index, tree_size - 1
+    result = leaf
+    for sibling in path:
+        if last == 0:
+            return None
+        if node & 1 or node == last:
+            result = node_hash(sibling, result)
+            while not node & 1 and node:
+                node >>= 1
+                last >>= 1
+        else:
+            result = node_hash(result, sibling)
+        node >>= 1
+        last >>= 1
+    return result if last == 0 else None
+
+class InclusionProof:
+    """
+    Proves that a message is leaf ``index`` of a batch of ``tree_size`` messages.
+    """
+
+    __slots__ = ("index", "tree_size", "path")
+
+    def __init__(self, index, tree_size, path):
+        self.index = index
+        self.tree_size = tree_size
+        self.path = path
+
+    def to_bytes(self):
+        return struct.pack(">IIB", self.index, self.tree_size, len(self.path)) + b"".join(self.path)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Raises:
+            ValueError: If the data is not an encoded proof.
+        """
+        if len(data) < 9:
+            raise ValueError("truncated inclusion proof")
+        index, tree_size, count = struct.unpack_from(">IIB", data)
+        if len(data) != 9 + count * HASH_SIZE:
+            raise ValueError("inclusion proof length does not match its path")
+        return cls(index, tree_size, [data[9 + i * HASH_SIZE:9 + (i + 1) * HASH_SIZE] for i in range(count)])
+
+class SignedRoot:
+    """
+    The root of one batch and its post-quantum signature, shared by every message in the batch.
+    """
+
+    __slots__ = ("tree_size", "root", "signature")
+
+    def __init__(self, tree_size, root, signature):
+        self.tree_size = tree_size
+        self.root = root
+        self.signature = signature
+
+    def to_bytes(self):
+        return struct.pack(">I", self.tree_size) + self.root + self.signature
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) <= 4 + HASH_SIZE:
+            raise ValueError("truncated signed root")
+        return cls(struct.unpack_from(">I", data)[0], data[4:4 + HASH_SIZE], data[4 + HASH_SIZE:])
+
+class BatchSignature:
+    """
+    What the batch signer returns per message: its inclusion proof and the batch's signed root.
+    """
+
+    __slots__ = ("proof", "signed_root")
+
+    def __init__(self, proof, signed_root):
+        self.proof = proof
+        self.signed_root = signed_root
+
+class MerkleBatchSigner:
+    """
+    Signs many messages with one post-quantum signature.
+
+    Messages submitted within ``max_delay`` seconds of the first one, up to
+    ``max_batch`` of them, become the leaves of a Merkle tree whose root is
+    signed once. Each message gets an inclusion proof of ``32 * ceil(log2(n))``
+    bytes plus the shared signed root, so a batch of n messages costs one
+    Dilithium signature instead of n. Batches are cut and signed on a
+    background thread; ``sign_batch`` signs a caller's own batch directly.
+    """
+
+    def __init__(self, sign_root, max_batch=256, max_delay=0.05):
+        """
+        Initializes the MerkleBatchSigner.
+
+        Args:
+            sign_root (callable): Takes the root payload (bytes) and returns its signature,
+                or None on failure, e.g. ``QuantumEncryptionService.sign_message_with_dilithium``
+                bound to a key.
+            max_batch (int): Messages per batch at most.
+            max_delay (float): Seconds the first message of a batch waits for more.
+        """
+        self.sign_root = sign_root
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._first_pending = None
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the background thread cutting batches.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="merkle-batch-signer", daemon=True)
+        self._thread.start()
+        logger.info(f"Merkle batch signer started (up to {self.max_batch} messages per {self.max_delay}s).")
+
+    def stop(self):
+        """
+        Signs the pending messages and stops the background thread.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, message):
+        """
+        Queues a message for the next batch.
+
+        Args:
+            message (bytes): The message to sign.
+
+        Returns:
+            concurrent.futures.Future: Resolves to a BatchSignature, or None if signing the root failed.
+                Async callers can await it with ``asyncio.wrap_future``.
+        """
+        future = Future()
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("The Merkle batch signer is not running")
+            if not self._pending:
+                self._first_pending = time.monotonic()
+            self._pending.append((message, future))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._condition.notify()
+        return future
+
+    def sign(self, message, timeout=None):
+        """
+        Submits a message and waits for its BatchSignature (None if signing failed).
+        """
+        return self.submit(message).result(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                deadline = self._first_pending + self.max_delay
+                while self._running and len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                self._first_pending = time.monotonic() if self._pending else None
+            futures = [future for _, future in batch]
+            try:
+                results = self.sign_batch([message for message, _ in batch])
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def sign_batch(self, messages):
+        """
+        Signs a batch of messages with one root signature.
+
+        Args:
+            messages (list): The messages (bytes), at most 2**32 - 1 of them.
+
+        Returns:
+            list: A BatchSignature per message in order, or Nones if signing the root failed.
+        """
+        if not messages:
+            return []
+        levels = build_tree([leaf_hash(message) for message in messages])
+        root = levels[-1][0]
+        signature = self.sign_root(root_payload(len(messages), root))
+        if signature is None:
+            logger.error(f"Failed to sign the root of a batch of {len(messages)} message(s).")
+            return [None] * len(messages)
+        signed_root = SignedRoot(len(messages), root, signature)
+        return [BatchSignature(InclusionProof(index, len(messages), inclusion_path(levels, index)), signed_root)
+                for index in range(len(messages))]
+
+class MerkleBatchVerifier:
+    """
+    Verifies messages signed by a MerkleBatchSigner.
+
+    A message is valid if its inclusion proof leads to a root carrying a
+    valid signature. Verified roots are cached, so the post-quantum
+    signature of a batch is checked once and the other messages of the batch
+    cost only ``log2(n)`` hashes; once its root is cached, a message verifies
+    without the signed root at all.
+    """
+
+    def __init__(self, verify_root, cache_size=1024):
+        """
+        Initializes the MerkleBatchVerifier.
+
+        Args:
+            verify_root (callable): Takes the root payload and a signature and returns whether it
+                is valid, e.g. ``QuantumEncryptionService.verify_dilithium_signature`` bound to a key.
+            cache_size (int): Verified roots kept, least recently used first out.
+        """
+        self.verify_root = verify_root
+        self.cache_size = cache_size
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
+
+    def verify(self, message, proof, signed_root=None):
+        """
+        Checks a message against its inclusion proof and the batch's signed root.
+
+        Args:
+            message (bytes): The message.
+            proof (InclusionProof): The message's inclusion proof.
+            signed_root (SignedRoot, optional): The batch's signed root; only needed while
+                the root is not cached.
+
+        Returns:
+            bool: True if the message was signed.
+        """
+        root = root_from_path(leaf_hash(message), proof.index, proof.tree_size, proof.path)
+        if root is None:
+            return False
+        key = (proof.tree_size, root)
+        with self._lock:
+            if key in self._verified:
+                self._verified.move_to_end(key)
+                return True
+        if signed_root is None or signed_root.tree_size != proof.tree_size or signed_root.root != root:
+            return False
+        if not self.verify_root(root_payload(signed_root.tree_size, root), signed_root.signature):
+            return False
+        with self._lock:
+            self._verified[key] = True
+            if len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return True
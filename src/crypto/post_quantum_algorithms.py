@@ -1,11 +1,18 @@
 import oqs
-from key_management import load_key_pair_from_kms
+from crypto.key_management import load_key_pair_from_kms
 from utils.logger import get_logger
 
 # Initialize custom logger
 logger = get_logger(__name__)
 
 class QuantumEncryptionService:
+    def __init__(self, encapsulation_pool=None):
+        """
+        Initialize the quantum encryption service.
+        :param encapsulation_pool: Optional EncapsulationPool supplying pregenerated Kyber encapsulations.
+        """
+        self.encapsulation_pool = encapsulation_pool
+
     def encrypt_aes_key_with_kyber(self, aes_key, key_name, kms_aes_key_name):
         """
         Encrypt the AES key using a quantum-safe Kyber public key.
@@ -21,15 +28,18 @@ class QuantumEncryptionService:
             if not public_key:
                 raise ValueError("Failed to retrieve Kyber public key.")
 
-            # Use Kyber to encapsulate the secret (AES key)
-            with oqs.KeyEncapsulation('Kyber768') as kem:
-                # Perform the quantum-safe key encapsulation using the public key
-                ciphertext, shared_secret = kem.encap_secret(public_key)
-                # Encrypt the AES key using the shared secret from the Kyber encapsulation
-                encrypted_aes_key = bytes(a ^ b for a, b in zip(aes_key, shared_secret))
+            # Use Kyber to encapsulate the secret (AES key), preferring pregenerated material
+            if self.encapsulation_pool is not None:
+                ciphertext, shared_secret = self.encapsulation_pool.acquire(public_key)
+            else:
+                with oqs.KeyEncapsulation('Kyber768') as kem:
+                    # Perform the quantum-safe key encapsulation using the public key
+                    ciphertext, shared_secret = kem.encap_secret(public_key)
+            # Encrypt the AES key using the shared secret from the Kyber encapsulation
+            encrypted_aes_key = bytes(a ^ b for a, b in zip(aes_key, shared_secret))
 
-                logger.info("AES key successfully encrypted using quantum-safe Kyber public key.")
-                return ciphertext, encrypted_aes_key
+            logger.info("AES key successfully encrypted using quantum-safe Kyber public key.")
+            return ciphertext, encrypted_aes_key
         except Exception as e:
             logger.error(f"Error encrypting AES key with Kyber: {str(e)}", exc_info=True)
             return None, None
@@ -108,3 +118,37 @@ class QuantumEncryptionService:
         except Exception as e:
             logger.error(f"Error verifying Dilithium signature: {str(e)}", exc_info=True)
             return False
+
+    # Batched signing: one Dilithium signature per Merkle tree of messages
+
+    def create_batch_signer(self, key_name, kms_aes_key_name, max_batch=256, max_delay=0.05):
+        """
+        Create a signer that covers batches of messages with one Dilithium signature over their Merkle root.
+        :param key_name: The KMS key resource name for retrieving the Dilithium private key.
+        :param kms_aes_key_name: The KMS key resource name used to decrypt the AES key.
+        :param max_batch: Messages per batch at most.
+        :param max_delay: Seconds the first message of a batch waits for more.
+        :return: A started MerkleBatchSigner; stop it to sign the pending messages.
+        """
+        from crypto.merkle_signing import MerkleBatchSigner
+        signer = MerkleBatchSigner(
+            lambda payload: self.sign_message_with_dilithium(payload, key_name, kms_aes_key_name),
+            max_batch=max_batch,
+            max_delay=max_delay
+        )
+        signer.start()
+        return signer
+
+    def create_batch_verifier(self, key_name, kms_aes_key_name, cache_size=1024):
+        """
+        Create a verifier for messages signed by a batch signer, caching the verified roots.
+        :param key_name: The KMS key resource name for retrieving the Dilithium public key.
+        :param kms_aes_key_name: The KMS key resource name used to decrypt the AES key.
+        :param cache_size: Number of verified roots kept.
+        :return: A MerkleBatchVerifier.
+        """
+        from crypto.merkle_signing import MerkleBatchVerifier
+        return MerkleBatchVerifier(
+            lambda payload, signature: self.verify_dilithium_signature(payload, signature, key_name, kms_aes_key_name),
+            cache_size=cache_size
+        )
@@ -1,118 +1,566 @@
 import os
+import time
+import signal
 import logging
-import yaml
 import asyncio
 from utils.logger import setup_logging
-from core.proxy_handler import QuantumSafeProxy
-from core.tls_setup import TLSSetup
-from crypto.key_management import KeyManager
-from crypto.post_quantum_algorithms import QuantumAlgorithmHandler
-from middleware.auth_handler import AuthHandler
-from middleware.rate_limiter import RateLimiter
-from monitoring.metrics import start_metrics_server, increment_request_counter, \
-                               increment_rate_limited_counter, increment_error_counter, \
-                               observe_request_latency, set_active_connections
-from monitoring.health_check import HealthCheck
-from services.backend_service import BackendService
-from services.certificate_manager import CertificateManager
-from services.tls_service import TLSService
-from workers.async_worker import AsyncWorker
 from utils.error_handler import handle_exception
-from tls_communication import get_tls_certificates_from_service
+from config.config_loader import ConfigReloader, load_config
 
-# Load configuration
-def load_config():
-    env = os.getenv("APP_ENV", "dev")
-    config_file = f"config/env/{env}/config.yaml"
-    with open(config_file, "r") as file:
-        config = yaml.safe_load(file)
-    return config
+# Optional subsystems (KMS, liboqs, aiohttp, prometheus_client, jwt, cryptography)
+# are imported inside the functions below once the configuration enables them,
+# keeping interpreter start-up short for autoscaled cold starts.
 
 def initialize_services(config):
-    # Retrieve public and internal service URLs from the environment variables
-    public_service_url = os.getenv("PUBLIC_API_URL")
-    internal_service_url = os.getenv("INTERNAL_API_URL")
+    from core.tls_setup import setup_tls_service
+    from middleware.rate_limiter import RateLimiter
+    from monitoring.health_check import HealthCheck
+    from services.backend_service import BackendService
+
+    # Public and internal service URLs come from the configuration (PUBLIC_API_URL / INTERNAL_API_URL)
+    public_service_url = config.public_backend.url
+    internal_service_url = config.internal_backend.url
 
     if not public_service_url or not internal_service_url:
-        raise ValueError("Both PUBLIC_API_URL and INTERNAL_API_URL must be set in environment variables")
+        raise ValueError("Both public_backend.url and internal_backend.url must be configured")
 
     # Initialize backend service communication for public and internal services
-    public_backend_service = BackendService(public_service_url)
-    internal_backend_service = BackendService(internal_service_url)
+    public_backend_service = BackendService(public_service_url,
+                                            max_body_size=config.public_backend.max_body_size,
+                                            chunk_size=config.public_backend.chunk_size)
+    internal_backend_service = BackendService(internal_service_url,
+                                              max_body_size=config.internal_backend.max_body_size,
+                                              chunk_size=config.internal_backend.chunk_size)
 
-    # Retrieve TLS certificates from the TLS Communication Service
-    try:
-        tls_cert_response = get_tls_certificates_from_service(os.getenv("TLS_COMMUNICATION_SERVICE_URL"))
-        cert_file_content = tls_cert_response["cert_file"]
-        key_file_content = tls_cert_response["key_file"]
-        ca_file_content = tls_cert_response.get("ca_file")
-
-        # Initialize TLS setup with retrieved certificates
-        tls_setup = TLSSetup(
-            cert_file=cert_file_content,
-            key_file=key_file_content,
-            ca_file=ca_file_content
-        )
-        tls_setup.configure_tls()
+    # Certificates pushed by the TLS communication service are cached on disk,
+    # so only a first start waits for the service
+    cert_subscriber = create_cert_subscriber(config)
 
-    except Exception as e:
-        logging.error(f"Failed to initialize TLS setup: {e}")
-        raise
+    # Hybrid-mode Kyber encapsulations are made ahead of time when the pool is enabled
+    encapsulation_pool = create_encapsulation_pool(config)
 
     # Initialize TLS service for managing certificate lifecycle
-    tls_service = TLSService(tls_setup)
+    tls_service = setup_tls_service(config, encapsulation_pool=encapsulation_pool)
 
     # Initialize certificate manager
-    cert_manager = CertificateManager(config)
+    cert_manager = None
+    if config.renewal.enable_auto_renewal:
+        from services.certificate_manager import CertificateManager
+        cert_manager = CertificateManager(
+            cert_file=config.tls.cert_file,
+            key_file=config.tls.key_file,
+            ca_file=config.tls.ca_file,
+            renewal_threshold_days=config.renewal.renewal_threshold_days,
+            certbot_path=config.renewal.certbot_path
+        )
 
-    # Initialize post-quantum algorithms
-    quantum_handler = QuantumAlgorithmHandler()
+    # Initialize post-quantum algorithms only in hybrid mode
+    quantum_handler = None
+    if config.tls.use_hybrid:
+        from crypto.post_quantum_algorithms import QuantumEncryptionService
+        quantum_handler = QuantumEncryptionService(encapsulation_pool=encapsulation_pool)
 
     # Initialize middleware
-    auth_handler = AuthHandler(config["auth"])
-    rate_limiter = RateLimiter(config["rate_limiter"])
+    auth_handler = None
+    if config.auth.enable:
+        from middleware.auth_handler import AuthHandler
+        auth_handler = AuthHandler(config.auth.token_secret, config.auth.algorithm)
+    rate_limiter = RateLimiter(rate_limit=config.rate_limiter.max_requests_per_minute, per_seconds=60)
 
     # Initialize health checks
     health_check = HealthCheck()
 
-    return (tls_setup, public_backend_service, internal_backend_service, tls_service,
+    return (cert_subscriber, public_backend_service, internal_backend_service, tls_service,
             cert_manager, quantum_handler, auth_handler,
             rate_limiter, health_check)
 
-async def wait_for_tls_updates(tls_setup):
+def create_encapsulation_pool(config):
     """
-    Listens for incoming connections from the TLS Communication Service
-    and dynamically updates the TLS configuration.
+    Creates the Kyber encapsulation pool when hybrid mode and the pool are enabled.
     """
-    try:
-        # This is where the server listens for incoming connections
-        # You could use any preferred method to establish this connection
-        # For now, this is a placeholder for listening and processing the incoming updates
-        logging.info("Waiting for incoming TLS certificate updates...")
-        while True:
-            # Simulate waiting for an update; replace with actual listening logic
-            await asyncio.sleep(60)  # Periodically check for updates
-            # If an update is received, you could update the TLS configuration like this:
-            tls_setup.configure_tls()
-            logging.info("TLS configuration updated successfully.")
-    except Exception as e:
-        logging.error(f"Error while waiting for TLS updates: {e}")
+    pool_config = config.quantum.encapsulation_pool
+    if not (config.tls.use_hybrid and pool_config.enabled):
+        return None
+    from crypto.kem_pool import EncapsulationPool
+    on_depth = on_starvation = None
+    if config.monitoring.metrics_port:
+        from monitoring.metrics import increment_kem_pool_starvation, set_kem_pool_depth
+        on_depth, on_starvation = set_kem_pool_depth, increment_kem_pool_starvation
+    return EncapsulationPool.from_config(pool_config, on_depth=on_depth, on_starvation=on_starvation)
 
-async def start_proxy(config, tls_setup, public_backend_service, internal_backend_service):
+def create_cert_subscriber(config):
     """
-    Starts the QuantumSafeProxy and listens for incoming TLS updates.
+    Creates the certificate subscriber when a TLS communication service is configured.
+
+    Cached certificates from an earlier run are served as they are; without
+    them the current certificates are fetched once before start-up continues.
     """
-    proxy = QuantumSafeProxy(
-        host=config["proxy"]["host"],
-        port=config["proxy"]["port"]
+    tls_config = config.tls
+    distribution = tls_config.distribution
+    if not distribution.url:
+        return None
+    from services.cert_distribution import CertificateSubscriber
+    on_propagation = None
+    if config.monitoring.metrics_port:
+        from monitoring.metrics import observe_cert_propagation
+        on_propagation = observe_cert_propagation
+    subscriber = CertificateSubscriber.from_config(tls_config, on_propagation=on_propagation)
+    if not subscriber.restore():
+        try:
+            subscriber.fetch_snapshot(distribution.startup_timeout)
+        except (OSError, ValueError, KeyError) as e:
+            if not (os.path.isfile(tls_config.cert_file) and os.path.isfile(tls_config.key_file)):
+                raise
+            logging.warning(f"TLS communication service unavailable ({e}); "
+                            f"starting with the certificate files on disk.")
+    return subscriber
+
+def create_shaper(bandwidth_config):
+    """
+    Creates the bandwidth shaper when shaping is enabled.
+    """
+    if not bandwidth_config.enabled:
+        return None
+    from middleware.bandwidth_shaper import BandwidthShaper
+    from monitoring.metrics import observe_throttle_delay
+    return BandwidthShaper.from_config(bandwidth_config, on_throttle=observe_throttle_delay)
+
+def create_hello_filter(config):
+    """
+    Creates the ClientHello fingerprint filter when it is enabled.
+    """
+    filter_config = config.client_hello_filter
+    if not filter_config.enabled:
+        return None
+    from middleware.fingerprint_filter import FingerprintFilter
+    on_reject = None
+    if config.monitoring.metrics_port:
+        from monitoring.metrics import increment_client_hello_rejection
+        on_reject = increment_client_hello_rejection
+    return FingerprintFilter.from_config(filter_config, on_reject=on_reject)
+
+def create_traffic_classes(config):
+    """
+    Creates the traffic classes when they are enabled.
+    """
+    traffic_config = config.traffic
+    if not traffic_config.enabled:
+        return None
+    from core.traffic_classes import TrafficClasses
+    on_shed = on_queue_wait = None
+    if config.monitoring.metrics_port:
+        from monitoring.metrics import increment_traffic_shed, observe_handshake_queue_wait
+        on_shed, on_queue_wait = increment_traffic_shed, observe_handshake_queue_wait
+    return TrafficClasses.from_config(traffic_config, on_shed=on_shed, on_queue_wait=on_queue_wait)
+
+def create_tls_policies(config):
+    """
+    Creates the TLS policies when providers, groups, overrides or handshake metrics are configured.
+
+    Handshake metrics read the negotiated group through ctypes bindings that
+    depend on CPython's ssl object layout, so they are opt-in.
+    """
+    tls_config = config.tls
+    policy_config = tls_config.policy
+    if not (policy_config.providers or policy_config.groups or policy_config.signature_algorithms
+            or policy_config.overrides or policy_config.handshake_metrics):
+        return None
+    from core.tls_policy import TLSPolicies
+    from core.tls_setup import create_tls_context
+    on_handshake = None
+    if policy_config.handshake_metrics and config.monitoring.metrics_port:
+        from monitoring.metrics import observe_tls_handshake
+        on_handshake = observe_tls_handshake
+    return TLSPolicies.from_config(
+        policy_config,
+        lambda: create_tls_context(tls_config.cert_file, tls_config.key_file, tls_config.ca_file),
+        on_handshake=on_handshake
+    )
+
+def create_revocation_checker(config):
+    """
+    Creates the client certificate revocation checker when revocation checking is enabled.
+    """
+    revocation_config = config.tls.revocation
+    if not revocation_config.enabled:
+        return None
+    from core.revocation import RevocationChecker
+    on_check = None
+    if config.monitoring.metrics_port:
+        from monitoring.metrics import observe_revocation_check
+        on_check = observe_revocation_check
+    return RevocationChecker(fail_closed=revocation_config.fail_closed, grace=revocation_config.grace,
+                             on_check=on_check)
+
+def create_scheduler(config, cert_manager=None, on_renewed=None, rotate_ticket_keys=None, revocation=None,
+                     on_stapled=None):
+    """
+    Creates the task scheduler with the background tasks the configuration enables.
+
+    Args:
+        config (Config): The validated configuration.
+        cert_manager (CertificateManager, optional): Renews the proxy's certificate when no inventory is configured.
+        on_renewed (callable, optional): Called after certificates were renewed, to load them.
+        rotate_ticket_keys (callable, optional): Coroutine function replacing the TLS contexts, and with
+            them the session ticket keys; the task is only scheduled when given.
+        revocation (RevocationChecker, optional): Receives the revocation indexes built from the CRLs.
+        on_stapled (callable, optional): Called after a new OCSP response was written to
+            ``tls.revocation.ocsp_staple_file``; the task is only scheduled when given.
+    """
+    from workers.scheduler import TaskScheduler, trigger_from_config
+
+    scheduler_config = config.scheduler
+    on_run = None
+    if config.monitoring.metrics_port:
+        from monitoring.metrics import observe_task_run
+        on_run = observe_task_run
+    scheduler = TaskScheduler.from_config(scheduler_config, on_run=on_run)
+
+    def add(name, func, default_interval, **options):
+        task_config = getattr(scheduler_config, name)
+        if task_config.enabled:
+            scheduler.add(name, func, trigger_from_config(task_config, default_interval),
+                          timeout=task_config.timeout, **options)
+
+    renewal_config = config.renewal
+    if renewal_config.enable_auto_renewal:
+        inventory = None
+        if renewal_config.inventory_paths:
+            from services.certificate_manager import CertificateInventory
+            inventory = CertificateInventory(
+                renewal_config.inventory_paths,
+                renewal_threshold_days=renewal_config.renewal_threshold_days,
+                max_concurrent_renewals=renewal_config.max_concurrent_renewals,
+                certbot_path=renewal_config.certbot_path
+            )
+
+        def schedule_next_renewal():
+            # The inventory knows when the next certificate becomes due (or a failed renewal is retried),
+            # so cert_renewal runs then; its own trigger only bounds the time between runs
+            seconds = inventory.seconds_until_next_due()
+            if seconds is not None and "cert_renewal" in scheduler.tasks:
+                scheduler.run_at("cert_renewal", time.time() + seconds)
+
+        if inventory is not None:
+            async def scan_inventory():
+                # Files are parsed in the thread pool but the inventory is updated on the loop, next to renew_due
+                await inventory.refresh()
+                schedule_next_renewal()
+
+            add("cert_inventory_scan", scan_inventory, renewal_config.renewal_check_interval, run_at_start=True)
+
+        async def renew_certificates():
+            if inventory is not None:
+                try:
+                    renewed, failed = await inventory.renew_due()
+                finally:
+                    schedule_next_renewal()
+                if failed:
+                    logging.error(f"{failed} certificate renewal(s) failed.")
+            else:
+                loop = asyncio.get_running_loop()
+                if await loop.run_in_executor(None, cert_manager.validate_certificate):
+                    return
+                renewed = await cert_manager.renew_certificate_async()
+                if not renewed:
+                    logging.error("Certificate renewal failed.")
+            if renewed and on_renewed is not None:
+                on_renewed()
+
+        # Certbot must not renew the same certificates from several workers at once
+        add("cert_renewal", renew_certificates, renewal_config.renewal_check_interval, lock=True)
+
+    if config.tls.use_hybrid and config.quantum.key_bundle.enabled:
+        from crypto.key_management import get_key_bundle
+        key_bundle = get_key_bundle()
+        if key_bundle is not None:
+            # KMS calls block; the lock lets one replica sharing the bundle refresh it for all
+            add("key_bundle_refresh", key_bundle.refresh_if_due, 60, lock=True)
+
+    if rotate_ticket_keys is not None:
+        add("ticket_key_rotation", rotate_ticket_keys, 3600)
+
+    revocation_config = config.tls.revocation
+    if revocation is not None:
+        from services.revocation_service import CRLUpdater
+        on_update = None
+        if config.monitoring.metrics_port:
+            from monitoring.metrics import set_revoked_serials
+            on_update = set_revoked_serials
+        crl_updater = CRLUpdater.from_config(revocation, config.tls, on_update=on_update)
+        # Parsing a large CRL blocks, so fetching and indexing run in the thread pool
+        add("crl_refresh", crl_updater.refresh, 300, run_at_start=True)
+
+    if revocation_config.ocsp_staple_file and on_stapled is not None:
+        from services.revocation_service import OCSPStapleCache
+        staple_cache = OCSPStapleCache(config.tls.cert_file, revocation_config.ocsp_staple_file,
+                                       ca_file=config.tls.ca_file, responder_url=revocation_config.ocsp_responder_url,
+                                       timeout=revocation_config.fetch_timeout)
+        staple_cache.load()
+        staple_cache.add_listener(on_stapled)
+        # Replicas sharing the staple file fetch it once
+        add("ocsp_staple_refresh", staple_cache.refresh_if_due, 600, lock=True, run_at_start=True)
+    return scheduler
+
+def register_reload_handlers(reloader, proxy, public_backend_service, internal_backend_service, rate_limiter,
+                             quic_listener=None):
+    """
+    Registers the subsystems that apply configuration changes without a restart.
+    """
+    def apply_bandwidth(config):
+        if proxy.shaper is not None and config.bandwidth.enabled:
+            proxy.shaper.reconfigure(config.bandwidth)
+        else:
+            proxy.shaper = create_shaper(config.bandwidth)
+
+    def apply_hello_filter(config):
+        filter_config = config.client_hello_filter
+        if proxy.hello_filter is not None and filter_config.enabled:
+            proxy.hello_filter.reconfigure(filter_config.allow, filter_config.deny, filter_config.rate_per_minute,
+                                           filter_config.burst, filter_config.action, filter_config.tarpit_seconds,
+                                           filter_config.max_tracked)
+        else:
+            proxy.hello_filter = create_hello_filter(config)
+
+    def apply_traffic(config):
+        traffic_config = config.traffic
+        listening = proxy.traffic.listen_addresses() if proxy.traffic is not None else []
+        if proxy.traffic is not None and traffic_config.enabled:
+            from core.traffic_classes import TrafficClasses
+            proxy.traffic.reconfigure(TrafficClasses.classes_from_config(traffic_config), traffic_config.default_class,
+                                      traffic_config.handshake_slots, traffic_config.max_queued,
+                                      traffic_config.forward_rate, traffic_config.forward_burst)
+        else:
+            proxy.traffic = create_traffic_classes(config)
+        if (proxy.traffic.listen_addresses() if proxy.traffic is not None else []) != listening:
+            logging.warning("Traffic class listen addresses changed; they are bound at start-up, so the change "
+                            "takes effect after a restart (SIGUSR2).")
+
+    def apply_tracing(config):
+        from monitoring.tracing import get_tracer
+        tracer = get_tracer()
+        tracer.sample_rate = config.monitoring.tracing.sample_rate
+        tail_latency_ms = config.monitoring.tracing.tail_latency_ms
+        tracer.tail_latency_ns = int(tail_latency_ms * 1e6) if tail_latency_ms else None
+        tracer.tail_errors = config.monitoring.tracing.tail_errors
+
+    def apply_backends(config):
+        for service, backend in ((public_backend_service, config.public_backend),
+                                 (internal_backend_service, config.internal_backend)):
+            service.base_url = backend.url
+            service.max_body_size = backend.max_body_size
+            service.chunk_size = backend.chunk_size
+
+    reloader.register(
+        lambda config: rate_limiter.reconfigure(config.rate_limiter.max_requests_per_minute, 60),
+        "rate_limiter.max_requests_per_minute"
+    )
+    reloader.register(apply_bandwidth, "bandwidth")
+    reloader.register(apply_hello_filter, "client_hello_filter")
+    reloader.register(apply_traffic, "traffic")
+    reloader.register(
+        lambda config: proxy.set_backend(config.internal_backend.host, config.internal_backend.port),
+        "internal_backend.host", "internal_backend.port"
+    )
+    reloader.register(
+        apply_backends,
+        "public_backend.url", "public_backend.max_body_size", "public_backend.chunk_size",
+        "internal_backend.url", "internal_backend.max_body_size", "internal_backend.chunk_size"
+    )
+    reloader.register(
+        lambda config: proxy.reload_certificates(config.tls.cert_file, config.tls.key_file, config.tls.ca_file),
+        "tls.cert_file", "tls.key_file", "tls.ca_file"
     )
+    reloader.register(lambda config: proxy.set_tls_policies(create_tls_policies(config)), "tls.policy")
+    if quic_listener is not None:
+        reloader.register(
+            lambda config: quic_listener.reload_certificates(config.tls.cert_file, config.tls.key_file),
+            "tls.cert_file", "tls.key_file"
+        )
+    if reloader.config.monitoring.tracing.enabled:
+        reloader.register(apply_tracing, "monitoring.tracing.sample_rate", "monitoring.tracing.tail_latency_ms",
+                          "monitoring.tracing.tail_errors")
+
+async def start_proxy(config, cert_subscriber, public_backend_service, internal_backend_service, rate_limiter,
+                      cert_manager=None):
+    """
+    Starts the QuantumSafeProxy, applies certificate updates pushed to it and runs the background tasks.
+    """
+    from core.proxy_handler import QuantumSafeProxy
+
+    if config.tls.revocation.ocsp_staple_file:
+        logging.warning("Python's ssl module cannot staple OCSP responses; tls.revocation.ocsp_staple_file "
+                        "is only served in control_plane.mode envoy.")
+    revocation = create_revocation_checker(config)
 
-    # Start the proxy server and TLS update listener concurrently
-    await asyncio.gather(
-        proxy.start(),
-        wait_for_tls_updates(tls_setup)
+    if config.monitoring.loop_lag.enabled:
+        from monitoring.loop_monitor import LoopLagMonitor
+        LoopLagMonitor(
+            interval=config.monitoring.loop_lag.interval,
+            slow_threshold=config.monitoring.loop_lag.slow_threshold
+        ).start()
+
+    handshake_pool = None
+    if config.proxy.handshake_workers:
+        from core.handshake_pool import HandshakePool
+        handshake_pool = HandshakePool(config.proxy.handshake_workers)
+
+    proxy_protocol = None
+    proxy_protocol_config = config.proxy.proxy_protocol
+    if proxy_protocol_config.accept or proxy_protocol_config.send or proxy_protocol_config.trusted_networks:
+        from core.proxy_protocol import ProxyProtocol
+        proxy_protocol = ProxyProtocol.from_config(proxy_protocol_config)
+
+    proxy = QuantumSafeProxy(
+        host=config.proxy.host,
+        port=config.proxy.port,
+        backend_host=config.internal_backend.host,
+        backend_port=config.internal_backend.port,
+        cert_file=config.tls.cert_file,
+        key_file=config.tls.key_file,
+        ca_file=config.tls.ca_file,
+        ktls=config.tls.ktls,
+        shaper=create_shaper(config.bandwidth),
+        proxy_protocol=proxy_protocol,
+        rate_limiter=rate_limiter if config.rate_limiter.enabled else None,
+        tls_policies=create_tls_policies(config),
+        handshake_pool=handshake_pool,
+        client_auth=config.tls.client_auth,
+        revocation=revocation,
+        hello_filter=create_hello_filter(config),
+        traffic=create_traffic_classes(config)
     )
 
+    # HTTP/3 clients are served on UDP next to the TCP listener, which advertises it
+    quic_listener = None
+    quic_config = config.proxy.quic
+    if quic_config.enabled:
+        from core.quic_listener import QuicListener
+        quic_listener = QuicListener(
+            proxy,
+            host=quic_config.host or config.proxy.host,
+            port=quic_config.port or config.proxy.port,
+            cert_file=config.tls.cert_file,
+            key_file=config.tls.key_file,
+            alt_svc_max_age=quic_config.alt_svc_max_age
+        )
+        await quic_listener.start()
+
+    # SIGHUP reloads the configuration and applies what changed
+    loop = asyncio.get_running_loop()
+    reloader = ConfigReloader(config)
+    register_reload_handlers(reloader, proxy, public_backend_service, internal_backend_service, rate_limiter,
+                             quic_listener)
+    loop.add_signal_handler(signal.SIGHUP, reloader.reload)
+
+    # SIGUSR2 starts a replacement process that takes over the listening sockets
+    from core.socket_handoff import serve_with_handoff, spawn_replacement, TAKEOVER_ENV
+    restart_config = config.restart
+    loop.add_signal_handler(signal.SIGUSR2, spawn_replacement)
+
+    # Pushed certificate updates reload the listeners only when a file changed
+    updates = None
+    if cert_subscriber is not None:
+        tls_config = config.tls
+        cert_subscriber.add_listener(
+            lambda: proxy.reload_certificates(tls_config.cert_file, tls_config.key_file, tls_config.ca_file)
+        )
+        if quic_listener is not None:
+            cert_subscriber.add_listener(
+                lambda: quic_listener.reload_certificates(tls_config.cert_file, tls_config.key_file)
+            )
+        updates = asyncio.ensure_future(cert_subscriber.run())
+
+    def reload_renewed_certificates():
+        tls_config = reloader.config.tls
+        proxy.reload_certificates(tls_config.cert_file, tls_config.key_file, tls_config.ca_file)
+        if quic_listener is not None:
+            quic_listener.reload_certificates(tls_config.cert_file, tls_config.key_file)
+
+    async def rotate_ticket_keys():
+        # Python cannot set OpenSSL's session ticket keys, but every new
+        # context draws fresh ones; the contexts are built off the loop
+        from core.tls_setup import create_tls_context
+        current = reloader.config
+        tls_policies = await loop.run_in_executor(None, create_tls_policies, current)
+        tls_context = None
+        if tls_policies is None:
+            tls_context = await loop.run_in_executor(None, create_tls_context, current.tls.cert_file,
+                                                     current.tls.key_file, current.tls.ca_file)
+        proxy.set_tls_policies(tls_policies, tls_context)
+
+    scheduler = create_scheduler(config, cert_manager, reload_renewed_certificates, rotate_ticket_keys, revocation)
+    background_tasks = asyncio.ensure_future(scheduler.run())
+
+    # Serve until the proxy has handed over and drained, then this process is done
+    try:
+        await serve_with_handoff(
+            proxy,
+            restart_config.handoff_socket,
+            drain_timeout=restart_config.drain_timeout,
+            takeover=os.getenv(TAKEOVER_ENV) == "1",
+            timeout=restart_config.handoff_timeout
+        )
+    finally:
+        background_tasks.cancel()
+        scheduler.close()
+        if updates is not None:
+            updates.cancel()
+        if quic_listener is not None:
+            quic_listener.close()
+
+async def run_control_plane(config, cert_subscriber=None, cert_manager=None):
+    """
+    Drives the configured NGINX or Envoy data plane instead of forwarding traffic in Python.
+    """
+    from services.control_plane import ControlPlane
+
+    control_plane = ControlPlane.from_config(config)
+    control_plane.apply(config)
+
+    # SIGHUP re-renders the data plane configuration from the reloaded file
+    loop = asyncio.get_running_loop()
+    reloader = ConfigReloader(config)
+    reloader.register(control_plane.apply, "proxy", "internal_backend", "tls", "rate_limiter")
+    loop.add_signal_handler(signal.SIGHUP, reloader.reload)
+
+    # Pushed certificates reload the data plane at once instead of at the next check
+    updates = None
+    if cert_subscriber is not None:
+        cert_subscriber.add_listener(lambda: control_plane.apply(control_plane.config, force=True))
+        updates = asyncio.ensure_future(cert_subscriber.run())
+
+    if config.traffic.enabled:
+        logging.warning("traffic classes apply to the Python proxy only; the data plane schedules all connections "
+                        "alike.")
+    if config.client_hello_filter.enabled:
+        logging.warning("client_hello_filter applies to the Python proxy only; the data plane does not screen "
+                        "ClientHellos.")
+    if config.tls.revocation.enabled:
+        logging.warning("tls.revocation indexes CRLs for the Python proxy only; the data plane does not check "
+                        "client certificate revocation.")
+    on_stapled = None
+    if config.control_plane.mode == "envoy":
+        on_stapled = lambda: control_plane.apply(control_plane.config, force=True)
+    elif config.tls.revocation.ocsp_staple_file:
+        logging.warning("The NGINX stream module cannot staple OCSP responses; tls.revocation.ocsp_staple_file "
+                        "is ignored.")
+
+    # The data plane owns the TLS contexts, so there are no ticket keys to rotate here
+    scheduler = create_scheduler(config, cert_manager,
+                                 on_renewed=lambda: control_plane.apply(control_plane.config, force=True),
+                                 on_stapled=on_stapled)
+    background_tasks = asyncio.ensure_future(scheduler.run())
+    try:
+        # Certificate files changed by other means are picked up here
+        await control_plane.watch_certificates(config.tls.check_interval)
+    finally:
+        background_tasks.cancel()
+        scheduler.close()
+        if updates is not None:
+            updates.cancel()
+        control_plane.close()
+
 def main():
     try:
         # Set up logging
@@ -120,23 +568,35 @@ def main():
 
         # Load configuration
         config = load_config()
-        logging.info(f"Starting Quantum Safe TLS Proxy in {config['app']['environment']} mode")
+        logging.info(f"Starting Quantum Safe TLS Proxy in {config.app.environment} mode")
 
         # Start Prometheus metrics server
-        start_metrics_server(config["monitoring"]["metrics_port"])
+        if config.monitoring.metrics_port:
+            from monitoring.metrics import start_metrics_server
+            start_metrics_server(config.monitoring.metrics_port)
+        if config.monitoring.admin_port:
+            from monitoring.admin_server import start_admin_server
+            start_admin_server(config.monitoring.admin_port, config.monitoring.admin_host)
+        tracing_config = config.monitoring.tracing
+        if tracing_config.enabled:
+            from monitoring.tracing import Tracer, TraceExporter, set_tracer
+            tracer = Tracer.from_config(tracing_config)
+            set_tracer(tracer)
+            TraceExporter.from_config(tracer, tracing_config).start()
 
         # Initialize services
-        (tls_setup, public_backend_service, internal_backend_service, tls_service,
+        (cert_subscriber, public_backend_service, internal_backend_service, tls_service,
          cert_manager, quantum_handler, auth_handler, rate_limiter,
          health_check) = initialize_services(config)
 
-        # Optionally enable automatic certificate renewal
-        if config["renewal"]["enable_auto_renewal"]:
-            renewer = AsyncWorker(cert_manager, tls_service, config["renewal"]["renewal_check_interval"])
-            renewer.start()
-
-        # Start the proxy and wait for TLS updates
-        asyncio.run(start_proxy(config, tls_setup, public_backend_service, internal_backend_service))
+        # Start the proxy and subscribe to certificate updates on the configured event loop
+        from core.event_loop import install_event_loop
+        install_event_loop(config.proxy.event_loop)
+        if config.control_plane.mode != "off":
+            asyncio.run(run_control_plane(config, cert_subscriber, cert_manager))
+        else:
+            asyncio.run(start_proxy(config, cert_subscriber, public_backend_service, internal_backend_service,
+                                    rate_limiter, cert_manager))
 
     except Exception as e:
         handle_exception(e)
@@ -0,0 +1,192 @@
+import time
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MIN_BURST_BYTES = 64 * 1024
+
+class TokenBucket:
+    """
+    Byte-rate token bucket that may go into debt.
+
+    A chunk that has already been read is always accounted for; the bucket
+    then reports how long the flow must stay paused until the debt is repaid.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated", "flows")
+
+    def __init__(self, rate, burst=None):
+        """
+        Initializes the TokenBucket.
+
+        Args:
+            rate (float): Sustained rate in bytes per second.
+            burst (float, optional): Bucket capacity in bytes; defaults to a tenth of a second of traffic.
+        """
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate / 10, MIN_BURST_BYTES))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.flows = 0
+
+    def consume(self, size, now):
+        """
+        Takes ``size`` bytes from the bucket.
+
+        Returns:
+            float: Seconds until the bucket is out of debt (0 if it is not in debt).
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate) - size
+        self.updated = now
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+class ShapedFlow:
+    """
+    A connection's path through the bucket hierarchy; both directions are charged to it.
+    """
+
+    __slots__ = ("shaper", "buckets", "client_id", "backend_id")
+
+    def __init__(self, shaper, buckets, client_id, backend_id):
+        self.shaper = shaper
+        self.buckets = buckets
+        self.client_id = client_id
+        self.backend_id = backend_id
+
+    def consume(self, size):
+        """
+        Accounts for ``size`` forwarded bytes at every level of the hierarchy.
+
+        Returns:
+            float: Seconds the flow must pause before reading more (0 if not throttled).
+        """
+        now = time.monotonic()
+        delay, scope = 0.0, None
+        for level, bucket in self.buckets:
+            wait = bucket.consume(size, now)
+            if wait > delay:
+                delay, scope = wait, level
+        if delay and self.shaper.on_throttle is not None:
+            self.shaper.on_throttle(scope, delay)
+        return delay
+
+    def close(self):
+        """
+        Releases the flow's per-client and per-backend buckets.
+        """
+        self.shaper._release(self)
+
+class BandwidthShaper:
+    """
+    Hierarchical token-bucket byte-rate shaper (global, per-client and per-backend).
+
+    Each forwarded chunk is charged to every bucket on the flow's path; the
+    largest resulting debt decides how long the flow's reads stay paused.
+    Levels without a configured rate are unlimited.
+    """
+
+    def __init__(self, global_rate=None, global_burst=None, per_client_rate=None, per_client_burst=None,
+                 per_backend_rate=None, per_backend_burst=None, on_throttle=None):
+        """
+        Initializes the BandwidthShaper.
+
+        Args:
+            global_rate (float, optional): Bytes per second across all connections.
+            global_burst (float, optional): Burst size of the global bucket in bytes.
+            per_client_rate (float, optional): Bytes per second per client address.
+            per_client_burst (float, optional): Burst size of each client bucket in bytes.
+            per_backend_rate (float, optional): Bytes per second per backend.
+            per_backend_burst (float, optional): Burst size of each backend bucket in bytes.
+            on_throttle (callable, optional): Called with the limiting scope and delay of each throttle.
+        """
+        self.global_bucket = TokenBucket(global_rate, global_burst) if global_rate else None
+        self.per_client_rate = per_client_rate
+        self.per_client_burst = per_client_burst
+        self.per_backend_rate = per_backend_rate
+        self.per_backend_burst = per_backend_burst
+        self.on_throttle = on_throttle
+        self.clients = {}
+        self.backends = {}
+
+    @classmethod
+    def from_config(cls, config, on_throttle=None):
+        """
+        Creates a shaper from the ``bandwidth`` configuration section.
+        """
+        return cls(
+            global_rate=config.get("global_rate"),
+            global_burst=config.get("global_burst"),
+            per_client_rate=config.get("per_client_rate"),
+            per_client_burst=config.get("per_client_burst"),
+            per_backend_rate=config.get("per_backend_rate"),
+            per_backend_burst=config.get("per_backend_burst"),
+            on_throttle=on_throttle
+        )
+
+    def reconfigure(self, config):
+        """
+        Applies new limits from the ``bandwidth`` configuration section to existing and future flows.
+
+        Buckets of connected clients and backends keep their current fill
+        level; a level whose rate is removed stops being charged for new connections.
+        """
+        global_rate, global_burst = config.get("global_rate"), config.get("global_burst")
+        if not global_rate:
+            self.global_bucket = None
+        elif self.global_bucket is None:
+            self.global_bucket = TokenBucket(global_rate, global_burst)
+        else:
+            self._retune(self.global_bucket, global_rate, global_burst)
+
+        self.per_client_rate = config.get("per_client_rate")
+        self.per_client_burst = config.get("per_client_burst")
+        self.per_backend_rate = config.get("per_backend_rate")
+        self.per_backend_burst = config.get("per_backend_burst")
+        for buckets, rate, burst in ((self.clients, self.per_client_rate, self.per_client_burst),
+                                     (self.backends, self.per_backend_rate, self.per_backend_burst)):
+            if rate:
+                for bucket in buckets.values():
+                    self._retune(bucket, rate, burst)
+        logger.info("Bandwidth limits reconfigured.")
+
+    def _retune(self, bucket, rate, burst):
+        fresh = TokenBucket(rate, burst)
+        bucket.rate, bucket.burst = fresh.rate, fresh.burst
+        bucket.tokens = min(bucket.tokens, bucket.burst)
+
+    def open_flow(self, client_id, backend_id):
+        """
+        Registers a connection and returns its flow.
+
+        Args:
+            client_id (str): The client identifier (e.g., IP address).
+            backend_id (str): The backend identifier (e.g., ``host:port``).
+
+        Returns:
+            ShapedFlow: The flow to charge forwarded bytes to.
+        """
+        buckets = []
+        if self.global_bucket is not None:
+            buckets.append(("global", self.global_bucket))
+        if self.per_client_rate:
+            buckets.append(("client", self._acquire(self.clients, client_id, self.per_client_rate, self.per_client_burst)))
+        if self.per_backend_rate:
+            buckets.append(("backend", self._acquire(self.backends, backend_id, self.per_backend_rate, self.per_backend_burst)))
+        return ShapedFlow(self, buckets, client_id, backend_id)
+
+    def _acquire(self, buckets, key, rate, burst):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rate, burst)
+        bucket.flows += 1
+        return bucket
+
+    def _release(self, flow):
+        for level, bucket in flow.buckets:
+            buckets, key = (self.clients, flow.client_id) if level == "client" else (self.backends, flow.backend_id)
+            if level == "global" or buckets.get(key) is not bucket:
+                continue
+            bucket.flows -= 1
+            if bucket.flows <= 0:
+                del buckets[key]
+        flow.buckets = []
@@ -0,0 +1,108 @@
+import re
+import time
+import fnmatch
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class FingerprintFilter:
+    """
+    Admits or rejects connections by the JA4 fingerprint of their ClientHello.
+
+    Runs before the TLS object exists, so a rejected client costs a parse of
+    its ClientHello and no key exchange or signature. Fingerprints on the
+    deny list are always rejected and those on the allow list always
+    admitted; every other fingerprint shares a token bucket with all clients
+    sending it, which catches a flood from one client stack spread over many
+    addresses, where per-address rate limiting does not.
+    """
+
+    def __init__(self, allow=(), deny=(), rate=None, burst=None, action="drop", tarpit_seconds=10.0,
+                 max_tracked=10000, on_reject=None):
+        """
+        Initializes the FingerprintFilter.
+
+        Args:
+            allow (iterable): JA4 fingerprints or ``fnmatch`` patterns that are never rate limited.
+            deny (iterable): JA4 fingerprints or patterns that are always rejected.
+            rate (float, optional): New connections per minute admitted per fingerprint; unlimited when None.
+            burst (int, optional): Bucket size; defaults to ``rate``.
+            action (str): What happens to rejected connections: ``drop`` resets them, ``tarpit``
+                holds them open unanswered for ``tarpit_seconds``.
+            tarpit_seconds (float): How long tarpitted connections are held.
+            max_tracked (int): Fingerprints with a token bucket at most; the least recently seen go first.
+            on_reject (callable, optional): Called with the reason (denied or rate_limited) of each rejection.
+        """
+        self.on_reject = on_reject
+        self.buckets = {}
+        self.reconfigure(allow, deny, rate, burst, action, tarpit_seconds, max_tracked)
+
+    @classmethod
+    def from_config(cls, config, on_reject=None):
+        """
+        Creates the filter from the ``client_hello_filter`` configuration section.
+        """
+        return cls(config.allow, config.deny, rate=config.rate_per_minute, burst=config.burst, action=config.action,
+                   tarpit_seconds=config.tarpit_seconds, max_tracked=config.max_tracked, on_reject=on_reject)
+
+    def reconfigure(self, allow=(), deny=(), rate=None, burst=None, action="drop", tarpit_seconds=10.0,
+                    max_tracked=10000):
+        """
+        Applies new lists and limits; tracked fingerprints keep their tokens.
+        """
+        self.allow = self._compile(allow)
+        self.deny = self._compile(deny)
+        self.rate = rate
+        self.burst = burst or rate
+        self.action = action
+        self.tarpit_seconds = tarpit_seconds
+        self.max_tracked = max_tracked
+
+    @staticmethod
+    def _compile(patterns):
+        # Exact fingerprints are a set lookup; only patterns with wildcards need a regex
+        exact = frozenset(pattern for pattern in patterns if not any(char in pattern for char in "*?["))
+        wildcards = [pattern for pattern in patterns if pattern not in exact]
+        regex = re.compile("|".join(fnmatch.translate(pattern) for pattern in wildcards)) if wildcards else None
+        return exact, regex
+
+    @staticmethod
+    def _matches(compiled, fingerprint):
+        exact, regex = compiled
+        return fingerprint in exact or (regex is not None and regex.match(fingerprint) is not None)
+
+    def check(self, fingerprint, now=None):
+        """
+        Decides whether a connection with the given fingerprint may proceed to the handshake.
+
+        Args:
+            fingerprint (str): The JA4 fingerprint of the connection's ClientHello.
+
+        Returns:
+            str: Why the connection is rejected (denied or rate_limited), or None to admit it.
+        """
+        if self._matches(self.deny, fingerprint):
+            reason = "denied"
+        elif self.rate is None or self._matches(self.allow, fingerprint):
+            return None
+        elif self._take_token(fingerprint, time.monotonic() if now is None else now):
+            return None
+        else:
+            reason = "rate_limited"
+        if self.on_reject is not None:
+            self.on_reject(reason)
+        return reason
+
+    def _take_token(self, fingerprint, now):
+        bucket = self.buckets.pop(fingerprint, None)
+        if bucket is None:
+            if len(self.buckets) >= self.max_tracked:
+                # Dicts keep insertion order and seen fingerprints are re-inserted, so the first is the stalest
+                del self.buckets[next(iter(self.buckets))]
+            tokens = float(self.burst)
+        else:
+            tokens, last = bucket
+            tokens = min(float(self.burst), tokens + (now - last) * self.rate / 60.0)
+        allowed = tokens >= 1.0
+        self.buckets[fingerprint] = (tokens - 1.0 if allowed else tokens, now)
+        return allowed
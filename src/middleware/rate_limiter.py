@@ -1,5 +1,4 @@
 import time
-from collections import defaultdict
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -7,6 +6,11 @@ logger = get_logger(__name__)
 class RateLimiter:
     """
     Implements a simple rate limiter using the token bucket algorithm.
+
+    Tokens refill continuously, so a client requesting more often than one
+    token's worth of time still earns fractional tokens between requests.
+    Clients whose bucket has refilled are forgotten by a periodic sweep, as
+    a fresh bucket is full too.
     """
 
     def __init__(self, rate_limit=10, per_seconds=60):
@@ -19,7 +23,20 @@ class RateLimiter:
         """
         self.rate_limit = rate_limit
         self.per_seconds = per_seconds
-        self.clients = defaultdict(lambda: {'tokens': rate_limit, 'last_time': time.time()})
+        self.clients = {}
+        self.next_sweep = time.monotonic() + per_seconds
+
+    def reconfigure(self, rate_limit, per_seconds=60):
+        """
+        Applies new limits; existing clients keep their tokens, capped at the new limit on their next request.
+        
+        Args:
+            rate_limit (int): Maximum number of requests allowed within the time window.
+            per_seconds (int): Time window in seconds.
+        """
+        self.rate_limit = rate_limit
+        self.per_seconds = per_seconds
+        logger.info(f"Rate limiter reconfigured: {rate_limit} requests per {per_seconds}s.")
 
     def is_allowed(self, client_id):
         """
@@ -31,20 +48,33 @@ class RateLimiter:
         Returns:
             bool: True if the request is allowed, False otherwise.
         """
-        current_time = time.time()
-        client_data = self.clients[client_id]
+        current_time = time.monotonic()
+        if current_time >= self.next_sweep:
+            self._sweep(current_time)
+        client_data = self.clients.get(client_id)
+        if client_data is None:
+            # Stamped with the same clock reading, so a new client starts with exactly a full bucket
+            client_data = self.clients[client_id] = {'tokens': float(self.rate_limit), 'last_time': current_time}
 
-        # Refill tokens based on elapsed time
+        # Refill tokens based on elapsed time, keeping fractions of a token
         elapsed_time = current_time - client_data['last_time']
-        refill_tokens = int(elapsed_time * (self.rate_limit / self.per_seconds))
+        refill_tokens = elapsed_time * (self.rate_limit / self.per_seconds)
         client_data['tokens'] = min(self.rate_limit, client_data['tokens'] + refill_tokens)
         client_data['last_time'] = current_time
 
-        # Check if tokens are available for this request
-        if client_data['tokens'] > 0:
+        # Check if a whole token is available for this request
+        if client_data['tokens'] >= 1:
             client_data['tokens'] -= 1
-            logger.info(f"Rate limiter: Request allowed for client {client_id}. Tokens left: {client_data['tokens']}")
             return True
         else:
             logger.warning(f"Rate limiter: Request denied for client {client_id}. Rate limit exceeded.")
             return False
+
+    def _sweep(self, current_time):
+        # Drop clients whose bucket has refilled; they are indistinguishable from new ones
+        rate = self.rate_limit / self.per_seconds
+        idle = [client_id for client_id, client_data in self.clients.items()
+                if client_data['tokens'] + (current_time - client_data['last_time']) * rate >= self.rate_limit]
+        for client_id in idle:
+            del self.clients[client_id]
+        self.next_sweep = current_time + self.per_seconds
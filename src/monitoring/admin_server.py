@@ -0,0 +1,70 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from utils.logger import get_logger
+from monitoring.profiler import profile_collapsed
+
+logger = get_logger(__name__)
+
+MAX_PROFILE_SECONDS = 60
+MAX_PROFILE_HZ = 1000
+
+class AdminRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves operational debug endpoints.
+
+    ``GET /debug/profile?seconds=10&hz=100`` runs a sampling profile and returns
+    a collapsed-stack file for flamegraph tools.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/debug/profile":
+            self.send_error(404)
+            return
+
+        query = parse_qs(url.query)
+        try:
+            seconds = float(query.get("seconds", ["10"])[0])
+            hz = int(query.get("hz", ["100"])[0])
+        except ValueError:
+            self.send_error(400, "seconds and hz must be numeric")
+            return
+        if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0 < hz <= MAX_PROFILE_HZ:
+            self.send_error(400, f"seconds must be in (0, {MAX_PROFILE_SECONDS}] and hz in (0, {MAX_PROFILE_HZ}]")
+            return
+
+        collapsed = profile_collapsed(seconds, hz)
+        if collapsed is None:
+            self.send_error(409, "A profile is already running")
+            return
+
+        body = collapsed.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Disposition", f'attachment; filename="profile-{int(time.time())}.collapsed"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info(f"Admin request from {self.client_address[0]}: {format % args}")
+
+def start_admin_server(port, host="127.0.0.1"):
+    """
+    Starts the admin HTTP server in a daemon thread.
+
+    Args:
+        port (int): Port to listen on.
+        host (str): Address to bind; defaults to loopback since profiles expose code paths.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    server = ThreadingHTTPServer((host, port), AdminRequestHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="admin-server", daemon=True)
+    thread.start()
+    logger.info(f"Admin server started on {host}:{port}")
+    return server
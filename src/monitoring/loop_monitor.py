@@ -0,0 +1,86 @@
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from utils.logger import get_logger
+from monitoring.metrics import observe_loop_lag, increment_loop_stall_counter
+
+logger = get_logger(__name__)
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag and logs the stack of callbacks that block the loop.
+
+    A timer callback re-arms itself every ``interval`` seconds and records how
+    late it fired. A watchdog thread checks the timer's heartbeat; when the loop
+    has not run it for ``slow_threshold`` seconds, the watchdog captures the loop
+    thread's current stack, so the blocking code is logged while it is still running.
+    """
+
+    def __init__(self, interval=0.25, slow_threshold=0.1, stack_limit=30):
+        """
+        Initializes the LoopLagMonitor.
+
+        Args:
+            interval (float): Seconds between lag probes.
+            slow_threshold (float): Lag in seconds after which a blocked loop is reported.
+            stack_limit (int): Maximum number of frames logged for a blocked loop.
+        """
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.stack_limit = stack_limit
+        self.loop = None
+        self._handle = None
+        self._expected = 0.0
+        self._heartbeat = 0.0
+        self._loop_thread_id = None
+        self._watchdog = None
+        self._stop = threading.Event()
+
+    def start(self, loop=None):
+        """
+        Starts probing the given (or running) event loop and the watchdog thread.
+        """
+        self.loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._expected = self.loop.time() + self.interval
+        self._handle = self.loop.call_at(self._expected, self._probe)
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event loop lag monitor started (interval {self.interval}s, threshold {self.slow_threshold}s).")
+
+    def stop(self):
+        """
+        Stops the probe and the watchdog thread.
+        """
+        self._stop.set()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    def _probe(self):
+        now = self.loop.time()
+        observe_loop_lag(max(0.0, now - self._expected))
+        self._heartbeat = time.monotonic()
+        self._expected = now + self.interval
+        self._handle = self.loop.call_at(self._expected, self._probe)
+
+    def _watch(self):
+        reported_heartbeat = None
+        while not self._stop.wait(self.slow_threshold / 2):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.slow_threshold or heartbeat == reported_heartbeat:
+                continue
+            reported_heartbeat = heartbeat  # Report each stall once
+            increment_loop_stall_counter()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame, limit=self.stack_limit)) if frame else "<unavailable>\n"
+            logger.warning(f"Event loop blocked for at least {blocked_for * 1000:.0f} ms; "
+                           f"loop thread stack (most recent call last):\n{stack}")
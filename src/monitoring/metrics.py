@@ -10,6 +10,37 @@ RATE_LIMITED_COUNTER = Counter('proxy_rate_limited_total', 'Total number of rate
 ERROR_COUNTER = Counter('proxy_errors_total', 'Total number of errors encountered')
 REQUEST_LATENCY = Histogram('proxy_request_latency_seconds', 'Histogram of request latency')
 ACTIVE_CONNECTIONS = Gauge('proxy_active_connections', 'Current number of active connections')
+LOOP_LAG = Histogram('proxy_event_loop_lag_seconds', 'Histogram of event loop scheduling lag',
+                     buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+LOOP_STALLS = Counter('proxy_event_loop_stalls_total', 'Number of times the event loop was blocked beyond the threshold')
+BANDWIDTH_THROTTLE = Histogram('proxy_bandwidth_throttle_seconds', 'Read pauses imposed by bandwidth shaping',
+                               ['scope'], buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+KTLS_OFFLOAD = Counter('proxy_ktls_offload_total', 'Kernel TLS offload outcome per connection', ['result'])
+TLS_HANDSHAKES = Counter('proxy_tls_handshakes_total', 'Completed TLS handshakes by policy and negotiated group',
+                         ['policy', 'group'])
+TLS_HANDSHAKE_CPU = Histogram('proxy_tls_handshake_cpu_seconds', 'Proxy CPU time spent in a TLS handshake', ['group'],
+                              buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05))
+CERT_PROPAGATION = Histogram('proxy_cert_update_propagation_seconds',
+                             'Time from a certificate update being issued to the proxy applying it',
+                             buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 300))
+TASK_RUNS = Counter('proxy_scheduled_task_runs_total', 'Scheduled task runs by outcome', ['task', 'status'])
+TASK_DURATION = Histogram('proxy_scheduled_task_duration_seconds', 'Duration of scheduled task runs', ['task'],
+                          buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 300, 900))
+TASK_LOOP_BLOCKING = Histogram('proxy_scheduled_task_loop_blocking_seconds',
+                               'Longest time a scheduled task run held the event loop without yielding', ['task'],
+                               buckets=(.0001, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1))
+REVOCATION_CHECKS = Counter('proxy_client_cert_revocation_checks_total',
+                            'Client certificate revocation checks by outcome', ['outcome'])
+CLIENT_HELLO_REJECTIONS = Counter('proxy_client_hello_rejections_total',
+                                  'Connections rejected by ClientHello fingerprint before the handshake', ['reason'])
+TRAFFIC_SHED = Counter('proxy_traffic_shed_total', 'Connections shed by traffic class and reason',
+                       ['traffic_class', 'reason'])
+HANDSHAKE_QUEUE_WAIT = Histogram('proxy_handshake_queue_wait_seconds', 'Time connections waited for a handshake slot',
+                                 ['traffic_class'], buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+KEM_POOL_DEPTH = Gauge('proxy_kem_encapsulation_pool_depth', 'Pregenerated Kyber encapsulations in the pool')
+KEM_POOL_STARVATION = Counter('proxy_kem_encapsulation_pool_starvation_total',
+                              'Kyber encapsulations made inline because the pool was empty')
+REVOKED_SERIALS = Gauge('proxy_revoked_serials', 'Revoked serial numbers indexed per issuer', ['issuer'])
 
 def start_metrics_server(port=9090):
     """
@@ -47,3 +78,91 @@ def set_active_connections(count):
     Sets the current number of active connections.
     """
     ACTIVE_CONNECTIONS.set(count)
+
+def set_kem_pool_depth(depth):
+    """
+    Sets the number of pregenerated Kyber encapsulations in the pool.
+    """
+    KEM_POOL_DEPTH.set(depth)
+
+def increment_kem_pool_starvation():
+    """
+    Counts a Kyber encapsulation made inline because the pool was empty.
+    """
+    KEM_POOL_STARVATION.inc()
+
+def observe_loop_lag(seconds):
+    """
+    Observes the event loop scheduling lag.
+    """
+    LOOP_LAG.observe(seconds)
+
+def increment_loop_stall_counter():
+    """
+    Increments the blocked event loop counter.
+    """
+    LOOP_STALLS.inc()
+
+def increment_ktls_offload(result):
+    """
+    Counts a connection's kernel TLS offload outcome (full, tx, rx or none).
+    """
+    KTLS_OFFLOAD.labels(result=result).inc()
+
+def observe_throttle_delay(scope, seconds):
+    """
+    Observes a read pause imposed by the bandwidth shaper at the given scope (global, client or backend).
+    """
+    BANDWIDTH_THROTTLE.labels(scope=scope).observe(seconds)
+
+def observe_tls_handshake(policy, group, cpu_seconds):
+    """
+    Counts a completed TLS handshake and observes its CPU time by negotiated key exchange group.
+    """
+    TLS_HANDSHAKES.labels(policy=policy, group=group).inc()
+    TLS_HANDSHAKE_CPU.labels(group=group).observe(cpu_seconds)
+
+def observe_cert_propagation(seconds):
+    """
+    Observes how long a pushed certificate update took to reach the proxy.
+    """
+    CERT_PROPAGATION.observe(seconds)
+
+def observe_task_run(task, status, seconds, loop_blocked):
+    """
+    Counts a scheduled task run by outcome and observes its duration and longest event loop block.
+    """
+    TASK_RUNS.labels(task=task, status=status).inc()
+    if status in ("ok", "error", "timeout"):
+        TASK_DURATION.labels(task=task).observe(seconds)
+        TASK_LOOP_BLOCKING.labels(task=task).observe(loop_blocked)
+
+def observe_revocation_check(outcome):
+    """
+    Counts a client certificate revocation check (good, revoked or unknown).
+    """
+    REVOCATION_CHECKS.labels(outcome=outcome).inc()
+
+def set_revoked_serials(issuer, count):
+    """
+    Sets the number of revoked serials indexed for an issuer.
+    """
+    REVOKED_SERIALS.labels(issuer=issuer).set(count)
+
+def increment_client_hello_rejection(reason):
+    """
+    Counts a connection rejected by its ClientHello fingerprint (denied or rate_limited).
+    """
+    CLIENT_HELLO_REJECTIONS.labels(reason=reason).inc()
+
+def increment_traffic_shed(traffic_class, reason):
+    """
+    Counts a connection shed from a traffic class (connection_limit, queue_full or queue_timeout).
+    """
+    TRAFFIC_SHED.labels(traffic_class=traffic_class, reason=reason).inc()
+
+def observe_handshake_queue_wait(traffic_class, seconds):
+    """
+    Observes how long a connection of a traffic class waited for its handshake slot.
+    """
+    HANDSHAKE_QUEUE_WAIT.labels(traffic_class=traffic_class).observe(seconds)
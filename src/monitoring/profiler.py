@@ -0,0 +1,66 @@
+import sys
+import time
+import threading
+from collections import Counter
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Only one profile runs at a time; sampling every thread is not free
+_profile_lock = threading.Lock()
+
+def _collapse(frame):
+    """
+    Returns the stack of ``frame`` as a ``root;...;leaf`` string.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+def sample_stacks(duration, hz=100):
+    """
+    Samples the stacks of all other threads for ``duration`` seconds.
+
+    Args:
+        duration (float): Seconds to sample for.
+        hz (int): Samples per second.
+
+    Returns:
+        Counter: Collapsed stacks mapped to the number of samples they appeared in.
+    """
+    own_thread = threading.get_ident()
+    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+    interval = 1.0 / hz
+    stacks = Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            stacks[f"{thread_names.get(thread_id, thread_id)};{_collapse(frame)}"] += 1
+        time.sleep(interval)
+    return stacks
+
+def profile_collapsed(duration, hz=100):
+    """
+    Runs a time-boxed sampling profile and renders it in collapsed-stack format.
+
+    The output is one ``frame;frame;frame count`` line per unique stack, as
+    consumed by flamegraph.pl, speedscope and similar tools.
+
+    Returns:
+        str: The collapsed stacks, or None if another profile is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        logger.info(f"Sampling profiler started for {duration}s at {hz} Hz.")
+        stacks = sample_stacks(duration, hz)
+        logger.info(f"Sampling profiler finished with {sum(stacks.values())} samples.")
+    finally:
+        _profile_lock.release()
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
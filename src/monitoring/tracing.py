@@ -0,0 +1,417 @@
+import json
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+TRACEPARENT_HEADER = "traceparent"
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+def parse_traceparent(value):
+    """
+    Parses a W3C ``traceparent`` header.
+
+    Args:
+        value (str): The header value, e.g. ``00-<trace-id>-<parent-id>-01``.
+
+    Returns:
+        tuple: ``(trace_id, parent_id, sampled)``, or None if the header is invalid.
+    """
+    parts = value.strip().lower().split("-")
+    if len(parts) < 4 or parts[0] == "ff" or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+        flags = int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+class _Trace:
+    __slots__ = ("_trace_id", "keep", "sampled", "root", "spans", "finished")
+
+    def __init__(self, trace_id, sampled):
+        self._trace_id = trace_id
+        self.sampled = sampled
+        self.keep = sampled
+        self.root = None
+        self.spans = []
+        self.finished = False
+
+    @property
+    def trace_id(self):
+        # Generated on first use; most unsampled traces never need one
+        if self._trace_id is None:
+            self._trace_id = f"{random.getrandbits(128):032x}"
+        return self._trace_id
+
+class Span:
+    """
+    A timed operation within a trace.
+
+    Used as a context manager, the span becomes the parent of spans started
+    inside the block and records an exception raised from it as an error.
+    """
+
+    __slots__ = ("tracer", "trace", "_span_id", "parent", "name", "start_ns", "end_ns",
+                 "attributes", "error", "tail_latency", "_token")
+
+    def __init__(self, tracer, trace, name, parent, start_ns=None, attributes=None, tail_latency=True):
+        self.tracer = tracer
+        self.trace = trace
+        self._span_id = None
+        self.parent = parent
+        self.name = name
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+        self.tail_latency = tail_latency
+        self._token = None
+
+    @property
+    def span_id(self):
+        if self._span_id is None:
+            self._span_id = f"{random.getrandbits(64):016x}"
+        return self._span_id
+
+    @property
+    def parent_id(self):
+        """
+        Returns the parent span id (a local span or a remote ``traceparent`` id), or None for a root.
+        """
+        return self.parent.span_id if isinstance(self.parent, Span) else self.parent
+
+    @property
+    def traceparent(self):
+        """
+        Returns the W3C ``traceparent`` value identifying this span as the parent.
+        """
+        return f"00-{self.trace.trace_id}-{self.span_id}-{'01' if self.trace.keep else '00'}"
+
+    def set_attribute(self, key, value):
+        if self.attributes is None:
+            self.attributes = {}
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.error = str(error) or type(error).__name__
+
+    def end(self, end_ns=None):
+        if self.end_ns is None:
+            self.end_ns = end_ns or time.time_ns()
+            self.tracer._on_end(self)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_error(exc)
+        _current_span.reset(self._token)
+        self.end()
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+    traceparent = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def end(self, end_ns=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+class Tracer:
+    """
+    Records spans with head and tail sampling into a bounded ring buffer.
+
+    Head sampling keeps a ``sample_rate`` fraction of traces (or follows the
+    sampled flag of an incoming ``traceparent``). Tail sampling additionally
+    keeps unsampled traces with an error or with a latency-sensitive span
+    slower than ``tail_latency``; their spans are held until the root span
+    ends. Kept spans are exported by a ``TraceExporter``; when the buffer is
+    full the oldest spans are dropped.
+    """
+
+    def __init__(self, sample_rate=0.01, tail_latency=None, tail_errors=True, buffer_size=8192,
+                 service_name="quantum-safe-tls-proxy"):
+        """
+        Initializes the Tracer.
+
+        Args:
+            sample_rate (float): Fraction of new traces to keep (0..1).
+            tail_latency (float, optional): Seconds above which a latency-sensitive span keeps its trace.
+            tail_errors (bool): Whether traces containing an error are kept.
+            buffer_size (int): Maximum number of kept spans awaiting export.
+            service_name (str): ``service.name`` reported to the collector.
+        """
+        self.sample_rate = sample_rate
+        self.tail_latency_ns = int(tail_latency * 1e9) if tail_latency else None
+        self.tail_errors = tail_errors
+        self.service_name = service_name
+        self.enabled = sample_rate > 0 or self.tail_latency_ns is not None or tail_errors
+        self.buffer = deque(maxlen=buffer_size)
+        self.dropped = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Creates a tracer from the ``tracing`` configuration section.
+        """
+        tail_latency_ms = config.get("tail_latency_ms")
+        return cls(
+            sample_rate=config.get("sample_rate", 0.01),
+            tail_latency=tail_latency_ms / 1000 if tail_latency_ms else None,
+            tail_errors=config.get("tail_errors", True),
+            buffer_size=config.get("buffer_size", 8192),
+            service_name=config.get("service_name", "quantum-safe-tls-proxy")
+        )
+
+    def start_span(self, name, parent=None, traceparent=None, start_ns=None, attributes=None, tail_latency=True):
+        """
+        Starts a span, as a child of ``parent`` or of the current span if there is one.
+
+        Args:
+            name (str): The operation name.
+            parent (Span, optional): Explicit parent span.
+            traceparent (str, optional): Incoming W3C ``traceparent`` continuing a remote trace.
+            start_ns (int, optional): Start time in Unix nanoseconds, for phases that began earlier.
+            attributes (dict, optional): Initial span attributes.
+            tail_latency (bool): Whether this span's duration counts for tail sampling; false
+                for spans that last as long as the connection.
+
+        Returns:
+            Span: The started span (a no-op span when tracing is disabled).
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        if parent is None:
+            parent = _current_span.get()
+        if isinstance(parent, Span):
+            return Span(self, parent.trace, name, parent, start_ns, attributes, tail_latency)
+
+        context = parse_traceparent(traceparent) if traceparent else None
+        if context is not None:
+            trace, parent_id = _Trace(context[0], context[2]), context[1]
+        else:
+            trace, parent_id = _Trace(None, random.random() < self.sample_rate), None
+        span = Span(self, trace, name, parent_id, start_ns, attributes, tail_latency)
+        trace.root = span
+        return span
+
+    def _on_end(self, span):
+        trace = span.trace
+        if not trace.keep:
+            if span.error is not None and self.tail_errors:
+                trace.keep = True
+            elif (self.tail_latency_ns is not None and span.tail_latency
+                  and span.end_ns - span.start_ns >= self.tail_latency_ns):
+                trace.keep = True
+
+        if trace.finished:
+            if trace.keep:
+                self._record(span)
+            return
+        trace.spans.append(span)
+        if span is trace.root:
+            trace.finished = True
+            if trace.keep:
+                for finished_span in trace.spans:
+                    self._record(finished_span)
+            trace.spans = None
+
+    def _record(self, span):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(span)
+
+    def drain(self, limit):
+        """
+        Removes and returns up to ``limit`` kept spans from the ring buffer.
+        """
+        spans = []
+        buffer = self.buffer
+        while buffer and len(spans) < limit:
+            spans.append(buffer.popleft())
+        return spans
+
+_tracer = Tracer(sample_rate=0, tail_errors=False)
+
+def get_tracer():
+    """
+    Returns the process-wide tracer (disabled until ``set_tracer`` is called).
+    """
+    return _tracer
+
+def set_tracer(tracer):
+    """
+    Sets the process-wide tracer.
+    """
+    global _tracer
+    _tracer = tracer
+
+def current_span():
+    """
+    Returns the span active in the current context, or a no-op span.
+    """
+    return _current_span.get() or NOOP_SPAN
+
+def inject(headers):
+    """
+    Adds the current span's ``traceparent`` to outgoing HTTP headers.
+    """
+    traceparent = current_span().traceparent
+    if traceparent is not None:
+        headers[TRACEPARENT_HEADER] = traceparent
+    return headers
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def to_otlp(spans, service_name):
+    """
+    Encodes spans as an OTLP/JSON ``ExportTraceServiceRequest``.
+    """
+    encoded = []
+    for span in spans:
+        item = {
+            "traceId": span.trace.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in (span.attributes or {}).items()],
+            "status": {"code": 2, "message": span.error} if span.error is not None else {"code": 1},
+        }
+        if span.parent_id:
+            item["parentSpanId"] = span.parent_id
+        encoded.append(item)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": "quantum-safe-tls-proxy"}, "spans": encoded}],
+    }]}
+
+class OTLPFileExporter:
+    """
+    Appends OTLP/JSON export requests to a file, one per line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, payload):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(payload, separators=(",", ":")) + "\n")
+
+class OTLPHttpExporter:
+    """
+    Posts OTLP/JSON export requests to a collector's ``/v1/traces`` endpoint.
+    """
+
+    def __init__(self, endpoint, timeout=5):
+        import urllib.request
+        self._urllib = urllib.request
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, payload):
+        request = self._urllib.Request(
+            self.endpoint, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
+        )
+        with self._urllib.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+class TraceExporter:
+    """
+    Exports kept spans from a tracer's ring buffer in batches on a background thread.
+    """
+
+    def __init__(self, tracer, exporter, interval=5.0, batch_size=512):
+        """
+        Initializes the TraceExporter.
+
+        Args:
+            tracer (Tracer): The tracer whose buffer is exported.
+            exporter: An object with an ``export(payload)`` method, e.g. ``OTLPFileExporter``.
+            interval (float): Seconds between exports.
+            batch_size (int): Maximum spans per export request.
+        """
+        self.tracer = tracer
+        self.exporter = exporter
+        self.interval = interval
+        self.batch_size = batch_size
+        self.exported = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, tracer, config):
+        """
+        Creates an exporter from the ``tracing`` configuration section.
+        """
+        if config.get("exporter", "file") == "otlp_http":
+            exporter = OTLPHttpExporter(config.get("endpoint", "http://127.0.0.1:4318/v1/traces"))
+        else:
+            exporter = OTLPFileExporter(config.get("file_path", "traces.jsonl"))
+        return cls(tracer, exporter, interval=config.get("export_interval", 5.0))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+        logger.info(f"Exporting traces every {self.interval}s with {type(self.exporter).__name__}")
+
+    def stop(self):
+        """
+        Stops the exporter thread after a final flush.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def flush(self):
+        """
+        Exports everything currently in the buffer.
+        """
+        while True:
+            spans = self.tracer.drain(self.batch_size)
+            if not spans:
+                return
+            try:
+                self.exporter.export(to_otlp(spans, self.tracer.service_name))
+                self.exported += len(spans)
+            except Exception as e:
+                logger.warning(f"Failed to export {len(spans)} span(s): {e}")
+                return
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+        self.flush()
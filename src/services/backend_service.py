@@ -1,59 +1,363 @@
+import json
 import aiohttp
 import asyncio
+import contextlib
 from utils.logger import get_logger
+from monitoring.tracing import get_tracer, inject
 
 logger = get_logger(__name__)
 
+# Responses and JSON values held in memory at most, unless configured otherwise
+DEFAULT_MAX_BODY_SIZE = 16 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Content types StreamingResponse.iter_json reads as newline-delimited JSON
+NDJSON_CONTENT_TYPES = frozenset(("application/x-ndjson", "application/ndjson", "application/jsonl",
+                                  "application/x-jsonlines", "application/jsonlines"))
+_JSON_WHITESPACE = " \t\n\r"
+
+class BodyTooLargeError(ValueError):
+ """
+ Raised when a response body, or one JSON value of it, exceeds the in-memory limit.
+ """
+
+class ReplayableBody:
+ """
+ A request body that can be produced again, so a failed upload can be retried.
+
+ ``factory`` is called once per attempt and returns anything aiohttp sends
+ as a body: bytes, a binary file object (sent with a Content-Length) or an
+ async iterator of bytes (sent with chunked transfer encoding).
+ """
+
+ __slots__ = ("factory",)
+
+ def __init__(self, factory):
+     """
+     Initializes the ReplayableBody.
+
+     Args:
+         factory (callable): Returns a fresh body for each attempt.
+     """
+     self.factory = factory
+
+ @classmethod
+ def from_file(cls, path):
+     """
+     Streams a file from disk, reopening it for every attempt.
+     """
+     return cls(lambda: open(path, "rb"))
+
+ @classmethod
+ def from_chunks(cls, produce):
+     """
+     Streams the async iterator ``produce()`` returns with chunked transfer encoding.
+
+     Args:
+         produce (callable): Returns a new async iterator of bytes for each attempt.
+     """
+     return cls(produce)
+
+class StreamingResponse:
+ """
+ A backend response whose body is read incrementally.
+
+ Only ``read``, ``json`` and one value at a time of ``iter_json`` are held
+ in memory, each bounded by the service's ``max_body_size``.
+ """
+
+ __slots__ = ("response", "max_body_size", "chunk_size")
+
+ def __init__(self, response, max_body_size, chunk_size):
+     self.response = response
+     self.max_body_size = max_body_size
+     self.chunk_size = chunk_size
+
+ @property
+ def status(self):
+     return self.response.status
+
+ @property
+ def headers(self):
+     return self.response.headers
+
+ async def iter_chunks(self):
+     """
+     Yields the body in chunks of at most ``chunk_size`` bytes as they arrive.
+     """
+     async for chunk in self.response.content.iter_chunked(self.chunk_size):
+         yield chunk
+
+ async def read(self):
+     """
+     Returns the whole body.
+
+     Raises:
+         BodyTooLargeError: If the body exceeds ``max_body_size``.
+     """
+     limit = self.max_body_size
+     length = self.response.content_length
+     if limit is not None and length is not None and length > limit:
+         raise BodyTooLargeError(f"response of {length} bytes exceeds the {limit} byte limit")
+     body = bytearray()
+     async for chunk in self.iter_chunks():
+         body += chunk
+         if limit is not None and len(body) > limit:
+             raise BodyTooLargeError(f"response exceeds the {limit} byte limit")
+     return bytes(body)
+
+ async def json(self):
+     """
+     Returns the parsed JSON body, whatever its declared content type.
+     """
+     return json.loads(await self.read())
+
+ async def iter_json(self, ndjson=None):
+     """
+     Parses the body incrementally, yielding each element of a top-level JSON array,
+     or each value of a newline-delimited JSON (NDJSON) body, as soon as it is complete.
+
+     A JSON body whose top-level value is not an array yields that one value.
+
+     Args:
+         ndjson (bool, optional): Whether the body is NDJSON; by default decided
+             by its content type (see ``NDJSON_CONTENT_TYPES``).
+
+     Raises:
+         BodyTooLargeError: If a single value exceeds ``max_body_size``.
+         ValueError: If the body is not valid JSON or NDJSON.
+     """
+     if ndjson is None:
+         ndjson = self.response.content_type in NDJSON_CONTENT_TYPES
+     decoder = json.JSONDecoder()
+     # start: before the top-level value; first/element: before an array element
+     # (first may close the array); after: after an element; single: a non-array
+     # top-level value; line/after_line: before/after an NDJSON value; end: done
+     state = "line" if ndjson else "start"
+     buffer = ""
+     position = 0
+     pending = b""
+     chunks = self.iter_chunks()
+     finished = False
+     while True:
+         if state == "after_line":
+             while position < len(buffer) and buffer[position] in " \t\r":
+                 position += 1
+         else:
+             while position < len(buffer) and buffer[position] in _JSON_WHITESPACE:
+                 position += 1
+         if position < len(buffer):
+             char = buffer[position]
+             if state == "after_line":
+                 if char != "\n":
+                     raise ValueError(f"expected a newline between NDJSON values, found {char!r}")
+                 position += 1
+                 state = "line"
+                 continue
+             if state == "start":
+                 if char == "[":
+                     position += 1
+                     state = "first"
+                 else:
+                     state = "single"
+                 continue
+             if state == "after":
+                 if char not in ",]":
+                     raise ValueError(f"expected ',' or ']' after a JSON array element, found {char!r}")
+                 position += 1
+                 state = "element" if char == "," else "end"
+                 continue
+             if state == "end":
+                 raise ValueError(f"unexpected {char!r} after the end of the JSON body")
+             if state == "first" and char == "]":
+                 position += 1
+                 state = "end"
+                 continue
+             if char in ",]":
+                 raise ValueError(f"expected a JSON value, found {char!r}")
+             try:
+                 value, end = decoder.raw_decode(buffer, position)
+             except json.JSONDecodeError:
+                 if finished:
+                     raise
+             else:
+                 # A number running to the end of the data read so far may continue in the next chunk
+                 if finished or char not in "-0123456789" or buffer[end:].strip("0123456789+-.eE"):
+                     yield value
+                     position = end
+                     state = {"line": "after_line", "single": "end"}.get(state, "after")
+                     continue
+         if finished:
+             if state not in ("end", "line", "after_line"):
+                 raise ValueError("JSON body ended before its top-level value was complete")
+             return
+         if self.max_body_size is not None and len(buffer) - position > self.max_body_size:
+             raise BodyTooLargeError(f"JSON value exceeds the {self.max_body_size} byte limit")
+         try:
+             chunk = await chunks.__anext__()
+         except StopAsyncIteration:
+             finished = True
+             chunk = b""
+         # A chunk may end inside a multi-byte UTF-8 sequence
+         data = pending + chunk
+         cut = len(data) if finished else _utf8_boundary(data)
+         buffer = buffer[position:] + data[:cut].decode("utf-8")
+         pending = data[cut:]
+         position = 0
+
+def _utf8_boundary(data):
+ # Index up to which ``data`` holds only complete UTF-8 sequences
+ for back in range(1, min(4, len(data)) + 1):
+     byte = data[-back]
+     if byte & 0xC0 != 0x80:
+         needed = 1 if byte < 0x80 else 2 if byte >> 5 == 0b110 else 3 if byte >> 4 == 0b1110 else 4
+         return len(data) if back >= needed else len(data) - back
+ return len(data)
+
+def _close_body(data):
+ # File objects from a ReplayableBody are closed once their attempt is over
+ if hasattr(data, "close") and not hasattr(data, "__aiter__"):
+     data.close()
+
 class BackendService:
  """
  Interacts with backend services, handling requests and responses.
  """
 
- def __init__(self, base_url, max_retries=3, timeout=10):
+ def __init__(self, base_url, max_retries=3, timeout=10, max_body_size=DEFAULT_MAX_BODY_SIZE,
+              chunk_size=DEFAULT_CHUNK_SIZE):
      """
      Initializes the BackendService.
-     
+
      Args:
          base_url (str): The base URL of the backend service.
          max_retries (int): Maximum number of retries for a failed request.
-         timeout (int): Timeout for the request in seconds.
+         timeout (int): Timeout for the request in seconds; for streamed requests, the
+             timeout of connecting and of each read.
+         max_body_size (int, optional): Bytes of a response body (or of one JSON value
+             when parsing incrementally) held in memory at most; unlimited when None.
+         chunk_size (int): Bytes per chunk when streaming a response body.
      """
      self.base_url = base_url
      self.max_retries = max_retries
      self.timeout = timeout
+     self.max_body_size = max_body_size
+     self.chunk_size = chunk_size
 
  async def send_request(self, endpoint, method="GET", data=None, headers=None):
      """
      Sends a request to the backend service with retries.
-     
+
+     Connection errors, timeouts and 5xx responses are retried, including
+     failures while the response body is read. Other statuses than 200 raise
+     at once: a 4xx describes the request itself, so sending it again would
+     fail the same way.
+
      Args:
          endpoint (str): The API endpoint.
          method (str): HTTP method (default is "GET").
-         data (dict, optional): The request payload.
+         data (dict, optional): The request payload, sent as JSON; bytes and
+             ``ReplayableBody`` objects are sent as they are.
          headers (dict, optional): Additional headers.
-     
+
      Returns:
-         dict: The response data.
+         The parsed response for JSON responses, the raw body (bytes) for others.
      """
-     url = f"{self.base_url}/{endpoint.lstrip('/')}"
-     headers = headers or {}
-     retries = 0
+     async def read(response):
+         if response.status != 200:
+             raise Exception(f"Request to {response.response.url} failed with status {response.status}")
+         if response.response.content_type.endswith("json"):
+             return await response.json()
+         return await response.read()
+
+     if isinstance(data, (bytes, ReplayableBody)):
+         body, json_data = data, None
+     else:
+         body, json_data = None, data
+     async with self._session() as session:
+         result, _ = await self._open(session, self._url(endpoint), method, body, json_data, headers or {}, read)
+         return result
+
+ @contextlib.asynccontextmanager
+ async def stream_request(self, endpoint, method="GET", body=None, json_data=None, headers=None):
+     """
+     Sends a request with retries and yields its response for streaming.
+
+     Connection errors, timeouts and 5xx responses are retried with
+     exponential backoff when the body can be sent again: no body, bytes,
+     JSON or a ``ReplayableBody``. Any other async iterator is sent once.
+     Failures while the caller reads the yielded response are not retried.
+     The response is not buffered; read it through the yielded object before
+     the context exits.
+
+     Args:
+         endpoint (str): The API endpoint.
+         method (str): HTTP method (default is "GET").
+         body (optional): Bytes, a ``ReplayableBody``, or an async iterator of bytes
+             (sent with chunked transfer encoding).
+         json_data (optional): A payload sent as JSON instead of ``body``.
+         headers (dict, optional): Additional headers.
 
-     while retries < self.max_retries:
+     Yields:
+         StreamingResponse: The first response that is not retried.
+     """
+     async with self._session() as session:
+         response, data = await self._open(session, self._url(endpoint), method, body, json_data, headers or {})
          try:
-             async with aiohttp.ClientSession() as session:
-                 async with session.request(method, url, json=data, headers=headers, timeout=self.timeout) as response:
-                     response_data = await response.json()
-                     if response.status == 200:
-                         logger.info(f"Request to {url} succeeded.")
-                         return response_data
-                     else:
-                         logger.warning(f"Request to {url} failed with status {response.status}.")
-                         retries += 1
-                         await asyncio.sleep(2 ** retries)  # Exponential backoff
-         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-             logger.error(f"Error sending request to {url}: {e}")
+             yield StreamingResponse(response, self.max_body_size, self.chunk_size)
+         finally:
+             response.release()
+             _close_body(data)
+
+ def _url(self, endpoint):
+     return f"{self.base_url}/{endpoint.lstrip('/')}"
+
+ def _session(self):
+     # No total timeout, so streamed bodies may take as long as they need between reads
+     timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+     return aiohttp.ClientSession(timeout=timeout)
+
+ async def _open(self, session, url, method, body, json_data, headers, read=None):
+     # Returns the response and the body sent with it, or read()'s result for it when given
+     replayable = body is None or isinstance(body, (bytes, ReplayableBody))
+     attempts = self.max_retries if replayable else 1
+     retries = 0
+     tracer = get_tracer()
+
+     with tracer.start_span("backend.request", attributes={"http.method": method, "http.url": url}) as request_span:
+         while retries < attempts:
+             # Each attempt is its own span and is propagated to the backend as the W3C parent
+             with tracer.start_span("backend.attempt", attributes={"attempt": retries + 1}) as attempt_span:
+                 data = body.factory() if isinstance(body, ReplayableBody) else body
+                 streaming = False
+                 try:
+                     response = await session.request(method, url, data=data, json=json_data,
+                                                      headers=inject(dict(headers)))
+                     attempt_span.set_attribute("http.status_code", response.status)
+                     if response.status < 500:
+                         logger.info(f"Request to {url} answered with status {response.status}.")
+                         if read is None:
+                             streaming = True
+                             return response, data
+                         try:
+                             return await read(StreamingResponse(response, self.max_body_size,
+                                                                 self.chunk_size)), None
+                         finally:
+                             response.release()
+                     logger.warning(f"Request to {url} failed with status {response.status}.")
+                     attempt_span.record_error(f"HTTP {response.status}")
+                     response.release()
+                 except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                     logger.error(f"Error sending request to {url}: {e}")
+                     attempt_span.record_error(e)
+                 finally:
+                     # A streamed file body stays open until the caller releases the response;
+                     # otherwise it is closed here and reopened by the next attempt
+                     if not streaming:
+                         _close_body(data)
              retries += 1
-             await asyncio.sleep(2 ** retries)  # Exponential backoff
-     
-     raise Exception(f"Failed to complete request to {url} after {self.max_retries} retries")
+             if retries < attempts:
+                 await asyncio.sleep(2 ** retries)  # Exponential backoff
+
+         request_span.record_error(f"Failed after {attempts} attempt(s)")
+     raise Exception(f"Failed to complete request to {url} after {attempts} attempt(s)")
@@ -0,0 +1,286 @@
+import os
+import ssl
+import json
+import time
+import socket
+import asyncio
+import hashlib
+import urllib.request
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Names of the certificate files a message can carry, as in the tls config section
+FILE_NAMES = ("cert_file", "key_file", "ca_file")
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _digest_file(path):
+    try:
+        with open(path, "rb") as f:
+            return _digest(f.read())
+    except OSError:
+        return None
+
+class CertificateSubscriber:
+    """
+    Receives certificate updates pushed by the TLS communication service.
+
+    The subscriber holds a long-lived ``GET {url}/v1/certificates/subscribe``
+    request whose response is a stream of newline-delimited JSON messages:
+
+    - ``{"type": "update", "version": 7, "issued_at": <unix time>, "files": {"cert_file": "<PEM>", ...}}``
+      carries the files that changed since the last version the subscriber
+      applied (sent on subscribing, then acknowledged), so an update it
+      rejected is repeated by the next; ``"snapshot": true`` marks a
+      message carrying every file.
+    - ``{"type": "heartbeat"}`` is sent while nothing changes; a stream that
+      is silent for ``heartbeat_timeout`` seconds is reconnected.
+
+    Every update is acknowledged with ``POST {url}/v1/certificates/ack``.
+    After a disconnect the subscription resumes from the last applied version.
+
+    Delivered files are written atomically to the configured certificate
+    paths after the certificate and key have been loaded together
+    successfully. The version is kept in ``state_file``, so a restart serves
+    the cached certificate immediately. Listeners run only when a file's
+    contents actually changed.
+    """
+
+    def __init__(self, url, cert_file, key_file, ca_file=None, state_file=None, subscriber_id=None,
+                 heartbeat_timeout=30.0, reconnect_delay=1.0, max_reconnect_delay=60.0, on_propagation=None):
+        """
+        Initializes the CertificateSubscriber.
+
+        Args:
+            url (str): Base URL of the TLS communication service.
+            cert_file (str): Path the certificate chain is written to.
+            key_file (str): Path the private key is written to.
+            ca_file (str, optional): Path the CA bundle is written to.
+            state_file (str, optional): File recording the applied version; without it every start is a first start.
+            subscriber_id (str, optional): Identifies this proxy to the service; defaults to the host name.
+            heartbeat_timeout (float): Seconds without a message before the stream is reconnected.
+            reconnect_delay (float): Initial delay before reconnecting; doubles up to ``max_reconnect_delay``.
+            max_reconnect_delay (float): Upper bound for the reconnect delay.
+            on_propagation (callable, optional): Called with the seconds between an update's
+                ``issued_at`` and the moment it was applied.
+        """
+        self.url = url.rstrip("/")
+        self.paths = {"cert_file": cert_file, "key_file": key_file, "ca_file": ca_file}
+        self.state_file = state_file
+        self.subscriber_id = subscriber_id or socket.gethostname()
+        self.heartbeat_timeout = heartbeat_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.on_propagation = on_propagation
+        self.version = 0
+        self.digests = {}
+        self.listeners = []
+
+    @classmethod
+    def from_config(cls, tls_config, on_propagation=None):
+        """
+        Creates the subscriber from the validated ``tls`` section.
+        """
+        distribution = tls_config.distribution
+        return cls(
+            distribution.url,
+            tls_config.cert_file,
+            tls_config.key_file,
+            tls_config.ca_file,
+            state_file=distribution.state_file,
+            subscriber_id=distribution.subscriber_id,
+            heartbeat_timeout=distribution.heartbeat_timeout,
+            reconnect_delay=distribution.reconnect_delay,
+            max_reconnect_delay=distribution.max_reconnect_delay,
+            on_propagation=on_propagation
+        )
+
+    def add_listener(self, callback):
+        """
+        Registers a callable run without arguments after the certificate files changed.
+        """
+        self.listeners.append(callback)
+
+    def restore(self):
+        """
+        Restores the applied version from the state file.
+
+        Returns:
+            bool: True if a previously delivered certificate and key are on disk.
+        """
+        self.digests = {name: _digest_file(path) for name, path in self.paths.items() if path}
+        if not self.state_file:
+            return False
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring certificate state {self.state_file}: {e}")
+            return False
+        if self.digests.get("cert_file") is None or self.digests.get("key_file") is None:
+            logger.warning("Cached certificate files are missing; waiting for the TLS communication service.")
+            return False
+        self.version = state.get("version", 0)
+        logger.info(f"Serving cached certificates version {self.version} from {self.paths['cert_file']}")
+        return True
+
+    def fetch_snapshot(self, timeout):
+        """
+        Fetches all certificate files once, for a first start without cached certificates.
+
+        Args:
+            timeout (float): Seconds to wait for the service.
+        """
+        request = urllib.request.Request(f"{self.url}/v1/certificates?subscriber={self.subscriber_id}")
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            message = json.load(response)
+        self.apply(message)
+
+    def apply(self, message):
+        """
+        Installs the files an update carries.
+
+        Args:
+            message (dict): An ``update`` message.
+
+        Returns:
+            bool: True if any certificate file changed.
+
+        Raises:
+            ValueError: If the message is malformed or the resulting certificate and key do not load.
+        """
+        version = message["version"]
+        if version <= self.version and not message.get("snapshot"):
+            logger.info(f"Ignoring certificate update version {version}; version {self.version} is applied.")
+            return False
+
+        changed = {}
+        for name, content in message.get("files", {}).items():
+            if name not in FILE_NAMES:
+                raise ValueError(f"Unknown certificate file {name!r} in update version {version}")
+            if not self.paths[name]:
+                logger.warning(f"Update version {version} carries {name}, which is not configured; skipping it.")
+                continue
+            data = content.encode()
+            if _digest(data) != self.digests.get(name):
+                changed[name] = data
+        if changed:
+            self._install(changed, version)
+
+        self.version = version
+        self._save_state()
+        issued_at = message.get("issued_at")
+        if issued_at and self.on_propagation is not None:
+            self.on_propagation(max(time.time() - issued_at, 0.0))
+        if changed:
+            logger.info(f"Applied certificate update version {version}: {', '.join(changed)} changed.")
+        else:
+            logger.info(f"Certificate update version {version} changed nothing on disk.")
+        return bool(changed)
+
+    def _install(self, changed, version):
+        """
+        Writes the changed files next to their targets, checks them together and renames them into place.
+        """
+        candidates = {}
+        try:
+            for name, data in changed.items():
+                path = self.paths[name]
+                candidates[name] = f"{path}.new"
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                fd = os.open(candidates[name], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+            current = {name: candidates.get(name, path) for name, path in self.paths.items()}
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile=current["cert_file"], keyfile=current["key_file"])
+            if current["ca_file"]:
+                context.load_verify_locations(cafile=current["ca_file"])
+        except (OSError, ssl.SSLError) as e:
+            for candidate in candidates.values():
+                if os.path.exists(candidate):
+                    os.unlink(candidate)
+            raise ValueError(f"Certificate update version {version} does not load: {e}") from e
+        for name, candidate in candidates.items():
+            os.replace(candidate, self.paths[name])
+            self.digests[name] = _digest(changed[name])
+
+    def _save_state(self):
+        if not self.state_file:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_file)), exist_ok=True)
+        candidate = f"{self.state_file}.new"
+        with open(candidate, "w") as f:
+            json.dump({"version": self.version, "subscriber": self.subscriber_id, "digests": self.digests}, f)
+        os.replace(candidate, self.state_file)
+
+    async def run(self):
+        """
+        Keeps the subscription open, resuming from the last applied version after every disconnect.
+        """
+        import aiohttp
+
+        delay = self.reconnect_delay
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.heartbeat_timeout,
+                                        sock_read=self.heartbeat_timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                try:
+                    if await self._subscribe(session):
+                        delay = self.reconnect_delay
+                    logger.info("The TLS communication service closed the certificate subscription.")
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    logger.warning(f"Certificate subscription to {self.url} failed: {str(e) or type(e).__name__}")
+                logger.info(f"Resuming the certificate subscription from version {self.version} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _subscribe(self, session):
+        """
+        Consumes one subscription stream.
+
+        Returns:
+            bool: True if the stream delivered at least one message.
+        """
+        params = {"subscriber": self.subscriber_id, "version": str(self.version)}
+        received = False
+        async with session.get(f"{self.url}/v1/certificates/subscribe", params=params) as response:
+            if response.status != 200:
+                raise ValueError(f"subscription rejected with HTTP {response.status}")
+            logger.info(f"Subscribed to certificate updates from {self.url} at version {self.version}")
+            async for line in response.content:
+                if not line.strip():
+                    continue
+                received = True
+                message = json.loads(line)
+                if message.get("type") == "update":
+                    await self._handle_update(session, message)
+        return received
+
+    async def _handle_update(self, session, message):
+        import aiohttp
+
+        acknowledgement = {"subscriber": self.subscriber_id, "version": message.get("version"), "applied": True}
+        try:
+            changed = self.apply(message)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Rejected certificate update version {message.get('version')}: {e}")
+            acknowledgement.update(applied=False, error=str(e))
+            changed = False
+        if changed:
+            for callback in self.listeners:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Failed to reload certificates after update version {self.version}: {e}",
+                                 exc_info=True)
+        try:
+            async with session.post(f"{self.url}/v1/certificates/ack", json=acknowledgement) as response:
+                if response.status >= 400:
+                    logger.warning(f"Acknowledgement of version {acknowledgement['version']} got HTTP {response.status}")
+        except aiohttp.ClientError as e:
+            logger.warning(f"Failed to acknowledge certificate update version {acknowledgement['version']}: {e}")
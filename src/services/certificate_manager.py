@@ -1,18 +1,129 @@
 import os
+import time
+import heapq
+import asyncio
 import subprocess
-from datetime import datetime
+from datetime import timezone
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+class CertificateRecord:
+    """
+    Parsed metadata for a single certificate file.
+    """
+
+    __slots__ = ("path", "name", "inode", "mtime_ns", "subject", "not_valid_after")
+
+    def __init__(self, path, name, inode, mtime_ns, subject, not_valid_after):
+        self.path = path
+        self.name = name
+        self.inode = inode
+        self.mtime_ns = mtime_ns
+        self.subject = subject
+        self.not_valid_after = not_valid_after
+
+    def days_to_expire(self, now=None):
+        """
+        Returns the number of whole days until the certificate expires.
+        """
+        now = time.time() if now is None else now
+        return int((self.not_valid_after - now) // 86400)
+
+def _certificate_name(path):
+    """
+    Derives the Certbot certificate name from a certificate path.
+
+    Certbot keeps each lineage under ``live/<name>/`` (``cert.pem``,
+    ``chain.pem``, ``fullchain.pem`` and ``privkey.pem``); for any other
+    layout the file name without extension is used.
+    """
+    base = os.path.basename(path)
+    if base in ("cert.pem", "fullchain.pem"):
+        return os.path.basename(os.path.dirname(path))
+    return os.path.splitext(base)[0]
+
+def load_certificate_record(path, stat_result=None, previous=None):
+    """
+    Loads certificate metadata, re-parsing the PEM file only when its inode or mtime changed.
+
+    Args:
+        path (str): Path to the PEM certificate file.
+        stat_result (os.stat_result, optional): Pre-fetched stat result for the file.
+        previous (CertificateRecord, optional): The record loaded last time, returned
+            as it is while the file is unchanged.
+
+    Returns:
+        CertificateRecord: The parsed certificate metadata.
+    """
+    st = stat_result or os.stat(path)
+    if previous is not None and previous.inode == st.st_ino and previous.mtime_ns == st.st_mtime_ns:
+        return previous
+
+    with open(path, 'rb') as f:
+        cert_data = f.read()
+    cert = x509.load_pem_x509_certificate(cert_data, default_backend())
+    not_valid_after = getattr(cert, "not_valid_after_utc", None)
+    if not_valid_after is None:
+        not_valid_after = cert.not_valid_after.replace(tzinfo=timezone.utc)
+
+    record = CertificateRecord(
+        path=path,
+        name=_certificate_name(path),
+        inode=st.st_ino,
+        mtime_ns=st.st_mtime_ns,
+        subject=cert.subject.rfc4514_string(),
+        not_valid_after=not_valid_after.timestamp()
+    )
+    return record
+
+async def run_certbot_renew(cert_name=None, certbot_path="certbot", deploy_hook=None, timeout=600):
+    """
+    Runs ``certbot renew`` as an asynchronous subprocess.
+
+    Args:
+        cert_name (str, optional): Restrict renewal to this Certbot certificate name.
+        certbot_path (str): Path to the Certbot executable.
+        deploy_hook (str, optional): Command Certbot runs after a successful renewal.
+        timeout (int): Maximum time in seconds to wait for Certbot.
+
+    Returns:
+        bool: True if the renewal was successful, False otherwise.
+    """
+    command = [certbot_path, "renew", "--non-interactive", "--quiet"]
+    if cert_name:
+        command += ["--cert-name", cert_name]
+    if deploy_hook:
+        command += ["--deploy-hook", deploy_hook]
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            logger.error(f"Certificate renewal for {cert_name or 'all certificates'} timed out after {timeout}s.")
+            return False
+
+        if process.returncode == 0:
+            return True
+        logger.error(f"Certificate renewal failed: {stderr.decode(errors='replace').strip()}")
+        return False
+    except Exception as e:
+        logger.error(f"Error during certificate renewal: {e}")
+        return False
+
 class CertificateManager:
     """
     Manages TLS certificates, including loading, validation, and renewal.
     """
 
-    def __init__(self, cert_file, key_file, ca_file=None, renewal_threshold_days=30, domain=None):
+    def __init__(self, cert_file, key_file, ca_file=None, renewal_threshold_days=30, domain=None, certbot_path="certbot"):
         """
         Initializes the CertificateManager with the specified certificate files.
         
@@ -22,12 +133,15 @@ class CertificateManager:
             ca_file (str, optional): Path to the CA certificate file.
             renewal_threshold_days (int): Number of days before expiration to renew the certificate.
             domain (str, optional): The domain name for which the certificate is issued.
+            certbot_path (str): Path to the Certbot executable.
         """
         self.cert_file = cert_file
         self.key_file = key_file
         self.ca_file = ca_file
         self.renewal_threshold_days = renewal_threshold_days
         self.domain = domain
+        self.certbot_path = certbot_path
+        self._record = None
 
     def load_certificate(self):
         """
@@ -51,10 +165,8 @@ class CertificateManager:
             bool: True if the certificate is valid, False otherwise.
         """
         try:
-            with open(self.cert_file, 'rb') as f:
-                cert_data = f.read()
-            cert = x509.load_pem_x509_certificate(cert_data, default_backend())
-            days_to_expire = (cert.not_valid_after - datetime.utcnow()).days
+            self._record = load_certificate_record(self.cert_file, previous=self._record)
+            days_to_expire = self._record.days_to_expire()
             if days_to_expire < self.renewal_threshold_days:
                 logger.warning(f"Certificate is expiring in {days_to_expire} days, renewal needed.")
                 return False
@@ -78,7 +190,7 @@ class CertificateManager:
         try:
             # Run Certbot command to renew the certificate
             command = [
-                "certbot", "renew",
+                self.certbot_path, "renew",
                 "--non-interactive",
                 "--quiet",
                 "--deploy-hook", f"echo 'Certificate for {self.domain} renewed'"
@@ -97,3 +209,217 @@ class CertificateManager:
         except Exception as e:
             logger.error(f"Error during certificate renewal: {e}")
             return False
+
+    async def renew_certificate_async(self):
+        """
+        Renews the TLS certificate using Certbot without blocking the event loop.
+
+        Returns:
+            bool: True if the renewal was successful, False otherwise.
+        """
+        if not self.domain:
+            logger.error("Domain is not specified for certificate renewal.")
+            return False
+
+        logger.info(f"Attempting to renew the certificate for {self.domain}...")
+        renewed = await run_certbot_renew(
+            certbot_path=self.certbot_path,
+            deploy_hook=f"echo 'Certificate for {self.domain} renewed'"
+        )
+        if renewed:
+            logger.info(f"Certificate for {self.domain} successfully renewed.")
+        return renewed
+
+class CertificateInventory:
+    """
+    Tracks many certificates and schedules their renewals by expiry.
+
+    Certificates are parsed once and kept in ``records`` while their inode and
+    mtime are unchanged; a scan drops the records of files that disappeared.
+    Renewals are kept in a min-heap ordered by the time each certificate
+    becomes due.
+    """
+
+    def __init__(self, paths, renewal_threshold_days=30, max_concurrent_renewals=4,
+                 certbot_path="certbot", retry_interval=3600, renewal_timeout=600):
+        """
+        Initializes the CertificateInventory.
+
+        Args:
+            paths (list): Certificate files or directories to scan for ``*.pem`` certificates.
+            renewal_threshold_days (int): Number of days before expiration to renew a certificate.
+            max_concurrent_renewals (int): Maximum number of Certbot processes running at once.
+            certbot_path (str): Path to the Certbot executable.
+            retry_interval (int): Seconds to wait before retrying a failed renewal.
+            renewal_timeout (int): Maximum time in seconds for a single renewal.
+        """
+        self.paths = list(paths)
+        self.renewal_threshold = renewal_threshold_days * 86400
+        self.max_concurrent_renewals = max_concurrent_renewals
+        self.certbot_path = certbot_path
+        self.retry_interval = retry_interval
+        self.renewal_timeout = renewal_timeout
+        self.records = {}
+        self._due_at = {}
+        self._heap = []
+        self._semaphore = None
+        self._scan_lock = None
+
+    def _iter_certificate_files(self):
+        for path in self.paths:
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    for name in files:
+                        if not name.endswith(".pem") or "key" in name or name == "chain.pem":
+                            continue
+                        # fullchain.pem holds the same leaf as cert.pem; tracking both would renew the lineage twice
+                        if name == "fullchain.pem" and "cert.pem" in files:
+                            continue
+                        yield os.path.join(root, name)
+            else:
+                yield path
+
+    def _schedule(self, path, due_at):
+        if self._due_at.get(path) == due_at:
+            return
+        self._due_at[path] = due_at
+        heapq.heappush(self._heap, (due_at, path))
+
+    def _load(self, records):
+        """
+        Parses the new or modified certificates; reads ``records`` but changes no inventory state.
+
+        Returns:
+            tuple: The records of every readable certificate by path, and how many had to be (re)parsed.
+        """
+        loaded = {}
+        parsed = 0
+        for path in self._iter_certificate_files():
+            try:
+                previous = records.get(path)
+                record = load_certificate_record(path, previous=previous)
+            except Exception as e:
+                logger.error(f"Failed to load certificate {path}: {e}")
+                continue
+            loaded[path] = record
+            if record is not previous:
+                parsed += 1
+        return loaded, parsed
+
+    def _apply(self, loaded, parsed):
+        for path, record in loaded.items():
+            if self.records.get(path) is not record:
+                self.records[path] = record
+                self._schedule(path, record.not_valid_after - self.renewal_threshold)
+
+        for path in set(self.records) - set(loaded):
+            del self.records[path]
+            self._due_at.pop(path, None)
+
+        logger.info(f"Certificate inventory scanned: {len(self.records)} certificates, {parsed} parsed.")
+        return parsed
+
+    def scan(self):
+        """
+        Scans the configured paths, parsing only new or modified certificates.
+
+        Returns:
+            int: The number of certificates that had to be (re)parsed.
+        """
+        return self._apply(*self._load(self.records))
+
+    async def refresh(self):
+        """
+        Scans like ``scan``, parsing the files in the default executor so the event loop is not blocked.
+
+        Only the parsing runs in the executor; the records and the renewal heap
+        are updated on the event loop, so a scan never races ``renew_due``.
+        """
+        if self._scan_lock is None:
+            self._scan_lock = asyncio.Lock()
+        # One scan at a time, so an older scan's records never replace a newer one's
+        async with self._scan_lock:
+            loaded, parsed = await asyncio.get_running_loop().run_in_executor(None, self._load, dict(self.records))
+            return self._apply(loaded, parsed)
+
+    def next_due(self):
+        """
+        Returns the timestamp at which the next renewal is due, or None if nothing is tracked.
+        """
+        heap = self._heap
+        while heap and self._due_at.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)  # Drop entries superseded by a rescan or removal
+        return heap[0][0] if heap else None
+
+    def seconds_until_next_due(self, now=None):
+        """
+        Returns the number of seconds until the next renewal is due, or None if nothing is tracked.
+        """
+        due_at = self.next_due()
+        if due_at is None:
+            return None
+        now = time.time() if now is None else now
+        return max(0.0, due_at - now)
+
+    def pop_due(self, now=None):
+        """
+        Removes and returns all certificates whose renewal is due.
+
+        Returns:
+            list: The due CertificateRecord objects, soonest first.
+        """
+        now = time.time() if now is None else now
+        due = []
+        while True:
+            due_at = self.next_due()
+            if due_at is None or due_at > now:
+                return due
+            _, path = heapq.heappop(self._heap)
+            del self._due_at[path]
+            record = self.records.get(path)
+            if record is not None:
+                due.append(record)
+
+    async def _renew(self, records):
+        record = records[0]
+        async with self._semaphore:
+            logger.info(f"Renewing certificate {record.name} ({record.days_to_expire()} days left).")
+            renewed = await run_certbot_renew(
+                cert_name=record.name,
+                certbot_path=self.certbot_path,
+                timeout=self.renewal_timeout
+            )
+        # Check back after retry_interval; a rescan that sees the renewed file
+        # replaces this entry with one based on the new expiry.
+        for record in records:
+            if record.path in self.records:  # Not removed by a scan during the renewal
+                self._schedule(record.path, time.time() + self.retry_interval)
+        return renewed
+
+    async def renew_due(self, now=None):
+        """
+        Renews all due certificates with bounded concurrency.
+
+        Renewed certificates are rescheduled from their new expiry once the
+        rescan picks up the changed file; failures are retried after ``retry_interval``.
+
+        Returns:
+            tuple: The number of certificate names renewed successfully and unsuccessfully.
+        """
+        due = self.pop_due(now)
+        if not due:
+            return 0, 0
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_renewals)
+
+        # One Certbot run per certificate name, even if several tracked files belong to it
+        lineages = {}
+        for record in due:
+            lineages.setdefault(record.name, []).append(record)
+        results = await asyncio.gather(*[self._renew(records) for records in lineages.values()])
+        renewed = sum(1 for result in results if result)
+        failed = len(results) - renewed
+        logger.info(f"Certificate renewals completed: {renewed} renewed, {failed} failed.")
+        if renewed:
+            await self.refresh()
+        return renewed, failed
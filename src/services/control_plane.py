@@ -0,0 +1,539 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Handshake and PROXY protocol deadlines mirror the Python proxy's
+HANDSHAKE_TIMEOUT_SECONDS = 10
+UPSTREAM_NAME = "internal_backend"
+LISTENER_NAME = "quantum_safe_tls"
+
+# Envoy (BoringSSL) names of the key exchange groups it implements
+ENVOY_CURVES = {
+    "x25519": "X25519",
+    "secp256r1": "P-256",
+    "prime256v1": "P-256",
+    "secp384r1": "P-384",
+    "secp521r1": "P-521",
+    "x25519mlkem768": "X25519MLKEM768",
+    "x25519kyber768draft00": "X25519Kyber768Draft00",
+}
+
+_TYPE_URLS = {
+    "listeners": "type.googleapis.com/envoy.config.listener.v3.Listener",
+    "clusters": "type.googleapis.com/envoy.config.cluster.v3.Cluster",
+}
+
+def certificate_fingerprint(tls_config):
+    """
+    Returns a digest of the certificate, key and OCSP staple files, which changes when they are renewed.
+
+    Args:
+        tls_config (TLSConfig): The ``tls`` configuration section.
+
+    Returns:
+        str: Hex digest, or an empty string if a file cannot be read.
+    """
+    digest = hashlib.sha256()
+    for path in (tls_config.cert_file, tls_config.key_file):
+        try:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        except OSError as e:
+            logger.warning(f"Cannot read {path} for the data plane: {e}")
+            return ""
+    # A new OCSP staple is picked up like a renewed certificate
+    staple_file = tls_config.revocation.ocsp_staple_file
+    if staple_file and os.path.exists(staple_file):
+        with open(staple_file, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def _nginx_quote(value):
+    value = str(value)
+    if value and not any(char in value for char in ' \t;{}"\'$#\\'):
+        return value
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def _address(host, port):
+    return f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+
+def render_nginx_config(config):
+    """
+    Renders an ``nginx.conf`` terminating TLS like the Python proxy and forwarding to the internal backend.
+
+    The ``stream`` (layer 4) module is used, so any protocol is forwarded as
+    the Python proxy does. Only the default TLS policy applies: NGINX picks
+    the key share before an SNI callback could switch contexts. The stream
+    module limits concurrent connections, not new connections per minute, so
+    ``rate_limiter.max_requests_per_minute`` caps each client's concurrent
+    connections instead. With PROXY protocol accepted, every peer must send a header.
+
+    Args:
+        config (Config): The validated configuration.
+
+    Returns:
+        str: The configuration file contents.
+    """
+    proxy_config = config.proxy
+    tls_config = config.tls
+    policy_config = tls_config.policy
+    proxy_protocol = proxy_config.proxy_protocol
+    backend = config.internal_backend
+    if policy_config.overrides:
+        logger.warning("NGINX applies only the default TLS policy; tls.policy.overrides are ignored.")
+
+    listen = [_address(proxy_config.host, proxy_config.port), "ssl", "reuseport"]
+    if proxy_protocol.accept:
+        listen.append("proxy_protocol")
+    server = [
+        f"listen {' '.join(listen)};",
+        f"ssl_certificate {_nginx_quote(tls_config.cert_file)};",
+        f"ssl_certificate_key {_nginx_quote(tls_config.key_file)};",
+        "ssl_protocols TLSv1.3;",
+        f"ssl_handshake_timeout {HANDSHAKE_TIMEOUT_SECONDS}s;",
+    ]
+    if policy_config.groups:
+        server.append(f"ssl_ecdh_curve {':'.join(policy_config.groups)};")
+    if policy_config.signature_algorithms:
+        server.append(f"ssl_conf_command SignatureAlgorithms {':'.join(policy_config.signature_algorithms)};")
+    if tls_config.client_auth != "none":
+        server.append(f"ssl_client_certificate {_nginx_quote(tls_config.ca_file)};")
+        server.append(f"ssl_verify_client {'on' if tls_config.client_auth == 'required' else 'optional'};")
+    if proxy_protocol.accept:
+        server.append(f"proxy_protocol_timeout {proxy_protocol.header_timeout:g}s;")
+        for network in proxy_protocol.trusted_networks or ("0.0.0.0/0", "::/0"):
+            server.append(f"set_real_ip_from {network};")
+    if config.rate_limiter.enabled:
+        server.append(f"limit_conn per_client {config.rate_limiter.max_requests_per_minute};")
+    if proxy_protocol.send:
+        server.append("proxy_protocol on;")
+    server.append(f"proxy_pass {UPSTREAM_NAME};")
+
+    lines = [
+        "# Rendered by the quantum-safe TLS proxy control plane from config.yaml; edits are overwritten.",
+        "include /etc/nginx/modules-enabled/*.conf;",
+        "worker_processes auto;",
+        "",
+        "events {",
+        "    worker_connections 4096;",
+        "}",
+        "",
+        "stream {",
+        f"    upstream {UPSTREAM_NAME} {{",
+        f"        server {_address(backend.host, backend.port)};",
+        "    }",
+    ]
+    if config.rate_limiter.enabled:
+        lines.append("    limit_conn_zone $binary_remote_addr zone=per_client:10m;")
+    lines.append("")
+    lines.append("    server {")
+    lines.extend(f"        {line}" for line in server)
+    lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+def _envoy_curves(groups):
+    curves = []
+    for name in groups:
+        curve = ENVOY_CURVES.get(name.lower())
+        if curve is None:
+            logger.warning(f"Envoy does not implement key exchange group {name}; skipping it.")
+        elif curve not in curves:
+            curves.append(curve)
+    return curves
+
+def _filter_chain(name, groups, signature_algorithms, tls_config, fingerprint, server_names=(), client_networks=()):
+    tls_params = {"tls_minimum_protocol_version": "TLSv1_3"}
+    curves = _envoy_curves(groups)
+    if curves:
+        tls_params["ecdh_curves"] = curves
+    if signature_algorithms:
+        tls_params["signature_algorithms"] = list(signature_algorithms)
+    certificate = {
+        "certificate_chain": {"filename": tls_config.cert_file},
+        "private_key": {"filename": tls_config.key_file},
+    }
+    staple_file = tls_config.revocation.ocsp_staple_file
+    if staple_file and os.path.exists(staple_file):
+        certificate["ocsp_staple"] = {"filename": staple_file}
+    tls_context = {
+        "@type": "type.googleapis.com/envoy.extensions.transport_sockets.tls.v3.DownstreamTlsContext",
+        "common_tls_context": {"tls_params": tls_params, "tls_certificates": [certificate]},
+    }
+    if tls_config.client_auth != "none":
+        tls_context["common_tls_context"]["validation_context"] = {"trusted_ca": {"filename": tls_config.ca_file}}
+        tls_context["require_client_certificate"] = tls_config.client_auth == "required"
+    chain = {
+        "name": name,
+        # A new fingerprint changes the chain, so Envoy rebuilds it and reads the renewed files
+        "metadata": {"filter_metadata": {LISTENER_NAME: {"certificate": fingerprint}}},
+        "transport_socket": {
+            "name": "envoy.transport_sockets.tls",
+            "typed_config": tls_context,
+        },
+        "filters": [{
+            "name": "envoy.filters.network.tcp_proxy",
+            "typed_config": {
+                "@type": "type.googleapis.com/envoy.extensions.filters.network.tcp_proxy.v3.TcpProxy",
+                "stat_prefix": LISTENER_NAME,
+                "cluster": UPSTREAM_NAME,
+            },
+        }],
+    }
+    match = {}
+    if server_names:
+        match["server_names"] = list(server_names)
+    if client_networks:
+        import ipaddress
+        networks = [ipaddress.ip_network(network, strict=False) for network in client_networks]
+        match["source_prefix_ranges"] = [
+            {"address_prefix": str(network.network_address), "prefix_len": network.prefixlen} for network in networks
+        ]
+    if match:
+        chain["filter_chain_match"] = match
+    return chain
+
+def envoy_resources(config, fingerprint=""):
+    """
+    Renders the Envoy listener and cluster served over xDS.
+
+    Each TLS policy override becomes a filter chain matched on server name
+    and client network before the handshake, so Envoy applies its groups
+    (Envoy prefers the most specific match rather than the first one). Envoy
+    has no per-client rate limit without an external rate limit service, so
+    ``rate_limiter`` is not applied.
+
+    Args:
+        config (Config): The validated configuration.
+        fingerprint (str): Certificate fingerprint from ``certificate_fingerprint``.
+
+    Returns:
+        dict: ``{"listeners": [...], "clusters": [...]}`` in Envoy's v3 JSON form.
+    """
+    proxy_config = config.proxy
+    tls_config = config.tls
+    policy_config = tls_config.policy
+    proxy_protocol = proxy_config.proxy_protocol
+    backend = config.internal_backend
+    if config.rate_limiter.enabled:
+        logger.warning("Envoy has no per-client local rate limit; rate_limiter is not applied to it.")
+
+    chains = [
+        _filter_chain(override.name, override.groups or policy_config.groups,
+                      override.signature_algorithms or policy_config.signature_algorithms, tls_config, fingerprint,
+                      override.server_names, override.client_networks)
+        for override in policy_config.overrides
+    ]
+    chains.append(_filter_chain("default", policy_config.groups, policy_config.signature_algorithms, tls_config,
+                                fingerprint))
+    listener_filters = []
+    if proxy_protocol.accept:
+        listener_filters.append({
+            "name": "envoy.filters.listener.proxy_protocol",
+            "typed_config": {
+                "@type": "type.googleapis.com/envoy.extensions.filters.listener.proxy_protocol.v3.ProxyProtocol",
+            },
+        })
+    if any(override.server_names for override in policy_config.overrides):
+        listener_filters.append({
+            "name": "envoy.filters.listener.tls_inspector",
+            "typed_config": {
+                "@type": "type.googleapis.com/envoy.extensions.filters.listener.tls_inspector.v3.TlsInspector",
+            },
+        })
+    listener = {
+        "@type": _TYPE_URLS["listeners"],
+        "name": LISTENER_NAME,
+        "address": {"socket_address": {"address": proxy_config.host, "port_value": proxy_config.port}},
+        "listener_filters": listener_filters,
+        "listener_filters_timeout": f"{proxy_protocol.header_timeout:g}s",
+        "filter_chains": chains,
+    }
+
+    cluster = {
+        "@type": _TYPE_URLS["clusters"],
+        "name": UPSTREAM_NAME,
+        "type": "STRICT_DNS",
+        "connect_timeout": "5s",
+        "load_assignment": {
+            "cluster_name": UPSTREAM_NAME,
+            "endpoints": [{"lb_endpoints": [{"endpoint": {"address": {"socket_address": {
+                "address": backend.host, "port_value": backend.port}}}}]}],
+        },
+    }
+    if proxy_protocol.send:
+        cluster["transport_socket"] = {
+            "name": "envoy.transport_sockets.upstream_proxy_protocol",
+            "typed_config": {
+                "@type": "type.googleapis.com/envoy.extensions.transport_sockets.proxy_protocol.v3."
+                         "ProxyProtocolUpstreamTransport",
+                "config": {"version": "V2"},
+                "transport_socket": {
+                    "name": "envoy.transport_sockets.raw_buffer",
+                    "typed_config": {
+                        "@type": "type.googleapis.com/envoy.extensions.transport_sockets.raw_buffer.v3.RawBuffer",
+                    },
+                },
+            },
+        }
+    return {"listeners": [listener], "clusters": [cluster]}
+
+def render_envoy_bootstrap(control_plane_config):
+    """
+    Renders an Envoy bootstrap that takes its listeners and clusters from the control plane's xDS server.
+
+    Args:
+        control_plane_config (ControlPlaneConfig): The ``control_plane`` configuration section.
+
+    Returns:
+        dict: The bootstrap in Envoy's v3 JSON form.
+    """
+    api_config_source = {
+        "api_type": "REST",
+        "transport_api_version": "V3",
+        "cluster_names": ["xds"],
+        "refresh_delay": f"{control_plane_config.refresh_delay:g}s",
+    }
+    return {
+        "node": {"id": "quantum-safe-tls-proxy", "cluster": "quantum-safe-tls-proxy"},
+        "dynamic_resources": {
+            "lds_config": {"resource_api_version": "V3", "api_config_source": api_config_source},
+            "cds_config": {"resource_api_version": "V3", "api_config_source": api_config_source},
+        },
+        "static_resources": {
+            "clusters": [{
+                "name": "xds",
+                "type": "STATIC",
+                "connect_timeout": "1s",
+                "load_assignment": {
+                    "cluster_name": "xds",
+                    "endpoints": [{"lb_endpoints": [{"endpoint": {"address": {"socket_address": {
+                        "address": control_plane_config.xds_host,
+                        "port_value": control_plane_config.xds_port}}}}]}],
+                },
+            }],
+        },
+    }
+
+def _write_atomically(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    candidate = f"{path}.new"
+    with open(candidate, "w") as f:
+        f.write(text)
+    os.replace(candidate, path)
+
+class NginxDataPlane:
+    """
+    Writes the rendered configuration for NGINX and reloads it gracefully.
+
+    A configuration NGINX rejects (``nginx -t``) is not installed, so the
+    running workers keep the last good one. ``nginx -s reload`` starts new
+    workers with the new configuration while the old ones finish their
+    connections; NGINX is started if no master process is running.
+    """
+
+    __slots__ = ("binary", "config_path", "rendered")
+
+    def __init__(self, binary, config_path):
+        """
+        Initializes the NginxDataPlane.
+
+        Args:
+            binary (str): The ``nginx`` executable.
+            config_path (str): Path of the configuration file NGINX runs with.
+        """
+        self.binary = binary
+        self.config_path = config_path
+        self.rendered = None
+
+    def apply(self, config, fingerprint, force=False):
+        """
+        Renders, validates and installs the configuration, then reloads NGINX.
+
+        Args:
+            config (Config): The validated configuration.
+            fingerprint (str): Certificate fingerprint; NGINX reads the files itself on reload.
+            force (bool): Reload even if the rendered configuration is unchanged, e.g. after a certificate renewal.
+
+        Raises:
+            ValueError: If NGINX rejects the rendered configuration.
+        """
+        text = render_nginx_config(config)
+        if text == self.rendered and not force:
+            return
+        candidate = f"{self.config_path}.candidate"
+        _write_atomically(candidate, text)
+        result = subprocess.run([self.binary, "-t", "-q", "-c", candidate], capture_output=True, text=True)
+        if result.returncode != 0:
+            os.unlink(candidate)
+            raise ValueError(f"NGINX rejected the rendered configuration: {result.stderr.strip()}")
+        os.replace(candidate, self.config_path)
+        self.rendered = text
+
+        result = subprocess.run([self.binary, "-s", "reload", "-c", self.config_path], capture_output=True, text=True)
+        if result.returncode == 0:
+            logger.info(f"NGINX reloaded with {self.config_path}")
+            return
+        # No master process to signal yet
+        subprocess.run([self.binary, "-c", self.config_path], check=True, capture_output=True)
+        logger.info(f"NGINX started with {self.config_path}")
+
+    def close(self):
+        pass
+
+class _XdsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers Envoy's REST-JSON discovery requests (``POST /v3/discovery:listeners`` and ``:clusters``).
+    """
+
+    def do_POST(self):
+        kind = self.path.rpartition(":")[2] if self.path.startswith("/v3/discovery:") else None
+        snapshot = self.server.snapshot
+        if kind not in _TYPE_URLS:
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_error(400, "Invalid discovery request")
+            return
+        version, resources = snapshot
+        if request.get("version_info") == version:
+            # Envoy treats 304 as "no update" and polls again after its refresh delay
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({"version_info": version, "type_url": _TYPE_URLS[kind], "resources": resources[kind]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class EnvoyDataPlane:
+    """
+    Serves the rendered listeners and clusters to Envoy over a minimal REST-JSON xDS server.
+
+    Envoy polls the server every ``refresh_delay`` seconds; a changed
+    resource set gets a new version, and Envoy updates its listener in place,
+    draining connections on replaced filter chains instead of dropping them.
+    The bootstrap file Envoy starts with is written once at start-up.
+    """
+
+    __slots__ = ("bootstrap_path", "server", "thread")
+
+    def __init__(self, control_plane_config):
+        """
+        Initializes the EnvoyDataPlane, writes the bootstrap and starts the xDS server.
+
+        Args:
+            control_plane_config (ControlPlaneConfig): The ``control_plane`` configuration section.
+        """
+        self.bootstrap_path = control_plane_config.envoy_bootstrap
+        _write_atomically(self.bootstrap_path, json.dumps(render_envoy_bootstrap(control_plane_config), indent=2))
+        self.server = ThreadingHTTPServer((control_plane_config.xds_host, control_plane_config.xds_port),
+                                          _XdsRequestHandler)
+        self.server.daemon_threads = True
+        self.server.snapshot = ("", {kind: [] for kind in _TYPE_URLS})
+        self.thread = threading.Thread(target=self.server.serve_forever, name="xds-server", daemon=True)
+        self.thread.start()
+        logger.info(f"xDS server for Envoy started on {control_plane_config.xds_host}:"
+                    f"{control_plane_config.xds_port}; bootstrap written to {self.bootstrap_path}")
+
+    def apply(self, config, fingerprint, force=False):
+        """
+        Publishes the rendered resources; Envoy picks them up on its next poll.
+
+        Args:
+            config (Config): The validated configuration.
+            fingerprint (str): Certificate fingerprint, embedded so renewed files are reloaded.
+            force (bool): Unused; a certificate renewal changes the fingerprint and so the version.
+        """
+        resources = envoy_resources(config, fingerprint)
+        version = hashlib.sha256(json.dumps(resources, sort_keys=True).encode()).hexdigest()[:16]
+        if version != self.server.snapshot[0]:
+            # Replaced as a whole, so request threads never see a partial update
+            self.server.snapshot = (version, resources)
+            logger.info(f"Published data plane configuration version {version} to Envoy.")
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class ControlPlane:
+    """
+    Drives a native data plane (NGINX or Envoy) from the proxy's configuration.
+
+    The Python process keeps configuration validation and certificate
+    management while the data plane carries the traffic: the data plane is
+    reconfigured when the configuration is reloaded and when the certificate
+    files change on disk, e.g. after a renewal.
+    """
+
+    __slots__ = ("data_plane", "config", "fingerprint")
+
+    def __init__(self, data_plane):
+        """
+        Initializes the ControlPlane.
+
+        Args:
+            data_plane (NginxDataPlane or EnvoyDataPlane): The data plane to drive.
+        """
+        self.data_plane = data_plane
+        self.config = None
+        self.fingerprint = None
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Creates the control plane for ``control_plane.mode``.
+        """
+        control_plane_config = config.control_plane
+        if control_plane_config.mode == "nginx":
+            return cls(NginxDataPlane(control_plane_config.nginx_binary, control_plane_config.nginx_config))
+        return cls(EnvoyDataPlane(control_plane_config))
+
+    def apply(self, config, force=False):
+        """
+        Renders the configuration for the data plane and reloads it.
+
+        Args:
+            config (Config): The validated configuration.
+            force (bool): Reload even if the rendered configuration is unchanged.
+        """
+        fingerprint = certificate_fingerprint(config.tls)
+        self.data_plane.apply(config, fingerprint, force)
+        self.config = config
+        self.fingerprint = fingerprint
+
+    async def watch_certificates(self, interval):
+        """
+        Reloads the data plane whenever the certificate or key files change.
+
+        Args:
+            interval (float): Seconds between checks.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            fingerprint = certificate_fingerprint(self.config.tls)
+            if fingerprint and fingerprint != self.fingerprint:
+                logger.info("Certificate files changed; reloading the data plane.")
+                try:
+                    self.apply(self.config, force=True)
+                except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                    logger.error(f"Failed to reload the data plane: {e}")
+
+    def close(self):
+        self.data_plane.close()
@@ -0,0 +1,432 @@
+import os
+import time
+import hashlib
+import datetime
+import urllib.error
+import urllib.request
+from cryptography import x509
+from cryptography.x509 import ocsp
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed448, ed25519, padding, rsa
+from core.revocation import IssuerRevocations, RevokedSerials, normalize_serial, subject_name
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Refetch interval of an OCSP response that carries no nextUpdate
+OCSP_DEFAULT_LIFETIME = 3600.0
+
+def _timestamp(obj, name):
+    # cryptography 42 added the timezone-aware *_utc properties
+    value = getattr(obj, f"{name}_utc", None)
+    if value is None:
+        value = getattr(obj, name)
+        if value is not None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp() if value is not None else None
+
+def _fetch(url, timeout, etag=None, data=None, content_type=None):
+    """
+    GETs (or POSTs ``data`` to) ``url``.
+
+    Returns:
+        tuple: The body and the response's ETag, or ``(None, etag)`` if the resource is unchanged.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if content_type:
+        headers["Content-Type"] = content_type
+    request = urllib.request.Request(url, data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read(), response.headers.get("ETag")
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, etag
+        raise
+
+def _write_atomically(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    candidate = f"{path}.{os.getpid()}.tmp"
+    with open(candidate, "wb") as f:
+        f.write(data)
+    os.replace(candidate, path)
+
+def _verify_signature(public_key, signature, data, hash_algorithm):
+    """
+    Verifies a signature with any key type used for CRLs and OCSP responses.
+
+    Raises:
+        InvalidSignature: If the signature does not match.
+    """
+    if isinstance(public_key, rsa.RSAPublicKey):
+        public_key.verify(signature, data, padding.PKCS1v15(), hash_algorithm)
+    elif isinstance(public_key, ec.EllipticCurvePublicKey):
+        public_key.verify(signature, data, ec.ECDSA(hash_algorithm))
+    elif isinstance(public_key, (ed25519.Ed25519PublicKey, ed448.Ed448PublicKey)):
+        public_key.verify(signature, data)
+    else:
+        raise InvalidSignature(f"unsupported key type {type(public_key).__name__}")
+
+def load_certificates(path):
+    """
+    Loads every PEM certificate in a file.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if hasattr(x509, "load_pem_x509_certificates"):
+        return x509.load_pem_x509_certificates(data)
+    marker = b"-----END CERTIFICATE-----"
+    return [x509.load_pem_x509_certificate(block + marker) for block in data.split(marker) if block.strip()]
+
+class CRLSource:
+    """
+    One CRL distribution point, optionally with a delta CRL, and what was last fetched from it.
+    """
+
+    __slots__ = ("url", "delta_url", "etag", "delta_etag", "base", "base_number", "base_next_update",
+                 "delta_number", "issuer")
+
+    def __init__(self, url, delta_url=None):
+        self.url = url
+        self.delta_url = delta_url
+        self.etag = None
+        self.delta_etag = None
+        self.base = None
+        self.base_number = None
+        self.base_next_update = None
+        self.delta_number = None
+        self.issuer = None
+
+class CRLUpdater:
+    """
+    Keeps the RevocationChecker's indexes in step with the configured CRLs.
+
+    Each refresh sends conditional requests, so an unchanged base CRL costs a
+    304. A new base CRL is verified against the issuing CA from ``ca_file``
+    and indexed from scratch; a delta CRL is applied to the indexed base
+    (which is kept next to the combined index), so revocations published
+    between base CRLs take effect within one refresh at the cost of a
+    splice rather than a rebuild. Base CRLs are cached in ``cache_dir``, so a
+    restart indexes the cached copy and only revalidates it.
+    """
+
+    def __init__(self, checker, ca_file, sources, cache_dir=None, timeout=30.0, error_rate=0.01, on_update=None):
+        """
+        Initializes the CRLUpdater.
+
+        Args:
+            checker (RevocationChecker): Receives the rebuilt indexes.
+            ca_file (str): PEM file with the CAs whose CRLs are accepted.
+            sources (list): ``(url, delta_url)`` pairs; ``delta_url`` may be None.
+            cache_dir (str, optional): Directory keeping the last base CRL of each source.
+            timeout (float): Seconds to wait for a distribution point.
+            error_rate (float): False positive rate of the Bloom filters.
+            on_update (callable, optional): Called with an issuer's name and its number of revoked serials.
+        """
+        self.checker = checker
+        self.ca_file = ca_file
+        self.sources = [CRLSource(url, delta_url) for url, delta_url in sources]
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.error_rate = error_rate
+        self.on_update = on_update
+        self.authorities = [(certificate, subject_name(certificate.public_bytes(serialization.Encoding.DER)))
+                            for certificate in load_certificates(ca_file)]
+
+    @classmethod
+    def from_config(cls, checker, tls_config, on_update=None):
+        """
+        Creates the updater from the validated ``tls`` section.
+        """
+        revocation_config = tls_config.revocation
+        return cls(
+            checker,
+            tls_config.ca_file,
+            [(source.url, source.delta_url) for source in revocation_config.crls],
+            cache_dir=revocation_config.cache_dir,
+            timeout=revocation_config.fetch_timeout,
+            error_rate=revocation_config.bloom_error_rate,
+            on_update=on_update
+        )
+
+    def _cache_path(self, source, suffix):
+        return os.path.join(self.cache_dir, hashlib.sha256(source.url.encode()).hexdigest()[:16] + suffix)
+
+    def _verified(self, data):
+        """
+        Parses a DER (or PEM) CRL and checks its signature against the configured CAs.
+
+        Returns:
+            tuple: The CRL, its issuing CA certificate and the CA's raw subject name.
+        """
+        crl = x509.load_pem_x509_crl(data) if data.lstrip().startswith(b"-----") else x509.load_der_x509_crl(data)
+        for certificate, name in self.authorities:
+            if certificate.subject == crl.issuer and crl.is_signature_valid(certificate.public_key()):
+                return crl, certificate, name
+        raise ValueError(f"CRL issued by {crl.issuer.rfc4514_string()} is not signed by a CA in {self.ca_file}")
+
+    @staticmethod
+    def _extension(crl, extension_type):
+        try:
+            return crl.extensions.get_extension_for_class(extension_type).value.crl_number
+        except x509.ExtensionNotFound:
+            return None
+
+    def refresh(self):
+        """
+        Fetches every source and installs the indexes that changed.
+
+        Returns:
+            bool: True if any issuer's revocations changed.
+        """
+        changed = False
+        for source in self.sources:
+            try:
+                changed |= self._refresh_source(source)
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to refresh CRL {source.url}: {e}")
+        return changed
+
+    def _refresh_source(self, source):
+        base_changed = self._refresh_base(source)
+        delta_changed = False
+        if source.delta_url and source.base is not None:
+            delta_changed = self._refresh_delta(source)
+        if base_changed and not delta_changed:
+            self._install(source, source.base, source.base_number, source.base_next_update)
+        return base_changed or delta_changed
+
+    def _refresh_base(self, source):
+        etag = source.etag
+        data = None
+        if source.base is None and self.cache_dir:
+            # First refresh after a start: index the cached copy and only revalidate it
+            try:
+                with open(self._cache_path(source, ".crl"), "rb") as f:
+                    data = f.read()
+                with open(self._cache_path(source, ".etag")) as f:
+                    etag = f.read().strip() or None
+            except FileNotFoundError:
+                data = etag = None
+        try:
+            fetched, etag = _fetch(source.url, self.timeout, etag)
+        except OSError as e:
+            if data is None:
+                raise
+            logger.warning(f"Failed to revalidate CRL {source.url}, using the cached copy: {e}")
+            fetched, etag = None, None
+        if fetched is not None:
+            data = fetched
+        elif data is None:
+            return False
+        source.etag = etag
+
+        crl, _, issuer = self._verified(data)
+        number = self._extension(crl, x509.CRLNumber)
+        if source.base is not None and number is not None and source.base_number is not None \
+                and number <= source.base_number:
+            return False
+        started = time.perf_counter()
+        source.base = RevokedSerials.build((normalize_serial(entry.serial_number) for entry in crl), self.error_rate)
+        source.base_number = number
+        source.base_next_update = _timestamp(crl, "next_update")
+        source.delta_number = None
+        source.delta_etag = None
+        source.issuer = (issuer, crl.issuer.rfc4514_string())
+        logger.info(f"Indexed CRL {source.url} number {number}: {len(source.base)} revoked serial(s) "
+                    f"in {time.perf_counter() - started:.2f}s.")
+        if fetched is not None and self.cache_dir:
+            _write_atomically(self._cache_path(source, ".crl"), data)
+            _write_atomically(self._cache_path(source, ".etag"), (etag or "").encode())
+        return True
+
+    def _refresh_delta(self, source):
+        data, etag = _fetch(source.delta_url, self.timeout, source.delta_etag)
+        if data is None:
+            return False
+        source.delta_etag = etag
+        crl, _, issuer = self._verified(data)
+        number = self._extension(crl, x509.CRLNumber)
+        base_number = self._extension(crl, x509.DeltaCRLIndicator)
+        if base_number is None:
+            raise ValueError(f"{source.delta_url} is not a delta CRL")
+        if issuer != source.issuer[0]:
+            raise ValueError(f"delta CRL {source.delta_url} has a different issuer than {source.url}")
+        if source.base_number is not None and (base_number > source.base_number or number <= source.base_number):
+            # RFC 5280 5.2.4: applies to complete CRLs numbered from its base up to itself
+            logger.info(f"Delta CRL {number} (base {base_number}) does not apply to base CRL {source.base_number}; "
+                        f"waiting for a new base.")
+            return False
+        if source.delta_number is not None and number <= source.delta_number:
+            return False
+
+        added, removed = [], []
+        for entry in crl:
+            serial = normalize_serial(entry.serial_number)
+            try:
+                reason = entry.extensions.get_extension_for_class(x509.CRLReason).value.reason
+            except x509.ExtensionNotFound:
+                reason = None
+            (removed if reason == x509.ReasonFlags.remove_from_crl else added).append(serial)
+        # Delta CRLs are cumulative, so each one is applied to the base rather than to the previous delta
+        serials = source.base.merged(added, removed, self.error_rate)
+        source.delta_number = number
+        next_update = min(filter(None, (source.base_next_update, _timestamp(crl, "next_update"))), default=None)
+        self._install(source, serials, number, next_update)
+        logger.info(f"Applied delta CRL {number} to base CRL {source.base_number}: "
+                    f"{len(added)} revoked, {len(removed)} removed.")
+        return True
+
+    def _install(self, source, serials, number, next_update):
+        issuer, label = source.issuer
+        self.checker.update(issuer, IssuerRevocations(label, serials, number, next_update))
+        if self.on_update is not None:
+            self.on_update(label, len(serials))
+
+class OCSPStapleCache:
+    """
+    Keeps a current OCSP response for the proxy's own certificate in ``staple_file``.
+
+    Data planes that staple from a file (Envoy's ``ocsp_staple``) serve it
+    to clients, so clients need no OCSP round trip of their own. The
+    response is fetched from the responder named in the certificate (or
+    ``responder_url``), verified against the issuer, and refreshed halfway
+    through its validity, well before it expires.
+    """
+
+    def __init__(self, cert_file, staple_file, ca_file=None, responder_url=None, timeout=10.0):
+        """
+        Initializes the OCSPStapleCache.
+
+        Args:
+            cert_file (str): The proxy's certificate chain; the issuer is the second certificate
+                or a CA in ``ca_file``.
+            staple_file (str): Where the DER OCSP response is written.
+            ca_file (str, optional): PEM file searched for the issuer.
+            responder_url (str, optional): OCSP responder overriding the certificate's AIA entry.
+            timeout (float): Seconds to wait for the responder.
+        """
+        self.cert_file = cert_file
+        self.staple_file = staple_file
+        self.ca_file = ca_file
+        self.responder_url = responder_url
+        self.timeout = timeout
+        self.serial_number = None
+        self.this_update = None
+        self.next_update = None
+        self.listeners = []
+
+    def add_listener(self, callback):
+        """
+        Registers a callable run without arguments after a new response was written.
+        """
+        self.listeners.append(callback)
+
+    def _certificate_and_issuer(self):
+        chain = load_certificates(self.cert_file)
+        certificate = chain[0]
+        candidates = chain[1:] + (load_certificates(self.ca_file) if self.ca_file else [])
+        for issuer in candidates:
+            if issuer.subject == certificate.issuer:
+                return certificate, issuer
+        raise ValueError(f"The issuer of {self.cert_file} is neither in the chain nor in the CA file")
+
+    def _responder(self, certificate):
+        if self.responder_url:
+            return self.responder_url
+        try:
+            access = certificate.extensions.get_extension_for_class(x509.AuthorityInformationAccess).value
+        except x509.ExtensionNotFound:
+            access = ()
+        for description in access:
+            if description.access_method == x509.oid.AuthorityInformationAccessOID.OCSP:
+                return description.access_location.value
+        raise ValueError(f"{self.cert_file} names no OCSP responder; set tls.revocation.ocsp_responder_url")
+
+    def _verify(self, response, issuer):
+        signer = issuer
+        for candidate in response.certificates:
+            # A delegated responder certificate must be issued by the CA for OCSP signing
+            try:
+                purposes = candidate.extensions.get_extension_for_class(x509.ExtendedKeyUsage).value
+            except x509.ExtensionNotFound:
+                continue
+            if candidate.issuer == issuer.subject and x509.oid.ExtendedKeyUsageOID.OCSP_SIGNING in purposes:
+                _verify_signature(issuer.public_key(), candidate.signature, candidate.tbs_certificate_bytes,
+                                  candidate.signature_hash_algorithm)
+                signer = candidate
+        _verify_signature(signer.public_key(), response.signature, response.tbs_response_bytes,
+                          response.signature_hash_algorithm)
+
+    def load(self):
+        """
+        Adopts a staple file written before a restart if it is for the current certificate.
+
+        Returns:
+            bool: True if the staple file holds a usable response.
+        """
+        try:
+            with open(self.staple_file, "rb") as f:
+                response = ocsp.load_der_ocsp_response(f.read())
+            certificate, issuer = self._certificate_and_issuer()
+            self._verify(response, issuer)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, InvalidSignature) as e:
+            logger.warning(f"Ignoring OCSP staple {self.staple_file}: {e}")
+            return False
+        next_update = _timestamp(response, "next_update")
+        if response.serial_number != certificate.serial_number or (next_update and next_update <= time.time()):
+            return False
+        self._adopt(response)
+        return True
+
+    def _adopt(self, response):
+        self.serial_number = response.serial_number
+        self.this_update = _timestamp(response, "this_update")
+        self.next_update = _timestamp(response, "next_update") or self.this_update + OCSP_DEFAULT_LIFETIME
+
+    def refresh_due(self, now=None):
+        """
+        Returns whether the cached response is missing or past half of its validity.
+        """
+        if self.next_update is None:
+            return True
+        now = time.time() if now is None else now
+        return now >= self.this_update + (self.next_update - self.this_update) / 2
+
+    def refresh_if_due(self):
+        """
+        Fetches and writes a new response when the cached one is due or the certificate changed.
+
+        Returns:
+            bool: True if a new response was written.
+        """
+        certificate, issuer = self._certificate_and_issuer()
+        if certificate.serial_number == self.serial_number and not self.refresh_due():
+            return False
+        request = ocsp.OCSPRequestBuilder().add_certificate(certificate, issuer, hashes.SHA1()).build()
+        data, _ = _fetch(self._responder(certificate), self.timeout,
+                         data=request.public_bytes(serialization.Encoding.DER),
+                         content_type="application/ocsp-request")
+        response = ocsp.load_der_ocsp_response(data)
+        if response.response_status != ocsp.OCSPResponseStatus.SUCCESSFUL:
+            raise ValueError(f"OCSP responder answered {response.response_status.name}")
+        if response.serial_number != certificate.serial_number:
+            raise ValueError("OCSP response is for a different certificate")
+        try:
+            self._verify(response, issuer)
+        except InvalidSignature as e:
+            raise ValueError(f"OCSP response signature is invalid{': ' + str(e) if str(e) else ''}") from e
+        if response.certificate_status == ocsp.OCSPCertStatus.REVOKED:
+            logger.error(f"The OCSP responder reports {self.cert_file} as revoked.")
+        _write_atomically(self.staple_file, data)
+        self._adopt(response)
+        logger.info(f"Stapling OCSP response ({response.certificate_status.name}) valid until "
+                    f"{datetime.datetime.fromtimestamp(self.next_update, datetime.timezone.utc):%Y-%m-%d %H:%M}Z.")
+        for callback in self.listeners:
+            callback()
+        return True
@@ -2,7 +2,6 @@ import ssl
 import os
 import time
 from utils.logger import get_logger
-from crypto.quantum_encryption_service import QuantumEncryptionService
 
 logger = get_logger(__name__)
 
@@ -11,7 +10,8 @@ class TLSService:
     Handles TLS configuration, including setting up quantum-safe TLS contexts.
     """
 
-    def __init__(self, cert_file, key_file, ca_file=None, use_hybrid=False, check_interval=60, key_name=None, kms_aes_key_name=None):
+    def __init__(self, cert_file, key_file, ca_file=None, use_hybrid=False, check_interval=60, key_name=None, kms_aes_key_name=None,
+                 encapsulation_pool=None):
         """
         Initializes the TLSService with the specified certificate files.
         
@@ -23,6 +23,7 @@ class TLSService:
             check_interval (int): Interval in seconds to check for certificate changes.
             key_name (str, optional): KMS key name for quantum-safe key operations.
             kms_aes_key_name (str, optional): KMS key name for decrypting the AES key.
+            encapsulation_pool (EncapsulationPool, optional): Pregenerated Kyber encapsulations for hybrid operations.
         """
         self.cert_file = cert_file
         self.key_file = key_file
@@ -33,9 +34,20 @@ class TLSService:
         self.kms_aes_key_name = kms_aes_key_name
         self.tls_context = None
         self.last_checked = time.time()
-        self.quantum_service = QuantumEncryptionService()
+        self.encapsulation_pool = encapsulation_pool
+        self._quantum_service = None
         self._setup_tls_context()
 
+    @property
+    def quantum_service(self):
+        """
+        Returns the quantum encryption service, importing liboqs on first use.
+        """
+        if self._quantum_service is None:
+            from crypto.post_quantum_algorithms import QuantumEncryptionService
+            self._quantum_service = QuantumEncryptionService(encapsulation_pool=self.encapsulation_pool)
+        return self._quantum_service
+
     def _setup_tls_context(self):
         """
         Sets up the TLS context with quantum-safe settings.
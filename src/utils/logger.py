@@ -59,6 +59,30 @@ def setup_logger(log_level=logging.INFO, log_to_file=True, log_file='logs/app.lo
     logging.config.dictConfig(log_config)
     logging.info("Logger configured successfully with level: %s", logging.getLevelName(log_level))
 
+def setup_logging(config_path, default_level=logging.INFO):
+    """
+    Configures logging from a JSON dictConfig file, falling back to basic console logging.
+    
+    Args:
+        config_path (str): Path to the JSON logging configuration.
+        default_level (int): Logging level used when the configuration file is missing.
+    """
+    if not os.path.exists(config_path):
+        logging.basicConfig(level=default_level)
+        logging.warning("Logging configuration %s not found, using basic console logging.", config_path)
+        return
+
+    with open(config_path, 'r') as f:
+        log_config = json.load(f)
+
+    # Ensure directories for file handlers exist
+    for handler in log_config.get('handlers', {}).values():
+        filename = handler.get('filename')
+        if filename and os.path.dirname(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    logging.config.dictConfig(log_config)
+
 def get_logger(name):
     """
     Gets a logger with the specified name.
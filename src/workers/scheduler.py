@@ -0,0 +1,424 @@
+import os
+import time
+import types
+import random
+import asyncio
+import calendar
+import concurrent.futures
+from datetime import datetime, timedelta, timezone
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Minute, hour, day of month, month and day of week (0 or 7 is Sunday)
+_CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+# A schedule that matches nothing within this many years never matches
+_CRON_HORIZON_YEARS = 5
+
+def _parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(","):
+        spec, _, step = part.partition("/")
+        if spec == "*":
+            start, end = low, high
+        elif "-" in spec:
+            start, end = (int(value) for value in spec.split("-", 1))
+        else:
+            start = end = int(spec)
+        step = int(step) if step else 1
+        if step < 1 or not low <= start <= end <= high:
+            raise ValueError(f"cron field {field!r} is outside {low}-{high}")
+        if step > 1 and spec != "*" and "-" not in spec:
+            end = high  # "5/15" means from 5 to the end of the range
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+class IntervalTrigger:
+    """
+    Fires every ``seconds`` seconds, each run delayed by up to ``jitter`` seconds.
+    """
+
+    def __init__(self, seconds, jitter=0.0):
+        if seconds <= 0:
+            raise ValueError("The interval must be positive")
+        self.seconds = seconds
+        self.jitter = jitter
+
+    def next_run(self, now):
+        """
+        Returns the wall-clock time of the first run after ``now``.
+        """
+        return now + self.seconds + random.uniform(0, self.jitter)
+
+    def __repr__(self):
+        return f"every {self.seconds:g}s"
+
+class CronTrigger:
+    """
+    Fires at the times matched by a five-field cron expression, evaluated in UTC.
+
+    Fields are minute, hour, day of month, month and day of week, each ``*``,
+    a value, a range ``a-b`` or a list of those, optionally with a step
+    (``*/15``, ``0-30/10``). As in cron, when both day fields are restricted a
+    day matching either of them matches.
+    """
+
+    def __init__(self, expression, jitter=0.0):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression {expression!r} must have 5 fields")
+        try:
+            parsed = [_parse_cron_field(field, low, high) for field, (low, high) in zip(fields, _CRON_RANGES)]
+        except ValueError as e:
+            raise ValueError(f"Invalid cron expression {expression!r}: {e}") from e
+        self.expression = expression
+        self.jitter = jitter
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+        # Fail on schedules such as "0 0 30 2 *" at start-up instead of at the first run
+        self.next_run(time.time())
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_run(self, now):
+        """
+        Returns the wall-clock time of the first matching minute after ``now``.
+
+        Raises:
+            ValueError: If the expression matches no time in the next years.
+        """
+        moment = datetime.fromtimestamp(now, timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        horizon = moment.year + _CRON_HORIZON_YEARS
+        while moment.year <= horizon:
+            if moment.month not in self.months:
+                days_left = calendar.monthrange(moment.year, moment.month)[1] - moment.day + 1
+                moment = (moment + timedelta(days=days_left)).replace(hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp() + random.uniform(0, self.jitter)
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
+
+    def __repr__(self):
+        return f"cron {self.expression!r}"
+
+def trigger_from_config(task_config, default_interval):
+    """
+    Creates the trigger of a task configured by a ``scheduler.<task>`` section.
+
+    Args:
+        task_config (ScheduledTaskConfig): The task's settings.
+        default_interval (float): Interval used when neither ``interval`` nor ``cron`` is set.
+    """
+    if task_config.cron:
+        return CronTrigger(task_config.cron, task_config.jitter)
+    return IntervalTrigger(task_config.interval or default_interval, task_config.jitter)
+
+class _StepTimer:
+    """
+    Records the longest time a coroutine ran between two suspensions, i.e. the longest it held the loop.
+    """
+
+    __slots__ = ("longest",)
+
+    def __init__(self):
+        self.longest = 0.0
+
+@types.coroutine
+def _timed(coroutine, timer):
+    """
+    Drives ``coroutine`` like ``await`` does while timing each step it runs on the loop.
+    """
+    value, error = None, None
+    while True:
+        started = time.perf_counter()
+        try:
+            if error is not None:
+                yielded = coroutine.throw(error)
+            else:
+                yielded = coroutine.send(value)
+        except StopIteration as e:
+            return e.value
+        finally:
+            timer.longest = max(timer.longest, time.perf_counter() - started)
+        try:
+            value, error = (yield yielded), None
+        except BaseException as e:
+            value, error = None, e
+
+class ScheduledTask:
+    """
+    A task registered with the TaskScheduler and its run state.
+    """
+
+    __slots__ = ("name", "func", "trigger", "timeout", "executor", "lock", "next_run", "running", "runs", "failures")
+
+    def __init__(self, name, func, trigger, timeout, executor, lock):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.timeout = timeout
+        self.executor = executor
+        self.lock = lock
+        self.next_run = None
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+
+class TaskScheduler:
+    """
+    Runs background tasks on interval or cron triggers next to the proxy.
+
+    Coroutine functions run on the event loop; every other callable is
+    treated as blocking and runs in a thread pool, or in a process pool when
+    registered with ``executor="process"`` (for CPU-bound work that should not
+    contend for the GIL). The longest stretch a task held the loop is measured
+    per run, so a task that blocks the loop shows up in its metrics.
+
+    A task never overlaps itself: a trigger that fires while the previous run
+    is still going is skipped. Tasks registered with ``lock=True`` also hold
+    an exclusive ``flock`` on ``<lock_dir>/<name>.lock`` while they run, so
+    only one of the proxy processes sharing ``lock_dir`` (workers, or a
+    replacement process during a restart) runs them at a time; the others
+    skip that run.
+    """
+
+    def __init__(self, lock_dir=None, thread_workers=2, process_workers=1, on_run=None):
+        """
+        Initializes the TaskScheduler.
+
+        Args:
+            lock_dir (str, optional): Directory of the lock files; required for tasks registered with ``lock=True``.
+            thread_workers (int): Threads running blocking tasks.
+            process_workers (int): Processes running tasks registered with ``executor="process"``.
+            on_run (callable, optional): Called with the task name, the outcome (ok, error, timeout,
+                locked or overlap), the run's duration and the longest time it blocked the loop, in seconds.
+        """
+        self.lock_dir = lock_dir
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self.on_run = on_run
+        self.tasks = {}
+        self._thread_pool = None
+        self._process_pool = None
+        self._wakeup = None
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, scheduler_config, on_run=None):
+        """
+        Creates the scheduler from the validated ``scheduler`` section.
+        """
+        return cls(
+            lock_dir=scheduler_config.lock_dir,
+            thread_workers=scheduler_config.thread_workers,
+            process_workers=scheduler_config.process_workers,
+            on_run=on_run
+        )
+
+    def add(self, name, func, trigger, timeout=None, executor=None, lock=False, run_at_start=False):
+        """
+        Registers a task.
+
+        Args:
+            name (str): Unique task name, used in logs, metrics and the lock file name.
+            func (callable): A coroutine function, or a blocking callable taking no arguments.
+                Process-pool tasks must be picklable (module-level functions or ``functools.partial`` of them).
+            trigger (IntervalTrigger | CronTrigger): When the task runs.
+            timeout (float, optional): Seconds after which a run is abandoned.
+            executor (str, optional): "loop", "thread" or "process"; chosen from ``func`` when omitted.
+            lock (bool): Whether to run the task in only one process sharing ``lock_dir`` at a time.
+            run_at_start (bool): Whether the first run happens as soon as the scheduler starts.
+
+        Returns:
+            ScheduledTask: The registered task.
+        """
+        if name in self.tasks:
+            raise ValueError(f"Task {name} is already registered")
+        if executor is None:
+            executor = "loop" if asyncio.iscoroutinefunction(func) else "thread"
+        if executor not in ("loop", "thread", "process"):
+            raise ValueError(f"Unknown executor {executor!r} for task {name}")
+        if lock and not self.lock_dir:
+            raise ValueError(f"Task {name} needs a lock directory")
+        task = ScheduledTask(name, func, trigger, timeout, executor, lock)
+        if run_at_start:
+            task.next_run = time.time()
+        self.tasks[name] = task
+        if self._wakeup is not None:
+            self._wakeup.set()
+        logger.info(f"Scheduled task {name} ({trigger}, {executor}).")
+        return task
+
+    def run_now(self, name):
+        """
+        Moves a task's next run to now, e.g. after an event it depends on.
+        """
+        self.run_at(name, time.time())
+
+    def run_at(self, name, when):
+        """
+        Moves a task's next run forward to ``when`` if its trigger would run it later.
+
+        The trigger stays in charge afterwards, so it bounds the time between
+        runs of a task that is also woken by its own events.
+
+        Args:
+            name (str): The task's name.
+            when (float): Wall-clock time of the run.
+        """
+        task = self.tasks[name]
+        if task.next_run is None or when < task.next_run:
+            task.next_run = when
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    async def run(self):
+        """
+        Starts the due tasks until cancelled.
+        """
+        self._wakeup = asyncio.Event()
+        logger.info(f"Task scheduler started with {len(self.tasks)} task(s).")
+        while True:
+            now = time.time()
+            for task in self.tasks.values():
+                if task.next_run is None:
+                    task.next_run = task.trigger.next_run(now)
+                elif task.next_run <= now:
+                    task.next_run = task.trigger.next_run(now)
+                    self._start(task)
+            self._wakeup.clear()
+            delay = min((task.next_run for task in self.tasks.values()), default=None)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), None if delay is None else max(delay - time.time(), 0))
+            except asyncio.TimeoutError:
+                pass
+
+    def _start(self, task):
+        if task.running:
+            logger.warning(f"Skipping task {task.name}: the previous run is still in progress.")
+            self._report(task, "overlap", 0.0, 0.0)
+            return
+        lock_fd = None
+        if task.lock:
+            lock_fd = self._acquire_lock(task)
+            if lock_fd is None:
+                logger.info(f"Skipping task {task.name}: another process is running it.")
+                self._report(task, "locked", 0.0, 0.0)
+                return
+        task.running = True
+        asyncio.ensure_future(self._run(task, lock_fd))
+
+    async def _run(self, task, lock_fd):
+        timer = _StepTimer()
+        pending = []
+        status = "ok"
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._measured(task, timer, pending), task.timeout)
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.error(f"Task {task.name} timed out after {task.timeout}s.")
+        except Exception as e:
+            status = "error"
+            logger.error(f"Task {task.name} failed: {e}", exc_info=True)
+        duration = time.perf_counter() - started
+        task.runs += 1
+        if status != "ok":
+            task.failures += 1
+        self._report(task, status, duration, timer.longest)
+
+        future = pending[0] if pending else None
+        if future is not None and not future.done():
+            # A thread or process cannot be interrupted; the task stays running
+            # (and locked) until it actually returns
+            loop = asyncio.get_running_loop()
+            future.add_done_callback(lambda _: self._finish_threadsafe(loop, task, lock_fd))
+        else:
+            self._finish(task, lock_fd)
+
+    def _finish_threadsafe(self, loop, task, lock_fd):
+        try:
+            loop.call_soon_threadsafe(self._finish, task, lock_fd)
+        except RuntimeError:
+            # The loop has shut down; nothing else uses the task any more
+            self._finish(task, lock_fd)
+
+    async def _measured(self, task, timer, pending):
+        return await _timed(self._execute(task, pending), timer)
+
+    async def _execute(self, task, pending):
+        if task.executor == "loop":
+            return await task.func()
+        future = self._pool(task.executor).submit(task.func)
+        pending.append(future)
+        return await asyncio.wrap_future(future)
+
+    def _pool(self, executor):
+        if executor == "process":
+            if self._process_pool is None:
+                import multiprocessing
+                # Forking a process with running threads and an event loop is unsafe
+                self._process_pool = concurrent.futures.ProcessPoolExecutor(
+                    self.process_workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = concurrent.futures.ThreadPoolExecutor(self.thread_workers,
+                                                                      thread_name_prefix="scheduled-task")
+        return self._thread_pool
+
+    def _finish(self, task, lock_fd):
+        task.running = False
+        if lock_fd is not None:
+            self._release_lock(lock_fd)
+
+    def _acquire_lock(self, task):
+        """
+        Takes the task's lock file without waiting.
+
+        Returns:
+            int: The open lock file descriptor, or None if another process holds the lock.
+        """
+        import fcntl
+        fd = os.open(os.path.join(self.lock_dir, f"{task.name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    @staticmethod
+    def _release_lock(fd):
+        import fcntl
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _report(self, task, status, duration, loop_blocked):
+        if self.on_run is None:
+            return
+        try:
+            self.on_run(task.name, status, duration, loop_blocked)
+        except Exception as e:
+            logger.error(f"Failed to report run of task {task.name}: {e}")
+
+    def close(self):
+        """
+        Shuts the worker pools down without waiting for running tasks.
+        """
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._thread_pool = self._process_pool = None
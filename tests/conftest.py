@@ -0,0 +1,56 @@
+import os
+import sys
+import socket
+import datetime
+
+import pytest
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat
+
+# Modules import each other from the src/ root, as they do when the proxy runs
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+@pytest.fixture
+def free_port():
+    """
+    Returns a function that finds a TCP port on the loopback interface that is currently free.
+    """
+    def find():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+    return find
+
+@pytest.fixture
+def make_certificate(tmp_path):
+    """
+    Returns a function writing a self-signed certificate and key, and returning their paths.
+
+    The function takes the certificate's path (relative to ``tmp_path``), its
+    common name and the number of days until it expires.
+    """
+    def make(relative_path="cert.pem", common_name="localhost", days=30):
+        key = ec.generate_private_key(ec.SECP256R1())
+        now = datetime.datetime.now(datetime.timezone.utc)
+        subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(subject)
+            .issuer_name(subject)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=days))
+            .add_extension(x509.SubjectAlternativeName([x509.DNSName(common_name)]), critical=False)
+            .sign(key, hashes.SHA256())
+        )
+        cert_file = tmp_path / relative_path
+        cert_file.parent.mkdir(parents=True, exist_ok=True)
+        cert_file.write_bytes(cert.public_bytes(Encoding.PEM))
+        key_file = cert_file.with_name(cert_file.stem + "-key.pem")
+        key_file.write_bytes(key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()))
+        return str(cert_file), str(key_file)
+    return make
@@ -0,0 +1,68 @@
+import os
+import sys
+import asyncio
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "benchmarks")
+sys.path.insert(0, BENCHMARKS)
+
+from cert_service_stub import CertificateServiceStub
+from services.cert_distribution import CertificateSubscriber
+
+def read_files(cert_file, key_file):
+    with open(cert_file) as cert, open(key_file) as key:
+        return {"cert_file": cert.read(), "key_file": key.read()}
+
+async def wait_until(predicate, timeout=10):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise TimeoutError("condition not reached")
+        await asyncio.sleep(0.02)
+
+def test_subscriber_receives_pushed_certificates(tmp_path, make_certificate):
+    first = read_files(*make_certificate("v1/cert.pem", "v1.example"))
+    second = read_files(*make_certificate("v2/cert.pem", "v2.example"))
+    unrelated_key = read_files(*make_certificate("other/cert.pem", "other.example"))["key_file"]
+    cert_file = tmp_path / "installed" / "cert.pem"
+    key_file = tmp_path / "installed" / "key.pem"
+
+    async def run(stub):
+        subscriber = CertificateSubscriber(stub.url, str(cert_file), str(key_file), subscriber_id="proxy-1",
+                                           state_file=str(tmp_path / "state.json"), reconnect_delay=0.1)
+        reloads = []
+        subscriber.add_listener(lambda: reloads.append(cert_file.read_text()))
+
+        # A first start without cached files fetches a snapshot before subscribing
+        await asyncio.get_running_loop().run_in_executor(None, subscriber.fetch_snapshot, 5)
+        assert cert_file.read_text() == first["cert_file"] and subscriber.version == 1
+        task = asyncio.create_task(subscriber.run())
+        try:
+            # A pushed update is installed, reloaded and acknowledged
+            stub.publish(second)
+            await wait_until(lambda: stub.applied.get("proxy-1") == 2)
+            assert cert_file.read_text() == second["cert_file"]
+            assert key_file.read_text() == second["key_file"]
+            assert reloads == [second["cert_file"]]
+
+            # A rejected update is acknowledged as failed and the files stay in place
+            stub.publish({"key_file": unrelated_key})
+            await wait_until(lambda: stub.acknowledgements["proxy-1"]["version"] == 3)
+            assert stub.acknowledgements["proxy-1"]["applied"] is False
+            assert key_file.read_text() == second["key_file"]
+
+            # After a disconnect the subscription resumes and receives the next update
+            stub.disconnect()
+            stub.publish(first)
+            await wait_until(lambda: stub.applied.get("proxy-1") == 4)
+            assert cert_file.read_text() == first["cert_file"]
+            assert len(reloads) == 2
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    with CertificateServiceStub(heartbeat_interval=0.5) as stub:
+        stub.publish(first)
+        asyncio.run(run(stub))
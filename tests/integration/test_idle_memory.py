@@ -0,0 +1,112 @@
+import os
+import ssl
+import sys
+import time
+import socket
+import asyncio
+import subprocess
+import multiprocessing
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "src")
+
+PROXY_SCRIPT = """
+import asyncio, sys
+from core.proxy_handler import QuantumSafeProxy
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4])
+asyncio.run(proxy.start())
+"""
+
+CONNECTIONS = 500
+
+# Proxy RSS growth allowed per idle proxied connection. It measured ~21 KiB
+# with pooled read buffers, against ~289 KiB with per-connection stream buffers.
+BUDGET_KIB = 64
+
+def _serve_echo(port):
+    async def echo(reader, writer):
+        try:
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve():
+        server = await asyncio.start_server(echo, "127.0.0.1", port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+    asyncio.run(serve())
+
+@pytest.fixture
+def echo_backend(free_port):
+    port = free_port()
+    process = multiprocessing.Process(target=_serve_echo, args=(port,), daemon=True)
+    process.start()
+    yield port
+    process.terminate()
+    process.join()
+
+def rss_bytes(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError(f"No VmRSS for process {pid}")
+
+def start_proxy(port, backend_port, cert_file, key_file):
+    return subprocess.Popen(
+        [sys.executable, "-c", PROXY_SCRIPT, str(port), str(backend_port), cert_file, key_file],
+        cwd=SRC, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def client_context():
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+def open_proxied_connection(port, context, timeout=10):
+    conn = context.wrap_socket(socket.create_connection(("127.0.0.1", port), timeout=timeout))
+    # One echoed byte so the backend leg is established too
+    conn.sendall(b"x")
+    assert conn.recv(1) == b"x"
+    return conn
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs /proc to read the proxy's RSS")
+def test_idle_connections_stay_within_memory_budget(make_certificate, free_port, echo_backend):
+    cert_file, key_file = make_certificate()
+    port = free_port()
+    proxy = start_proxy(port, echo_backend, cert_file, key_file)
+    context = client_context()
+    connections = []
+    try:
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                open_proxied_connection(port, context, timeout=1).close()
+                break
+            except (OSError, ssl.SSLError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        # Warm up allocator arenas and the handshake path before the baseline
+        for _ in range(20):
+            open_proxied_connection(port, context).close()
+        time.sleep(0.5)
+        baseline = rss_bytes(proxy.pid)
+
+        for _ in range(CONNECTIONS):
+            connections.append(open_proxied_connection(port, context))
+        time.sleep(1.0)
+        per_connection_kib = (rss_bytes(proxy.pid) - baseline) / CONNECTIONS / 1024
+
+        assert per_connection_kib < BUDGET_KIB, f"{per_connection_kib:.1f} KiB per idle connection"
+    finally:
+        for conn in connections:
+            conn.close()
+        proxy.kill()
+        proxy.wait()
@@ -0,0 +1,128 @@
+import os
+import ssl
+import sys
+import time
+import socket
+import threading
+import subprocess
+import socketserver
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "src")
+
+PROXY_SCRIPT = """
+import asyncio, os, sys
+from core.proxy_handler import QuantumSafeProxy
+from core.socket_handoff import serve_with_handoff, TAKEOVER_ENV
+proxy = QuantumSafeProxy("127.0.0.1", int(sys.argv[1]), "127.0.0.1", int(sys.argv[2]), sys.argv[3], sys.argv[4])
+asyncio.run(serve_with_handoff(proxy, sys.argv[5], drain_timeout=10, takeover=os.getenv(TAKEOVER_ENV) == "1"))
+"""
+
+class _Echo(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            self.request.sendall(data)
+
+@pytest.fixture
+def echo_backend():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _Echo)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+def client_context():
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+def connect(port, timeout=5):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+    return client_context().wrap_socket(sock, server_hostname="localhost")
+
+def echo(conn, payload):
+    conn.sendall(payload)
+    received = b""
+    while len(received) < len(payload):
+        data = conn.recv(len(payload) - len(received))
+        if not data:
+            raise ConnectionError("connection closed before the echo arrived")
+        received += data
+    return received
+
+def wait_for_proxy(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with connect(port, timeout=1) as conn:
+                echo(conn, b"ping")
+                return
+        except (OSError, ssl.SSLError):
+            time.sleep(0.05)
+    raise TimeoutError(f"Proxy on port {port} did not start")
+
+def start_proxy(port, backend_port, cert_file, key_file, handoff_path, takeover=False):
+    env = dict(os.environ, PROXY_TAKEOVER="1" if takeover else "0")
+    return subprocess.Popen(
+        [sys.executable, "-c", PROXY_SCRIPT, str(port), str(backend_port), cert_file, key_file, handoff_path],
+        cwd=SRC, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def test_restart_via_socket_handoff_fails_no_connections(tmp_path, make_certificate, free_port, echo_backend):
+    cert_file, key_file = make_certificate()
+    handoff_path = str(tmp_path / "handoff.sock")
+    port = free_port()
+    processes = [start_proxy(port, echo_backend, cert_file, key_file, handoff_path)]
+    try:
+        wait_for_proxy(port)
+        while not os.path.exists(handoff_path):
+            time.sleep(0.05)
+
+        stop = threading.Event()
+        counts = {"completed": 0, "failed": 0}
+        errors = []
+
+        def churn():
+            while not stop.is_set():
+                try:
+                    with connect(port) as conn:
+                        assert echo(conn, b"hello") == b"hello"
+                    counts["completed"] += 1
+                except (OSError, ssl.SSLError, AssertionError) as e:
+                    counts["failed"] += 1
+                    errors.append(repr(e))
+
+        clients = [threading.Thread(target=churn) for _ in range(4)]
+        for client in clients:
+            client.start()
+        # An in-flight connection must keep working while the old process drains
+        in_flight = connect(port)
+        assert echo(in_flight, b"before") == b"before"
+        time.sleep(0.5)
+
+        processes.append(start_proxy(port, echo_backend, cert_file, key_file, handoff_path, takeover=True))
+        time.sleep(1.0)
+        assert echo(in_flight, b"during") == b"during"
+        in_flight.close()
+        assert processes[0].wait(timeout=20) == 0
+
+        completed_before = counts["completed"]
+        time.sleep(0.5)
+        stop.set()
+        for client in clients:
+            client.join()
+
+        assert counts["failed"] == 0, errors[:5]
+        assert counts["completed"] > completed_before, "the replacement did not serve any connection"
+        assert processes[1].poll() is None
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
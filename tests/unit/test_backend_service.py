@@ -0,0 +1,96 @@
+import json
+import asyncio
+
+import pytest
+
+from services.backend_service import BodyTooLargeError, StreamingResponse
+
+class FakeContent:
+    """
+    Stands in for aiohttp's StreamReader, delivering the body in the given chunks.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.delivered = 0
+
+    async def iter_chunked(self, size):
+        for chunk in self.chunks:
+            self.delivered += 1
+            yield chunk
+
+class FakeResponse:
+    def __init__(self, chunks, content_type="application/json"):
+        self.content = FakeContent(chunks)
+        self.content_type = content_type
+        self.content_length = None
+        self.status = 200
+        self.headers = {}
+
+def iter_json(chunks, content_type="application/json", max_body_size=None, ndjson=None):
+    async def collect():
+        response = StreamingResponse(FakeResponse(chunks, content_type), max_body_size, 1024)
+        return [value async for value in response.iter_json(ndjson)]
+    return asyncio.run(collect())
+
+DOCUMENT = [1, -2.5e3, "café ☃ \U0001f600", {"a": [1, 2], "b": {}}, None, True, 10, [], "]"]
+
+def test_array_elements_survive_any_chunking():
+    body = json.dumps(DOCUMENT, ensure_ascii=False).encode()
+    assert iter_json([bytes([byte]) for byte in body]) == DOCUMENT
+    for cut in range(1, len(body)):
+        assert iter_json([body[:cut], body[cut:]]) == DOCUMENT, cut
+
+def test_numbers_are_not_split_at_chunk_boundaries():
+    assert iter_json([b"[12", b"34, -", b"5", b".0e", b"2]"]) == [1234, -500.0]
+    assert iter_json([b"4", b"2"]) == [42]
+    assert iter_json([b" \n[ ", b"]\n"]) == []
+
+def test_a_non_array_body_yields_one_value():
+    assert iter_json([b'{"items": ', b"[1, 2]}"]) == [{"items": [1, 2]}]
+    assert iter_json([b'"text"']) == ["text"]
+
+def test_ndjson_is_detected_by_content_type():
+    body = [b'{"a": 1}\n{"a"', b': 2}\r\n\n  3\n[4]']
+    assert iter_json(body, "application/x-ndjson") == [{"a": 1}, {"a": 2}, 3, [4]]
+    assert iter_json(body, ndjson=True) == [{"a": 1}, {"a": 2}, 3, [4]]
+    assert iter_json([b"\n\n"], "application/jsonl") == []
+    with pytest.raises(ValueError, match="unexpected"):
+        iter_json(body)
+
+def test_values_are_yielded_before_the_rest_of_the_body_arrives():
+    async def first_value():
+        response = StreamingResponse(FakeResponse([b"[1,", b" 2,", b" 3]"]), None, 1024)
+        values = response.iter_json()
+        value = await values.__anext__()
+        delivered = response.response.content.delivered
+        await values.aclose()
+        return value, delivered
+
+    # The ',' after the first element completes it, so no further chunk is read
+    assert asyncio.run(first_value()) == (1, 1)
+
+@pytest.mark.parametrize("chunks, ndjson, message", [
+    ([b"[1 2]"], False, "expected ',' or ']'"),
+    ([b"[1,]"], False, "expected a JSON value"),
+    ([b"[,1]"], False, "expected a JSON value"),
+    ([b"[1] [2]"], False, r"unexpected '\[' after the end"),
+    ([b'{"a": 1} x'], False, "unexpected 'x' after the end"),
+    ([b"[1, 2"], False, "ended before its top-level value was complete"),
+    ([b"[1, ", b'{"a": '], False, "Expecting value"),
+    ([b"[tru]"], False, "Expecting value"),
+    ([b""], False, "ended before"),
+    ([b"1 2\n"], True, "expected a newline between NDJSON values"),
+    ([b'{"a": 1}\n{"a"'], True, "Expecting"),
+])
+def test_malformed_bodies_are_rejected(chunks, ndjson, message):
+    with pytest.raises(ValueError, match=message):
+        iter_json(chunks, ndjson=ndjson)
+
+def test_value_size_limit_applies_to_each_value():
+    small = json.dumps([{"n": i} for i in range(200)]).encode()
+    assert len(iter_json([small[i:i + 64] for i in range(0, len(small), 64)], max_body_size=64)) == 200
+
+    large = json.dumps([1, "x" * 500, 2]).encode()
+    with pytest.raises(BodyTooLargeError, match="64 byte limit"):
+        iter_json([large[i:i + 32] for i in range(0, len(large), 32)], max_body_size=64)
@@ -0,0 +1,35 @@
+from core.buffer_pool import DEFAULT_SIZE, BufferPool
+
+def test_size_class_picks_the_smallest_class_that_fits():
+    pool = BufferPool(size_classes=(2048, 16384, 65536))
+
+    assert pool.size_class(1) == 2048
+    assert pool.size_class(2048) == 2048
+    assert pool.size_class(2049) == 16384
+    assert pool.size_class(1 << 20) == 65536
+    assert pool.size_class(0) == pool.size_class(-1) == DEFAULT_SIZE
+
+def test_released_buffers_are_reused():
+    pool = BufferPool()
+    buffer = pool.acquire(1000)
+
+    assert len(buffer) == 2048
+    pool.release(buffer)
+    assert pool.stats()[2048] == 1
+    assert pool.acquire(1500) is buffer
+    assert pool.stats()[2048] == 0
+    assert pool.acquire(1500) is not buffer
+
+def test_release_keeps_at_most_max_free_buffers_per_class():
+    pool = BufferPool(max_free=2)
+    buffers = [pool.acquire() for _ in range(3)]
+    for buffer in buffers:
+        pool.release(buffer)
+
+    assert pool.stats()[DEFAULT_SIZE] == 2
+
+def test_release_ignores_buffers_of_foreign_sizes():
+    pool = BufferPool()
+    pool.release(bytearray(1234))
+
+    assert sum(pool.stats().values()) == 0
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from services.cert_distribution import CertificateSubscriber
+
+def read_files(cert_file, key_file):
+    with open(cert_file) as cert, open(key_file) as key:
+        return {"cert_file": cert.read(), "key_file": key.read()}
+
+@pytest.fixture
+def subscriber(tmp_path):
+    target = tmp_path / "installed"
+    return CertificateSubscriber("http://127.0.0.1:1/", str(target / "cert.pem"), str(target / "key.pem"),
+                                 state_file=str(tmp_path / "state" / "certificates.json"), subscriber_id="proxy-1")
+
+def test_apply_installs_files_and_records_the_version(tmp_path, subscriber, make_certificate):
+    files = read_files(*make_certificate())
+    propagation = []
+    subscriber.on_propagation = propagation.append
+
+    assert subscriber.apply({"type": "update", "version": 1, "issued_at": 1.0, "files": files})
+    assert (tmp_path / "installed" / "cert.pem").read_text() == files["cert_file"]
+    assert (tmp_path / "installed" / "key.pem").read_text() == files["key_file"]
+    assert subscriber.version == 1
+    state = json.loads((tmp_path / "state" / "certificates.json").read_text())
+    assert state["version"] == 1 and state["subscriber"] == "proxy-1"
+    assert len(propagation) == 1 and propagation[0] > 0
+
+    # Older versions are ignored; a newer one with identical contents changes nothing on disk
+    assert not subscriber.apply({"type": "update", "version": 1, "files": files})
+    assert not subscriber.apply({"type": "update", "version": 2, "files": files})
+    assert subscriber.version == 2
+
+def test_apply_rejects_files_that_do_not_load(tmp_path, subscriber, make_certificate):
+    files = read_files(*make_certificate())
+    subscriber.apply({"type": "update", "version": 1, "files": files})
+    other_key = read_files(*make_certificate("other/cert.pem", "other"))["key_file"]
+
+    with pytest.raises(ValueError, match="does not load"):
+        subscriber.apply({"type": "update", "version": 2, "files": {"key_file": other_key}})
+    assert (tmp_path / "installed" / "key.pem").read_text() == files["key_file"]
+    assert not (tmp_path / "installed" / "key.pem.new").exists()
+    assert subscriber.version == 1
+
+    with pytest.raises(ValueError, match="Unknown certificate file"):
+        subscriber.apply({"type": "update", "version": 2, "files": {"chain_file": files["cert_file"]}})
+
+def test_restore_serves_the_cached_version(tmp_path, subscriber, make_certificate):
+    assert not subscriber.restore()
+    subscriber.apply({"type": "update", "version": 3, "files": read_files(*make_certificate())})
+
+    installed = (subscriber.paths["cert_file"], subscriber.paths["key_file"])
+    restarted = CertificateSubscriber(subscriber.url, *installed, state_file=subscriber.state_file)
+    assert restarted.restore()
+    assert restarted.version == 3
+    assert not restarted.apply({"type": "update", "version": 4, "files": read_files(*installed)})
+
+    (tmp_path / "installed" / "key.pem").unlink()
+    assert not restarted.restore()
+
+def test_restore_ignores_a_corrupt_state_file(tmp_path, subscriber, make_certificate):
+    subscriber.apply({"type": "update", "version": 3, "files": read_files(*make_certificate())})
+    (tmp_path / "state" / "certificates.json").write_text("{not json")
+
+    assert not subscriber.restore()
@@ -0,0 +1,167 @@
+import os
+import time
+import asyncio
+
+import pytest
+
+from services.certificate_manager import CertificateInventory, load_certificate_record
+
+FAKE_CERTBOT = """#!/bin/sh
+echo "$@" >> "{log_file}"
+exit {exit_code}
+"""
+
+@pytest.fixture
+def fake_certbot(tmp_path):
+    """
+    Returns a function writing a stand-in ``certbot`` that logs its arguments and exits with the given code.
+    """
+    def write(exit_code=0):
+        path = tmp_path / "certbot"
+        log_file = tmp_path / "certbot.log"
+        path.write_text(FAKE_CERTBOT.format(log_file=log_file, exit_code=exit_code))
+        path.chmod(0o755)
+        return str(path), log_file
+    return write
+
+def certbot_calls(log_file):
+    return log_file.read_text().splitlines() if log_file.exists() else []
+
+def make_lineage(make_certificate, name, days):
+    """
+    Writes a Certbot lineage: ``live/<name>/`` with cert.pem, chain.pem, fullchain.pem and privkey.pem.
+    """
+    cert_file, key_file = make_certificate(f"live/{name}/cert.pem", name, days=days)
+    issuer_file, _ = make_certificate(f"issuers/{name}.pem", f"Issuer for {name}", days=365)
+    directory = os.path.dirname(cert_file)
+    with open(cert_file) as cert, open(issuer_file) as issuer:
+        leaf, chain = cert.read(), issuer.read()
+    with open(os.path.join(directory, "chain.pem"), "w") as f:
+        f.write(chain)
+    with open(os.path.join(directory, "fullchain.pem"), "w") as f:
+        f.write(leaf + chain)
+    os.replace(key_file, os.path.join(directory, "privkey.pem"))
+    return directory
+
+def test_scan_parses_only_new_or_changed_certificates(tmp_path, make_certificate):
+    make_certificate("live/a.example/cert.pem", "a.example")
+    make_certificate("live/b.example/cert.pem", "b.example")
+    inventory = CertificateInventory([str(tmp_path / "live")])
+
+    assert inventory.scan() == 2
+    assert sorted(record.name for record in inventory.records.values()) == ["a.example", "b.example"]
+    assert inventory.scan() == 0
+
+    cert_file, _ = make_certificate("live/a.example/cert.pem", "a.example", days=90)
+    stat = os.stat(cert_file)
+    os.utime(cert_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert inventory.scan() == 1
+    assert inventory.records[cert_file].days_to_expire() >= 89
+
+def test_scan_forgets_removed_certificates(tmp_path, make_certificate):
+    removed, _ = make_certificate("live/a.example/cert.pem", "a.example", days=5)
+    kept, _ = make_certificate("live/b.example/cert.pem", "b.example", days=60)
+    inventory = CertificateInventory([str(tmp_path / "live")])
+    inventory.scan()
+
+    os.remove(removed)
+    assert inventory.scan() == 0
+    assert list(inventory.records) == [kept]
+    assert inventory.pop_due(now=time.time() + 40 * 86400) == [inventory.records[kept]]
+
+def test_scan_skips_unreadable_certificates(tmp_path, make_certificate):
+    make_certificate("live/a.example/cert.pem", "a.example")
+    (tmp_path / "live" / "broken.pem").write_text("not a certificate")
+    inventory = CertificateInventory([str(tmp_path / "live")])
+
+    assert inventory.scan() == 1
+    assert [record.name for record in inventory.records.values()] == ["a.example"]
+
+def test_load_certificate_record_reuses_unchanged_record(make_certificate):
+    cert_file, _ = make_certificate()
+    record = load_certificate_record(cert_file)
+
+    assert load_certificate_record(cert_file, previous=record) is record
+    assert record.subject == "CN=localhost"
+
+def test_renewals_are_due_in_expiry_order(tmp_path, make_certificate):
+    for name, days in (("late.example", 25), ("soon.example", 3), ("later.example", 80)):
+        make_certificate(f"live/{name}/cert.pem", name, days=days)
+    inventory = CertificateInventory([str(tmp_path / "live")], renewal_threshold_days=30)
+    inventory.scan()
+
+    assert inventory.seconds_until_next_due() == 0.0
+    assert [record.name for record in inventory.pop_due()] == ["soon.example", "late.example"]
+    assert inventory.pop_due() == []
+    assert 49 * 86400 < inventory.seconds_until_next_due() <= 50 * 86400
+
+def test_renew_due_runs_certbot_per_due_certificate(tmp_path, make_certificate, fake_certbot):
+    certbot_path, log_file = fake_certbot()
+    for name, days in (("a.example", 5), ("b.example", 10), ("c.example", 90)):
+        make_certificate(f"live/{name}/cert.pem", name, days=days)
+    inventory = CertificateInventory([str(tmp_path / "live")], certbot_path=certbot_path, max_concurrent_renewals=1)
+    inventory.scan()
+
+    assert asyncio.run(inventory.renew_due()) == (2, 0)
+    calls = certbot_calls(log_file)
+    assert len(calls) == 2
+    assert all(call.startswith("renew --non-interactive --quiet --cert-name ") for call in calls)
+    assert sorted(call.rsplit(" ", 1)[1] for call in calls) == ["a.example", "b.example"]
+    assert asyncio.run(inventory.renew_due()) == (0, 0)
+
+def test_failed_renewal_is_retried_after_retry_interval(tmp_path, make_certificate, fake_certbot):
+    certbot_path, log_file = fake_certbot(exit_code=1)
+    make_certificate("live/a.example/cert.pem", "a.example", days=5)
+    inventory = CertificateInventory([str(tmp_path / "live")], certbot_path=certbot_path, retry_interval=600)
+    inventory.scan()
+
+    assert asyncio.run(inventory.renew_due()) == (0, 1)
+    assert 590 < inventory.seconds_until_next_due() <= 600
+    assert asyncio.run(inventory.renew_due(now=time.time() + 601)) == (0, 1)
+    assert len(certbot_calls(log_file)) == 2
+
+def test_certbot_lineage_is_tracked_and_renewed_once(tmp_path, make_certificate, fake_certbot):
+    certbot_path, log_file = fake_certbot()
+    directory = make_lineage(make_certificate, "a.example", days=5)
+    make_lineage(make_certificate, "b.example", days=90)
+    inventory = CertificateInventory([str(tmp_path / "live")], certbot_path=certbot_path)
+
+    assert inventory.scan() == 2
+    assert sorted(inventory.records) == sorted([os.path.join(directory, "cert.pem"),
+                                                str(tmp_path / "live" / "b.example" / "cert.pem")])
+    assert asyncio.run(inventory.renew_due()) == (1, 0)
+    assert certbot_calls(log_file) == ["renew --non-interactive --quiet --cert-name a.example"]
+
+def test_files_of_one_lineage_are_renewed_once(tmp_path, make_certificate, fake_certbot):
+    certbot_path, log_file = fake_certbot()
+    directory = make_lineage(make_certificate, "a.example", days=5)
+    paths = [os.path.join(directory, "cert.pem"), os.path.join(directory, "fullchain.pem")]
+    inventory = CertificateInventory(paths, certbot_path=certbot_path, retry_interval=600)
+    inventory.scan()
+
+    assert asyncio.run(inventory.renew_due()) == (1, 0)
+    assert len(certbot_calls(log_file)) == 1
+    # Both files are checked again after the retry interval
+    assert sorted(record.path for record in inventory.pop_due(now=time.time() + 601)) == sorted(paths)
+
+def test_scan_during_renewal_keeps_the_inventory_consistent(tmp_path, make_certificate, fake_certbot):
+    certbot_path, log_file = fake_certbot()
+    # A renewal slow enough for the scan to run while it is in progress
+    (tmp_path / "certbot").write_text(f"#!/bin/sh\nsleep 0.3\necho \"$@\" >> \"{log_file}\"\n")
+    removed, _ = make_certificate("live/a.example/cert.pem", "a.example", days=5)
+    kept, _ = make_certificate("live/b.example/cert.pem", "b.example", days=6)
+    inventory = CertificateInventory([str(tmp_path / "live")], certbot_path=certbot_path, retry_interval=600)
+    inventory.scan()
+
+    async def run():
+        renewal = asyncio.create_task(inventory.renew_due())
+        await asyncio.sleep(0.05)
+        os.remove(removed)
+        assert await inventory.refresh() == 0
+        return await renewal
+
+    assert asyncio.run(run()) == (2, 0)
+    assert list(inventory.records) == [kept]
+    # Only the certificate still on disk is checked again
+    assert [record.path for record in inventory.pop_due(now=time.time() + 601)] == [kept]
+    assert inventory.next_due() is None
@@ -0,0 +1,126 @@
+import random
+import struct
+
+import pytest
+
+from core.client_hello import ClientHello, is_grease, parse_client_hello
+
+def u16(value):
+    return struct.pack("!H", value)
+
+def vector(data, length_size=2):
+    return len(data).to_bytes(length_size, "big") + data
+
+def extension(code, body=b""):
+    return u16(code) + vector(body)
+
+def server_name(name):
+    return extension(0x0000, vector(b"\x00" + vector(name.encode())))
+
+def alpn(*protocols):
+    return extension(0x0010, vector(b"".join(vector(protocol.encode(), 1) for protocol in protocols)))
+
+def u16_vector(values, length_size=2):
+    return vector(b"".join(u16(value) for value in values), length_size)
+
+# The Chrome ClientHello of the JA4 specification's example, whose fingerprint is
+# t13d1516h2_8daaf6152771_e5627efa2ab1: GREASE values, SNI, h2 and extensions in wire order
+CHROME_CIPHERS = [0x0a0a, 0x1301, 0x1302, 0x1303, 0xc02b, 0xc02f, 0xc02c, 0xc030, 0xcca9, 0xcca8, 0xc013, 0xc014,
+                  0x009c, 0x009d, 0x002f, 0x0035]
+CHROME_SIGNATURE_ALGORITHMS = [0x0403, 0x0804, 0x0401, 0x0503, 0x0805, 0x0501, 0x0806, 0x0601]
+CHROME_EXTENSIONS = [
+    extension(0x1a1a),
+    server_name("Example.COM"),
+    extension(0x0017),
+    extension(0xff01, b"\x00"),
+    extension(0x000a, u16_vector([0x2a2a, 0x001d, 0x0017, 0x0018])),
+    extension(0x000b, b"\x01\x00"),
+    extension(0x0023),
+    alpn("h2", "http/1.1"),
+    extension(0x0005, b"\x01\x00\x00\x00\x00"),
+    extension(0x000d, u16_vector(CHROME_SIGNATURE_ALGORITHMS)),
+    extension(0x0012),
+    extension(0x0033, vector(u16(0x2a2a) + vector(b"\x00") + u16(0x001d) + vector(bytes(range(32))))),
+    extension(0x002d, b"\x01\x01"),
+    extension(0x002b, u16_vector([0x3a3a, 0x0304, 0x0303], 1)),
+    extension(0x001b, b"\x02\x00\x02"),
+    extension(0x4469, vector(vector(b"h2", 1))),
+    extension(0x3a3a, b"\x00"),
+    extension(0x0015, bytes(200)),
+]
+CHROME_JA4 = "t13d1516h2_8daaf6152771_e5627efa2ab1"
+
+def client_hello(ciphers=CHROME_CIPHERS, extensions=CHROME_EXTENSIONS, legacy_version=0x0303):
+    body = (u16(legacy_version) + bytes(32) + vector(bytes(range(32)), 1) + u16_vector(ciphers)
+            + b"\x01\x00" + vector(b"".join(extensions)))
+    return b"\x01" + vector(body, 3)
+
+def records(handshake, *splits):
+    # Frames the handshake message in TLS records, cut at the given offsets
+    bounds = [0, *splits, len(handshake)]
+    return b"".join(b"\x16\x03\x01" + vector(handshake[start:end]) for start, end in zip(bounds, bounds[1:]))
+
+def test_chrome_client_hello_matches_the_ja4_known_answer():
+    hello = parse_client_hello(records(client_hello()) + b"\x14\x03\x03\x00\x01\x01")
+
+    assert hello.ja4() == CHROME_JA4
+    assert hello.server_name == "example.com"
+    assert hello.alpn == ("h2", "http/1.1")
+    assert hello.versions == (0x3a3a, 0x0304, 0x0303)
+    assert hello.signature_algorithms == tuple(CHROME_SIGNATURE_ALGORITHMS)
+    assert len(hello.ciphers) == 16 and len(hello.extensions) == 18
+
+def test_extension_order_does_not_change_the_fingerprint():
+    shuffled = list(CHROME_EXTENSIONS)
+    random.Random(7).shuffle(shuffled)
+    ciphers = list(reversed(CHROME_CIPHERS))
+    assert parse_client_hello(records(client_hello(ciphers, shuffled))).ja4() == CHROME_JA4
+
+def test_grease_values_are_ignored():
+    greases = [0x0a0a + 0x1010 * i for i in range(16)]
+    assert all(is_grease(value) for value in greases)
+    assert not any(is_grease(value) for value in (0x0a0b, 0x1a0a, 0x0a1a, 0x0000, 0x1301, 0xfafb))
+
+    extensions = [extension(0x5a5a, b"grease")] + CHROME_EXTENSIONS + [extension(0xeaea)]
+    ciphers = [0xbaba] + CHROME_CIPHERS + [0xfafa]
+    assert parse_client_hello(records(client_hello(ciphers, extensions))).ja4() == CHROME_JA4
+
+def test_ja4_fields_without_sni_alpn_or_supported_versions():
+    hello = ClientHello(0x0303, [0x1301, 0x0a0a], [0x000d, 0x0000], signature_algorithms=(0x0403,))
+    assert hello.ja4().startswith("t12i010200_")
+
+    # Only SNI and ALPN extensions, and no cipher suites: both hashes are zeros
+    assert ClientHello(0x0301, [], [0x0000, 0x0010], server_name="a", alpn=("http/1.1",)).ja4() == (
+        "t10d0002h1_000000000000_000000000000")
+
+    # ALPN values starting or ending with a non-alphanumeric character use their hex form
+    assert ClientHello(0x0303, [], [], alpn=("h2\xff",)).ja4().startswith("t12i0000" + "6f")
+    assert ClientHello(0x0303, [0x1301] * 120, [0x0017] * 150).ja4().startswith("t12i999900_")
+    assert ClientHello(0x0303, [], [], versions=(0x0304, 0x7f1c)).ja4().startswith("t00i")
+
+def test_extension_hash_includes_signature_algorithms_in_order():
+    base = ClientHello(0x0303, [0x1301], [0x000d, 0x000a], signature_algorithms=(0x0403, 0x0804))
+    swapped = ClientHello(0x0303, [0x1301], [0x000a, 0x000d], signature_algorithms=(0x0804, 0x0403))
+    without = ClientHello(0x0303, [0x1301], [0x000a, 0x000d])
+    assert base.ja4() != swapped.ja4()
+    assert len({base.ja4(), swapped.ja4(), without.ja4()}) == 3
+    assert base.ja4().split("_")[:2] == swapped.ja4().split("_")[:2]
+
+@pytest.mark.parametrize("splits", [(), (1,), (3, 4), (100, 200, 300)])
+def test_partial_and_fragmented_records(splits):
+    data = records(client_hello(), *splits)
+    for end in range(len(data)):
+        assert parse_client_hello(data[:end]) is None
+    assert parse_client_hello(data).ja4() == CHROME_JA4
+    assert parse_client_hello(memoryview(data)).ja4() == CHROME_JA4
+
+@pytest.mark.parametrize("data, message", [
+    (b"\x17\x03\x03\x00\x05hello", "not a TLS handshake record"),
+    (b"GET / HTTP/1.1\r\n", "not a TLS handshake record"),
+    (records(b"\x02\x00\x00\x04" + bytes(4)), "not a ClientHello"),
+    (records(b"\x01\x01\x00\x00"), "too large"),
+    (records(b"\x01\x00\x00\x24" + b"\x03\x03" + bytes(34)), "truncated ClientHello"),
+])
+def test_non_client_hello_data_is_rejected(data, message):
+    with pytest.raises(ValueError, match=message):
+        parse_client_hello(data)
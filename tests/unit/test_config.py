@@ -0,0 +1,139 @@
+import os
+
+import pytest
+
+from config.config_loader import ConfigReloader, load_config
+from config.schema import Config, ConfigError
+
+SHIPPED_CONFIG = os.path.join(os.path.dirname(__file__), "..", "..", "config", "env", "config.yaml")
+
+def compile_config(**sections):
+    raw = {"tls": {"cert_file": "cert.pem", "key_file": "key.pem"}}
+    for name, values in sections.items():
+        raw[name] = {**raw.get(name, {}), **values}
+    return Config.compile(raw)
+
+@pytest.mark.parametrize("sections, message", [
+    ({"tls": {"cert_file": None}}, "tls.cert_file is required"),
+    ({"tls": {"bogus": 1}}, r"Unknown setting\(s\) tls.bogus"),
+    ({"proxy": {"proxy_protocol": []}}, "proxy.proxy_protocol must be a mapping"),
+    ({"proxy": {"port": "https"}}, "proxy.port must be of type int, got 'https'"),
+    ({"proxy": {"port": 70000}}, "proxy.port must be at most 65535, got 70000"),
+    ({"rate_limiter": {"max_requests_per_minute": 0}}, "rate_limiter.max_requests_per_minute must be at least 1"),
+    ({"tls": {"client_auth": "sometimes"}}, "tls.client_auth must be one of none, optional, required"),
+    ({"tls": {"policy": {"groups": "X25519"}}}, "tls.policy.groups must be of type tuple"),
+    ({"tls": {"policy": {"overrides": [{"groups": ["X25519"]}]}}}, r"tls.policy.overrides\[0\].name is required"),
+    ({"tls": {"policy": {"overrides": [{"name": "default", "server_names": ["a.example"]}]}}},
+     "names must be unique and not 'default'"),
+    ({"proxy": {"proxy_protocol": {"trusted_networks": ["10.0.0.0/33"]}}}, "invalid network '10.0.0.0/33'"),
+    ({"auth": {"enable": True}}, "auth.token_secret is required when authentication is enabled"),
+    ({"quantum": {"encapsulation_pool": {"capacity": 4, "min_depth": 8}}},
+     "quantum.encapsulation_pool.min_depth must not exceed quantum.encapsulation_pool.capacity"),
+])
+def test_invalid_settings_name_their_location(sections, message):
+    with pytest.raises(ConfigError, match=message):
+        compile_config(**sections)
+
+def test_absent_settings_take_their_defaults():
+    config = compile_config()
+
+    assert config.app.environment == "dev"
+    assert config.rate_limiter.enabled is False
+    assert config.rate_limiter.max_requests_per_minute == 60
+    assert config.proxy.proxy_protocol.header_timeout == 3.0
+    assert config.proxy.proxy_protocol.trusted_networks == ()
+    assert config.tls.policy.overrides == ()
+    assert config.tls.policy.handshake_metrics is False
+    assert config.quantum.encapsulation_pool.capacity == 64
+    assert config.monitoring.metrics_port is None
+    assert config.get("rate_limiter").get("missing", "fallback") == "fallback"
+    with pytest.raises(AttributeError, match="immutable"):
+        config.rate_limiter.enabled = True
+
+def test_placeholders_are_expanded_and_coerced(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(
+        "tls:\n"
+        "  cert_file: ${CERT_DIR}/cert.pem\n"
+        "  key_file: ${KEY_FILE:-/certs/key.pem}\n"
+        "  ca_file: ${CA_FILE}\n"
+        "rate_limiter:\n"
+        "  enabled: ${RATE_LIMIT:-off}\n"
+        "  max_requests_per_minute: ${RATE}\n"
+    )
+    config = load_config(str(path), environ={"CERT_DIR": "/certs", "RATE": " 30 "})
+
+    assert config.tls.cert_file == "/certs/cert.pem"
+    assert config.tls.key_file == "/certs/key.pem"
+    assert config.tls.ca_file is None
+    assert config.rate_limiter.enabled is False
+    assert config.rate_limiter.max_requests_per_minute == 30
+
+def test_malformed_files_are_rejected(tmp_path):
+    duplicate = tmp_path / "duplicate.yaml"
+    duplicate.write_text("tls:\n  cert_file: a.pem\n  cert_file: b.pem\n")
+    with pytest.raises(ConfigError, match="Duplicate key 'cert_file' at line 3"):
+        load_config(str(duplicate))
+
+    toml = tmp_path / "config.toml"
+    toml.write_text("[tls]\n")
+    with pytest.raises(ConfigError, match="Unsupported file format"):
+        load_config(str(toml))
+    with pytest.raises(ConfigError, match="Failed to read"):
+        load_config(str(tmp_path / "missing.yaml"))
+
+def test_shipped_config_is_valid():
+    config = load_config(SHIPPED_CONFIG, environ={"TOKEN_SECRET": "x", "INTERNAL_PORT": "8080",
+                                                  "PUBLIC_PORT": "8081"})
+    assert config.tls.policy.groups[0] == "X25519MLKEM768"
+
+def test_reloader_applies_only_changed_sections(tmp_path):
+    path = tmp_path / "config.yaml"
+
+    def write(max_requests, port, groups):
+        path.write_text(
+            "tls: {cert_file: cert.pem, key_file: key.pem, policy: {groups: [" + ", ".join(groups) + "]}}\n"
+            f"rate_limiter: {{enabled: true, max_requests_per_minute: {max_requests}}}\n"
+            f"proxy: {{port: {port}}}\n"
+        )
+
+    write(60, 8443, ["X25519"])
+    reloader = ConfigReloader(load_config(str(path)), str(path))
+    calls = []
+    reloader.register(lambda config: calls.append(("rate_limiter", config.rate_limiter.max_requests_per_minute)),
+                      "rate_limiter")
+    reloader.register(lambda config: calls.append(("policy", config.tls.policy.groups)), "tls.policy")
+    reloader.register(lambda config: calls.append(("cert", config.tls.cert_file)), "tls.cert_file")
+
+    assert reloader.reload() == []
+    assert calls == []
+
+    # A handler runs once however many of its settings changed; unhandled changes wait for a restart
+    write(30, 9443, ["X25519MLKEM768", "X25519"])
+    assert reloader.reload() == ["proxy.port", "tls.policy.groups", "rate_limiter.max_requests_per_minute"]
+    assert calls == [("rate_limiter", 30), ("policy", ("X25519MLKEM768", "X25519"))]
+    assert reloader.config.proxy.port == 9443
+
+    # An invalid file leaves the applied configuration alone
+    path.write_text("rate_limiter: {max_requests_per_minute: 0}\n")
+    assert reloader.reload() == []
+    assert reloader.config.rate_limiter.max_requests_per_minute == 30
+    assert len(calls) == 2
+
+def test_reloader_keeps_going_when_a_handler_fails(tmp_path, caplog):
+    path = tmp_path / "config.yaml"
+    path.write_text("tls: {cert_file: cert.pem, key_file: key.pem}\n")
+    reloader = ConfigReloader(load_config(str(path)), str(path))
+    calls = []
+
+    def fail(config):
+        raise RuntimeError("cannot apply")
+
+    reloader.register(fail, "tls")
+    reloader.register(calls.append, "tls.key_file")
+
+    path.write_text("tls: {cert_file: new.pem, key_file: new-key.pem}\n")
+    assert reloader.reload() == ["tls.cert_file", "tls.key_file"]
+    assert [config.tls.key_file for config in calls] == ["new-key.pem"]
+    assert "Failed to apply configuration change(s) tls.cert_file, tls.key_file: cannot apply" in caplog.text
+    assert "take effect after a restart: tls.cert_file" in caplog.text
@@ -0,0 +1,210 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from config.schema import Config
+from services.control_plane import (
+    ControlPlane, EnvoyDataPlane, NginxDataPlane, certificate_fingerprint, envoy_resources, render_envoy_bootstrap,
+    render_nginx_config
+)
+
+FAKE_NGINX = """#!/bin/sh
+echo "$@" >> "{log_file}"
+if [ "$1" = "-t" ]; then exit {test_exit_code}; fi
+exit 0
+"""
+
+def compile_config(cert_file="/certs/cert.pem", key_file="/certs/key.pem", **sections):
+    raw = {
+        "proxy": {"host": "0.0.0.0", "port": 8443},
+        "internal_backend": {"host": "10.0.0.5", "port": 8080},
+        "tls": {"cert_file": cert_file, "key_file": key_file, "policy": {"groups": ["X25519MLKEM768", "x25519"]}},
+    }
+    for name, values in sections.items():
+        raw[name] = {**raw.get(name, {}), **values}
+    return Config.compile(raw)
+
+@pytest.fixture
+def fake_nginx(tmp_path):
+    """
+    Returns a function writing a stand-in ``nginx`` that logs its arguments; ``-t`` exits with the given code.
+    """
+    def write(test_exit_code=0):
+        path = tmp_path / "nginx"
+        log_file = tmp_path / "nginx.log"
+        path.write_text(FAKE_NGINX.format(log_file=log_file, test_exit_code=test_exit_code))
+        path.chmod(0o755)
+        return str(path), log_file
+    return write
+
+def discover(port, kind, version_info=None):
+    request = {"node": {"id": "test"}}
+    if version_info is not None:
+        request["version_info"] = version_info
+    http_request = urllib.request.Request(f"http://127.0.0.1:{port}/v3/discovery:{kind}",
+                                          data=json.dumps(request).encode(), method="POST")
+    try:
+        with urllib.request.urlopen(http_request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+def test_nginx_config_terminates_tls_and_forwards_to_the_backend():
+    text = render_nginx_config(compile_config())
+
+    assert "listen 0.0.0.0:8443 ssl reuseport;" in text
+    assert "ssl_certificate /certs/cert.pem;" in text
+    assert "ssl_certificate_key /certs/key.pem;" in text
+    assert "ssl_protocols TLSv1.3;" in text
+    assert "ssl_ecdh_curve X25519MLKEM768:x25519;" in text
+    assert "server 10.0.0.5:8080;" in text
+    assert text.count("proxy_pass internal_backend;") == 1
+    for directive in ("ssl_verify_client", "proxy_protocol", "limit_conn", "set_real_ip_from"):
+        assert directive not in text
+
+def test_nginx_config_applies_client_auth_proxy_protocol_and_connection_limit():
+    config = compile_config(
+        proxy={"host": "::", "port": 443, "proxy_protocol": {"accept": True, "send": True,
+                                                             "trusted_networks": ["10.0.0.0/8"]}},
+        tls={"client_auth": "required", "ca_file": "/certs/my ca.pem"},
+        rate_limiter={"enabled": True, "max_requests_per_minute": 30},
+    )
+    text = render_nginx_config(config)
+
+    assert "listen [::]:443 ssl reuseport proxy_protocol;" in text
+    assert 'ssl_client_certificate "/certs/my ca.pem";' in text
+    assert "ssl_verify_client on;" in text
+    assert "proxy_protocol_timeout 3s;" in text
+    assert "set_real_ip_from 10.0.0.0/8;" in text
+    assert "limit_conn_zone $binary_remote_addr zone=per_client:10m;" in text
+    assert "limit_conn per_client 30;" in text
+    assert "proxy_protocol on;" in text
+
+def test_envoy_resources_have_a_filter_chain_per_policy_override():
+    config = compile_config(tls={
+        "client_auth": "optional", "ca_file": "/certs/ca.pem",
+        "policy": {"groups": ["X25519MLKEM768", "x25519", "brainpoolP256r1"], "overrides": [
+            {"name": "legacy", "client_networks": ["192.168.1.7/24"], "groups": ["secp256r1", "prime256v1"]},
+            {"name": "api", "server_names": ["api.example"]},
+        ]},
+    })
+    resources = envoy_resources(config, "abc123")
+    listener, = resources["listeners"]
+    chains = {chain["name"]: chain for chain in listener["filter_chains"]}
+
+    assert list(chains) == ["legacy", "api", "default"]
+    assert listener["address"] == {"socket_address": {"address": "0.0.0.0", "port_value": 8443}}
+    assert [f["name"] for f in listener["listener_filters"]] == ["envoy.filters.listener.tls_inspector"]
+
+    def tls_context(name):
+        return chains[name]["transport_socket"]["typed_config"]
+
+    assert tls_context("default")["common_tls_context"]["tls_params"] == {
+        "tls_minimum_protocol_version": "TLSv1_3", "ecdh_curves": ["X25519MLKEM768", "X25519"]
+    }
+    assert tls_context("legacy")["common_tls_context"]["tls_params"]["ecdh_curves"] == ["P-256"]
+    assert tls_context("api")["require_client_certificate"] is False
+    assert chains["legacy"]["filter_chain_match"] == {
+        "source_prefix_ranges": [{"address_prefix": "192.168.1.0", "prefix_len": 24}]
+    }
+    assert chains["api"]["filter_chain_match"] == {"server_names": ["api.example"]}
+    assert "filter_chain_match" not in chains["default"]
+    assert all(chain["metadata"]["filter_metadata"]["quantum_safe_tls"] == {"certificate": "abc123"}
+               for chain in chains.values())
+
+    cluster, = resources["clusters"]
+    assert cluster["name"] == "internal_backend"
+    endpoint, = cluster["load_assignment"]["endpoints"][0]["lb_endpoints"]
+    assert endpoint["endpoint"]["address"]["socket_address"] == {"address": "10.0.0.5", "port_value": 8080}
+    assert "transport_socket" not in cluster
+
+def test_envoy_bootstrap_polls_the_xds_server():
+    control_plane_config = compile_config(control_plane={"mode": "envoy", "xds_port": 18123,
+                                                         "refresh_delay": 2.5}).control_plane
+    bootstrap = render_envoy_bootstrap(control_plane_config)
+
+    source = bootstrap["dynamic_resources"]["lds_config"]["api_config_source"]
+    assert source == {"api_type": "REST", "transport_api_version": "V3", "cluster_names": ["xds"],
+                      "refresh_delay": "2.5s"}
+    assert bootstrap["dynamic_resources"]["cds_config"]["api_config_source"] == source
+    xds, = bootstrap["static_resources"]["clusters"]
+    endpoint, = xds["load_assignment"]["endpoints"][0]["lb_endpoints"]
+    assert endpoint["endpoint"]["address"]["socket_address"] == {"address": "127.0.0.1", "port_value": 18123}
+
+def test_certificate_fingerprint_changes_with_the_files(tmp_path, make_certificate):
+    cert_file, key_file = make_certificate()
+    tls_config = compile_config(cert_file, key_file).tls
+    fingerprint = certificate_fingerprint(tls_config)
+
+    assert fingerprint and certificate_fingerprint(tls_config) == fingerprint
+    make_certificate(days=90)
+    assert certificate_fingerprint(tls_config) not in ("", fingerprint)
+    assert certificate_fingerprint(compile_config(str(tmp_path / "missing.pem"), key_file).tls) == ""
+
+def test_xds_server_answers_304_until_the_resources_change(tmp_path, free_port, make_certificate):
+    cert_file, key_file = make_certificate()
+    port = free_port()
+    config = compile_config(cert_file, key_file, control_plane={
+        "mode": "envoy", "xds_port": port, "envoy_bootstrap": str(tmp_path / "envoy" / "envoy.json")
+    })
+    control_plane = ControlPlane.from_config(config)
+    try:
+        assert isinstance(control_plane.data_plane, EnvoyDataPlane)
+        assert json.loads((tmp_path / "envoy" / "envoy.json").read_text()) == render_envoy_bootstrap(
+            config.control_plane)
+        control_plane.apply(config)
+
+        status, listeners = discover(port, "listeners")
+        assert status == 200
+        assert listeners["type_url"] == "type.googleapis.com/envoy.config.listener.v3.Listener"
+        assert [listener["name"] for listener in listeners["resources"]] == ["quantum_safe_tls"]
+        version = listeners["version_info"]
+        status, clusters = discover(port, "clusters", "")
+        assert status == 200 and clusters["version_info"] == version
+        assert [cluster["name"] for cluster in clusters["resources"]] == ["internal_backend"]
+        assert discover(port, "listeners", version) == (304, None)
+        assert discover(port, "routes") == (404, None)
+
+        # Applying the same configuration keeps the version
+        control_plane.apply(config)
+        assert discover(port, "listeners", version) == (304, None)
+
+        # A changed configuration or renewed certificate gets a new version
+        control_plane.apply(compile_config(cert_file, key_file, proxy={"port": 9443}))
+        status, listeners = discover(port, "listeners", version)
+        assert status == 200 and listeners["version_info"] != version
+        assert listeners["resources"][0]["address"]["socket_address"]["port_value"] == 9443
+        version = listeners["version_info"]
+
+        make_certificate(days=90)
+        control_plane.apply(control_plane.config, force=True)
+        status, listeners = discover(port, "listeners", version)
+        assert status == 200 and listeners["version_info"] != version
+    finally:
+        control_plane.close()
+
+def test_nginx_data_plane_installs_only_validated_configurations(tmp_path, fake_nginx):
+    nginx_path, log_file = fake_nginx()
+    config_path = tmp_path / "nginx.conf"
+    data_plane = NginxDataPlane(nginx_path, str(config_path))
+    config = compile_config()
+
+    data_plane.apply(config, "abc123")
+    assert config_path.read_text() == render_nginx_config(config)
+    assert log_file.read_text().splitlines() == [
+        f"-t -q -c {config_path}.candidate", f"-s reload -c {config_path}"
+    ]
+
+    # Unchanged configurations reload only when forced
+    data_plane.apply(config, "abc123")
+    assert len(log_file.read_text().splitlines()) == 2
+    data_plane.apply(config, "def456", force=True)
+    assert len(log_file.read_text().splitlines()) == 4
+
+    rejecting = NginxDataPlane(fake_nginx(test_exit_code=1)[0], str(config_path))
+    with pytest.raises(ValueError, match="NGINX rejected"):
+        rejecting.apply(compile_config(proxy={"port": 9443}), "abc123")
+    assert config_path.read_text() == render_nginx_config(config)
+    assert not (tmp_path / "nginx.conf.candidate").exists()
@@ -0,0 +1,97 @@
+import time
+import itertools
+
+from crypto.kem_pool import EncapsulationPool
+
+def counting_kem():
+    counter = itertools.count()
+
+    def encapsulate(public_key):
+        n = next(counter)
+        return f"ct-{n}".encode(), public_key + f"-ss-{n}".encode()
+    return encapsulate
+
+def wait_for_depth(pool, depth, timeout=5):
+    deadline = time.monotonic() + timeout
+    while pool.depth() < depth:
+        assert time.monotonic() < deadline, f"pool depth {pool.depth()} never reached {depth}"
+        time.sleep(0.01)
+
+def test_empty_pool_falls_back_to_inline_encapsulation():
+    starved, depths = [], []
+    pool = EncapsulationPool(min_depth=3, encapsulate=counting_kem(), on_depth=depths.append,
+                             on_starvation=lambda: starved.append(True))
+    try:
+        ciphertext, shared_secret = pool.acquire(b"key-a")
+        assert shared_secret.startswith(b"key-a-ss-")
+        assert pool.starvations == 1 and starved == [True]
+
+        wait_for_depth(pool, 3)
+        assert depths[-1] == 3
+        pool.acquire(b"key-a")
+        assert pool.starvations == 1
+    finally:
+        pool.close()
+
+def test_each_encapsulation_is_handed_out_once():
+    pool = EncapsulationPool(capacity=8, min_depth=8, encapsulate=counting_kem())
+    try:
+        pool.acquire(b"key-a")
+        wait_for_depth(pool, 8)
+        ciphertexts = [pool.acquire(b"key-a")[0] for _ in range(50)]
+        assert len(set(ciphertexts)) == 50
+    finally:
+        pool.close()
+
+def test_material_for_a_previous_key_is_never_used():
+    pool = EncapsulationPool(min_depth=4, encapsulate=counting_kem())
+    try:
+        pool.acquire(b"key-a")
+        wait_for_depth(pool, 4)
+
+        _, shared_secret = pool.acquire(b"key-b")
+        assert shared_secret.startswith(b"key-b-ss-")
+        assert pool.starvations == 2
+        wait_for_depth(pool, 4)
+        # An equal key object different from the one first passed uses the pool
+        assert pool.acquire(bytes(bytearray(b"key-b")))[1].startswith(b"key-b-ss-")
+        assert pool.starvations == 2
+    finally:
+        pool.close()
+
+def test_depth_follows_consumption_within_capacity():
+    pool = EncapsulationPool(capacity=32, min_depth=2, refill_horizon=1.0, encapsulate=counting_kem())
+    try:
+        pool.acquire(b"key-a")
+        wait_for_depth(pool, 2)
+        time.sleep(0.2)
+        assert pool.depth() == 2
+
+        # A sustained rate well above min_depth per second raises the target depth
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            pool.acquire(b"key-a")
+            time.sleep(0.005)
+        wait_for_depth(pool, 10)
+        assert pool.depth() <= 32
+    finally:
+        pool.close()
+    assert pool.depth() == 0
+
+def test_producer_failures_leave_the_inline_fallback():
+    calls = []
+
+    def failing(public_key):
+        calls.append(public_key)
+        raise RuntimeError("liboqs unavailable")
+
+    pool = EncapsulationPool(min_depth=2, encapsulate=failing)
+    try:
+        try:
+            pool.acquire(b"key-a")
+        except RuntimeError:
+            pass
+        time.sleep(0.1)
+        assert pool.depth() == 0
+    finally:
+        pool.close()
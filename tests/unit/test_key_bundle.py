@@ -0,0 +1,170 @@
+import os
+import stat
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from crypto import key_bundle, key_management
+from crypto.key_bundle import KeyBundle
+
+class Clock:
+    """
+    Stands in for the ``time`` module of key_bundle, so expiry is reached without sleeping.
+    """
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(key_bundle, "time", clock)
+    return clock
+
+@pytest.fixture(scope="module")
+def key_pair():
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    public_pem = private_key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                       serialization.PublicFormat.SubjectPublicKeyInfo)
+    private_pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                            serialization.NoEncryption())
+    return public_pem, private_pem
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "bundle" / "keys.bundle"), str(tmp_path / "secrets" / "bundle.key")
+
+def write_bundle(paths, key_pair, **kwargs):
+    bundle = KeyBundle(*paths, **kwargs)
+    bundle.put("projects/p/keys/pair", "projects/p/keys/aes", *key_pair)
+    return bundle
+
+def test_bundle_round_trip(paths, key_pair, clock):
+    written = write_bundle(paths, key_pair, ttl=600)
+    assert written.version == 1 and written.expires_at == clock.now + 600
+    assert stat.S_IMODE(os.stat(paths[1]).st_mode) == 0o600
+    assert os.path.getsize(paths[1]) == 32
+
+    bundle = KeyBundle(*paths)
+    assert bundle.load()
+    assert bundle.version == 1 and bundle.expires_at == written.expires_at
+    assert bundle.get("projects/p/keys/pair", "projects/p/keys/aes") == key_pair
+    assert bundle.get("projects/p/keys/pair", "projects/p/keys/other") is None
+    assert (bundle.hits, bundle.misses) == (1, 1)
+
+    # Entries added later keep the original expiry
+    clock.now += 100
+    bundle.put("projects/p/keys/second", "projects/p/keys/aes", b"public", b"private")
+    reloaded = KeyBundle(*paths)
+    assert reloaded.load() and reloaded.version == 2 and reloaded.expires_at == written.expires_at
+    assert reloaded.get("projects/p/keys/second", "projects/p/keys/aes") == (b"public", b"private")
+
+def flip_byte(data, offset):
+    return data[:offset] + bytes([data[offset] ^ 1]) + data[offset + 1:]
+
+def header_end(data):
+    return key_bundle._PREFIX.size + key_bundle._PREFIX.unpack_from(data)[2]
+
+@pytest.mark.parametrize("tamper", [
+    lambda data: data.replace(b'"version": 1', b'"version": 7'),
+    lambda data: flip_byte(data, header_end(data) + 20),
+    lambda data: flip_byte(data, len(data) - 1),
+], ids=["header", "wrapped-key", "ciphertext"])
+def test_tampered_bundle_falls_back_to_kms(paths, key_pair, clock, monkeypatch, tamper, caplog):
+    write_bundle(paths, key_pair)
+    with open(paths[0], "rb") as f:
+        data = f.read()
+    tampered = tamper(data)
+    assert tampered != data
+    with open(paths[0], "wb") as f:
+        f.write(tampered)
+
+    bundle = KeyBundle(*paths)
+    assert not bundle.load()
+    # Rejected by AES-GCM (InvalidTag), not by parsing
+    assert "authentication failed" in caplog.text
+
+    fetched = []
+    monkeypatch.setattr(key_management, "fetch_key_pair", lambda *names: fetched.append(names) or key_pair)
+    monkeypatch.setattr(key_management, "_key_bundle", bundle)
+    public_key, private_key = key_management.load_key_pair_from_kms("projects/p/keys/pair", "projects/p/keys/aes")
+    assert fetched == [("projects/p/keys/pair", "projects/p/keys/aes")]
+    assert public_key.public_numbers() == private_key.public_key().public_numbers()
+
+    # The fetched pair replaced the tampered file, so the next process skips KMS
+    assert KeyBundle(*paths).load()
+
+def test_expired_bundle_is_rejected(paths, key_pair, clock, caplog):
+    bundle = write_bundle(paths, key_pair, ttl=60)
+    clock.now += 60
+
+    assert bundle.get("projects/p/keys/pair", "projects/p/keys/aes") is None
+    assert not KeyBundle(*paths).load()
+    assert "bundle version 1 has expired" in caplog.text
+
+def test_truncated_bundle_is_rejected(paths, key_pair, clock):
+    write_bundle(paths, key_pair)
+    with open(paths[0], "rb") as f:
+        data = f.read()
+
+    for length in (0, 5, 40, len(data) // 2, len(data) - 1):
+        with open(paths[0], "wb") as f:
+            f.write(data[:length])
+        assert not KeyBundle(*paths).load(), length
+
+def test_key_file_must_hold_32_bytes(paths, key_pair, clock, caplog):
+    write_bundle(paths, key_pair)
+    with open(paths[1], "wb") as f:
+        f.write(os.urandom(16))
+
+    assert not KeyBundle(*paths).load()
+    assert "must hold exactly 32 bytes" in caplog.text
+
+    # Writing fails too, but the key pair is still served from memory
+    bundle = write_bundle(paths, key_pair)
+    assert "Failed to write key bundle" in caplog.text
+    assert bundle.get("projects/p/keys/pair", "projects/p/keys/aes") == key_pair
+
+def test_missing_key_file_is_not_created_on_load(paths, key_pair, clock):
+    write_bundle(paths, key_pair)
+    os.unlink(paths[1])
+
+    assert not KeyBundle(*paths).load()
+    assert not os.path.exists(paths[1])
+
+def test_refresh_is_skipped_when_another_process_refreshed(paths, key_pair, clock):
+    fetched = []
+
+    def fetch(key_name, kms_aes_key_name):
+        fetched.append(key_name)
+        return key_pair
+
+    first = write_bundle(paths, key_pair, ttl=100, refresh_margin=0.2, fetch=fetch)
+    second = KeyBundle(*paths, ttl=100, refresh_margin=0.2, fetch=fetch)
+    assert second.load()
+    assert not first.refresh_if_due()
+
+    clock.now += 85
+    assert second.refresh_if_due()
+    assert fetched == ["projects/p/keys/pair"]
+    assert second.version == 2 and second.expires_at == clock.now + 100
+
+    # The other replica finds the refreshed file and does not call KMS again
+    assert not first.refresh_if_due()
+    assert fetched == ["projects/p/keys/pair"]
+    assert first.version == 2 and first.expires_at == second.expires_at
+
+def test_failed_refresh_keeps_the_bundle(paths, key_pair, clock):
+    def fetch(key_name, kms_aes_key_name):
+        raise RuntimeError("KMS unavailable")
+
+    bundle = write_bundle(paths, key_pair, ttl=100, fetch=fetch)
+    clock.now += 90
+
+    assert not bundle.refresh_if_due()
+    assert bundle.version == 1
+    assert bundle.get("projects/p/keys/pair", "projects/p/keys/aes") == key_pair
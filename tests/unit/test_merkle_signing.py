@@ -0,0 +1,171 @@
+import hmac
+import hashlib
+import threading
+
+import pytest
+
+from crypto.merkle_signing import (
+    HASH_SIZE, InclusionProof, MerkleBatchSigner, MerkleBatchVerifier, SignedRoot, build_tree, inclusion_path,
+    leaf_hash, node_hash, root_from_path, root_payload
+)
+
+KEY = b"test signing key"
+
+def sign_root(payload):
+    return hmac.new(KEY, payload, hashlib.sha256).digest()
+
+def verify_root(payload, signature):
+    return hmac.compare_digest(sign_root(payload), signature)
+
+def reference_root(leaves):
+    # RFC 9162, 2.1.1: split at the largest power of two smaller than n
+    if len(leaves) == 1:
+        return leaves[0]
+    split = 1 << (len(leaves) - 1).bit_length() - 1
+    return node_hash(reference_root(leaves[:split]), reference_root(leaves[split:]))
+
+def leaves_of(size):
+    return [leaf_hash(b"message %d" % i) for i in range(size)]
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 6, 7, 9, 13, 31, 33, 100])
+def test_every_leaf_proves_the_root(size):
+    leaves = leaves_of(size)
+    levels = build_tree(leaves)
+    root = levels[-1][0]
+    assert root == reference_root(leaves)
+
+    for index, leaf in enumerate(leaves):
+        path = inclusion_path(levels, index)
+        assert len(path) <= (size - 1).bit_length()
+        assert root_from_path(leaf, index, size, path) == root
+
+def test_proofs_for_another_position_are_rejected():
+    size = 7
+    leaves = leaves_of(size)
+    levels = build_tree(leaves)
+    root = levels[-1][0]
+    path = inclusion_path(levels, 2)
+
+    assert root_from_path(leaves[2], 2, size, path) == root
+    # Wrong index or tree size: either the path no longer fits or it leads elsewhere
+    for index, tree_size in ((3, size), (1, size), (6, size), (2, 4), (2, 2), (7, size), (9, size)):
+        assert root_from_path(leaves[2], index, tree_size, path) != root, (index, tree_size)
+    assert root_from_path(leaves[2], 7, size, path) is None
+    # The last leaf's path depends on the tree size; the signed payload binds it for the others
+    last_path = inclusion_path(levels, 6)
+    assert root_from_path(leaves[6], 6, size, last_path) == root
+    for tree_size in (8, 9, 12, 16):
+        assert root_from_path(leaves[6], 6, tree_size, last_path) != root, tree_size
+    # Paths that are too short or too long
+    assert root_from_path(leaves[2], 2, size, path[:-1]) is None
+    assert root_from_path(leaves[2], 2, size, path + [root]) is None
+    assert root_from_path(leaves[0], 0, 1, []) == leaves[0]
+    assert root_from_path(leaves[0], 0, 1, [leaves[1]]) is None
+
+def test_proof_and_signed_root_bytes_round_trip():
+    levels = build_tree(leaves_of(13))
+    proof = InclusionProof(12, 13, inclusion_path(levels, 12))
+    data = proof.to_bytes()
+    assert len(data) == 9 + HASH_SIZE * len(proof.path)
+
+    decoded = InclusionProof.from_bytes(data)
+    assert (decoded.index, decoded.tree_size, decoded.path) == (12, 13, proof.path)
+    with pytest.raises(ValueError, match="truncated"):
+        InclusionProof.from_bytes(data[:8])
+    with pytest.raises(ValueError, match="does not match"):
+        InclusionProof.from_bytes(data[:-1])
+    with pytest.raises(ValueError, match="does not match"):
+        InclusionProof.from_bytes(data + bytes(HASH_SIZE))
+
+    signed_root = SignedRoot(13, levels[-1][0], b"signature")
+    decoded = SignedRoot.from_bytes(signed_root.to_bytes())
+    assert (decoded.tree_size, decoded.root, decoded.signature) == (13, levels[-1][0], b"signature")
+    with pytest.raises(ValueError, match="truncated"):
+        SignedRoot.from_bytes(signed_root.to_bytes()[:4 + HASH_SIZE])
+
+def test_batch_signatures_verify_with_one_root_check():
+    messages = [b"message %d" % i for i in range(11)]
+    signed = MerkleBatchSigner(sign_root).sign_batch(messages)
+    checks = []
+
+    def counting_verify(payload, signature):
+        checks.append(payload)
+        return verify_root(payload, signature)
+
+    verifier = MerkleBatchVerifier(counting_verify)
+    for message, batch_signature in zip(messages, signed):
+        proof = InclusionProof.from_bytes(batch_signature.proof.to_bytes())
+        signed_root = SignedRoot.from_bytes(batch_signature.signed_root.to_bytes())
+        assert verifier.verify(message, proof, signed_root)
+    assert checks == [root_payload(11, signed[0].signed_root.root)]
+
+    # Once cached, the root is not needed; other messages or positions still fail
+    assert verifier.verify(messages[4], signed[4].proof)
+    assert not verifier.verify(b"forged", signed[4].proof, signed[4].signed_root)
+    assert not verifier.verify(messages[4], signed[5].proof, signed[5].signed_root)
+    resized = InclusionProof(4, 12, signed[4].proof.path)
+    assert not verifier.verify(messages[4], resized, signed[4].signed_root)
+    assert not MerkleBatchVerifier(verify_root).verify(messages[4], signed[4].proof)
+
+    forged_root = SignedRoot(11, signed[0].signed_root.root, b"not a signature")
+    assert not MerkleBatchVerifier(verify_root).verify(messages[0], signed[0].proof, forged_root)
+
+def test_failed_root_signature_fails_the_whole_batch():
+    assert MerkleBatchSigner(lambda payload: None).sign_batch([b"a", b"b", b"c"]) == [None, None, None]
+    assert MerkleBatchSigner(sign_root).sign_batch([]) == []
+
+def test_background_signer_batches_concurrent_messages():
+    roots = []
+
+    def recording_sign_root(payload):
+        roots.append(payload)
+        return sign_root(payload)
+
+    signer = MerkleBatchSigner(recording_sign_root, max_batch=8, max_delay=0.5)
+    signer.start()
+    try:
+        futures = [signer.submit(b"message %d" % i) for i in range(20)]
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        signer.stop()
+
+    # Full batches are cut without waiting for max_delay
+    assert [result.proof.tree_size for result in results] == [8] * 16 + [4] * 4
+    assert len(roots) == 3
+    verifier = MerkleBatchVerifier(verify_root)
+    for i, result in enumerate(results):
+        assert result.proof.index == i % 8
+        assert verifier.verify(b"message %d" % i, result.proof, result.signed_root)
+
+def test_stop_signs_pending_messages():
+    release = threading.Event()
+
+    def slow_sign_root(payload):
+        release.wait(5)
+        return sign_root(payload)
+
+    signer = MerkleBatchSigner(slow_sign_root, max_batch=2, max_delay=60)
+    signer.start()
+    first = [signer.submit(b"a"), signer.submit(b"b")]
+    # Would wait for max_delay (a minute) if stop did not flush it
+    pending = signer.submit(b"c")
+    release.set()
+    assert all(future.result(timeout=5) is not None for future in first)
+    assert not pending.done()
+
+    signer.stop()
+    assert pending.result(timeout=0).proof.tree_size == 1
+    with pytest.raises(RuntimeError, match="not running"):
+        signer.submit(b"d")
+
+def test_signing_errors_reach_the_callers():
+    def failing_sign_root(payload):
+        raise RuntimeError("HSM unavailable")
+
+    signer = MerkleBatchSigner(failing_sign_root, max_delay=0.01)
+    signer.start()
+    try:
+        with pytest.raises(RuntimeError, match="HSM unavailable"):
+            signer.sign(b"message", timeout=5)
+    finally:
+        signer.stop()
@@ -0,0 +1,122 @@
+import struct
+
+import pytest
+
+from core.proxy_handler import QuantumSafeProxy
+from core.proxy_protocol import (
+    V2_SIGNATURE, ProxyProtocol, ProxyProtocolError, build_v2_header, parse_header
+)
+from middleware.rate_limiter import RateLimiter
+
+CLIENT_HELLO = b"\x16\x03\x01\x02\x00"
+
+def v2_header(command, family, addresses):
+    return V2_SIGNATURE + bytes([0x20 | command, family]) + struct.pack("!H", len(addresses)) + addresses
+
+def test_v1_headers_carry_the_client_address():
+    header = b"PROXY TCP4 192.0.2.1 198.51.100.2 56324 443\r\n"
+    assert parse_header(header + CLIENT_HELLO) == (len(header), ("192.0.2.1", 56324), ("198.51.100.2", 443))
+
+    header = b"PROXY TCP6 2001:db8::1 2001:db8::2 56324 8443\r\n"
+    assert parse_header(header) == (len(header), ("2001:db8::1", 56324), ("2001:db8::2", 8443))
+
+    assert parse_header(b"PROXY UNKNOWN\r\n" + CLIENT_HELLO) == (15, None, None)
+    header = b"PROXY UNKNOWN 192.0.2.1 198.51.100.2 56324 443\r\n"
+    assert parse_header(header) == (len(header), None, None)
+
+@pytest.mark.parametrize("header", [
+    b"PROXY TCP4 192.0.2.1 198.51.100.2 56324 443\r\n",
+    v2_header(0x01, 0x11, bytes(12)),
+])
+def test_partial_headers_wait_for_more_data(header):
+    for end in range(1, len(header)):
+        assert parse_header(header[:end]) is None
+    assert parse_header(header)[0] == len(header)
+
+@pytest.mark.parametrize("data, message", [
+    (CLIENT_HELLO, "does not start"),
+    (b"PROXZ TCP4", "v1 signature"),
+    (b"PROXY TCP4 " + b"1" * 120, "too long"),
+    (b"PROXY TCP4 192.0.2.1 198.51.100.2 56324\r\n", "malformed"),
+    (b"PROXY UDP4 192.0.2.1 198.51.100.2 56324 443\r\n", "malformed"),
+    (b"PROXY TCP4 2001:db8::1 198.51.100.2 56324 443\r\n", "malformed"),
+    (b"PROXY TCP4 192.0.2.1 198.51.100.2 56324 65536\r\n", "malformed"),
+    (b"\r\n\r\n\x01", "v2 signature"),
+    (b"\r\n\r\n\x00\r\nQUIX\n" + bytes(4), "v2 signature"),
+    (V2_SIGNATURE + b"\x11\x11\x00\x0c" + bytes(12), "v2 signature"),
+    (v2_header(0x02, 0x11, bytes(12)), "command"),
+    (v2_header(0x01, 0x11, bytes(4)), "truncated"),
+])
+def test_invalid_headers_are_rejected(data, message):
+    with pytest.raises(ProxyProtocolError, match=message):
+        parse_header(data)
+
+def test_longest_v1_header_is_accepted():
+    # The v1 limit of 107 bytes leaves room for the longest TCP6 header
+    header = b"PROXY TCP6 ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff 65535 65535\r\n"
+    assert len(header) == 104
+    assert parse_header(header)[0] == 104
+
+def test_v2_headers_round_trip():
+    for source, destination in ((("192.0.2.1", 56324), ("198.51.100.2", 443)),
+                                (("2001:db8::1", 1), ("2001:db8::2", 65535))):
+        header = build_v2_header(source, destination)
+        assert parse_header(header + CLIENT_HELLO) == (len(header), source, destination)
+
+def test_v2_headers_without_a_tcp_address():
+    # LOCAL is sent for mixed address families and by load balancer health checks
+    local = build_v2_header(("192.0.2.1", 56324), ("2001:db8::2", 443))
+    assert local == v2_header(0x00, 0x00, b"")
+    assert parse_header(local + CLIENT_HELLO) == (16, None, None)
+    assert build_v2_header(None, ("192.0.2.1", 443)) == local
+    assert parse_header(v2_header(0x00, 0x11, bytes(12))) == (28, None, None)
+
+    # UNSPEC and Unix socket families are valid but carry no TCP address
+    assert parse_header(v2_header(0x01, 0x00, b"")) == (16, None, None)
+    assert parse_header(v2_header(0x01, 0x31, bytes(216))) == (232, None, None)
+
+def test_v2_tlvs_after_the_addresses_are_skipped():
+    addresses = bytes([192, 0, 2, 1, 198, 51, 100, 2]) + struct.pack("!HH", 56324, 443)
+    tlv = b"\x04" + struct.pack("!H", 4) + b"test"
+    header = v2_header(0x01, 0x11, addresses + tlv)
+    assert parse_header(header + CLIENT_HELLO) == (len(header), ("192.0.2.1", 56324), ("198.51.100.2", 443))
+
+def test_headers_are_expected_only_from_trusted_peers():
+    assert not ProxyProtocol(send=True).expects_header(("192.0.2.1", 1))
+    assert ProxyProtocol(accept=True).expects_header(("192.0.2.1", 1))
+
+    settings = ProxyProtocol(accept=True, trusted_networks=["10.0.0.0/8", "2001:db8::/32"])
+    assert settings.expects_header(("10.1.2.3", 1))
+    assert settings.expects_header(("2001:db8::5", 1, 0, 0))
+    assert not settings.expects_header(("192.0.2.1", 1))
+    assert not settings.expects_header(None)
+
+def test_rate_limit_applies_to_clients_not_load_balancers(make_certificate):
+    cert_file, key_file = make_certificate()
+
+    def proxy(proxy_protocol):
+        return QuantumSafeProxy("127.0.0.1", 0, "127.0.0.1", 1, cert_file, key_file,
+                                proxy_protocol=proxy_protocol, rate_limiter=RateLimiter(rate_limit=1))
+
+    balancer = ("10.0.0.5", 40000)
+
+    # Without PROXY protocol settings every peer is a client
+    direct = proxy(None)
+    assert direct.admits(balancer)
+    assert not direct.admits(balancer)
+
+    # A listed load balancer is not limited by its own address, with or without headers
+    for settings in (ProxyProtocol(trusted_networks=["10.0.0.0/8"]),
+                     ProxyProtocol(accept=True, trusted_networks=["10.0.0.0/8"])):
+        limited = proxy(settings)
+        for _ in range(3):
+            assert limited.admits(balancer)
+        assert limited.admits(("192.0.2.1", 1))
+        assert not limited.admits(("192.0.2.1", 2))
+
+    # Clients announced by a load balancer are limited by their own address
+    behind = proxy(ProxyProtocol(accept=True))
+    assert behind.admits(balancer, ("198.51.100.7", 1))
+    assert not behind.admits(balancer, ("198.51.100.7", 2))
+    assert behind.admits(balancer, ("198.51.100.8", 1))
+    assert behind.admits(balancer)
@@ -0,0 +1,315 @@
+import os
+import time
+import random
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from cryptography import x509
+from cryptography.x509 import ocsp
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import Encoding
+
+from core.revocation import (
+    BloomFilter, IssuerRevocations, RevocationChecker, RevokedSerials, issuer_and_serial, normalize_serial
+)
+from services.revocation_service import CRLUpdater, OCSPStapleCache
+
+def now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+class Authority:
+    """
+    A test CA issuing client certificates, CRLs and OCSP responses.
+    """
+
+    def __init__(self, common_name="Test CA"):
+        self.key = ec.generate_private_key(ec.SECP256R1())
+        self.name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+        self.certificate = (
+            x509.CertificateBuilder()
+            .subject_name(self.name)
+            .issuer_name(self.name)
+            .public_key(self.key.public_key())
+            .serial_number(1)
+            .not_valid_before(now() - datetime.timedelta(days=1))
+            .not_valid_after(now() + datetime.timedelta(days=365))
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+            .sign(self.key, hashes.SHA256())
+        )
+
+    def issue(self, serial):
+        key = ec.generate_private_key(ec.SECP256R1())
+        return (
+            x509.CertificateBuilder()
+            .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, f"client {serial}")]))
+            .issuer_name(self.name)
+            .public_key(key.public_key())
+            .serial_number(serial)
+            .not_valid_before(now() - datetime.timedelta(days=1))
+            .not_valid_after(now() + datetime.timedelta(days=30))
+            .sign(self.key, hashes.SHA256())
+        )
+
+    def crl(self, revoked, number, delta_base=None, removed=(), next_update=None):
+        builder = (
+            x509.CertificateRevocationListBuilder()
+            .issuer_name(self.name)
+            .last_update(now() - datetime.timedelta(minutes=1))
+            .next_update(next_update or now() + datetime.timedelta(days=1))
+            .add_extension(x509.CRLNumber(number), critical=False)
+        )
+        if delta_base is not None:
+            builder = builder.add_extension(x509.DeltaCRLIndicator(delta_base), critical=True)
+        for serial in revoked:
+            builder = builder.add_revoked_certificate(
+                x509.RevokedCertificateBuilder().serial_number(serial).revocation_date(now()).build())
+        for serial in removed:
+            builder = builder.add_revoked_certificate(
+                x509.RevokedCertificateBuilder().serial_number(serial).revocation_date(now())
+                .add_extension(x509.CRLReason(x509.ReasonFlags.remove_from_crl), critical=False).build())
+        return builder.sign(self.key, hashes.SHA256()).public_bytes(Encoding.DER)
+
+    def ocsp_response(self, certificate, lifetime=datetime.timedelta(hours=4)):
+        this_update = now() - datetime.timedelta(minutes=1)
+        return (
+            ocsp.OCSPResponseBuilder()
+            .add_response(cert=certificate, issuer=self.certificate, algorithm=hashes.SHA1(),
+                          cert_status=ocsp.OCSPCertStatus.GOOD, this_update=this_update,
+                          next_update=this_update + lifetime, revocation_time=None, revocation_reason=None)
+            .responder_id(ocsp.OCSPResponderEncoding.HASH, self.certificate)
+            .sign(self.key, hashes.SHA256())
+            .public_bytes(Encoding.DER)
+        )
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.path)
+        if self.path not in server.documents:
+            self.send_error(404)
+            return
+        body, etag = server.documents[self.path]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = ocsp.load_der_ocsp_request(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(self.path)
+        body = self.server.respond(request)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/ocsp-response")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def distribution_point():
+    """
+    Serves ``documents`` (path to body and ETag) with conditional GETs, and OCSP requests with ``respond``.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.documents = {}
+    server.requests = []
+    server.respond = None
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def authority(tmp_path):
+    authority = Authority()
+    authority.ca_file = str(tmp_path / "ca.pem")
+    with open(authority.ca_file, "wb") as f:
+        f.write(authority.certificate.public_bytes(Encoding.PEM))
+    return authority
+
+def der(certificate):
+    return certificate.public_bytes(Encoding.DER)
+
+def test_issuer_and_serial_matches_the_parsed_certificate(authority):
+    for serial in (1, 0x7f, 0x80, 0xff00, x509.random_serial_number()):
+        issuer, normalized = issuer_and_serial(der(authority.issue(serial)))
+        assert issuer == authority.name.public_bytes()
+        assert normalized == normalize_serial(serial)
+    assert normalize_serial(b"\x00\x80") == normalize_serial(0x80) == b"\x80"
+    with pytest.raises(ValueError):
+        issuer_and_serial(der(authority.issue(5))[:40])
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    members = [os.urandom(16) for _ in range(5000)]
+    bloom = BloomFilter(len(members), error_rate=0.01)
+    bloom.update(members[:2500])
+    for member in members[2500:]:
+        bloom.add(member)
+
+    assert all(member in bloom for member in members)
+    false_positives = sum(os.urandom(16) in bloom for _ in range(20000))
+    assert false_positives < 20000 * 0.03
+
+def test_revoked_serials_lookup_and_merge():
+    rng = random.Random(7)
+    serials = {normalize_serial(rng.getrandbits(120)) for _ in range(2000)}
+    index = RevokedSerials.build(serials)
+    revoked = sorted(serials)
+
+    assert len(index) == len(serials)
+    assert all(serial in index for serial in serials)
+    others = {normalize_serial(rng.getrandbits(120)) for _ in range(1000)} - serials
+    assert not any(serial in index for serial in others)
+    assert normalize_serial(0) not in RevokedSerials.build([])
+
+    added = [normalize_serial(rng.getrandbits(100)) for _ in range(50)] + [revoked[0]]
+    removed = revoked[1:31] + [normalize_serial(1 << 125)]
+    merged = index.merged(added, removed)
+    expected = (serials | set(added)) - set(removed)
+    assert len(merged) == len(expected)
+    assert all(serial in merged for serial in expected)
+    assert not any(serial in merged for serial in revoked[1:31])
+    # The base index is unchanged, so later deltas are applied to it again
+    assert len(index) == len(serials) and revoked[1] in index
+
+    # Wider serials than the base holds rebuild the index
+    wide = normalize_serial(1 << 159)
+    rebuilt = index.merged([wide], revoked[:1])
+    assert wide in rebuilt and revoked[0] not in rebuilt and revoked[1] in rebuilt
+
+def test_checker_outcomes(authority):
+    outcomes = []
+    checker = RevocationChecker(on_check=outcomes.append)
+    good, revoked = der(authority.issue(10)), der(authority.issue(11))
+
+    assert checker.check(good) is None
+    checker.update(authority.name.public_bytes(), IssuerRevocations(
+        "CN=Test CA", RevokedSerials.build([normalize_serial(11)]), 1, time.time() + 60))
+    assert checker.check(good) is None
+    assert checker.check(revoked) == "serial 0b is revoked by CN=Test CA"
+    assert checker.check(None) is None
+    assert checker.check(b"\x30\x03\x02").startswith("unreadable certificate")
+    assert outcomes == ["unknown", "good", "revoked"]
+
+    # An expired CRL is unknown, which only a fail-closed checker rejects
+    assert checker.check(good, now=time.time() + 120) is None
+    checker.fail_closed, checker.grace = True, 300
+    assert checker.check(good, now=time.time() + 120) is None
+    assert checker.check(good, now=time.time() + 600) == "the CRL of CN=Test CA has expired"
+    assert RevocationChecker(fail_closed=True).check(good) == "no CRL for its issuer"
+
+def test_crl_updater_applies_base_and_delta_crls(tmp_path, authority, distribution_point):
+    documents = distribution_point.documents
+    documents["/base.crl"] = (authority.crl([11, 12, 13], number=5), '"base-5"')
+    checker = RevocationChecker()
+    updates = []
+    updater = CRLUpdater(checker, authority.ca_file, [(f"{distribution_point.url}/base.crl",
+                                                       f"{distribution_point.url}/delta.crl")],
+                         cache_dir=str(tmp_path / "cache"), on_update=lambda name, count: updates.append(count))
+
+    def revoked(serial):
+        return checker.check(der(authority.issue(serial))) is not None
+
+    documents["/delta.crl"] = (authority.crl([14], number=6, delta_base=5, removed=[12]), '"delta-6"')
+    assert updater.refresh()
+    assert [serial for serial in range(10, 16) if revoked(serial)] == [11, 13, 14]
+    assert checker.issuers[authority.name.public_bytes()].crl_number == 6
+    assert updates == [3]
+
+    # Unchanged CRLs cost a 304 each and change nothing
+    distribution_point.requests.clear()
+    assert not updater.refresh()
+    assert distribution_point.requests == ["/base.crl", "/delta.crl"]
+
+    # Delta CRLs are cumulative and applied to the base, not to the previous delta
+    documents["/delta.crl"] = (authority.crl([15], number=7, delta_base=5), '"delta-7"')
+    assert updater.refresh()
+    assert [serial for serial in range(10, 16) if revoked(serial)] == [11, 12, 13, 15]
+
+    # A delta for a newer base waits for that base
+    documents["/delta.crl"] = (authority.crl([10], number=9, delta_base=8), '"delta-9"')
+    assert not updater.refresh()
+    assert not revoked(10)
+    documents["/base.crl"] = (authority.crl([10, 11], number=8), '"base-8"')
+    assert updater.refresh()
+    assert [serial for serial in range(10, 16) if revoked(serial)] == [10, 11]
+
+    # A restart indexes the cached base and only revalidates it
+    restarted = RevocationChecker()
+    distribution_point.requests.clear()
+    assert CRLUpdater(restarted, authority.ca_file, [(f"{distribution_point.url}/base.crl", None)],
+                      cache_dir=str(tmp_path / "cache")).refresh()
+    assert restarted.check(der(authority.issue(10))) is not None
+    assert distribution_point.requests == ["/base.crl"]
+
+def test_crl_updater_rejects_crls_of_unknown_issuers(authority, distribution_point):
+    distribution_point.documents["/base.crl"] = (Authority("Other CA").crl([11], number=1), '"other"')
+    checker = RevocationChecker()
+    updater = CRLUpdater(checker, authority.ca_file, [(f"{distribution_point.url}/base.crl", None)])
+
+    assert not updater.refresh()
+    assert checker.issuers == {}
+
+def test_ocsp_staple_is_fetched_verified_and_reused(tmp_path, authority, distribution_point):
+    certificate = authority.issue(42)
+    cert_file = tmp_path / "cert.pem"
+    cert_file.write_bytes(certificate.public_bytes(Encoding.PEM) + authority.certificate.public_bytes(Encoding.PEM))
+    staple_file = tmp_path / "staple" / "ocsp.der"
+
+    def respond(request):
+        assert request.serial_number == 42
+        return authority.ocsp_response(certificate)
+
+    distribution_point.respond = respond
+    cache = OCSPStapleCache(str(cert_file), str(staple_file), responder_url=f"{distribution_point.url}/ocsp")
+    refreshed = []
+    cache.add_listener(lambda: refreshed.append(True))
+
+    assert not cache.load()
+    assert cache.refresh_due()
+    assert cache.refresh_if_due()
+    response = ocsp.load_der_ocsp_response(staple_file.read_bytes())
+    assert response.serial_number == 42 and response.certificate_status == ocsp.OCSPCertStatus.GOOD
+    assert refreshed == [True]
+
+    # Not due again until half of the four-hour validity has passed
+    assert not cache.refresh_due()
+    assert not cache.refresh_if_due()
+    assert cache.refresh_due(now=time.time() + 2.5 * 3600)
+    assert distribution_point.requests == ["/ocsp"]
+
+    restarted = OCSPStapleCache(str(cert_file), str(staple_file))
+    assert restarted.load()
+    assert restarted.next_update == cache.next_update
+
+def test_ocsp_staple_signed_by_another_key_is_rejected(tmp_path, authority, distribution_point):
+    certificate = authority.issue(42)
+    cert_file = tmp_path / "cert.pem"
+    cert_file.write_bytes(certificate.public_bytes(Encoding.PEM))
+    impostor = Authority("Test CA")
+    distribution_point.respond = lambda request: impostor.ocsp_response(certificate)
+    staple_file = tmp_path / "ocsp.der"
+    cache = OCSPStapleCache(str(cert_file), str(staple_file), ca_file=authority.ca_file,
+                            responder_url=f"{distribution_point.url}/ocsp")
+
+    with pytest.raises(ValueError, match="signature is invalid"):
+        cache.refresh_if_due()
+    assert not staple_file.exists()
+
+    # A staple left by another certificate is not adopted
+    staple_file.write_bytes(authority.ocsp_response(authority.issue(43)))
+    assert not cache.load()
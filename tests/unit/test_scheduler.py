@@ -0,0 +1,214 @@
+import time
+import asyncio
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from config.schema import Config
+from workers.scheduler import CronTrigger, IntervalTrigger, TaskScheduler
+
+def utc(*fields):
+    return datetime(*fields, tzinfo=timezone.utc).timestamp()
+
+def runs(trigger, start, count):
+    times, now = [], start
+    for _ in range(count):
+        now = trigger.next_run(now)
+        times.append(datetime.fromtimestamp(now, timezone.utc).strftime("%a %Y-%m-%d %H:%M"))
+    return times
+
+def test_cron_fields_are_parsed():
+    trigger = CronTrigger("*/15 9-17/4 1,15 */6 0,7")
+    assert trigger.minutes == {0, 15, 30, 45}
+    assert trigger.hours == {9, 13, 17}
+    assert trigger.days == {1, 15}
+    assert trigger.months == {1, 7}
+    assert trigger.weekdays == {0}
+    # A single value with a step runs to the end of the range
+    assert CronTrigger("5/20 * * * *").minutes == {5, 25, 45}
+
+@pytest.mark.parametrize("expression", [
+    "* * * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "* * * 13 *", "* * * * 8",
+    "*/0 * * * *", "30-10 * * * *", "a * * * *", "0 0 30 2 *",
+])
+def test_invalid_cron_expressions_are_rejected(expression):
+    with pytest.raises(ValueError, match="Cron expression|Invalid cron expression"):
+        CronTrigger(expression)
+
+def test_cron_runs_at_the_next_matching_minute():
+    trigger = CronTrigger("30 2 * * *")
+    assert runs(trigger, utc(2026, 12, 31, 2, 30), 2) == ["Fri 2027-01-01 02:30", "Sat 2027-01-02 02:30"]
+    assert runs(trigger, utc(2026, 3, 1, 2, 29, 59), 1) == ["Sun 2026-03-01 02:30"]
+    assert runs(CronTrigger("0 0 29 2 *"), utc(2026, 1, 1), 1) == ["Tue 2028-02-29 00:00"]
+
+def test_restricted_day_fields_match_either_day():
+    start = utc(2026, 1, 1)  # A Thursday
+    # Both day fields restricted: the 13th or any Friday
+    assert runs(CronTrigger("0 0 13 * 5"), start, 4) == [
+        "Fri 2026-01-02 00:00", "Fri 2026-01-09 00:00", "Tue 2026-01-13 00:00", "Fri 2026-01-16 00:00"
+    ]
+    # Only one restricted: that one alone decides
+    assert runs(CronTrigger("0 0 13 * *"), start, 2) == ["Tue 2026-01-13 00:00", "Fri 2026-02-13 00:00"]
+    assert runs(CronTrigger("0 0 * * 5"), start, 2) == ["Fri 2026-01-02 00:00", "Fri 2026-01-09 00:00"]
+    assert runs(CronTrigger("0 0 * * 7"), start, 1) == ["Sun 2026-01-04 00:00"]
+
+def scheduler_with_reports(tmp_path, **kwargs):
+    reports = []
+    scheduler = TaskScheduler(lock_dir=str(tmp_path), on_run=lambda name, status, *_: reports.append((name, status)),
+                              **kwargs)
+    return scheduler, reports
+
+def test_a_task_never_overlaps_itself(tmp_path):
+    scheduler, reports = scheduler_with_reports(tmp_path)
+    release = asyncio.Event()
+    started = []
+
+    async def slow():
+        started.append(True)
+        await release.wait()
+
+    task = scheduler.add("slow", slow, IntervalTrigger(3600))
+
+    async def main():
+        scheduler._start(task)
+        await asyncio.sleep(0)
+        scheduler._start(task)
+        assert reports == [("slow", "overlap")]
+        release.set()
+        while task.running:
+            await asyncio.sleep(0.01)
+        scheduler._start(task)
+        while task.running:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert len(started) == 2
+    assert reports == [("slow", "overlap"), ("slow", "ok"), ("slow", "ok")]
+    assert (task.runs, task.failures) == (2, 0)
+
+def test_locked_tasks_run_in_one_scheduler_at_a_time(tmp_path):
+    first, first_reports = scheduler_with_reports(tmp_path)
+    second, second_reports = scheduler_with_reports(tmp_path)
+    release = asyncio.Event()
+
+    async def job():
+        await release.wait()
+
+    first_task = first.add("rotate", job, IntervalTrigger(3600), lock=True)
+    second_task = second.add("rotate", job, IntervalTrigger(3600), lock=True)
+    unlocked = second.add("local", job, IntervalTrigger(3600))
+
+    async def main():
+        first._start(first_task)
+        assert (tmp_path / "rotate.lock").exists()
+        second._start(second_task)
+        second._start(unlocked)
+        assert second_reports == [("rotate", "locked")]
+        assert unlocked.running
+
+        release.set()
+        while first_task.running or unlocked.running:
+            await asyncio.sleep(0.01)
+        # Released once the run finished
+        second._start(second_task)
+        while second_task.running:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert first_reports == [("rotate", "ok")]
+    assert second_reports == [("rotate", "locked"), ("local", "ok"), ("rotate", "ok")]
+
+    with pytest.raises(ValueError, match="needs a lock directory"):
+        TaskScheduler().add("rotate", job, IntervalTrigger(3600), lock=True)
+
+def test_timed_out_runs_are_reported_and_end(tmp_path):
+    scheduler, reports = scheduler_with_reports(tmp_path)
+
+    async def hangs():
+        await asyncio.sleep(3600)
+
+    task = scheduler.add("hangs", hangs, IntervalTrigger(3600), timeout=0.05, lock=True)
+
+    async def main():
+        scheduler._start(task)
+        while task.running:
+            await asyncio.sleep(0.01)
+        # The lock was released with the abandoned run
+        scheduler._start(task)
+        while task.running:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert reports == [("hangs", "timeout"), ("hangs", "timeout")]
+    assert (task.runs, task.failures) == (2, 2)
+
+def test_timed_out_thread_keeps_the_task_running_until_it_returns(tmp_path):
+    scheduler, reports = scheduler_with_reports(tmp_path)
+    release = threading.Event()
+    task = scheduler.add("blocking", lambda: release.wait(5), IntervalTrigger(3600), timeout=0.05, lock=True)
+
+    async def main():
+        scheduler._start(task)
+        while not reports:
+            await asyncio.sleep(0.01)
+        assert reports == [("blocking", "timeout")]
+        # A thread cannot be interrupted: the next trigger is skipped rather than run twice
+        assert task.running
+        scheduler._start(task)
+        assert reports[-1] == ("blocking", "overlap")
+        release.set()
+        while task.running:
+            await asyncio.sleep(0.01)
+
+    try:
+        asyncio.run(main())
+    finally:
+        scheduler.close()
+    lock_fd = scheduler._acquire_lock(task)
+    assert lock_fd is not None
+    scheduler._release_lock(lock_fd)
+
+def test_run_at_only_moves_a_run_forward(tmp_path):
+    scheduler = TaskScheduler(lock_dir=str(tmp_path))
+
+    async def noop():
+        pass
+
+    task = scheduler.add("task", noop, IntervalTrigger(3600))
+    scheduler.run_at("task", 1000.0)
+    assert task.next_run == 1000.0
+    scheduler.run_at("task", 2000.0)
+    assert task.next_run == 1000.0
+    scheduler.run_at("task", 500.0)
+    assert task.next_run == 500.0
+
+def test_certificate_renewal_runs_when_the_inventory_is_due(tmp_path, make_certificate):
+    from main import create_scheduler
+
+    certbot = tmp_path / "certbot"
+    certbot.write_text("#!/bin/sh\nexit 1\n")
+    certbot.chmod(0o755)
+    make_certificate("live/a.example/cert.pem", "a.example", days=40)
+    config = Config.compile({
+        "tls": {"cert_file": "cert.pem", "key_file": "key.pem"},
+        "renewal": {"enable_auto_renewal": True, "renewal_threshold_days": 30, "certbot_path": str(certbot),
+                    "inventory_paths": [str(tmp_path / "live")]},
+        "scheduler": {"lock_dir": str(tmp_path / "locks"), "cert_renewal": {"cron": "17 */6 * * *"}},
+    })
+    scheduler = create_scheduler(config)
+    renewal = scheduler.tasks["cert_renewal"]
+    renewal.next_run = renewal.trigger.next_run(time.time())
+
+    # The certificate is due in about ten days, later than the cron trigger: the trigger stays
+    asyncio.run(scheduler.tasks["cert_inventory_scan"].func())
+    assert renewal.next_run <= time.time() + 6 * 3600
+
+    # Once due, the renewal runs right away; a failure is retried after the retry interval
+    make_certificate("live/a.example/cert.pem", "a.example", days=5)
+    asyncio.run(scheduler.tasks["cert_inventory_scan"].func())
+    assert renewal.next_run == pytest.approx(time.time(), abs=5)
+
+    renewal.next_run = renewal.trigger.next_run(time.time())
+    asyncio.run(renewal.func())
+    assert renewal.next_run == pytest.approx(min(time.time() + 3600, renewal.trigger.next_run(time.time())), abs=5)
@@ -0,0 +1,95 @@
+import socket
+import asyncio
+
+from core.socket_handoff import HandoffServer, confirm_ready, request_listening_sockets
+
+def listening_socket():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen()
+    return sock
+
+async def serve_handoff(path, listener, handed_over):
+    async def on_handoff():
+        handed_over.set()
+
+    server = HandoffServer(path, lambda: [listener], on_handoff, asyncio.get_running_loop(), timeout=5)
+    server.start()
+    return server
+
+def test_handoff_passes_listening_sockets_and_waits_for_ready(tmp_path):
+    path = str(tmp_path / "handoff.sock")
+    listener = listening_socket()
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        handed_over = asyncio.Event()
+        server = await serve_handoff(path, listener, handed_over)
+        try:
+            sockets, control = await loop.run_in_executor(None, request_listening_sockets, path, 5)
+            assert [sock.getsockname() for sock in sockets] == [listener.getsockname()]
+            await asyncio.sleep(0.1)
+            assert not handed_over.is_set()
+
+            confirm_ready(control)
+            await asyncio.wait_for(handed_over.wait(), 5)
+            for sock in sockets:
+                sock.close()
+        finally:
+            server.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        listener.close()
+
+def test_handoff_without_ready_keeps_serving(tmp_path):
+    path = str(tmp_path / "handoff.sock")
+    listener = listening_socket()
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        handed_over = asyncio.Event()
+        server = await serve_handoff(path, listener, handed_over)
+        try:
+            # A replacement that exits before confirming leaves traffic with this process
+            sockets, control = await loop.run_in_executor(None, request_listening_sockets, path, 5)
+            for sock in sockets:
+                sock.close()
+            control.close()
+
+            # A malformed request is ignored
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+                conn.connect(path)
+                conn.sendall(b"HELLO\n")
+                assert await loop.run_in_executor(None, conn.recv, 64) == b""
+
+            sockets, control = await loop.run_in_executor(None, request_listening_sockets, path, 5)
+            confirm_ready(control)
+            await asyncio.wait_for(handed_over.wait(), 5)
+            for sock in sockets:
+                sock.close()
+        finally:
+            server.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        listener.close()
+
+def test_close_removes_only_its_own_control_socket(tmp_path):
+    path = str(tmp_path / "handoff.sock")
+    listener = listening_socket()
+
+    async def run():
+        first = await serve_handoff(path, listener, asyncio.Event())
+        second = await serve_handoff(path, listener, asyncio.Event())
+        first.close()
+        assert (tmp_path / "handoff.sock").exists()
+        second.close()
+        assert not (tmp_path / "handoff.sock").exists()
+
+    try:
+        asyncio.run(run())
+    finally:
+        listener.close()
@@ -0,0 +1,45 @@
+import os
+import sys
+import json
+import subprocess
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "src")
+
+# Modules that must only be imported once the configuration enables them
+DEFERRED_MODULES = [
+    "google.cloud.kms_v1", "oqs", "aiohttp", "prometheus_client", "jwt", "cryptography", "aioquic"
+]
+
+# Cumulative import time of main, with room for slower CI hosts; it was ~90ms when set
+IMPORT_BUDGET_MS = 250
+
+def run_python(*args):
+    # A fresh interpreter, so modules imported by other tests do not count
+    return subprocess.run([sys.executable, *args], cwd=SRC, capture_output=True, text=True, check=True)
+
+def test_importing_main_defers_optional_subsystems():
+    result = run_python("-c", "import sys, json, main; print(json.dumps(sorted(sys.modules)))")
+    loaded = set(json.loads(result.stdout))
+
+    assert [module for module in DEFERRED_MODULES if module in loaded] == []
+
+def test_loading_the_shipped_config_defers_optional_subsystems():
+    script = (
+        "import sys, json\n"
+        "from config.config_loader import load_config\n"
+        "load_config('../config/env/config.yaml', environ={'TOKEN_SECRET': 'x', 'INTERNAL_PORT': '8080',"
+        " 'PUBLIC_PORT': '8081'})\n"
+        "print(json.dumps(sorted(sys.modules)))\n"
+    )
+    loaded = set(json.loads(run_python("-c", script).stdout))
+
+    assert [module for module in DEFERRED_MODULES if module in loaded] == []
+
+def test_importing_main_stays_within_budget():
+    samples = []
+    for _ in range(3):
+        stderr = run_python("-X", "importtime", "-c", "import main").stderr
+        line = next(line for line in stderr.splitlines() if line.rstrip().endswith("| main"))
+        samples.append(int(line.split("|")[1]) / 1000)
+
+    assert min(samples) < IMPORT_BUDGET_MS, f"importing main took {min(samples):.1f}ms"
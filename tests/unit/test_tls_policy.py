@@ -0,0 +1,56 @@
+import ssl
+import logging
+
+import pytest
+
+from config.schema import Config
+from core import tls_policy
+
+class ProviderlessLib:
+    """
+    Wraps the real libssl bindings like an OpenSSL 1.1 build, which has no ``OSSL_PROVIDER_load``.
+    """
+
+    def __init__(self, lib):
+        self._lib = lib
+
+    def __getattr__(self, name):
+        if name == "OSSL_PROVIDER_load":
+            raise AttributeError(name)
+        return getattr(self._lib, name)
+
+@pytest.fixture
+def providerless(monkeypatch):
+    bindings = tls_policy._LibSSL()
+    bindings.lib = ProviderlessLib(bindings.lib)
+    monkeypatch.setattr(tls_policy, "_bindings", bindings)
+    monkeypatch.setattr(tls_policy, "_bindings_checked", True)
+    monkeypatch.setattr(tls_policy, "_loaded_providers", set())
+    return bindings
+
+def test_missing_provider_support_keeps_the_group_bindings(providerless, caplog):
+    with caplog.at_level(logging.WARNING, logger="core.tls_policy"):
+        tls_policy.load_providers(["oqsprovider"])
+    assert "has no providers" in caplog.text
+    assert tls_policy._loaded_providers == set()
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    assert tls_policy.configure_groups(context, ["X25519", "secp256r1"]) == (("X25519", "secp256r1"), ())
+
+def compile_config(cert_file, key_file, policy, **sections):
+    return Config.compile({"tls": {"cert_file": cert_file, "key_file": key_file, "policy": policy}, **sections})
+
+def test_handshake_metrics_are_opt_in(make_certificate):
+    from main import create_tls_policies
+
+    cert_file, key_file = make_certificate()
+    monitoring = {"monitoring": {"metrics_port": 9100}}
+
+    assert create_tls_policies(compile_config(cert_file, key_file, {}, **monitoring)) is None
+
+    policies = create_tls_policies(compile_config(cert_file, key_file, {"groups": ["X25519"]}, **monitoring))
+    assert policies.on_handshake is None
+
+    policies = create_tls_policies(compile_config(cert_file, key_file, {"handshake_metrics": True}, **monitoring))
+    assert policies.on_handshake is not None
+    assert create_tls_policies(compile_config(cert_file, key_file, {"handshake_metrics": True})).on_handshake is None
@@ -0,0 +1,152 @@
+import pytest
+
+from core.traffic_classes import TrafficClass, TrafficClasses, parse_listen_address
+
+class Waiter:
+    """
+    A connection asking for a handshake slot, recording when it is granted or shed.
+    """
+
+    def __init__(self, traffic, name, log, local_address=("0.0.0.0", 8443), server_name=None):
+        self.name = name
+        self.admission = traffic.admit(local_address, server_name)
+        self.started = self.admission.request_handshake(lambda: log.append(("grant", name)),
+                                                        lambda reason: log.append((reason, name)))
+
+def make_traffic(handshake_slots=1, max_queued=16, **options):
+    sheds = []
+    classes = [
+        TrafficClass("interactive", weight=3, priority=2, server_names=["api.example", "*.api.example"], **options),
+        TrafficClass("bulk", weight=1, priority=0, listen=["[::]:9443"], client_networks=["10.0.0.0/8"]),
+    ]
+    traffic = TrafficClasses(classes + [TrafficClass("default")], "default", handshake_slots=handshake_slots,
+                             max_queued=max_queued, on_shed=lambda name, reason: sheds.append((name, reason)))
+    return traffic, sheds
+
+def test_connections_are_classified_by_address_server_name_and_network():
+    traffic, _ = make_traffic()
+
+    assert parse_listen_address("[::]:9443") == ("::", 9443)
+    assert parse_listen_address(":8443") == ("0.0.0.0", 8443)
+    with pytest.raises(ValueError):
+        parse_listen_address("localhost")
+    assert traffic.listen_addresses() == [("::", 9443)]
+
+    def classify(*args):
+        return traffic.classify(*args).name
+
+    assert classify(("::", 9443), "api.example") == "interactive"
+    assert classify(("::", 9443)) == "bulk"
+    assert classify(("0.0.0.0", 8443), "v2.api.example") == "interactive"
+    assert classify(("0.0.0.0", 8443), "api.example.org") == "default"
+    assert classify(("0.0.0.0", 8443), None, ("10.1.2.3", 5000)) == "bulk"
+    assert classify(("0.0.0.0", 8443), None, ("192.0.2.1", 5000)) == "default"
+    assert traffic.needs_server_name and not traffic.needs_identity
+
+def finish_granted(waiters, log, count):
+    # Completes the handshake of the connection granted last, ``count`` times in a row
+    for _ in range(count):
+        next(waiter for waiter in waiters if ("grant", waiter.name) == log[-1]).admission.handshake_finished()
+
+def test_slots_are_granted_by_weighted_fair_queueing():
+    traffic, _ = make_traffic()
+    log = []
+    holder = Waiter(traffic, "holder", log)
+    assert holder.started
+
+    waiters = [Waiter(traffic, f"bulk{i}", log, ("::", 9443)) for i in range(4)]
+    waiters += [Waiter(traffic, f"interactive{i}", log, server_name="api.example") for i in range(4)]
+    assert not any(waiter.started for waiter in waiters)
+    assert traffic.queued == 8
+
+    holder.admission.handshake_finished()
+    finish_granted(waiters, log, 8)
+
+    # Weight 3 against 1: three interactive handshakes per bulk one; ties go to the class listed first
+    assert [name for _, name in log] == ["interactive0", "interactive1", "interactive2", "bulk0", "interactive3",
+                                         "bulk1", "bulk2", "bulk3"]
+    assert traffic.busy == 0 and traffic.queued == 0
+
+def test_an_idle_class_gets_no_credit_for_its_idle_time():
+    traffic, _ = make_traffic()
+    log = []
+    holder = Waiter(traffic, "holder", log)
+    bulk = [Waiter(traffic, f"bulk{i}", log, ("::", 9443)) for i in range(6)]
+    holder.admission.handshake_finished()
+    finish_granted(bulk, log, 3)
+    assert [name for _, name in log] == ["bulk0", "bulk1", "bulk2", "bulk3"]
+
+    # The interactive class arrives late; its tags start at the virtual time, not at zero,
+    # so it gets its weighted share from now on instead of all slots until it catches up
+    late = [Waiter(traffic, f"interactive{i}", log, server_name="api.example") for i in range(6)]
+    finish_granted(bulk + late, log, 5)
+    assert [name for _, name in log[4:]] == ["interactive0", "interactive1", "interactive2", "bulk4",
+                                             "interactive3"]
+
+def test_full_queue_sheds_the_newest_lowest_priority_waiter():
+    traffic, sheds = make_traffic(max_queued=2)
+    log = []
+    Waiter(traffic, "holder", log)
+    first = Waiter(traffic, "bulk0", log, ("::", 9443))
+    Waiter(traffic, "bulk1", log, ("::", 9443))
+
+    # Same priority: the newcomer is shed
+    Waiter(traffic, "bulk2", log, ("::", 9443))
+    assert log == [("queue_full", "bulk2")]
+    # Higher priority: the newest bulk waiter makes room
+    important = Waiter(traffic, "interactive0", log, server_name="api.example")
+    assert log[-1] == ("queue_full", "bulk1")
+    assert sheds == [("bulk", "queue_full"), ("bulk", "queue_full")]
+    assert traffic.queued == 2 and not important.started
+
+    # A withdrawn waiter is not picked as the victim
+    first.admission.close()
+    assert traffic.queued == 1
+    Waiter(traffic, "interactive1", log, server_name="api.example")
+    Waiter(traffic, "interactive2", log, server_name="api.example")
+    assert log[-1] == ("queue_full", "interactive2")
+
+def test_waiters_past_their_queue_wait_are_shed_at_the_head():
+    traffic, sheds = make_traffic(max_queue_wait=0.5)
+    log = []
+    holder = Waiter(traffic, "holder", log)
+    stale = Waiter(traffic, "interactive0", log, server_name="api.example")
+    fresh = Waiter(traffic, "interactive1", log, server_name="api.example")
+    stale.admission.queued_at -= 1.0
+
+    holder.admission.handshake_finished()
+    assert log == [("queue_timeout", "interactive0"), ("grant", "interactive1")]
+    assert sheds == [("interactive", "queue_timeout")]
+    assert fresh.admission.state == "handshaking" and stale.admission.state == "shed"
+
+def test_connection_limits_and_slot_accounting():
+    traffic, sheds = make_traffic(handshake_slots=2, max_connections=2)
+    log = []
+    first = Waiter(traffic, "interactive0", log, server_name="api.example")
+    second = Waiter(traffic, "interactive1", log, server_name="api.example")
+    assert first.started and second.started
+    assert traffic.admit(("0.0.0.0", 8443), "api.example") is None
+    assert sheds == [("interactive", "connection_limit")]
+
+    first.admission.handshake_finished()
+    first.admission.handshake_finished()
+    assert traffic.busy == 1
+    first.admission.close()
+    first.admission.close()
+    assert traffic.classes["interactive"].connections == 1
+    assert traffic.admit(("0.0.0.0", 8443), "api.example") is not None
+
+def test_reconfigure_keeps_queued_connections():
+    traffic, _ = make_traffic()
+    log = []
+    holder = Waiter(traffic, "holder", log)
+    waiter = Waiter(traffic, "bulk0", log, ("::", 9443))
+
+    # bulk is removed; its waiter is still served, from the retired class
+    traffic.reconfigure([TrafficClass("interactive", weight=1, server_names=["api.example"]),
+                         TrafficClass("default")], "default", handshake_slots=1)
+    assert [traffic_class.name for traffic_class in traffic.retired] == ["bulk"]
+    holder.admission.handshake_finished()
+    assert log == [("grant", "bulk0")]
+    waiter.admission.close()
+    assert traffic.classify(("::", 9443)).name == "default"